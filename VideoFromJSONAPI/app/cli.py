@@ -5,6 +5,7 @@ import logging
 import sys
 from pathlib import Path
 
+from app.utils.util_schema import CREATION_SCHEMA, validate_creation_body
 from app.video_processor import VideoProcessor
 
 
@@ -102,6 +103,38 @@ def validate_video(args):
         return 1
 
 
+def validate_body(args):
+    """Validate a creation request body against the API's schema."""
+    logger = setup_logging()
+
+    try:
+        if args.input == "-":
+            data = json.load(sys.stdin)
+        else:
+            with open(args.input) as f:
+                data = json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading request body: {str(e)}")
+        return 1
+
+    # Accept a full request ({"body": {...}}) or the body on its own
+    if isinstance(data, dict) and "body" in data:
+        data = data["body"]
+    errors = validate_creation_body(data)
+    for error in errors:
+        logger.error(f"{error['path']}: {error['message']}")
+    if errors:
+        return 1
+    logger.info("Request body is valid")
+    return 0
+
+
+def print_schema(args):
+    """Print the JSON Schema of creation request bodies."""
+    print(json.dumps(CREATION_SCHEMA, indent=2))
+    return 0
+
+
 def main():
     """Main entry point for the CLI."""
     parser = argparse.ArgumentParser(
@@ -148,6 +181,16 @@ def main():
         "platform", choices=["tiktok", "instagram", "facebook", "youtube"],
         help="Target platform")
     
+    # Validate request body command
+    validate_body_parser = subparsers.add_parser(
+        "validate-body", help="Validate a creation request body before sending it")
+    validate_body_parser.add_argument(
+        "input", help="JSON file with the request body, or - for stdin")
+
+    # Print schema command
+    subparsers.add_parser(
+        "schema", help="Print the JSON Schema of creation request bodies")
+
     args = parser.parse_args()
     
     if args.command == "process":
@@ -156,6 +199,10 @@ def main():
         return get_video_info(args)
     elif args.command == "validate":
         return validate_video(args)
+    elif args.command == "validate-body":
+        return validate_body(args)
+    elif args.command == "schema":
+        return print_schema(args)
     else:
         parser.print_help()
         return 1
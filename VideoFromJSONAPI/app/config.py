@@ -1,6 +1,7 @@
 import logging
 import os
 import shutil
+import socket
 from datetime import datetime, timedelta
 from typing import Any, Dict
 
@@ -14,9 +15,24 @@ class Config:
     # Configuration
     API_KEY = os.getenv("API_KEY", "your_api_key_here")
     PIXABAY_API_KEY = os.getenv("PIXABAY_API_KEY", "47235106-227579315fdd6311b7e7cbb7b")
-    SUCCESS_WEBHOOK_URL = "https://hook.us1.make.com/31yc9urbo92ui6og29em8f5be9rfuj5b"
-    ERROR_WEBHOOK_URL = "https://hook.us1.make.com/31yc9urbo92ui6og29em8f5be9rfuj5b"
-    LOG_LEVEL = logging.DEBUG
+    # Webhooks posted for every finished job (in addition to per-job webhooks)
+    SUCCESS_WEBHOOK_URL = os.getenv("SUCCESS_WEBHOOK_URL", "")
+    ERROR_WEBHOOK_URL = os.getenv("ERROR_WEBHOOK_URL", "")
+    # Logging (see util_logging): records are written by one thread per process
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "json" (one object per line)
+    LOG_TEXT_FORMAT = "%(asctime)s - %(process)d - %(levelname)s - %(name)s - %(message)s"
+    LOG_QUEUE_SIZE = 10000  # records waiting for the writer; more are dropped
+    LOG_DEBUG_SAMPLE_RATE = int(os.getenv("LOG_DEBUG_SAMPLE_RATE", "100"))  # keep 1 in N sampled debug events
+    # Production serving with gunicorn (see gunicorn.conf.py)
+    WSGI_SERVER = os.getenv("WSGI_SERVER", "")  # set by gunicorn.conf.py: startup work runs in its hooks
+    API_BIND = os.getenv("API_BIND", "0.0.0.0:5000")
+    API_WORKERS = int(os.getenv("API_WORKERS", "4"))  # server processes
+    API_THREADS = int(os.getenv("API_THREADS", "8"))  # request threads per process
+    API_PRELOAD = os.getenv("API_PRELOAD", "true").lower() == "true"  # import the app once, before forking
+    API_TIMEOUT = int(os.getenv("API_TIMEOUT", "120"))  # seconds a silent worker lives before it is restarted
+    API_GRACEFUL_TIMEOUT = 30  # seconds workers get to finish requests on restart
+    API_KEEPALIVE = 5  # seconds idle client connections are kept open
     DEBUG = os.getenv("FLASK_DEBUG", "False").lower() == "true"
     REQUEST_ID_HEADER = "X-Request-ID"
     ENABLE_REQUEST_ID = True
@@ -142,6 +158,9 @@ class Config:
             "price": 0,
             "credits": 10,
             "rate_limit": 1,  # requests per minute
+            "weight": 1,  # share of render workers relative to other plans
+            "max_concurrent_jobs": 1,  # renders one key may run at once
+            "max_render_seconds": 300,  # renders running longer are killed
             "features": ["basic_video_creation", "720p_resolution"]
         },
         "starter": {
@@ -149,6 +168,9 @@ class Config:
             "price": 19.99,
             "credits": 60,
             "rate_limit": 1,
+            "weight": 2,
+            "max_concurrent_jobs": 1,
+            "max_render_seconds": 600,
             "features": ["basic_video_creation", "1080p_resolution", "watermark"]
         },
         "creator": {
@@ -156,6 +178,9 @@ class Config:
             "price": 39.99,
             "credits": 150,
             "rate_limit": 1,
+            "weight": 4,
+            "max_concurrent_jobs": 2,
+            "max_render_seconds": 1200,
             "features": ["basic_video_creation", "1080p_resolution", "watermark", "custom_fonts"]
         },
         "pro": {
@@ -163,6 +188,9 @@ class Config:
             "price": 79.99,
             "credits": 500,
             "rate_limit": 1,
+            "weight": 8,
+            "max_concurrent_jobs": 4,
+            "max_render_seconds": 3600,
             "features": ["basic_video_creation", "4k_resolution", "watermark", "custom_fonts", "priority_support"]
         }
     }
@@ -176,8 +204,6 @@ class Config:
             "created_at": datetime.now().isoformat(),
             "expires_at": (datetime.now() + timedelta(days=365)).isoformat(),
             "is_active": True,
-            "credits_used": 0,
-            "credits_reset": (datetime.now() + timedelta(days=30)).isoformat(),
             "last_request": None
         }
     }
@@ -191,17 +217,160 @@ class Config:
     
     # API Key Settings
     API_KEY_HEADER = "X-API-Key"
+    IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+    # Seconds a finished render is reused for an identical request that uses
+    # remote URLs, whose content can change (local assets are hashed by content)
+    DEDUP_REUSE_TTL = int(os.getenv("DEDUP_REUSE_TTL", "3600"))
     API_KEY_LENGTH = 32
     API_KEY_EXPIRY_DAYS = 365  # Default expiry period
+    API_KEY_CACHE_TTL = 300  # seconds a key looked up in Supabase is trusted
+    API_KEY_NEGATIVE_CACHE_TTL = 30  # seconds an unknown key is remembered as invalid
+    API_KEY_CACHE_SIZE = 10000  # cached lookups kept per process, least recently used dropped
+    API_KEY_INVALIDATION_INTERVAL = 1.0  # seconds between checks for keys revoked by other processes
     
     # Rate Limiting
-    RATE_LIMIT_REQUESTS = 1  # requests per minute
+    RATE_LIMIT_REQUESTS = 1  # requests per period for keys without a plan rate_limit
     RATE_LIMIT_PERIOD = 60  # seconds
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sqlite")  # "sqlite" (shared by processes) or "memory"
+    RATE_LIMIT_STORE_PATH = os.getenv("RATE_LIMIT_STORE_PATH", os.path.join("temp", "ratelimit.sqlite3"))
     
+    # Credits (ledger in the job store database, see util_credits)
+    CREDITS_PER_JOB = 1
+    CREDIT_CACHE_TTL = 5  # seconds a process may show a cached credit balance
+
     # Video Processing
     MAX_SEGMENTS = 20
     MIN_SEGMENTS = 1
+    MAX_VALIDATION_ERRORS = 50  # errors listed in one rejected creation body
     DEFAULT_RESOLUTION = "1920x1080"
     DEFAULT_FPS = 30
 
+    # Batch creation
+    MAX_BATCH_SIZE = 100  # bodies accepted by one /creation/batch request
+    ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join("temp", "asset_cache"))  # shared downloads, relative to ROOT_DIR
+    ASSET_CACHE_TTL = 24 * 3600  # seconds a downloaded asset is reused
+
+    # Resumable uploads (see util_uploads)
+    ASSET_STORE_DIR = os.getenv("ASSET_STORE_DIR", os.path.join("uploads", "assets"))  # uploaded files by SHA-256, relative to ROOT_DIR
+    UPLOAD_PARTS_DIR = os.getenv("UPLOAD_PARTS_DIR", os.path.join("temp", "uploads"))  # uploads in progress, relative to ROOT_DIR
+    UPLOAD_MAX_SIZE = 2 * 1024 ** 3  # bytes per upload
+    UPLOAD_CHUNK_SIZE = 8 * 1024 ** 2  # chunk size suggested to clients
+    UPLOAD_BUFFER_SIZE = 1024 ** 2  # bytes read from a request at a time
+    UPLOAD_WRITER_TIMEOUT = 600  # seconds before a stalled chunk stops blocking the next one
+    UPLOAD_SESSION_TTL = 24 * 3600  # seconds an idle upload is kept
+
+    # Asset ingest (see util_ingest): renditions prepared once per uploaded asset
+    ASSET_RENDITION_DIR = os.getenv("ASSET_RENDITION_DIR", os.path.join("uploads", "renditions"))  # relative to ROOT_DIR
+    FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+    FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+    INGEST_RESOLUTIONS = ["1920x1080", "1080x1920", "1080x1080"]  # image variants and mezzanines made per asset
+    INGEST_MIX_RATE = 44100  # Hz; sample rate renders mix audio at
+    INGEST_MIX_CHANNELS = 2
+    # Mezzanine encode: must match the render's chunk encode so pre/post-rolls
+    # can be joined to outputs with stream copy
+    INGEST_MEZZANINE_FPS = 24
+    INGEST_MEZZANINE_VIDEO_ARGS = ["-c:v", "libx264", "-pix_fmt", "yuv420p"]
+    INGEST_MEZZANINE_AUDIO_ARGS = ["-c:a", "aac"]
+    INGEST_POLL_INTERVAL = 5  # seconds between checks for assets waiting to be ingested
+    INGEST_LEASE_SECONDS = 3600  # ingests not finished by then are retried by any process
+    INGEST_MAX_ATTEMPTS = 3
+    INGEST_RETRY_DELAY = 60  # seconds before a failed ingest is tried again
+    BATCH_PREFETCH_WORKERS = 8  # concurrent asset downloads per batch
+    BATCH_PREFETCH_TIMEOUT = 30  # seconds per asset download
+
+    # Render scheduling
+    # Set RENDER_WORKERS=0 on API nodes that only accept jobs and run
+    # "python -m app.worker" on the render nodes
+    RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))  # concurrent renders per process
+    SCHEDULER_AGING_RATE = 1 / 60  # virtual time credited per second a job waits
+    SCHEDULER_POLL_INTERVAL = float(os.getenv("SCHEDULER_POLL_INTERVAL", "5"))  # idle worker re-check interval
+    RENDER_START_METHOD = os.getenv("RENDER_START_METHOD", "spawn")  # each render runs in a child process
+    RENDER_SUPERVISE_INTERVAL = 1  # seconds between cancellation/deadline checks
+    RENDER_KILL_GRACE = 5  # seconds between SIGTERM and SIGKILL when stopping a render
+    JOB_WORKSPACE_DIR = os.getenv("JOB_WORKSPACE_DIR", os.path.join("temp", "jobs"))  # per-job scratch and render checkpoints
+    VIDEO_OUTPUT_DIR = os.getenv("VIDEO_OUTPUT_DIR", os.path.join("static", "videos"))  # shared by API and workers
+    LEASE_TIMEOUT = int(os.getenv("LEASE_TIMEOUT", "60"))  # seconds without a heartbeat before a job is re-queued
+    LEASE_HEARTBEAT_INTERVAL = 10  # seconds between lease renewals while rendering
+    MAX_JOB_ATTEMPTS = 3  # leases per job before it is failed instead of retried
+    WORKER_SHUTDOWN_GRACE = int(os.getenv("WORKER_SHUTDOWN_GRACE", "600"))  # seconds to finish renders on SIGTERM
+
+    # Memory-aware admission: a queued job starts only if its predicted peak
+    # RSS fits in what the host's running renders leave of the budget
+    RENDER_MEMORY_BUDGET_MB = int(os.getenv("RENDER_MEMORY_BUDGET_MB", "0"))  # 0: 80% of physical memory, -1: off
+    RENDER_HOST_ID = os.getenv("RENDER_HOST_ID", socket.gethostname())  # workers sharing a budget use the same id
+    MEMORY_BASE_MB = 250  # interpreter, moviepy and ffmpeg before any frames
+    MEMORY_BYTES_PER_PIXEL = 64  # frame buffers and encoder state per output pixel
+    MEMORY_AUDIOGRAM_MB = 150  # waveform analysis of a segment's audio
+    MEMORY_SEGMENT_MB = 2  # bookkeeping per segment (chunks are rendered one at a time)
+    MEMORY_CALIBRATION_WINDOW = 50  # recent measured renders used to calibrate the estimate
+    MEMORY_CALIBRATION_MIN_SAMPLES = 5  # measured renders needed before calibrating
+    MEMORY_BACKFILL_MAX_WAIT = 300  # seconds smaller jobs may overtake a job waiting for memory
+
+    # Video downloads
+    DOWNLOAD_REQUIRE_API_KEY = os.getenv("DOWNLOAD_REQUIRE_API_KEY", "true").lower() == "true"
+    # Internal nginx location serving VIDEO_OUTPUT_DIR (e.g. /internal/videos/);
+    # when set, downloads are handed to nginx with X-Accel-Redirect
+    DOWNLOAD_ACCEL_PREFIX = os.getenv("DOWNLOAD_ACCEL_PREFIX", "")
+    DOWNLOAD_MAX_AGE = 3600  # seconds clients may cache a downloaded video
+
+    # Video catalog listing (GET /api/videos)
+    VIDEO_LIST_PAGE_SIZE = 50
+    VIDEO_LIST_MAX_PAGE_SIZE = 500
+
+    # Render progress reporting
+    PROGRESS_UPDATE_INTERVAL = 1.0  # seconds between progress writes to the job store
+    PROGRESS_FPS_SMOOTHING = 0.3  # EWMA weight of the newest encoding fps sample
+    STATUS_POLL_MIN_SECONDS = 2  # Retry-After bounds suggested to polling clients
+    STATUS_POLL_MAX_SECONDS = 30
+    STATUS_MAX_WAIT = 60  # longest ?wait= a status request may block for
+    STATUS_EVENTS_KEEPALIVE = 15  # seconds between SSE keep-alive comments
+    STATUS_EVENTS_MAX_DURATION = 300  # seconds an event stream stays open before the client reconnects
+    # Long polls and event streams each hold a request thread while they wait.
+    # At most this many wait at once per API process, so the other threads of
+    # API_THREADS stay free for creation, downloads and health checks. Extra
+    # long polls answer at once; extra event streams get 503 with Retry-After.
+    STATUS_MAX_WAITERS = int(os.getenv("STATUS_MAX_WAITERS", str(max(API_THREADS // 2, 1))))
+
+    # Job Store (SQLite in WAL mode, shared by every process on the host)
+    JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join("temp", "jobs.sqlite3"))
+    JOB_TTL_DAYS = int(os.getenv("JOB_TTL_DAYS", "7"))  # Keep finished jobs this long
+    JOB_COMPACT_INTERVAL = 300  # seconds between opportunistic compactions
+    JOB_WATCH_INTERVAL = 0.25  # seconds between checks for changes made by other processes
+
+    # Webhook delivery (outbox in the job store database)
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # default HMAC key for X-Webhook-Signature
+    WEBHOOK_WORKERS = 4  # concurrent deliveries per process
+    WEBHOOK_TIMEOUT = 10  # seconds per delivery request
+    WEBHOOK_POLL_INTERVAL = 1  # seconds between checks for due deliveries
+    WEBHOOK_LEASE_LIMIT = 100  # deliveries leased per check
+    WEBHOOK_LEASE_SECONDS = 300  # leased deliveries not finished by then are retried by any sender
+    WEBHOOK_BATCH_SIZE = 50  # events per request for webhooks with batching enabled
+    WEBHOOK_MAX_ATTEMPTS = 8
+    WEBHOOK_BACKOFF_BASE = 5  # seconds before the first retry, doubled on each failure
+    WEBHOOK_BACKOFF_MAX = 3600
+
+    # Metrics (GET /api/metrics, see util_metrics)
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # bearer token scrapers must send; empty: no auth
+    METRICS_FLUSH_INTERVAL = 5  # seconds between writes of each process's metrics to the job store
+    METRICS_STALE_AFTER = 300  # seconds before a silent process's counters are archived and its gauges dropped
+    METRICS_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]  # seconds
+    METRICS_QUEUE_WAIT_BUCKETS = [0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600]  # seconds
+    METRICS_STAGE_BUCKETS = [0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800]  # seconds
+
+    # Render traces (GET /api/jobs/<video_id>/trace, see util_trace)
+    TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+    TRACE_DIR = os.getenv("TRACE_DIR", os.path.join("temp", "traces"))  # one Chrome trace file per job
+    TRACE_MAX_SPANS = 50000  # spans kept per render attempt; later ones are counted as dropped
+    TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")  # e.g. http://localhost:4318/v1/traces
+    TRACE_OTLP_TIMEOUT = 5  # seconds per export request
+    TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "videofromjson-render")
+
+    # On-demand render profiling (POST /api/profiles, see util_profile)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # bearer token of operator endpoints; empty: they are disabled
+    PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join("temp", "profiles"))  # one profile file per job
+    PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between stack samples of the sampling profiler
+    PROFILE_TOP_FUNCTIONS = 15  # hottest functions listed in the job's status
+    PROFILE_REQUEST_TTL = 24 * 3600  # seconds an unused profile request stays armed
+    PROFILE_MAX_JOBS = 100  # jobs one profile request may cover
+
     logging.debug("Config loaded successfully")
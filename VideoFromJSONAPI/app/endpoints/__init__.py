@@ -10,6 +10,10 @@ from app.endpoints.download import download_bp
 from app.endpoints.health import health_bp
 from app.endpoints.temp_videos import temp_videos_bp
 from app.endpoints.random_data import random_data_bp
+from app.endpoints.queue import queue_bp
+from app.endpoints.jobs import jobs_bp
+from app.endpoints.metrics import metrics_bp
+from app.endpoints.profiles import profiles_bp
 
 allroutes.register_blueprint(creation_bp)
 allroutes.register_blueprint(upload_bp)
@@ -19,3 +23,7 @@ allroutes.register_blueprint(download_bp)
 allroutes.register_blueprint(health_bp)
 allroutes.register_blueprint(temp_videos_bp)
 allroutes.register_blueprint(random_data_bp)
+allroutes.register_blueprint(queue_bp)
+allroutes.register_blueprint(jobs_bp)
+allroutes.register_blueprint(metrics_bp)
+allroutes.register_blueprint(profiles_bp)
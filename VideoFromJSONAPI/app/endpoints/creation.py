@@ -1,24 +1,124 @@
 """Video creation endpoint."""
+import json
 import logging
+import os
 import threading
 import uuid
+from typing import Any, Dict, List, Optional, Tuple
 
 from app.config import Config
+from app.endpoints.status import job_status_payload
+from app.utils.util_auth import validate_api_key
+from app.utils.util_batch import aggregate_status, asset_prefetcher, remote_assets, rewrite_assets
+from app.utils.util_credits import credit_ledger
+from app.utils.util_dedup import link_output, plan_hasher
+from app.utils.util_job_store import job_store
+from app.utils.util_metrics import CACHE_BYTES, CACHE_REQUESTS
 from app.utils.util_rate_limit import rate_limiter
-from app.utils.util_video import process_video
+from app.utils.util_scheduler import render_scheduler
+from app.utils.util_schema import CREATION_SCHEMA, CREATION_SCHEMA_VERSION, validate_creation_body
+from app.utils.util_webhook import parse_webhook
 from flask import Blueprint, jsonify, request
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-logger.info("Importing creation blueprint")
 creation_bp = Blueprint("creation", __name__)
 
-# Define video_status and status_lock
-video_status = {}
+# video_status is backed by the persistent job store so every worker process
+# sees the same jobs; status_lock is kept for callers that still take it.
+video_status = job_store.status_view()
 status_lock = threading.Lock()
 
 
+def parse_creation_body(body: Any) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, str]]]:
+    """
+    Validate a creation request body against the schema and apply defaults.
+
+    Args:
+        body: The "body" object of a creation request
+
+    Returns:
+        Tuple of (renderer keyword arguments, None) on success or
+        (None, error response listing every problem) if the body is invalid
+    """
+    if not isinstance(body, dict):
+        return None, {
+            "error": "Invalid JSON format",
+            "message": "Field body must be an object"
+        }
+
+    # Reject the whole body before it takes a queue slot or credits
+    errors = validate_creation_body(body)
+    if errors:
+        return None, {
+            "error": "Invalid JSON format",
+            "message": "; ".join(f"{error['path']}: {error['message']}" for error in errors),
+            "errors": errors,
+            "schema_version": CREATION_SCHEMA_VERSION,
+        }
+
+    # Extract parameters from request body with defaults
+    return {
+        "segments": body["segments"],
+        "zoom_pan": body.get("zoom_pan", False),
+        "fade_effect": body.get("fade_effect", "fade"),
+        "audiogram": body.get("audiogram"),
+        "watermark": body.get("watermark"),
+        "background_music": body.get("background_music"),
+        "resolution": body.get("resolution", "1920x1080"),
+        "thumbnail": body.get("thumbnail", False),
+        "audio_enhancement": body.get("audio_enhancement"),
+        "dynamic_text": body.get("dynamic_text"),
+        "template": body.get("template"),
+        "use_local_files": body.get("use_local_files", False),
+        "intro_music": body.get("intro_music"),
+        "outro_music": body.get("outro_music"),
+        "audio_filters": body.get("audio_filters"),
+        "segment_audio_effects": body.get("segment_audio_effects"),
+    }, None
+
+
+def credit_summary(api_key: str) -> Dict[str, Any]:
+    """Return the credit block included in creation responses."""
+    credit_info = credit_ledger.credit_info(api_key) or {}
+    return {
+        'plan': credit_info.get('plan', 'Free'),
+        'credits_used': credit_info.get('credits_used', 0),
+        'credits_reserved': credit_info.get('credits_reserved', 0),
+        'credits_remaining': credit_info.get('credits_remaining', 0),
+        'credits_total': credit_info.get('credits_total', 0),
+        'credits_reset': credit_info.get('credits_reset')
+    }
+
+
+def attach_to_source(
+    video_id: str, outcome: str, source: Optional[Dict[str, Any]]
+) -> Optional[Dict[str, str]]:
+    """
+    Finish setting up a job that was matched to an identical earlier job.
+
+    Args:
+        video_id: The new job
+        outcome: Result of ``job_store.claim_job``
+        source: The matched job, if any
+
+    Returns:
+        Optional[Dict[str, str]]: The "deduplicated" block for the response,
+        or None if the job will be rendered
+    """
+    if outcome == "reused":
+        try:
+            output_path = link_output(source["output_path"], video_id)
+            job_store.update_job(video_id, output_path=output_path)
+            CACHE_BYTES.inc(os.path.getsize(output_path), tier="dedup", result="hit")
+        except OSError as e:
+            logger.error(f"Error linking reused output for {video_id}: {e}")
+    CACHE_REQUESTS.inc(tier="dedup", result="hit" if outcome in ("reused", "coalesced") else "miss")
+    if outcome in ("reused", "coalesced"):
+        return {"type": outcome, "source_video_id": source["video_id"]}
+    return None
+
+
 @creation_bp.route("/creation", methods=["POST", "GET"])
 def create_video():
     """
@@ -47,6 +147,12 @@ def create_video():
                 "outro_music": "str, optional",
                 "audio_filters": "dict, optional",
                 "segment_audio_effects": "list, optional",
+                "webhook": "str or dict, optional, URL (or {url, secret, batch}) notified when the job finishes",
+            },
+            "schema": "/creation/schema",
+            "headers": {
+                "Idempotency-Key": "str, optional, retries with the same key return the original job",
+                "Cache-Control": "str, optional, 'no-cache' renders even if an identical video exists",
             },
             "example": {
                 "body": {
@@ -71,6 +177,11 @@ def create_video():
             "error": "Unauthorized",
             "message": "API key required"
         }), 401
+    if not validate_api_key(request):
+        return jsonify({
+            "error": "Unauthorized",
+            "message": "Valid API key required"
+        }), 401
 
     # Check rate limit and credits
     allowed, error = rate_limiter.check_rate_limit(api_key)
@@ -80,12 +191,8 @@ def create_video():
             "message": error
         }), 429
 
-    allowed, error = rate_limiter.check_credits(api_key)
-    if not allowed:
-        return jsonify({
-            "error": "Credit limit reached",
-            "message": error
-        }), 403
+    # Credits are checked when the job is claimed below: identical resubmits
+    # and Idempotency-Key retries are answered even when none are left
 
     # Check content type
     if request.content_type != "application/json":
@@ -102,96 +209,321 @@ def create_video():
             "message": "Missing required field: body"
         }), 400
 
+    payload, error = parse_creation_body(data["body"])
+    if error:
+        return jsonify(error), 400
+    webhook, error = parse_webhook(data["body"])
+    if error:
+        return jsonify(error), 400
+
     # Generate a unique video ID
     video_id = str(uuid.uuid4())
 
-    # Extract parameters from request body with defaults
-    body = data["body"]
-    segments = body.get("segments", [])
-    zoom_pan = body.get("zoom_pan", False)
-    fade_effect = body.get("fade_effect", "fade")
-    audiogram = body.get("audiogram")
-    watermark = body.get("watermark")
-    background_music = body.get("background_music")
-    resolution = body.get("resolution", "1920x1080")
-    thumbnail = body.get("thumbnail", False)
-    audio_enhancement = body.get("audio_enhancement")
-    dynamic_text = body.get("dynamic_text")
-    template = body.get("template")
-    use_local_files = body.get("use_local_files", False)
-    intro_music = body.get("intro_music")
-    outro_music = body.get("outro_music")
-    audio_filters = body.get("audio_filters")
-    segment_audio_effects = body.get("segment_audio_effects")
-
-    # Validate segments
-    if not segments or not isinstance(segments, list):
+    # Identical plans from the same key share one render; "Cache-Control:
+    # no-cache" forces a fresh one
+    plan_hash = plan_hasher.plan_hash(payload)
+    idempotency_key = request.headers.get(Config.IDEMPOTENCY_KEY_HEADER)
+    reuse = "no-cache" not in request.headers.get("Cache-Control", "")
+    # A job that is rendered reserves its credits as it is created; they are
+    # charged if it completes and refunded otherwise
+    outcome, source = job_store.claim_job(
+        video_id, api_key, plan_hash, idempotency_key=idempotency_key, reuse=reuse, webhook=webhook,
+        admit=credit_ledger.admit(api_key, Config.CREDITS_PER_JOB), credits=Config.CREDITS_PER_JOB,
+        reuse_ttl=plan_hasher.reuse_ttl(payload)
+    )
+
+    if outcome == "refused":
         return jsonify({
-            "error": "Invalid segments",
-            "message": "Segments must be a non-empty list"
-        }), 400
+            "error": "Credit limit reached",
+            "message": "Monthly credit limit reached"
+        }), 403
+
+    if outcome == "replay":
+        if source["plan_hash"] != plan_hash:
+            return jsonify({
+                "error": "Idempotency key reused",
+                "message": "Idempotency-Key was already used with a different request body"
+            }), 422
+        # Retried request: answer with the original job and do not charge again
+        response = jsonify({
+            "message": "Request already accepted",
+            **job_status_payload(source),
+        })
+        response.headers["Idempotent-Replayed"] = "true"
+        return response, 200
+
+    deduplicated = attach_to_source(video_id, outcome, source)
+    if outcome == "created":
+        # Queue the render; workers pick jobs in plan-weighted fair-share order
+        plan = Config.API_KEYS.get(api_key, {}).get("plan", "free")
+        render_scheduler.submit(video_id, plan, payload)
+
+    result = {
+        'message': 'Video processing started',
+        'video_id': video_id,
+        'status': 'Processing',
+        'credits': credit_summary(api_key)
+    }
+    if deduplicated:
+        result['deduplicated'] = deduplicated
+    if outcome == "reused":
+        result.update(job_status_payload(job_store.get_job(video_id)))
+        result['message'] = 'Identical video already rendered'
+        return jsonify(result), 200
+    return jsonify(result), 202
+
+
+@creation_bp.route("/creation/schema", methods=["GET"])
+def get_creation_schema():
+    """Return the JSON Schema that creation request bodies are validated against."""
+    response = jsonify(CREATION_SCHEMA)
+    response.headers["X-Schema-Version"] = str(CREATION_SCHEMA_VERSION)
+    return response, 200
+
+
+def parse_batch_items(req) -> Tuple[Optional[List[Any]], Optional[Tuple[Dict[str, Any], int]]]:
+    """
+    Read the request bodies of a batch from a JSON array or an NDJSON stream.
+
+    Each item is either a full creation request (``{"body": {...}}``) or just
+    its body.
+
+    Returns:
+        Tuple of (items, None) or (None, (error response, status code))
+    """
+    content_type = (req.content_type or "").split(";")[0].strip()
+    if content_type in ("application/x-ndjson", "application/jsonl"):
+        items, errors = [], []
+        for line_number, line in enumerate(req.get_data(as_text=True).splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                errors.append({"line": line_number, "message": str(e)})
+        if errors:
+            return None, ({
+                "error": "Invalid JSON format",
+                "message": "Some NDJSON lines could not be parsed",
+                "lines": errors
+            }, 400)
+    elif content_type == "application/json":
+        data = req.get_json(silent=True)
+        items = data.get("items") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            return None, ({
+                "error": "Invalid JSON format",
+                "message": "Expected a JSON array of request bodies"
+            }, 400)
+    else:
+        return None, ({
+            "error": "Unsupported Media Type",
+            "message": "Content-Type must be application/json or application/x-ndjson"
+        }, 415)
 
-    if len(segments) > 20:
+    items = [item["body"] if isinstance(item, dict) and "body" in item else item for item in items]
+    if not items:
+        return None, ({"error": "Empty batch", "message": "Batch contains no requests"}, 400)
+    if len(items) > Config.MAX_BATCH_SIZE:
+        return None, ({
+            "error": "Batch too large",
+            "message": f"Maximum {Config.MAX_BATCH_SIZE} requests per batch"
+        }, 400)
+    return items, None
+
+
+def prefetch_batch_assets(jobs: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """
+    Download the union of a batch's remote assets once and point the batch's
+    still-queued renders at the local copies.
+
+    The renders are queued before this runs, so it is only an optimisation:
+    a job leased before its assets arrive (or after this process exits)
+    downloads them itself.
+
+    Args:
+        jobs: (video_id, renderer keyword arguments) for every job to render
+    """
+    try:
+        mapping = asset_prefetcher.fetch_all(
+            set().union(*(remote_assets(payload) for _, payload in jobs))
+        )
+    except Exception as e:
+        logger.error(f"Error prefetching batch assets: {e}")
+        return
+    for video_id, payload in jobs:
+        rewritten = rewrite_assets(payload, mapping)
+        if rewritten != payload:
+            job_store.update_queued_payload(video_id, rewritten)
+
+
+@creation_bp.route("/creation/batch", methods=["POST", "GET"])
+def create_video_batch():
+    """
+    Create several videos from one request.
+    """
+    if request.method == "GET":
+        return jsonify({
+            "endpoint": "/creation/batch",
+            "method": "POST",
+            "content_types": ["application/json", "application/x-ndjson"],
+            "parameters": {
+                "items": "list, required, 1-%d creation bodies (a JSON array, "
+                         "{\"items\": [...]} or one body per NDJSON line)" % Config.MAX_BATCH_SIZE,
+            },
+            "headers": {
+                "Cache-Control": "str, optional, 'no-cache' renders even if an identical video exists",
+            },
+            "returns": {
+                "batch_id": "str, identifier for GET /creation/batch/<batch_id>",
+                "status": "str, aggregate status of the batch",
+                "items": "list, per item: index, video_id and deduplicated (if any), "
+                         "or error if the key ran out of credits while the batch was created",
+                "credits": "dict, credit information after the batch",
+            },
+        }), 200
+
+    api_key = request.headers.get("X-API-Key")
+    if not api_key:
+        return jsonify({
+            "error": "Unauthorized",
+            "message": "API key required"
+        }), 401
+    if not validate_api_key(request):
         return jsonify({
-            "error": "Too many segments",
-            "message": "Maximum 20 segments allowed"
+            "error": "Unauthorized",
+            "message": "Valid API key required"
+        }), 401
+
+    # A batch counts as a single request against the rate limit
+    allowed, error = rate_limiter.check_rate_limit(api_key)
+    if not allowed:
+        return jsonify({
+            "error": "Rate limit exceeded",
+            "message": error
+        }), 429
+
+    items, failure = parse_batch_items(request)
+    if failure:
+        return jsonify(failure[0]), failure[1]
+
+    # Validate every item before creating any job
+    payloads, webhooks, errors = [], [], []
+    for index, body in enumerate(items):
+        payload, error = parse_creation_body(body)
+        if not error:
+            webhook, error = parse_webhook(body)
+            webhooks.append(webhook)
+        if error:
+            errors.append({"index": index, **error})
+        payloads.append(payload)
+    if errors:
+        return jsonify({
+            "error": "Invalid batch",
+            "message": f"{len(errors)} of {len(items)} requests are invalid",
+            "items": errors
         }), 400
 
-    # Initialize video status
-    with status_lock:
-        video_status[video_id] = "Processing"
-
-    # Start video processing in a separate thread
-    thread = threading.Thread(
-        target=process_video,
-        args=(
-            video_id,
-            segments,
-            zoom_pan,
-            fade_effect,
-            audiogram,
-            watermark,
-            background_music,
-            resolution,
-            thumbnail,
-            audio_enhancement,
-            dynamic_text,
-            template,
-            use_local_files,
-            video_status,
-            status_lock,
-            intro_music,
-            outro_music,
-            audio_filters,
-            segment_audio_effects,
-        ),
-    )
-    thread.daemon = True
-    thread.start()
+    # Only items that will be rendered need credits: identical items share one
+    # render, inside the batch or with an earlier job of the key
+    reuse = "no-cache" not in request.headers.get("Cache-Control", "")
+    plan_hashes = [plan_hasher.plan_hash(payload) for payload in payloads]
+    rendered = len(payloads)
+    if reuse:
+        rendered = sum(
+            1 for plan_hash, payload in dict(zip(plan_hashes, payloads)).items()
+            if not job_store.find_identical(api_key, plan_hash, plan_hasher.reuse_ttl(payload))
+        )
+    needed = rendered * Config.CREDITS_PER_JOB
+    if needed:
+        allowed, error = rate_limiter.check_credits(api_key)
+        if allowed:
+            credit_ledger.invalidate(api_key)
+            credit_info = credit_ledger.credit_info(api_key)
+        if not allowed or credit_info["credits_remaining"] < needed:
+            return jsonify({
+                "error": "Credit limit reached",
+                "message": error or (
+                    f"Batch needs {needed} credits, "
+                    f"{credit_info['credits_remaining']} remaining"
+                )
+            }), 403
 
-    # Consume a credit
-    rate_limiter.use_credit(api_key)
+    batch_id = str(uuid.uuid4())
+    results, to_render = [], []
+    for index, payload in enumerate(payloads):
+        video_id = str(uuid.uuid4())
+        # Identical items inside the batch coalesce onto the first of them
+        outcome, source = job_store.claim_job(
+            video_id, api_key, plan_hashes[index], reuse=reuse, batch_id=batch_id,
+            webhook=webhooks[index], admit=credit_ledger.admit(api_key, Config.CREDITS_PER_JOB),
+            credits=Config.CREDITS_PER_JOB, reuse_ttl=plan_hasher.reuse_ttl(payload)
+        )
+        if outcome == "refused":
+            # Credits were spent by a concurrent request since the check above
+            results.append({"index": index, "error": "Credit limit reached"})
+            continue
+        item = {"index": index, "video_id": video_id}
+        deduplicated = attach_to_source(video_id, outcome, source)
+        if deduplicated:
+            item["deduplicated"] = deduplicated
+        else:
+            to_render.append((video_id, payload))
+        results.append(item)
 
-    # Get credit information
-    credit_info = Config.API_KEYS.get(api_key, {})
-    credits_used = credit_info.get('credits_used', 0)
-    credits_total = 60 if credit_info.get('plan', '').lower() == 'starter' else 10  # Default to free tier
-    credits_remaining = credits_total - credits_used
+    plan = Config.API_KEYS.get(api_key, {}).get("plan", "free")
+    # Queued before answering, so the jobs survive a restart of this process
+    for video_id, payload in to_render:
+        render_scheduler.submit(video_id, plan, payload)
+    if to_render:
+        thread = threading.Thread(
+            target=prefetch_batch_assets, args=(to_render,), name=f"batch-{batch_id[:8]}"
+        )
+        thread.daemon = True
+        thread.start()
+    logger.info(f"Accepted batch {batch_id}: {len(results)} items, {len(to_render)} to render")
 
+    status, counts = aggregate_status(job_store.list_batch(batch_id))
     return jsonify({
-        'message': 'Video processing started',
-        'video_id': video_id,
-        'status': 'Processing',
-        'credits': {
-            'plan': credit_info.get('plan', 'Free').title(),
-            'credits_used': credits_used,
-            'credits_remaining': credits_remaining,
-            'credits_total': credits_total,
-            'credits_reset': credit_info.get('credits_reset')
-        }
+        "message": "Batch accepted",
+        "batch_id": batch_id,
+        "status": status,
+        "counts": counts,
+        "items": results,
+        "credits": credit_summary(api_key)
     }), 202
 
 
+@creation_bp.route("/creation/batch/<batch_id>", methods=["GET"])
+def get_batch_status(batch_id):
+    """
+    Return the aggregate status of a batch and the status of each item.
+    """
+    if "info" in request.args:
+        return jsonify({
+            "parameters": {"batch_id": "str, required, identifier returned by /creation/batch"},
+            "returns": {
+                "batch_id": "str",
+                "status": "str, Processing, Completed, Partially completed or Error",
+                "counts": "dict, total, processing, completed and failed",
+                "items": "list, status of each video in submission order",
+            },
+        }), 200
+    jobs = job_store.list_batch(batch_id)
+    if not jobs:
+        return jsonify({
+            "error": "Batch not found",
+            "message": f"Batch ID {batch_id} does not exist"
+        }), 404
+    status, counts = aggregate_status(jobs)
+    return jsonify({
+        "batch_id": batch_id,
+        "status": status,
+        "counts": counts,
+        "items": [job_status_payload(job) for job in jobs]
+    }), 200
+
+
 @creation_bp.route("/api/create_video_with_audio_enhancement", methods=["POST", "GET"])
 def create_video_with_audio_enhancement():
     """Create a video with audio enhancement."""
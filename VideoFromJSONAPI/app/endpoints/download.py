@@ -1,6 +1,10 @@
-from flask import send_from_directory, Blueprint, request, abort, current_app
+from flask import send_from_directory, Blueprint, request, current_app
 from app.utils.util_auth import validate_api_key
+from app.utils.util_catalog import video_catalog
+from app.utils.util_job_store import job_store
+from app.config import Config
 import logging
+import mimetypes
 from werkzeug.utils import secure_filename
 import os
 from flask import jsonify
@@ -10,6 +14,27 @@ logger = logging.getLogger(__name__)  # Ensure logger is correctly configured
 download_bp = Blueprint("download", __name__)
 
 
+def can_download(api_key, filename):
+    """
+    Return True if the API key may download an output file.
+
+    Owners are looked up in the job store and in the video catalog, whose
+    entries outlive compacted jobs. A file shared by several jobs
+    (deduplicated requests) may be downloaded by the owner of any of them.
+    Files recorded only without an owner (made before jobs recorded their
+    API key) may be downloaded with any valid key; files with no record at
+    all may not.
+    """
+    video_id = os.path.splitext(filename)[0]
+    owners = set(video_catalog.owners(filename))
+    job = job_store.get_job(video_id)
+    if job is not None:
+        owners.add(job["api_key"] or None)
+    if api_key in owners or owners == {None}:
+        return True
+    return job_store.owns_output(api_key, filename)
+
+
 @download_bp.route("/download/<filename>", methods=["GET"])
 def download_file(filename):
     if "info" in request.args:
@@ -17,7 +42,14 @@ def download_file(filename):
             jsonify(
                 {
                     "parameters": {
-                        "filename": "str, required, name of the file to download"
+                        "filename": "str, required, name of the file to download",
+                        "api_key": f"str, API key if not sent in the {Config.API_KEY_HEADER} header "
+                        "(for players and links that cannot set headers)",
+                        "inline": "bool, optional, serve for playback instead of as an attachment",
+                    },
+                    "headers": {
+                        "Range": "bytes=START-END, optional, returns 206 with that part of the file",
+                        "If-None-Match": "str, optional, ETag of a cached copy; returns 304 if unchanged",
                     },
                     "returns": {
                         "file": "binary, the requested file",
@@ -27,27 +59,44 @@ def download_file(filename):
             ),
             200,
         )
+    api_key = request.headers.get(Config.API_KEY_HEADER) or request.args.get("api_key")
+    if Config.DOWNLOAD_REQUIRE_API_KEY and not validate_api_key(request, allow_query=True):
+        return jsonify({"error": "Unauthorized", "message": "Valid API key required"}), 401
     safe_filename = secure_filename(filename)
-    file_path = os.path.join("static/videos", safe_filename)
-    if os.path.isfile(file_path):
-        logger.info(f"Serving file: {safe_filename}")
-        return send_from_directory("static/videos", safe_filename, as_attachment=True)
-    else:
+    file_path = os.path.join(Config.VIDEO_OUTPUT_DIR, safe_filename)
+    if not os.path.isfile(file_path):
         logger.error(f"File not found: {safe_filename}")
         return jsonify({"error": "File not found"}), 404
+    if Config.DOWNLOAD_REQUIRE_API_KEY and not can_download(api_key, safe_filename):
+        return jsonify({"error": "Forbidden", "message": "File belongs to a different API key"}), 403
 
-
-@download_bp.route("/api/download/<video_filename>", methods=["GET"])
-def download_video(video_filename):
-    logger.debug(f"Download request for video: {video_filename}")
-    videos_dir = os.path.join(current_app.root_path, "static/videos")
-    file_path = os.path.join(videos_dir, video_filename)
-
-    if os.path.exists(file_path):
-        logger.debug(f"Serving video file: {file_path}")
-        return send_from_directory(
-            directory=videos_dir, filename=video_filename, as_attachment=False
+    as_attachment = request.args.get("inline", "").lower() not in ("1", "true", "yes")
+    if Config.DOWNLOAD_ACCEL_PREFIX:
+        # nginx sends the file (with Range and ETag support) from an internal
+        # location; this process only answers the authorization question
+        logger.info(f"Handing {safe_filename} to the front-end server")
+        response = current_app.response_class(
+            mimetype=mimetypes.guess_type(safe_filename)[0] or "application/octet-stream"
         )
-    else:
-        logger.error(f"Video file not found: {file_path}")
-        abort(404, description="Video file not found")
+        response.headers["X-Accel-Redirect"] = Config.DOWNLOAD_ACCEL_PREFIX.rstrip("/") + "/" + safe_filename
+        if as_attachment:
+            response.headers["Content-Disposition"] = f'attachment; filename="{safe_filename}"'
+        return response
+
+    # Conditional response: ETag/If-None-Match (304) and Range (206) are
+    # handled by werkzeug; full responses go out through the server's
+    # wsgi.file_wrapper, which uses sendfile() where available
+    logger.info(f"Serving file: {safe_filename}")
+    response = send_from_directory(
+        os.path.abspath(Config.VIDEO_OUTPUT_DIR),
+        safe_filename,
+        as_attachment=as_attachment,
+        conditional=True,
+        etag=True,
+        max_age=Config.DOWNLOAD_MAX_AGE,
+    )
+    # Outputs belong to one API key: browsers may cache them, shared caches may not
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
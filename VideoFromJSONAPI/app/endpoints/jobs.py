@@ -0,0 +1,104 @@
+from flask import Blueprint, jsonify, request
+import logging
+from app.config import Config
+from app.utils.util_dedup import resolve_followers
+from app.utils.util_job_store import job_store
+from app.utils.util_trace import load_trace, to_otlp
+
+logger = logging.getLogger(__name__)
+
+jobs_bp = Blueprint("jobs", __name__)
+
+
+@jobs_bp.route("/jobs/<video_id>", methods=["DELETE"])
+@jobs_bp.route("/jobs/<video_id>/cancel", methods=["POST", "GET"])
+def cancel_job(video_id):
+    if request.method == "GET" and "info" in request.args:
+        return (
+            jsonify(
+                {
+                    "parameters": {
+                        "video_id": "str, required, unique identifier of the job to cancel"
+                    },
+                    "returns": {
+                        "video_id": "str, unique identifier",
+                        "status": "str, 'Cancelled' if the job had not started, "
+                        "'Cancelling' while a running render is being stopped",
+                        "error": "str, error message if any",
+                    },
+                }
+            ),
+            200,
+        )
+    api_key = request.headers.get(Config.API_KEY_HEADER)
+    if not api_key:
+        return jsonify({"error": "Unauthorized", "message": "API key required"}), 401
+
+    job = job_store.get_job(video_id)
+    if job is None:
+        return jsonify({"error": "Job not found", "message": f"Job {video_id} does not exist"}), 404
+    if job["api_key"] and job["api_key"] != api_key:
+        return jsonify({"error": "Forbidden", "message": "Job belongs to a different API key"}), 403
+
+    outcome = job_store.request_cancel(video_id)
+    if outcome is None:
+        return jsonify({"error": "Job not found", "message": f"Job {video_id} does not exist"}), 404
+    if outcome == "finished":
+        return (
+            jsonify(
+                {
+                    "error": "Job already finished",
+                    "message": f"Job {video_id} is {job_store.get_status(video_id)}",
+                }
+            ),
+            409,
+        )
+    if outcome == "cancelling":
+        # The worker rendering the job notices within RENDER_SUPERVISE_INTERVAL
+        logger.info(f"Cancellation requested for running job {video_id}")
+        return jsonify({"video_id": video_id, "status": "Cancelling"}), 202
+
+    logger.info(f"Cancelled queued job {video_id}")
+    resolve_followers(job_store, video_id)
+    return jsonify({"video_id": video_id, "status": "Cancelled"}), 200
+
+
+@jobs_bp.route("/jobs/<video_id>/trace", methods=["GET"])
+def job_trace(video_id):
+    if "info" in request.args:
+        return (
+            jsonify(
+                {
+                    "parameters": {
+                        "video_id": "str, required, unique identifier of the job",
+                        "format": "str, optional, 'chrome' (default, trace_event JSON for "
+                        "chrome://tracing or Perfetto) or 'otlp' (OpenTelemetry OTLP/JSON)",
+                    },
+                    "returns": "the trace of the job's render, one span per step",
+                }
+            ),
+            200,
+        )
+    api_key = request.headers.get(Config.API_KEY_HEADER)
+    if not api_key:
+        return jsonify({"error": "Unauthorized", "message": "API key required"}), 401
+
+    job = job_store.get_job(video_id)
+    if job is None:
+        return jsonify({"error": "Job not found", "message": f"Job {video_id} does not exist"}), 404
+    if job["api_key"] and job["api_key"] != api_key:
+        return jsonify({"error": "Forbidden", "message": "Job belongs to a different API key"}), 403
+
+    trace_format = request.args.get("format", "chrome")
+    if trace_format not in ("chrome", "otlp"):
+        return jsonify({"error": "Bad request", "message": "format must be 'chrome' or 'otlp'"}), 400
+    document = load_trace(video_id)
+    if document is None:
+        # Jobs that reused or followed another render have no render of their own
+        return (
+            jsonify({"error": "Trace not found", "message": f"Job {video_id} has no render trace yet"}),
+            404,
+        )
+    if trace_format == "otlp":
+        return jsonify(to_otlp(document)), 200
+    return jsonify(document), 200
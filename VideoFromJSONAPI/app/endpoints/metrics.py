@@ -0,0 +1,25 @@
+from flask import Blueprint, Response, jsonify, request
+import hmac
+import logging
+from app.config import Config
+from app.utils.util_metrics import metrics
+# Registers the render queue and worker gauges
+import app.utils.util_scheduler  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("metrics", methods=["GET"])
+def metrics_exposition():
+    if Config.METRICS_TOKEN:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(token, Config.METRICS_TOKEN):
+            return jsonify({"error": "Unauthorized", "message": "Metrics token required"}), 401
+    try:
+        body = metrics.expose()
+    except Exception as e:
+        logger.error(f"Error collecting metrics: {e}")
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+    return Response(body, mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,120 @@
+from flask import Blueprint, jsonify, request, send_file
+import hmac
+import logging
+import os
+from app.config import Config
+from app.utils.util_job_store import job_store
+from app.utils.util_profile import PROFILE_FILTERS, PROFILE_MODES, job_profiler
+
+logger = logging.getLogger(__name__)
+
+profiles_bp = Blueprint("profiles", __name__)
+
+
+def admin_error():
+    """Return an error response unless the request carries ADMIN_TOKEN."""
+    if not Config.ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden", "message": "Admin endpoints are disabled (ADMIN_TOKEN is not set)"}), 403
+    token = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(token, Config.ADMIN_TOKEN):
+        return jsonify({"error": "Unauthorized", "message": "Admin token required"}), 401
+    return None
+
+
+@profiles_bp.route("profiles", methods=["POST"])
+def arm_profile():
+    if "info" in request.args:
+        return (
+            jsonify(
+                {
+                    "parameters": {
+                        "count": f"int, optional, number of jobs to profile (default 1, max {Config.PROFILE_MAX_JOBS})",
+                        "mode": "str, optional, 'sampling' (default, low overhead) or 'cprofile' (every call)",
+                        "api_key": "str, optional, only profile jobs of this API key",
+                        "plan": "str, optional, only profile jobs of this plan",
+                        "resolution": "str, optional, only profile renders at this resolution, e.g. '1920x1080'",
+                        "ttl": f"int, optional, seconds the request stays armed (default {Config.PROFILE_REQUEST_TTL})",
+                    },
+                    "returns": "the profile request; the next matching renders are profiled",
+                }
+            ),
+            200,
+        )
+    error = admin_error()
+    if error:
+        return error
+
+    data = request.get_json(silent=True) or {}
+    count, ttl = data.get("count", 1), data.get("ttl", Config.PROFILE_REQUEST_TTL)
+    if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= Config.PROFILE_MAX_JOBS:
+        return (
+            jsonify({"error": "Bad request", "message": f"count must be between 1 and {Config.PROFILE_MAX_JOBS}"}),
+            400,
+        )
+    if not isinstance(ttl, (int, float)) or isinstance(ttl, bool) or ttl <= 0:
+        return jsonify({"error": "Bad request", "message": "ttl must be a positive number of seconds"}), 400
+    mode = data.get("mode", "sampling")
+    if mode not in PROFILE_MODES:
+        return jsonify({"error": "Bad request", "message": "mode must be 'sampling' or 'cprofile'"}), 400
+    filters = {name: data.get(name) for name in PROFILE_FILTERS}
+    if any(value is not None and not isinstance(value, str) for value in filters.values()):
+        return jsonify({"error": "Bad request", "message": "api_key, plan and resolution must be strings"}), 400
+
+    try:
+        profile_request = job_profiler.arm(count, mode=mode, ttl=ttl, **filters)
+    except Exception as e:
+        logger.error(f"Error arming profile request: {e}")
+        return jsonify({"error": "Internal server error", "message": str(e)}), 500
+    return jsonify(profile_request), 201
+
+
+@profiles_bp.route("profiles", methods=["GET"])
+def list_profiles():
+    if "info" in request.args:
+        return jsonify({"parameters": {}, "returns": "the profile requests that can still match jobs"}), 200
+    error = admin_error()
+    if error:
+        return error
+    return jsonify({"profiles": job_profiler.pending()}), 200
+
+
+@profiles_bp.route("profiles/<request_id>", methods=["DELETE"])
+def cancel_profile(request_id):
+    error = admin_error()
+    if error:
+        return error
+    if not job_profiler.cancel(request_id):
+        return jsonify({"error": "Not found", "message": f"Profile request {request_id} does not exist"}), 404
+    return jsonify({"request_id": request_id, "status": "Cancelled"}), 200
+
+
+@profiles_bp.route("jobs/<video_id>/profile", methods=["GET"])
+def job_profile(video_id):
+    if "info" in request.args:
+        return (
+            jsonify(
+                {
+                    "parameters": {"video_id": "str, required, unique identifier of the job"},
+                    "returns": "the job's profile: collapsed stacks (text, for flamegraph.pl or speedscope) "
+                    "of a sampling profile, or pstats data of a cProfile profile",
+                }
+            ),
+            200,
+        )
+    error = admin_error()
+    if error:
+        return error
+
+    job = job_store.get_job(video_id)
+    if job is None:
+        return jsonify({"error": "Job not found", "message": f"Job {video_id} does not exist"}), 404
+    profile = job.get("profile") or {}
+    path = job_profiler.output_path(video_id, profile.get("mode", "sampling"))
+    if profile.get("status") != "done" or not os.path.exists(path):
+        return jsonify({"error": "Profile not found", "message": f"Job {video_id} has no profile"}), 404
+    if profile["mode"] == "cprofile":
+        return send_file(
+            os.path.abspath(path), mimetype="application/octet-stream",
+            as_attachment=True, download_name=f"{video_id}.pstats",
+        )
+    return send_file(os.path.abspath(path), mimetype="text/plain; charset=utf-8")
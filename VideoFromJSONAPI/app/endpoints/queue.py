@@ -0,0 +1,34 @@
+from flask import Blueprint, jsonify, request
+import logging
+from app.utils.util_scheduler import render_scheduler
+
+logger = logging.getLogger(__name__)
+
+queue_bp = Blueprint("queue", __name__)
+
+
+@queue_bp.route("queue", methods=["GET"])
+def queue_stats():
+    if "info" in request.args:
+        return (
+            jsonify(
+                {
+                    "parameters": {},
+                    "returns": {
+                        "workers_per_process": "int, renders each API process runs at once",
+                        "plans": "dict, per plan: queued, running, oldest_wait, started, "
+                        "avg_wait and max_wait (seconds, last hour)",
+                    },
+                }
+            ),
+            200,
+        )
+    return (
+        jsonify(
+            {
+                "workers_per_process": render_scheduler.workers,
+                "plans": render_scheduler.get_metrics(),
+            }
+        ),
+        200,
+    )
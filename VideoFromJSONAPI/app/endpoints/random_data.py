@@ -1,7 +1,6 @@
 from flask import jsonify, Blueprint, request
 import random
 from app.utils import *
-import requests
 import logging
 import os
 from dotenv import load_dotenv  # Import load_dotenv to load environment variables
@@ -112,6 +111,8 @@ def get_random_pixabay_image():
         "orientation": "horizontal",
         "per_page": 200,
     }
+    import requests
+
     response = requests.get(url, params=params)
     data = response.json()
     hits = data.get("hits", [])
@@ -131,6 +132,8 @@ def get_random_pixabay_video(max_duration=30):
         "orientation": "horizontal",
         "per_page": 50,
     }
+    import requests
+
     response = requests.get(url, params=params)
     data = response.json()
     hits = data.get("hits", [])
@@ -1,4 +1,5 @@
 from flask import (
+    Response,
     jsonify,
     request,
     Blueprint,
@@ -7,14 +8,25 @@ from flask import (
 )
 from werkzeug.utils import safe_join  # Added safe_join from werkzeug.utils
 from app.utils import *
+import hashlib
+import json
+import math
 import os
-from app.endpoints.creation import video_status  # Import video_status
+import threading
+import time
+from datetime import datetime, timezone
+from app.config import Config
+from app.utils.util_catalog import video_catalog
+from app.utils.util_job_store import is_terminal_status, job_store
 import logging
 
 logger = logging.getLogger(__name__)  # Configure logger
 
 status_bp = Blueprint("status", __name__)
 
+# Request threads of this process that may block in a long poll or event stream
+_waiters = threading.BoundedSemaphore(Config.STATUS_MAX_WAITERS)
+
 
 @status_bp.route("status/<video_id>", methods=["GET"])
 def get_video_status_route(video_id):
@@ -23,19 +35,137 @@ def get_video_status_route(video_id):
             jsonify(
                 {
                     "parameters": {
-                        "video_id": "str, required, unique identifier of the video"
+                        "video_id": "str, required, unique identifier of the video",
+                        "wait": f"int, optional, seconds (up to {Config.STATUS_MAX_WAIT}) to wait for the status to change",
+                        "since": "float, optional, updated_at value already seen (defaults to the current one)",
                     },
                     "returns": {
                         "video_id": "str, unique identifier",
                         "status": "str, status of the video processing",
+                        "created_at": "float, unix time the job was accepted",
+                        "updated_at": "float, unix time of the last change",
+                        "finished_at": "float, unix time the job finished (if finished)",
+                        "progress": "dict, stage, segments_done/segments_total, "
+                        "frames_done/frames_total, fps, eta_seconds, percent and "
+                        "per-stage timings (while rendering)",
+                        "error": "str, error message (if the job failed)",
+                        "download_url": "str, download path (if completed)",
                     },
                 }
             ),
             200,
         )
     logger.debug("get_video_status_route called")  # Add this line for debugging
-    status = video_status.get(video_id, "Unknown video ID")
-    return jsonify({"video_id": video_id, "status": status}), 200
+    try:
+        wait = float(request.args.get("wait", 0))
+        since = request.args.get("since", type=float)
+        if not math.isfinite(wait) or (since is not None and not math.isfinite(since)):
+            raise ValueError(wait)
+    except ValueError:
+        return jsonify({"error": "Invalid parameter", "message": "wait and since must be numbers"}), 400
+    wait = min(max(wait, 0), Config.STATUS_MAX_WAIT)
+    job = job_store.get_job(video_id)
+    if job is None:
+        return jsonify({"video_id": video_id, "status": "Unknown video ID"}), 200
+    # With every waiting slot taken, answer at once; Retry-After paces the client
+    if wait and _waiters.acquire(blocking=False):
+        try:
+            # Long poll: answer as soon as the job changes, or with the current state on timeout
+            job = job_store.wait_for_update(video_id, job["updated_at"] if since is None else since, wait) or job
+        finally:
+            _waiters.release()
+    response = jsonify(job_status_payload(job))
+    retry_after = poll_interval_hint(job)
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(retry_after)
+    return response, 200
+
+
+@status_bp.route("status/<video_id>/events", methods=["GET"])
+def video_status_events(video_id):
+    if "info" in request.args:
+        return (
+            jsonify(
+                {
+                    "parameters": {
+                        "video_id": "str, required, unique identifier of the video"
+                    },
+                    "returns": "text/event-stream of 'status' events carrying the same JSON "
+                    "as /status/<video_id>; the stream ends when the job finishes",
+                }
+            ),
+            200,
+        )
+    job = job_store.get_job(video_id)
+    if job is None:
+        return jsonify({"error": "Video not found", "message": f"Video ID {video_id} does not exist"}), 404
+    if not _waiters.acquire(blocking=False):
+        response = jsonify({"error": "Service unavailable", "message": "Too many open status streams; poll instead"})
+        response.headers["Retry-After"] = str(Config.STATUS_POLL_MIN_SECONDS)
+        return response, 503
+
+    def stream(job):
+        # Streams are closed after a while so their threads turn over; EventSource reconnects by itself
+        deadline = time.monotonic() + Config.STATUS_EVENTS_MAX_DURATION
+        yield f"retry: {Config.STATUS_EVENTS_KEEPALIVE * 1000}\n\n"
+        while True:
+            yield f"id: {job['updated_at']}\nevent: status\ndata: {json.dumps(job_status_payload(job))}\n\n"
+            if is_terminal_status(job["status"]):
+                return
+            last_seen = job["updated_at"]
+            while job["updated_at"] <= last_seen and not is_terminal_status(job["status"]):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                job = job_store.wait_for_update(
+                    video_id, last_seen, min(Config.STATUS_EVENTS_KEEPALIVE, remaining)
+                )
+                if job is None:
+                    return
+                if job["updated_at"] <= last_seen:
+                    # Comments keep proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+
+    response = Response(
+        stream(job),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Also runs when the client goes away mid-stream
+    response.call_on_close(_waiters.release)
+    return response
+
+
+def poll_interval_hint(job):
+    """Suggest how many seconds a client should wait before polling an unfinished job again."""
+    if is_terminal_status(job["status"]):
+        return None
+    eta = (job.get("progress") or {}).get("eta_seconds")
+    if eta is None:
+        return Config.STATUS_POLL_MIN_SECONDS * 2
+    # Poll about four times over the remaining render time
+    return int(min(max(eta / 4, Config.STATUS_POLL_MIN_SECONDS), Config.STATUS_POLL_MAX_SECONDS))
+
+
+def job_status_payload(job):
+    """Build the public status JSON for a job record (never exposes the API key)."""
+    payload = {
+        "video_id": job["video_id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+    if job.get("finished_at"):
+        payload["finished_at"] = job["finished_at"]
+    if job.get("progress"):
+        payload["progress"] = job["progress"]
+    if job.get("error"):
+        payload["error"] = job["error"]
+    if job.get("profile"):
+        payload["profile"] = job["profile"]
+    if job.get("output_path") and job["status"] == "Completed":
+        payload["download_url"] = f"/api/download/{os.path.basename(job['output_path'])}"
+    return payload
 
 
 @status_bp.route("videos", methods=["GET"])
@@ -44,14 +174,87 @@ def list_videos():
         return (
             jsonify(
                 {
-                    "parameters": {},
-                    "returns": {"videos": "list of str, names of available videos"},
+                    "parameters": {
+                        "limit": f"int, optional, videos per page (default {Config.VIDEO_LIST_PAGE_SIZE}, "
+                        f"max {Config.VIDEO_LIST_MAX_PAGE_SIZE})",
+                        "cursor": "str, optional, next_cursor of the previous page",
+                        "since": "str, optional, ISO date/time or unix time; only videos created from then on",
+                        "until": "str, optional, ISO date/time or unix time; only videos created before then",
+                    },
+                    "returns": {
+                        "videos": "list of dict, id, filename, created_at, duration, size, "
+                        "resolution, thumbnail, variants and download_url, newest first",
+                        "next_cursor": "str, cursor of the next page, null on the last page",
+                    },
                 }
             ),
             200,
         )
-    videos = os.listdir("static/videos")
-    return jsonify({"videos": videos})
+    # Videos of the caller's API key; without a key, videos that have no owner
+    api_key = request.headers.get(Config.API_KEY_HEADER)
+    try:
+        limit = min(max(int(request.args.get("limit", Config.VIDEO_LIST_PAGE_SIZE)), 1),
+                    Config.VIDEO_LIST_MAX_PAGE_SIZE)
+        since = parse_time_param(request.args.get("since"))
+        until = parse_time_param(request.args.get("until"))
+    except ValueError as e:
+        return jsonify({"error": "Invalid parameter", "message": str(e)}), 400
+
+    # The catalog version changes on every write, so a matching ETag means
+    # the page is unchanged and can be answered without running the query
+    query = json.dumps([api_key, sorted(request.args.items(multi=True))])
+    etag = f"{video_catalog.version()}-{hashlib.sha1(query.encode()).hexdigest()[:16]}"
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    try:
+        videos, next_cursor = video_catalog.list_videos(
+            api_key, limit=limit, cursor=request.args.get("cursor"), since=since, until=until
+        )
+    except ValueError as e:
+        return jsonify({"error": "Invalid parameter", "message": str(e)}), 400
+    response = jsonify({
+        "videos": [describe_video(video) for video in videos],
+        "next_cursor": next_cursor,
+    })
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def parse_time_param(value):
+    """Parse a unix time or ISO 8601 date/time query parameter (None if absent)."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def describe_video(video):
+    """Return the API representation of a catalog entry."""
+    filename = os.path.basename(video["output_path"])
+    return {
+        "id": video["video_id"],
+        "filename": filename,
+        "created_at": datetime.fromtimestamp(video["created_at"], timezone.utc).isoformat(),
+        "duration": video["duration"],
+        "size": video["size"],
+        "resolution": f"{video['width']}x{video['height']}" if video["width"] else None,
+        "thumbnail": video["thumbnail"],
+        "variants": video["variants"],
+        "download_url": f"/api/download/{filename}",
+    }
 
 
 @status_bp.route("videos/<video_id>", methods=["DELETE"])
@@ -71,9 +274,10 @@ def delete_video(video_id):
             ),
             200,
         )
-    video_path = os.path.join("static/videos", f"{video_id}.mp4")
+    video_path = os.path.join(Config.VIDEO_OUTPUT_DIR, f"{video_id}.mp4")
     if os.path.exists(video_path):
         os.remove(video_path)
+        video_catalog.remove(video_id)
         return jsonify({"status": "Video deleted"}), 200
     else:
         return jsonify({"error": "Video not found"}), 404
@@ -5,8 +5,10 @@ from werkzeug.utils import secure_filename
 from app.config import Config
 from app.utils.util_auth import validate_api_key
 from app.utils.util_auth import is_valid_directory_name
+from app.utils.util_ingest import asset_ingest
+from app.utils.util_uploads import UPLOAD_KINDS, upload_store
 
-logger = logging.getLogger(__name__)  # Ensure logger is correctly configured
+logger = logging.getLogger(__name__)
 
 upload_bp = Blueprint("upload", __name__)
 
@@ -36,29 +38,29 @@ def upload_video(category):
         return jsonify({"error": "Unauthorized"}), 401
 
     if not is_valid_directory_name(category):
-        logger.error(f"Invalid category name: {category}")
+        logger.warning("Invalid category name: %s", category)
         return jsonify({"error": "Invalid category name"}), 400
 
     if "file" not in request.files:
-        logger.error("No file part in the request")
+        logger.warning("No file part in the request")
         return jsonify({"error": "No file part"}), 400
     file = request.files["file"]
     if file.filename == "":
-        logger.error("No selected file")
+        logger.warning("No selected file")
         return jsonify({"error": "No selected file"}), 400
 
     directory_path = os.path.join(Config.UPLOADS_DIR, "video", category)
     if not os.path.exists(directory_path):
-        logger.debug(f"Directory does not exist. Creating: {directory_path}")
+        logger.debug("Directory does not exist. Creating: %s", directory_path)
         os.makedirs(directory_path, exist_ok=True)
-        logger.info(f"Created directory: {directory_path}")
+        logger.info("Created directory: %s", directory_path)
     else:
-        logger.debug(f"Directory already exists: {directory_path}")
+        logger.debug("Directory already exists: %s", directory_path)
 
     file_path = os.path.join(directory_path, secure_filename(file.filename))
-    logger.debug(f"Saving file to: {file_path}")
+    logger.debug("Saving file to: %s", file_path)
     file.save(file_path)
-    logger.info(f"Video uploaded successfully: {file_path}")
+    logger.info("Video uploaded successfully: %s", file_path)
     return jsonify({"status": "Video uploaded", "file_path": file_path}), 200
 
 
@@ -87,36 +89,36 @@ def upload_audio(category):
         return jsonify({"error": "Unauthorized"}), 401
 
     if not is_valid_directory_name(category):
-        logger.error(f"Invalid category name: {category}")
+        logger.warning("Invalid category name: %s", category)
         return jsonify({"error": "Invalid category name"}), 400
 
     if "file" not in request.files:
-        logger.error("No file part in the request")
+        logger.warning("No file part in the request")
         return jsonify({"error": "No file part"}), 400
     file = request.files["file"]
     if file.filename == "":
-        logger.error("No selected file")
+        logger.warning("No selected file")
         return jsonify({"error": "No selected file"}), 400
 
     directory_path = os.path.join(Config.UPLOADS_DIR, "audio", category)
     if not os.path.exists(directory_path):
-        logger.debug(f"Directory does not exist. Creating: {directory_path}")
+        logger.debug("Directory does not exist. Creating: %s", directory_path)
         os.makedirs(directory_path, exist_ok=True)
-        logger.info(f"Created directory: {directory_path}")
+        logger.info("Created directory: %s", directory_path)
     else:
-        logger.debug(f"Directory already exists: {directory_path}")
+        logger.debug("Directory already exists: %s", directory_path)
 
     file_path = os.path.join(directory_path, secure_filename(file.filename))
-    logger.debug(f"Saving file to: {file_path}")
+    logger.debug("Saving file to: %s", file_path)
     file.save(file_path)
-    logger.info(f"Audio uploaded successfully: {file_path}")
+    logger.info("Audio uploaded successfully: %s", file_path)
     return jsonify({"status": "Audio uploaded", "file_path": file_path}), 200
 
 
 # Upload Image
 @upload_bp.route("upload_image/<category>", methods=["POST", "GET"])
 def upload_image(category):
-    logger.error("upload_image route called")
+    logger.debug("upload_image route called")
     if request.method == "GET" and "info" in request.args:
         return (
             jsonify(
@@ -138,27 +140,165 @@ def upload_image(category):
         return jsonify({"error": "Unauthorized"}), 401
 
     if not is_valid_directory_name(category):
-        logger.error(f"Invalid category name: {category}")
+        logger.warning("Invalid category name: %s", category)
         return jsonify({"error": "Invalid category name"}), 400
 
     if "file" not in request.files:
-        logger.error("No file part in the request")
+        logger.warning("No file part in the request")
         return jsonify({"error": "No file part"}), 400
     file = request.files["file"]
     if file.filename == "":
-        logger.error("No selected file")
+        logger.warning("No selected file")
         return jsonify({"error": "No selected file"}), 400
 
     directory_path = os.path.join(Config.UPLOADS_DIR, "image", category)
     if not os.path.exists(directory_path):
-        logger.error(f"Directory does not exist. Creating: {directory_path}")
+        logger.debug("Directory does not exist. Creating: %s", directory_path)
         os.makedirs(directory_path, exist_ok=True)
-        logger.error(f"Created directory: {directory_path}")
+        logger.info("Created directory: %s", directory_path)
     else:
-        logger.error(f"Directory already exists: {directory_path}")
+        logger.debug("Directory already exists: %s", directory_path)
 
     file_path = os.path.join(directory_path, secure_filename(file.filename))
-    logger.error(f"Saving file to: {file_path}")
+    logger.debug("Saving file to: %s", file_path)
     file.save(file_path)
-    logger.error(f"Image uploaded successfully: {file_path}")
+    logger.info("Image uploaded successfully: %s", file_path)
     return jsonify({"status": "Image uploaded", "file_path": file_path}), 200
+
+
+# Resumable uploads
+def _upload_response(upload, status=200, **fields):
+    """Return an upload record, with its offset also in the Upload-Offset header."""
+    response = jsonify({**upload, "offset": upload["received"], **fields})
+    response.headers["Upload-Offset"] = str(upload["received"])
+    return response, status
+
+
+@upload_bp.route("uploads", methods=["POST", "GET"])
+def create_upload():
+    logger.debug("create_upload route called")
+    if request.method == "GET" and "info" in request.args:
+        return (
+            jsonify(
+                {
+                    "parameters": {
+                        "kind": "str, required, one of video, audio, image",
+                        "filename": "str, optional, original file name (its extension is kept)",
+                        "length": "int, optional, total size in bytes",
+                    },
+                    "returns": {
+                        "upload_id": "str, id to send chunks to",
+                        "offset": "int, bytes received so far",
+                        "chunk_size": "int, suggested chunk size in bytes",
+                    },
+                    "protocol": [
+                        "PATCH /uploads/<upload_id> with header Upload-Offset and the raw chunk as body",
+                        "GET /uploads/<upload_id> to find the offset to resume from",
+                        "POST /uploads/<upload_id>/complete to store the file and get its asset id",
+                        "DELETE /uploads/<upload_id> to abandon the upload",
+                        "GET /assets/<asset_id> to see the stored asset and its ingest status",
+                    ],
+                }
+            ),
+            200,
+        )
+    if not validate_api_key(request):
+        logger.warning("Unauthorized access attempt")
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    kind = data.get("kind")
+    length = data.get("length")
+    if kind not in UPLOAD_KINDS:
+        return jsonify({"error": "Invalid kind", "message": f"kind must be one of {sorted(UPLOAD_KINDS)}"}), 400
+    if length is not None and (not isinstance(length, int) or isinstance(length, bool) or length < 0):
+        return jsonify({"error": "Invalid length", "message": "length must be a non-negative integer"}), 400
+    if length is not None and length > Config.UPLOAD_MAX_SIZE:
+        return jsonify({"error": "File too large", "message": f"Maximum upload size is {Config.UPLOAD_MAX_SIZE} bytes"}), 413
+
+    filename = secure_filename(str(data.get("filename") or "")) or None
+    upload = upload_store.create(request.headers.get(Config.API_KEY_HEADER), kind, filename, length)
+    logger.info("Started upload %s (%s, %s bytes)", upload["upload_id"], kind, length)
+    return _upload_response(upload, 201, chunk_size=Config.UPLOAD_CHUNK_SIZE)
+
+
+@upload_bp.route("uploads/<upload_id>", methods=["GET", "PATCH", "DELETE"])
+def upload_chunk(upload_id):
+    if not validate_api_key(request):
+        logger.warning("Unauthorized access attempt")
+        return jsonify({"error": "Unauthorized"}), 401
+    api_key = request.headers.get(Config.API_KEY_HEADER)
+
+    if request.method == "DELETE":
+        if not upload_store.abort(upload_id, api_key):
+            return jsonify({"error": "Upload not found"}), 404
+        return jsonify({"status": "Upload aborted", "upload_id": upload_id}), 200
+
+    if request.method == "GET":
+        upload = upload_store.get(upload_id, api_key)
+        if upload is None:
+            return jsonify({"error": "Upload not found"}), 404
+        return _upload_response(upload)
+
+    try:
+        offset = int(request.headers["Upload-Offset"])
+    except (KeyError, ValueError):
+        return jsonify({"error": "Invalid offset", "message": "Upload-Offset header must be an integer"}), 400
+
+    # Read the body as it arrives; it is never buffered whole
+    outcome, upload = upload_store.append(
+        upload_id, api_key, offset, request.stream, max_bytes=request.content_length
+    )
+    if outcome == "not_found":
+        return jsonify({"error": "Upload not found"}), 404
+    if outcome == "conflict":
+        return _upload_response(upload, 409, error="Offset mismatch",
+                                message=f"Resume from offset {upload['received']}")
+    if outcome == "busy":
+        return _upload_response(upload, 423, error="Upload busy",
+                                message="Another chunk of this upload is being written")
+    if outcome == "too_large":
+        return _upload_response(upload, 413, error="File too large",
+                                message="The chunk goes past the upload's length or the maximum upload size")
+    return _upload_response(upload)
+
+
+@upload_bp.route("uploads/<upload_id>/complete", methods=["POST"])
+def complete_upload(upload_id):
+    if not validate_api_key(request):
+        logger.warning("Unauthorized access attempt")
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    outcome, result = upload_store.complete(
+        upload_id, request.headers.get(Config.API_KEY_HEADER), sha256=data.get("sha256")
+    )
+    if outcome == "not_found":
+        return jsonify({"error": "Upload not found"}), 404
+    if outcome == "incomplete":
+        return _upload_response(result, 409, error="Upload incomplete",
+                                message=f"Received {result['received']} of {result['length']} bytes")
+    if outcome == "busy":
+        return _upload_response(result, 409, error="Upload busy",
+                                message="A chunk of this upload is still being written")
+    if outcome == "mismatch":
+        return jsonify({
+            "error": "Checksum mismatch",
+            "message": f"Received content has SHA-256 {result['sha256']}; the upload was discarded",
+        }), 422
+    # Probe the asset and prepare its renditions in the background
+    asset_ingest.enqueue(result["asset_id"])
+    return jsonify({"status": "Upload complete", "deduplicated": outcome == "deduplicated", **result}), (
+        201 if outcome == "stored" else 200
+    )
+
+
+@upload_bp.route("assets/<asset_id>", methods=["GET"])
+def get_asset(asset_id):
+    if not validate_api_key(request):
+        logger.warning("Unauthorized access attempt")
+        return jsonify({"error": "Unauthorized"}), 401
+    asset = upload_store.get_asset(asset_id)
+    if asset is None:
+        return jsonify({"error": "Asset not found"}), 404
+    return jsonify({**asset, "ingest": asset_ingest.get(asset_id)}), 200
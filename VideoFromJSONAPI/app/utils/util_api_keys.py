@@ -1,35 +1,240 @@
 """API key management utility."""
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
 
 from app.config import Config
-from supabase import Client, create_client
+from app.utils.util_job_store import JobStore, job_store
+from app.utils.util_metrics import CACHE_REQUESTS
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 logger = logging.getLogger(__name__)
 
+# Keys invalidated by any process sharing the job store; each process's cache
+# replays the rows it has not seen yet, so a revocation reaches every worker
+KEY_INVALIDATION_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS api_key_invalidations (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        api_key TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )""",
+]
+
+
+class _Lookup:
+    """A lookup in flight, shared by every caller asking for the same key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class KeyInfoCache:
+    """
+    Per-process cache of API key lookups.
+
+    Found keys are kept for ``ttl`` seconds and unknown keys for
+    ``negative_ttl`` seconds, so a flood of bad keys does not reach the
+    backend either. Concurrent misses on one key share a single lookup, and
+    at most ``max_size`` entries are kept, least recently used dropped first.
+    Failed lookups are not cached.
+
+    With a ``store``, invalidations are also written to the job store and
+    replayed by the caches of the other processes (every ``check_interval``
+    seconds at most), so revoking a key takes effect in every API worker.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        negative_ttl: float,
+        max_size: int,
+        store: Optional[JobStore] = None,
+        check_interval: float = Config.API_KEY_INVALIDATION_INTERVAL,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.store = store
+        self.check_interval = check_interval
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires, info or None)
+        self._lookups: Dict[str, _Lookup] = {}
+        self._lock = threading.Lock()
+        self._seen = 0  # newest invalidation replayed
+        self._next_check = 0.0
+        if store is not None:
+            conn = store._connect()
+            for statement in KEY_INVALIDATION_SCHEMA:
+                conn.execute(statement)
+            self._seen = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM api_key_invalidations").fetchone()[0]
+
+    def _sync(self) -> None:
+        """Drop the keys other processes invalidated since the last check."""
+        now = time.monotonic()
+        if self.store is None or now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            rows = self.store._connect().execute(
+                "SELECT seq, api_key FROM api_key_invalidations WHERE seq > ? ORDER BY seq", (self._seen,)
+            ).fetchall()
+        except Exception as e:
+            logger.error(f"Error reading API key invalidations: {e}")
+            return
+        with self._lock:
+            for row in rows:
+                self._entries.pop(row["api_key"], None)
+                self._lookups.pop(row["api_key"], None)
+                self._seen = max(self._seen, row["seq"])
+
+    def get(self, key: str, loader: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached info for a key, calling ``loader`` on a miss.
+
+        Args:
+            key: The API key
+            loader: Looks the key up in the backend; returns None if unknown
+
+        Returns:
+            Optional[Dict[str, Any]]: Key information, or None if the key is unknown
+
+        Raises:
+            Exception: Whatever ``loader`` raised, in every caller waiting on it
+        """
+        self._sync()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                CACHE_REQUESTS.inc(tier="api_key", result="hit")
+                return entry[1]
+            lookup = self._lookups.get(key)
+            leader = lookup is None
+            if leader:
+                lookup = self._lookups[key] = _Lookup()
+        CACHE_REQUESTS.inc(tier="api_key", result="miss" if leader else "hit")
+
+        if not leader:
+            lookup.done.wait()
+            if lookup.error:
+                raise lookup.error
+            return lookup.result
+
+        try:
+            lookup.result = loader(key)
+        except BaseException as e:
+            lookup.error = e
+            raise
+        finally:
+            with self._lock:
+                # An invalidation during the lookup drops it from _lookups; its
+                # result may predate the change, so it is returned but not kept
+                if self._lookups.get(key) is lookup:
+                    del self._lookups[key]
+                    if lookup.error is None:
+                        ttl = self.ttl if lookup.result is not None else self.negative_ttl
+                        self._entries[key] = (time.monotonic() + ttl, lookup.result)
+                        self._entries.move_to_end(key)
+                        while len(self._entries) > self.max_size:
+                            self._entries.popitem(last=False)
+            lookup.done.set()
+        return lookup.result
+
+    def invalidate(self, key: str) -> None:
+        """Forget a key in every process so its next use is looked up again."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._lookups.pop(key, None)
+        if self.store is None:
+            return
+        try:
+            now = time.time()
+            conn = self.store._connect()
+            conn.execute("INSERT INTO api_key_invalidations (api_key, created_at) VALUES (?, ?)", (key, now))
+            # Older rows can no longer affect a cached entry
+            conn.execute(
+                "DELETE FROM api_key_invalidations WHERE created_at < ?",
+                (now - 2 * max(self.ttl, self.negative_ttl, self.check_interval),),
+            )
+        except Exception as e:
+            logger.error(f"Error broadcasting API key invalidation: {e}")
+
+    def clear(self) -> None:
+        """Forget every key."""
+        with self._lock:
+            self._entries.clear()
+            self._lookups.clear()
+
+
 class APIKeyManager:
     """Manages API keys with support for local config and Supabase."""
     
-    def __init__(self):
-        """Initialize the API key manager."""
+    def __init__(self, client: Optional["Client"] = None, store: Optional[JobStore] = job_store):
+        """
+        Initialize the API key manager.
+
+        Args:
+            client: Supabase client (or a stand-in with the same table API);
+                created from SUPABASE_URL/SUPABASE_KEY on first use when omitted
+            store: Job store through which key invalidations reach the other
+                processes (None keeps them in this process)
+        """
         self.local_keys = Config.API_KEYS
-        self.supabase: Optional[Client] = None
-        self._init_supabase()
-    
+        self._supabase: Optional["Client"] = client
+        self._supabase_ready = client is not None
+        self._supabase_lock = threading.Lock()
+        self.key_cache = KeyInfoCache(
+            Config.API_KEY_CACHE_TTL,
+            Config.API_KEY_NEGATIVE_CACHE_TTL,
+            Config.API_KEY_CACHE_SIZE,
+            store=store,
+        )
+
+    @property
+    def supabase(self) -> Optional["Client"]:
+        """The Supabase client, created (and the library imported) on first use."""
+        if not self._supabase_ready:
+            with self._supabase_lock:
+                if not self._supabase_ready:
+                    self._init_supabase()
+                    self._supabase_ready = True
+        return self._supabase
+
     def _init_supabase(self) -> None:
         """Initialize Supabase client if credentials are configured."""
         if Config.SUPABASE_URL and Config.SUPABASE_KEY:
             try:
-                self.supabase = create_client(
+                from supabase import create_client
+
+                self._supabase = create_client(
                     Config.SUPABASE_URL,
                     Config.SUPABASE_KEY
                 )
                 logger.info("Supabase client initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize Supabase client: {e}")
-                self.supabase = None
+                self._supabase = None
     
+    def _fetch_key(self, api_key: str) -> Optional[Dict[str, Any]]:
+        """Look an API key up in Supabase, bypassing the cache."""
+        response = self.supabase.table(Config.SUPABASE_API_KEYS_TABLE).select('*').eq('key', api_key).execute()
+        if not response.data:
+            return None
+        key_data = response.data[0]
+        return {
+            'name': key_data.get('name', 'Supabase Key'),
+            'created_at': key_data.get('created_at'),
+            'expires_at': key_data.get('expires_at'),
+            'is_active': key_data.get('is_active', False),
+            'source': 'supabase'
+        }
+
     def validate_key(self, api_key: str) -> bool:
         """
         Validate an API key by checking local config and Supabase.
@@ -45,20 +250,14 @@ class APIKeyManager:
             logger.debug(f"API key validated from local config: {api_key[:8]}...")
             return True
         
-        # If Supabase is configured, check there
-        if self.supabase:
-            try:
-                response = self.supabase.table('api_keys').select('*').eq('key', api_key).execute()
-                if response.data:
-                    key_data = response.data[0]
-                    # Check if key is active and not expired
-                    if (key_data.get('is_active', False) and 
-                        (not key_data.get('expires_at') or 
-                         datetime.fromisoformat(key_data['expires_at']) > datetime.now())):
-                        logger.debug(f"API key validated from Supabase: {api_key[:8]}...")
-                        return True
-            except Exception as e:
-                logger.error(f"Error checking API key in Supabase: {e}")
+        # Then Supabase, through the key cache
+        key_info = self.get_key_info(api_key)
+        if key_info and key_info['is_active'] and (
+            not key_info.get('expires_at') or
+            datetime.fromisoformat(key_info['expires_at']) > datetime.now()
+        ):
+            logger.debug(f"API key validated from Supabase: {api_key[:8]}...")
+            return True
         
         logger.warning(f"Invalid API key attempted: {api_key[:8]}...")
         return False
@@ -83,19 +282,10 @@ class APIKeyManager:
                 'source': 'local'
             }
         
-        # Check Supabase if configured
+        # Check Supabase if configured; lookups are cached for API_KEY_CACHE_TTL
         if self.supabase:
             try:
-                response = self.supabase.table('api_keys').select('*').eq('key', api_key).execute()
-                if response.data:
-                    key_data = response.data[0]
-                    return {
-                        'name': key_data.get('name', 'Supabase Key'),
-                        'created_at': key_data.get('created_at'),
-                        'expires_at': key_data.get('expires_at'),
-                        'is_active': key_data.get('is_active', False),
-                        'source': 'supabase'
-                    }
+                return self.key_cache.get(api_key, self._fetch_key)
             except Exception as e:
                 logger.error(f"Error getting key info from Supabase: {e}")
         
@@ -125,7 +315,7 @@ class APIKeyManager:
         # If Supabase is configured, store there
         if self.supabase:
             try:
-                response = self.supabase.table('api_keys').insert({
+                response = self.supabase.table(Config.SUPABASE_API_KEYS_TABLE).insert({
                     'key': api_key,
                     'name': name,
                     'created_at': datetime.now().isoformat(),
@@ -134,6 +324,7 @@ class APIKeyManager:
                 }).execute()
                 
                 if response.data:
+                    self.key_cache.invalidate(api_key)
                     return {
                         'key': api_key,
                         'name': name,
@@ -173,16 +364,18 @@ class APIKeyManager:
         # Check local config first
         if api_key in self.local_keys:
             del self.local_keys[api_key]
+            self.key_cache.invalidate(api_key)
             logger.info(f"API key revoked from local config: {api_key[:8]}...")
             return True
         
         # Check Supabase if configured
         if self.supabase:
             try:
-                response = self.supabase.table('api_keys').update({
+                response = self.supabase.table(Config.SUPABASE_API_KEYS_TABLE).update({
                     'is_active': False,
                     'revoked_at': datetime.now().isoformat()
                 }).eq('key', api_key).execute()
+                self.key_cache.invalidate(api_key)
                 
                 if response.data:
                     logger.info(f"API key revoked in Supabase: {api_key[:8]}...")
@@ -10,12 +10,14 @@ from werkzeug.utils import secure_filename
 logger = logging.getLogger(__name__)
 
 
-def validate_api_key(req=None) -> bool:
+def validate_api_key(req=None, allow_query=False) -> bool:
     """
     Validate the API key from the request headers.
     
     Args:
         req: Flask request object (optional)
+        allow_query: Also accept the key as an ``api_key`` query parameter,
+            for players and links that cannot set headers
         
     Returns:
         bool: True if the API key is valid, False otherwise
@@ -24,6 +26,8 @@ def validate_api_key(req=None) -> bool:
         req = request
     
     api_key = req.headers.get(Config.API_KEY_HEADER)
+    if not api_key and allow_query:
+        api_key = req.args.get("api_key")
     
     if not api_key:
         logger.warning("No API key provided in request headers")
@@ -0,0 +1,190 @@
+"""Shared asset prefetching for batch video creation."""
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from app.config import Config
+from app.utils.util_dedup import ASSET_FIELDS
+from app.utils.util_job_store import is_terminal_status
+from app.utils.util_metrics import CACHE_BYTES, CACHE_REQUESTS
+from app.utils.util_trace import traced
+
+logger = logging.getLogger(__name__)
+
+
+def remote_assets(payload: Any, key: Optional[str] = None) -> Set[str]:
+    """
+    Collect the remote (http/https) asset URLs referenced by a render payload.
+
+    Args:
+        payload: Renderer keyword arguments, or any nested part of them
+        key: Field name the value was found under
+
+    Returns:
+        Set[str]: Distinct remote asset URLs
+    """
+    if isinstance(payload, dict):
+        return set().union(*(remote_assets(v, k) for k, v in payload.items()))
+    if isinstance(payload, list):
+        child_key = "imageUrl" if key == "segments" else key
+        return set().union(*(remote_assets(v, child_key) for v in payload))
+    if key in ASSET_FIELDS and isinstance(payload, str):
+        if urlparse(payload).scheme in ("http", "https"):
+            return {payload}
+    return set()
+
+
+def rewrite_assets(payload: Any, mapping: Dict[str, str], key: Optional[str] = None) -> Any:
+    """Return a copy of the payload with asset URLs replaced by local references."""
+    if isinstance(payload, dict):
+        return {k: rewrite_assets(v, mapping, k) for k, v in payload.items()}
+    if isinstance(payload, list):
+        child_key = "imageUrl" if key == "segments" else key
+        return [rewrite_assets(v, mapping, child_key) for v in payload]
+    if key in ASSET_FIELDS and isinstance(payload, str):
+        return mapping.get(payload, payload)
+    return payload
+
+
+def aggregate_status(jobs: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+    """
+    Summarize the jobs of a batch.
+
+    Args:
+        jobs: Job records belonging to the batch
+
+    Returns:
+        Tuple[str, Dict[str, int]]: Overall status ("Processing", "Completed",
+        "Partially completed" or "Error") and per-state counts
+    """
+    counts = {"total": len(jobs), "processing": 0, "completed": 0, "failed": 0}
+    for job in jobs:
+        if not is_terminal_status(job["status"]):
+            counts["processing"] += 1
+        elif job["status"] == "Completed":
+            counts["completed"] += 1
+        else:
+            counts["failed"] += 1
+    if counts["processing"]:
+        status = "Processing"
+    elif not counts["failed"]:
+        status = "Completed"
+    elif counts["completed"]:
+        status = "Partially completed"
+    else:
+        status = "Error"
+    return status, counts
+
+
+class AssetPrefetcher:
+    """
+    Downloads remote assets once into a shared cache directory.
+
+    Files are named after the SHA-256 of their URL and kept for
+    ``ASSET_CACHE_TTL`` seconds, so the same music or logo used by every item
+    of a batch (or by several batches) is fetched a single time. Cached files
+    live under ``Config.ROOT_DIR``, where ``fetch_resource`` finds local paths
+    before trying the network.
+    """
+
+    def __init__(
+        self, cache_dir: str = Config.ASSET_CACHE_DIR, workers: int = Config.BATCH_PREFETCH_WORKERS
+    ):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            cache_dir: Cache directory, relative to Config.ROOT_DIR
+            workers: Number of concurrent downloads
+        """
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """HTTP session, created (and requests imported) on the first download."""
+        with self._session_lock:
+            if self._session is None:
+                import requests
+
+                self._session = requests.Session()
+            return self._session
+
+    def cache_reference(self, url: str) -> str:
+        """Return the cache path (relative to ROOT_DIR) used for a URL."""
+        extension = os.path.splitext(urlparse(url).path)[1][:8]
+        name = hashlib.sha256(url.encode("utf-8")).hexdigest() + extension
+        return os.path.join(self.cache_dir, name)
+
+    @traced("AssetPrefetcher.fetch")
+    def fetch(self, url: str) -> Optional[str]:
+        """
+        Download one asset unless a fresh copy is cached.
+
+        Args:
+            url: Remote asset URL
+
+        Returns:
+            Optional[str]: Local reference for the asset, or None if the
+            download failed
+        """
+        reference = self.cache_reference(url)
+        path = os.path.join(Config.ROOT_DIR, reference)
+        if os.path.isfile(path) and time.time() - os.path.getmtime(path) < Config.ASSET_CACHE_TTL:
+            CACHE_REQUESTS.inc(tier="asset_prefetch", result="hit")
+            CACHE_BYTES.inc(os.path.getsize(path), tier="asset_prefetch", result="hit")
+            return reference
+        CACHE_REQUESTS.inc(tier="asset_prefetch", result="miss")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{threading.get_ident()}.part"
+        import requests
+
+        try:
+            with self.session.get(url, stream=True, timeout=Config.BATCH_PREFETCH_TIMEOUT) as response:
+                if response.status_code != 200:
+                    logger.warning(f"Prefetch of {url} failed with HTTP {response.status_code}")
+                    return None
+                size = 0
+                with open(partial, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        f.write(chunk)
+                        size += len(chunk)
+            os.replace(partial, path)
+            CACHE_BYTES.inc(size, tier="asset_prefetch", result="miss")
+            return reference
+        except (requests.RequestException, OSError) as e:
+            logger.warning(f"Prefetch of {url} failed: {e}")
+            if os.path.exists(partial):
+                os.remove(partial)
+            return None
+
+    def fetch_all(self, urls: Iterable[str]) -> Dict[str, str]:
+        """
+        Download a set of assets concurrently.
+
+        Args:
+            urls: Remote asset URLs (duplicates are fetched once)
+
+        Returns:
+            Dict[str, str]: URL -> local reference for every asset that was
+            downloaded; failed URLs are left out so renders fall back to them
+        """
+        urls = sorted(set(urls))
+        if not urls:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(urls))) as pool:
+            references = dict(zip(urls, pool.map(self.fetch, urls)))
+        fetched = {url: ref for url, ref in references.items() if ref}
+        logger.info(f"Prefetched {len(fetched)}/{len(urls)} shared assets")
+        return fetched
+
+
+# Create a singleton instance
+asset_prefetcher = AssetPrefetcher()
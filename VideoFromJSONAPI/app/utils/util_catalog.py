@@ -0,0 +1,272 @@
+"""Catalog of finished videos, stored next to the jobs in the job store database."""
+import base64
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.utils.util_job_store import JobStore, job_store
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS videos (
+        video_id TEXT PRIMARY KEY,
+        api_key TEXT,
+        created_at REAL NOT NULL,
+        output_path TEXT NOT NULL,
+        duration REAL,
+        size INTEGER,
+        width INTEGER,
+        height INTEGER,
+        thumbnail TEXT,
+        variants TEXT
+    )""",
+    # Keyset pagination walks these newest first
+    "CREATE INDEX IF NOT EXISTS idx_videos_owner ON videos (api_key, created_at, video_id)",
+    "CREATE INDEX IF NOT EXISTS idx_videos_created ON videos (created_at, video_id)",
+]
+
+# Bumped on every change, so conditional GETs can be answered without a query
+_BUMP_VERSION_SQL = (
+    "INSERT INTO meta (key, value) VALUES ('catalog_version', 1) "
+    "ON CONFLICT(key) DO UPDATE SET value = value + 1;"
+)
+
+# Every job that completes with an output gets an entry, whatever finished it
+# (render process, coalesced follower, reused output). Followers copy the
+# metadata of the render they share; renders record theirs before setting
+# output_path, so the upsert keeps it.
+_CATALOG_SQL = f"""
+    INSERT INTO videos (video_id, api_key, created_at, output_path, duration, size, width, height, thumbnail, variants)
+    SELECT NEW.video_id, NEW.api_key, NEW.created_at, NEW.output_path,
+           src.duration, src.size, src.width, src.height, src.thumbnail, src.variants
+    FROM (SELECT 1) LEFT JOIN videos AS src ON src.video_id = NEW.source_id
+    WHERE true
+    ON CONFLICT(video_id) DO UPDATE SET output_path = excluded.output_path, api_key = excluded.api_key;
+    {_BUMP_VERSION_SQL}
+"""
+CATALOG_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS jobs_catalog_on_update AFTER UPDATE OF output_path ON jobs "
+    "WHEN NEW.output_path IS NOT NULL AND NEW.status = 'Completed' "
+    f"BEGIN {_CATALOG_SQL} END",
+    "CREATE TRIGGER IF NOT EXISTS jobs_catalog_on_insert AFTER INSERT ON jobs "
+    "WHEN NEW.output_path IS NOT NULL AND NEW.status = 'Completed' "
+    f"BEGIN {_CATALOG_SQL} END",
+]
+
+
+def encode_cursor(created_at: float, video_id: str) -> str:
+    """Return the opaque cursor of the page after this entry."""
+    return base64.urlsafe_b64encode(json.dumps([created_at, video_id]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """
+    Parse a cursor returned by encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        created_at, video_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(created_at), str(video_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class VideoCatalog:
+    """
+    Indexed listing of finished videos.
+
+    Entries are added by triggers on the jobs table when a job completes with
+    an output, and enriched with duration, size and resolution by the render
+    pipeline. Listing uses keyset pagination on (created_at, video_id), so a
+    page costs the same however many videos exist.
+    """
+
+    def __init__(self, store: JobStore):
+        """
+        Initialize the catalog and create its table and triggers.
+
+        Args:
+            store: Job store whose database holds the catalog
+        """
+        self.store = store
+        conn = store._connect()
+        for statement in CATALOG_SCHEMA + CATALOG_TRIGGERS:
+            conn.execute(statement)
+
+    def record(
+        self,
+        video_id: str,
+        output_path: str,
+        duration: Optional[float] = None,
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        thumbnail: Optional[str] = None,
+        variants: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """
+        Add or update the entry of a rendered video.
+
+        Called by the renderer before it marks the job completed; the owner
+        and creation time are taken from the job.
+
+        Args:
+            video_id: Unique identifier of the job
+            output_path: Path of the rendered file
+            duration: Length in seconds
+            width: Frame width in pixels
+            height: Frame height in pixels
+            thumbnail: Path of a thumbnail image, if one was made
+            variants: Other renditions of the video, if any
+        """
+        job = self.store.get_job(video_id) or {}
+        with self.store._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO videos (video_id, api_key, created_at, output_path, duration, "
+                "size, width, height, thumbnail, variants) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    video_id,
+                    job.get("api_key"),
+                    job.get("created_at") or time.time(),
+                    output_path,
+                    duration,
+                    os.path.getsize(output_path) if os.path.exists(output_path) else None,
+                    width,
+                    height,
+                    thumbnail,
+                    json.dumps(variants or []),
+                ),
+            )
+            conn.execute(_BUMP_VERSION_SQL)
+
+    def remove(self, video_id: str) -> bool:
+        """Delete a video's entry; returns True if it existed."""
+        with self.store._transaction() as conn:
+            removed = conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,)).rowcount > 0
+            if removed:
+                conn.execute(_BUMP_VERSION_SQL)
+        return removed
+
+    def owners(self, filename: str) -> List[Optional[str]]:
+        """
+        Return the API keys of the videos whose output file has this name.
+
+        Entries outlive their jobs (see JobStore.compact), so this still knows
+        who owns a file after its job has been removed. Videos without an
+        owner are listed as None.
+
+        Args:
+            filename: Base name of the output file
+
+        Returns:
+            List[Optional[str]]: One API key per video sharing the file
+        """
+        return [
+            row["api_key"]
+            for row in self.store._connect().execute(
+                "SELECT api_key, output_path FROM videos WHERE output_path LIKE ?", (f"%{filename}",)
+            )
+            if os.path.basename(row["output_path"]) == filename
+        ]
+
+    def version(self) -> int:
+        """Return a number that changes whenever the catalog changes."""
+        return int(self.store._get_meta(self.store._connect(), "catalog_version"))
+
+    def list_videos(
+        self,
+        api_key: Optional[str],
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Return one page of an owner's videos, newest first.
+
+        Args:
+            api_key: Owner whose videos to list (None lists videos without an owner)
+            limit: Page size
+            cursor: ``next_cursor`` of the previous page
+            since: Only videos created at or after this unix time
+            until: Only videos created before this unix time
+
+        Returns:
+            Tuple of (videos, cursor of the next page or None)
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        clauses, params = ["api_key IS ?"], [api_key]
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        if cursor:
+            created_at, video_id = decode_cursor(cursor)
+            clauses.append("(created_at, video_id) < (?, ?)")
+            params.extend([created_at, video_id])
+        rows = self.store._connect().execute(
+            f"SELECT * FROM videos WHERE {' AND '.join(clauses)} "
+            "ORDER BY created_at DESC, video_id DESC LIMIT ?",
+            [*params, limit + 1],
+        ).fetchall()
+        videos = [self._decode(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last["created_at"], last["video_id"])
+        return videos, next_cursor
+
+    @staticmethod
+    def _decode(row) -> Dict[str, Any]:
+        video = dict(row)
+        video.pop("api_key", None)
+        video["variants"] = json.loads(video["variants"]) if video["variants"] else []
+        return video
+
+    def import_files(self, directory: str = None) -> int:
+        """
+        Add entries for output files made before the catalog existed.
+
+        Runs once per database; later calls return immediately.
+
+        Args:
+            directory: Directory holding the videos (default VIDEO_OUTPUT_DIR)
+
+        Returns:
+            int: Number of entries added
+        """
+        directory = directory or Config.VIDEO_OUTPUT_DIR
+        conn = self.store._connect()
+        if self.store._get_meta(conn, "catalog_imported") or not os.path.isdir(directory):
+            return 0
+        added = 0
+        with self.store._transaction() as conn:
+            for entry in os.scandir(directory):
+                if not entry.is_file() or not entry.name.endswith(".mp4"):
+                    continue
+                video_id = entry.name[: -len(".mp4")]
+                owner = conn.execute("SELECT api_key FROM jobs WHERE video_id = ?", (video_id,)).fetchone()
+                stat = entry.stat()
+                added += conn.execute(
+                    "INSERT OR IGNORE INTO videos (video_id, api_key, created_at, output_path, size, variants) "
+                    "VALUES (?, ?, ?, ?, ?, '[]')",
+                    (video_id, owner["api_key"] if owner else None, stat.st_mtime, entry.path, stat.st_size),
+                ).rowcount
+            self.store._set_meta(conn, "catalog_imported", time.time())
+            if added:
+                conn.execute(_BUMP_VERSION_SQL)
+        logger.info(f"Imported {added} existing videos into the catalog")
+        return added
+
+
+# Create a singleton instance
+video_catalog = VideoCatalog(job_store)
@@ -0,0 +1,260 @@
+"""Durable credit ledger, stored next to the jobs in the job store database."""
+import logging
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.utils.util_job_store import JobStore, job_store
+
+logger = logging.getLogger(__name__)
+
+# Every change to a key's credits is an append-only ledger entry:
+#   reserve  credits held by a job when it is accepted
+#   commit   a reservation charged because the job completed
+#   refund   a reservation released because the job failed, was cancelled,
+#            timed out or was deleted unfinished
+#   adjust   a manual charge (or a grant, with a negative amount)
+# Entries count against the billing period (calendar month, UTC) in which the
+# job was created. credit_balances is the running aggregate of the ledger.
+LEDGER_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS credit_ledger (
+        id INTEGER PRIMARY KEY,
+        api_key TEXT NOT NULL,
+        period TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        video_id TEXT,
+        note TEXT,
+        created_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_credit_ledger_key ON credit_ledger (api_key, period)",
+    "CREATE INDEX IF NOT EXISTS idx_credit_ledger_video ON credit_ledger (video_id)",
+    """CREATE TABLE IF NOT EXISTS credit_balances (
+        api_key TEXT NOT NULL,
+        period TEXT NOT NULL,
+        reserved INTEGER NOT NULL DEFAULT 0,
+        used INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (api_key, period)
+    )""",
+]
+
+_NOW_SQL = "((julianday('now') - 2440587.5) * 86400.0)"
+
+
+def _ledger_sql(row: str, kind: str) -> str:
+    """Return an INSERT of a ledger entry for the job ``row`` (NEW or OLD)."""
+    return (
+        "INSERT INTO credit_ledger (api_key, period, kind, amount, video_id, created_at) "
+        f"VALUES ({row}.api_key, strftime('%Y-%m', {row}.created_at, 'unixepoch'), {kind}, "
+        f"{row}.credits, {row}.video_id, {_NOW_SQL});"
+    )
+
+
+_RESERVE_SQL = _ledger_sql("NEW", "'reserve'")
+_SETTLE_SQL = _ledger_sql("NEW", "CASE NEW.status WHEN 'Completed' THEN 'commit' ELSE 'refund' END")
+_REFUND_DELETED_SQL = _ledger_sql("OLD", "'refund'")
+
+# Reservations are made and settled in the same transaction that creates or
+# finishes the job, so every path that finishes a job (render process,
+# coalesced followers, reused output, cancellation, expired leases) settles
+# its credits exactly once, in whichever process it runs.
+LEDGER_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS jobs_credit_reserve AFTER INSERT ON jobs "
+    "WHEN NEW.credits > 0 AND NEW.api_key IS NOT NULL "
+    f"BEGIN {_RESERVE_SQL} END",
+    "CREATE TRIGGER IF NOT EXISTS jobs_credit_settle_on_insert AFTER INSERT ON jobs "
+    "WHEN NEW.credits > 0 AND NEW.api_key IS NOT NULL AND NEW.finished_at IS NOT NULL "
+    f"BEGIN {_SETTLE_SQL} END",
+    "CREATE TRIGGER IF NOT EXISTS jobs_credit_settle_on_update AFTER UPDATE OF finished_at ON jobs "
+    "WHEN OLD.finished_at IS NULL AND NEW.finished_at IS NOT NULL "
+    "AND NEW.credits > 0 AND NEW.api_key IS NOT NULL "
+    f"BEGIN {_SETTLE_SQL} END",
+    "CREATE TRIGGER IF NOT EXISTS jobs_credit_refund_on_delete AFTER DELETE ON jobs "
+    "WHEN OLD.finished_at IS NULL AND OLD.credits > 0 AND OLD.api_key IS NOT NULL "
+    f"BEGIN {_REFUND_DELETED_SQL} END",
+    """CREATE TRIGGER IF NOT EXISTS credit_ledger_balance AFTER INSERT ON credit_ledger BEGIN
+        INSERT INTO credit_balances (api_key, period, reserved, used)
+        VALUES (NEW.api_key, NEW.period,
+                CASE NEW.kind WHEN 'reserve' THEN NEW.amount WHEN 'adjust' THEN 0 ELSE -NEW.amount END,
+                CASE WHEN NEW.kind IN ('commit', 'adjust') THEN NEW.amount ELSE 0 END)
+        ON CONFLICT(api_key, period) DO UPDATE SET
+            reserved = reserved + excluded.reserved, used = used + excluded.used;
+    END""",
+    "CREATE TRIGGER IF NOT EXISTS credit_ledger_no_update BEFORE UPDATE ON credit_ledger "
+    "BEGIN SELECT RAISE(ABORT, 'credit_ledger is append-only'); END",
+    "CREATE TRIGGER IF NOT EXISTS credit_ledger_no_delete BEFORE DELETE ON credit_ledger "
+    "BEGIN SELECT RAISE(ABORT, 'credit_ledger is append-only'); END",
+]
+
+
+def billing_period(at: Optional[float] = None) -> str:
+    """Return the billing period ("YYYY-MM", UTC) containing a timestamp (default now)."""
+    return time.strftime("%Y-%m", time.gmtime(time.time() if at is None else at))
+
+
+def period_end(period: str) -> str:
+    """Return the ISO time at which a billing period ends and credits reset."""
+    year, month = (int(part) for part in period.split("-"))
+    year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return datetime(year, month, 1, tzinfo=timezone.utc).isoformat()
+
+
+class CreditLedger:
+    """
+    Monthly credit accounting for API keys.
+
+    A job holds a reservation from the moment it is accepted. The reservation
+    is committed if the job completes and refunded otherwise, by triggers on
+    the jobs table, so credits survive restarts, are shared by every process
+    on the host and are only charged for delivered videos. Admission checks
+    the balance inside the job's own creation transaction, so concurrent
+    requests cannot overspend. Reads for display go through a short-lived
+    per-process cache of the aggregate.
+    """
+
+    def __init__(self, store: JobStore):
+        """
+        Initialize the ledger and create its tables and triggers.
+
+        Args:
+            store: Job store whose database holds the ledger
+        """
+        self.store = store
+        self._balances: Dict[str, Tuple[float, str, int, int]] = {}  # key -> (expires, period, reserved, used)
+        conn = store._connect()
+        for statement in LEDGER_SCHEMA + LEDGER_TRIGGERS:
+            conn.execute(statement)
+
+    @staticmethod
+    def limit_for(api_key: str) -> Optional[int]:
+        """Return the monthly credits of an API key's plan, or None if it has no valid plan."""
+        key_info = Config.API_KEYS.get(api_key) or {}
+        plan = Config.API_PLANS.get(str(key_info.get("plan", "free")).lower())
+        return plan["credits"] if plan else None
+
+    @staticmethod
+    def _read_balance(conn: sqlite3.Connection, api_key: str, period: str) -> Tuple[int, int]:
+        row = conn.execute(
+            "SELECT reserved, used FROM credit_balances WHERE api_key = ? AND period = ?",
+            (api_key, period),
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def balance(self, api_key: str, period: Optional[str] = None, fresh: bool = False) -> Tuple[int, int]:
+        """
+        Return the credits an API key has reserved and used in a billing period.
+
+        Args:
+            api_key: The API key
+            period: Billing period (defaults to the current one)
+            fresh: Read the database instead of the cache
+
+        Returns:
+            Tuple[int, int]: (reserved, used)
+        """
+        period = period or billing_period()
+        cached = self._balances.get(api_key)
+        if cached and not fresh and cached[1] == period and cached[0] > time.monotonic():
+            return cached[2], cached[3]
+        reserved, used = self._read_balance(self.store._connect(), api_key, period)
+        self._balances[api_key] = (time.monotonic() + Config.CREDIT_CACHE_TTL, period, reserved, used)
+        return reserved, used
+
+    def invalidate(self, api_key: str) -> None:
+        """Drop the cached balance of an API key."""
+        self._balances.pop(api_key, None)
+
+    def admit(self, api_key: str, credits: int = 1) -> Callable[[sqlite3.Connection], bool]:
+        """
+        Return a ``JobStore.claim_job`` guard that reserves credits for a new job.
+
+        The guard admits the job if the key's reserved and used credits for
+        the current period leave room for ``credits`` more; the reservation
+        itself is made by a trigger when the job row (with ``credits`` set)
+        is inserted.
+
+        Args:
+            api_key: Owner of the job
+            credits: Credits the job costs
+
+        Returns:
+            Callable[[sqlite3.Connection], bool]: Guard run inside the claim transaction
+        """
+        def guard(conn: sqlite3.Connection) -> bool:
+            limit = self.limit_for(api_key)
+            if limit is None:
+                return False
+            reserved, used = self._read_balance(conn, api_key, billing_period())
+            # Whether or not the job is created, the cached balance is stale
+            self.invalidate(api_key)
+            return reserved + used + credits <= limit
+
+        return guard
+
+    def adjust(self, api_key: str, amount: int, note: Optional[str] = None, at: Optional[float] = None) -> None:
+        """
+        Record a manual charge (positive amount) or grant (negative amount).
+
+        Args:
+            api_key: The API key
+            amount: Credits to add to the key's usage
+            note: Reason for the adjustment
+            at: Time whose billing period the adjustment counts against (default now)
+        """
+        now = time.time()
+        self.store._connect().execute(
+            "INSERT INTO credit_ledger (api_key, period, kind, amount, note, created_at) "
+            "VALUES (?, ?, 'adjust', ?, ?, ?)",
+            (api_key, billing_period(at if at is not None else now), amount, note, now),
+        )
+        self.invalidate(api_key)
+
+    def entries(self, api_key: str, period: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Return the ledger entries of an API key, oldest first.
+
+        Args:
+            api_key: The API key
+            period: Only return entries counting against this billing period
+
+        Returns:
+            List[Dict[str, Any]]: Ledger entries
+        """
+        query = "SELECT * FROM credit_ledger WHERE api_key = ?"
+        params: List[Any] = [api_key]
+        if period:
+            query += " AND period = ?"
+            params.append(period)
+        rows = self.store._connect().execute(query + " ORDER BY id", params)
+        return [dict(row) for row in rows]
+
+    def credit_info(self, api_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Summarize the current billing period of an API key from the cached balance.
+
+        Args:
+            api_key: The API key
+
+        Returns:
+            Optional[Dict[str, Any]]: Plan, credit totals and reset time, or None
+            if the key or its plan is unknown
+        """
+        limit = self.limit_for(api_key)
+        if api_key not in Config.API_KEYS or limit is None:
+            return None
+        period = billing_period()
+        reserved, used = self.balance(api_key, period)
+        return {
+            "plan": str(Config.API_KEYS[api_key].get("plan", "free")).capitalize(),
+            "credits_total": limit,
+            "credits_used": used,
+            "credits_reserved": reserved,
+            "credits_remaining": max(limit - used - reserved, 0),
+            "credits_reset": period_end(period),
+        }
+
+
+# Create a singleton instance
+credit_ledger = CreditLedger(job_store)
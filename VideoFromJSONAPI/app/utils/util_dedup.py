@@ -0,0 +1,178 @@
+"""Request deduplication keyed by a canonical hash of the render plan."""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.config import Config
+from app.utils.util_job_store import JobStore, is_terminal_status
+from app.utils.util_workspace import local_asset_path
+
+logger = logging.getLogger(__name__)
+
+# Bump when the renderer changes in a way that makes old outputs stale
+PLAN_HASH_VERSION = 1
+
+# Payload fields (at any depth) that reference an asset rather than a setting
+ASSET_FIELDS = {"imageUrl", "audioUrl", "background_music", "intro_music", "outro_music"}
+
+
+class PlanHasher:
+    """
+    Computes a stable hash for a render request.
+
+    The plan is normalized (sorted keys, defaults already applied by the
+    caller) and every asset reference that resolves to a local file is
+    replaced by the SHA-256 of its content, so renaming or re-uploading the
+    same file still matches while editing it does not. Remote URLs are
+    identified by the URL itself, so renders using them are only reused for
+    a limited time (see ``reuse_ttl``). File digests are cached by path, size and
+    modification time so repeated submissions do not re-read large files.
+    """
+
+    def __init__(self):
+        """Initialize the hasher with an empty digest cache."""
+        self._digests: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+
+    def file_digest(self, path: str) -> str:
+        """
+        Return the SHA-256 of a file, reusing the cached value if it is unchanged.
+
+        Args:
+            path: Path of the file to hash
+
+        Returns:
+            str: Hex digest of the file content
+        """
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._digests.get(path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        with self._lock:
+            self._digests[path] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+        return digest.hexdigest()
+
+    def asset_fingerprint(self, reference: Any) -> Any:
+        """
+        Identify an asset by content when it is a local file, else by reference.
+
+        Local paths are resolved the same way ``fetch_resource`` resolves them.
+        """
+        if not isinstance(reference, str) or not reference:
+            return reference
+        local_path = local_asset_path(reference)
+        if os.path.isfile(local_path):
+            return f"sha256:{self.file_digest(local_path)}"
+        return reference
+
+    def normalize(self, value: Any, key: str = None) -> Any:
+        """Recursively replace asset references with their fingerprints."""
+        if isinstance(value, dict):
+            return {k: self.normalize(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            # Bare strings in the segment list are image URLs
+            return [self.normalize(v, key if key != "segments" else "imageUrl") for v in value]
+        if key in ASSET_FIELDS:
+            return self.asset_fingerprint(value)
+        return value
+
+    def has_remote_assets(self, value: Any, key: str = None) -> bool:
+        """Return True if any asset reference is a remote (http/https) URL."""
+        if isinstance(value, dict):
+            return any(self.has_remote_assets(v, k) for k, v in value.items())
+        if isinstance(value, list):
+            return any(self.has_remote_assets(v, key if key != "segments" else "imageUrl") for v in value)
+        return key in ASSET_FIELDS and isinstance(value, str) and urlparse(value).scheme in ("http", "https")
+
+    def reuse_ttl(self, payload: Dict[str, Any]) -> Optional[float]:
+        """
+        Return how long a finished render of the payload may be reused.
+
+        Args:
+            payload: Renderer keyword arguments with defaults applied
+
+        Returns:
+            Optional[float]: DEDUP_REUSE_TTL seconds if the payload uses remote
+            URLs (the content behind them may change), else None (no limit)
+        """
+        return Config.DEDUP_REUSE_TTL if self.has_remote_assets(payload) else None
+
+    def plan_hash(self, payload: Dict[str, Any]) -> str:
+        """
+        Hash a render payload.
+
+        Args:
+            payload: Renderer keyword arguments with defaults applied
+
+        Returns:
+            str: Hex digest identifying the rendered output
+        """
+        canonical = json.dumps(
+            {"version": PLAN_HASH_VERSION, "plan": self.normalize(payload)},
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def link_output(source_path: str, video_id: str) -> str:
+    """
+    Give a reused render its own file name without copying the video.
+
+    Args:
+        source_path: Path of the existing rendered video
+        video_id: Job that should own the new name
+
+    Returns:
+        str: Path of the new file (a hard link where the filesystem allows it)
+    """
+    target_path = os.path.join(os.path.dirname(source_path), f"{video_id}.mp4")
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copyfile(source_path, target_path)
+    return target_path
+
+
+def resolve_followers(store: JobStore, video_id: str) -> int:
+    """
+    Finish the jobs that were coalesced onto a render once it ends.
+
+    Args:
+        store: Job store holding the jobs
+        video_id: Job whose render just finished
+
+    Returns:
+        int: Number of follower jobs updated
+    """
+    source = store.get_job(video_id)
+    if source is None or not is_terminal_status(source["status"]):
+        return 0
+    followers = store.list_followers(video_id)
+    for follower in followers:
+        fields: Dict[str, Any] = {"status": source["status"], "error": source.get("error")}
+        if source["status"] == "Completed" and source.get("output_path"):
+            try:
+                fields["output_path"] = link_output(source["output_path"], follower["video_id"])
+            except OSError as e:
+                logger.error(f"Error linking output for job {follower['video_id']}: {e}")
+                fields["output_path"] = source["output_path"]
+        store.update_job(follower["video_id"], **fields)
+    if followers:
+        logger.info(f"Resolved {len(followers)} coalesced jobs from {video_id}")
+    return len(followers)
+
+
+# Create a singleton instance
+plan_hasher = PlanHasher()
@@ -0,0 +1,442 @@
+"""Background ingest of uploaded assets into render-ready renditions."""
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.utils.util_job_store import JobStore, job_store
+from app.utils.util_metrics import FFMPEG_PROCESSES
+from app.utils.util_uploads import UPLOAD_SCHEMA
+from app.utils.util_workspace import local_asset_path
+
+logger = logging.getLogger(__name__)
+
+# asset_ingest: one row per stored asset, from "pending" to "ready" (or
+# "failed" after INGEST_MAX_ATTEMPTS). probe and renditions are JSON; paths
+# in renditions are relative to ROOT_DIR like the asset's own path.
+INGEST_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS asset_ingest (
+        sha256 TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        leased_until REAL,
+        probe TEXT,
+        renditions TEXT,
+        error TEXT,
+        updated_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_asset_ingest_status ON asset_ingest (status, leased_until)",
+    # Renders find an asset by the path a creation request refers to it by
+    "CREATE INDEX IF NOT EXISTS idx_assets_path ON assets (path)",
+]
+
+_LOUDNORM_REPORT = re.compile(r"\{[^{}]*\"input_i\"[^{}]*\}")
+
+
+def parse_resolution(resolution: str) -> Tuple[int, int]:
+    """Split "WIDTHxHEIGHT" into integers."""
+    width, height = map(int, resolution.lower().split("x"))
+    return width, height
+
+
+def run_ffmpeg(args: List[str], purpose: str = "ingest") -> str:
+    """Run ffmpeg and return its log output; raise RuntimeError if it fails."""
+    result = subprocess.run([Config.FFMPEG_BINARY, "-y", "-nostdin", *args], capture_output=True)
+    stderr = result.stderr.decode(errors="replace")
+    FFMPEG_PROCESSES.inc(purpose=purpose, outcome="ok" if result.returncode == 0 else "error")
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr[-500:]}")
+    return stderr
+
+
+def probe_media(path: str) -> Dict[str, Any]:
+    """
+    Describe an audio or video file with ffprobe.
+
+    Returns:
+        Dict[str, Any]: container format and duration, plus width, height,
+        video_codec and frame_rate for the first video stream and
+        audio_codec, sample_rate and channels for the first audio stream
+    """
+    result = subprocess.run(
+        [Config.FFPROBE_BINARY, "-v", "error", "-print_format", "json", "-show_format", "-show_streams", path],
+        capture_output=True,
+    )
+    FFMPEG_PROCESSES.inc(purpose="probe", outcome="ok" if result.returncode == 0 else "error")
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {result.stderr.decode(errors='replace')[-500:]}")
+    data = json.loads(result.stdout)
+    streams = data.get("streams", [])
+    container = data.get("format", {})
+    info: Dict[str, Any] = {
+        "format": container.get("format_name"),
+        "duration": float(container["duration"]) if container.get("duration") else None,
+    }
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video:
+        info.update(
+            width=video.get("width"),
+            height=video.get("height"),
+            video_codec=video.get("codec_name"),
+            frame_rate=video.get("avg_frame_rate"),
+        )
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    if audio:
+        info.update(
+            audio_codec=audio.get("codec_name"),
+            sample_rate=int(audio["sample_rate"]) if audio.get("sample_rate") else None,
+            channels=audio.get("channels"),
+        )
+    return info
+
+
+def probe_image(path: str) -> Dict[str, Any]:
+    """Describe an image file (format, width, height and mode)."""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        return {"format": image.format, "width": image.width, "height": image.height, "mode": image.mode}
+
+
+def make_image_variants(path: str, directory: str, resolutions: List[str]) -> List[Dict[str, Any]]:
+    """
+    Write copies of an image scaled down to fit each output resolution.
+
+    An image that already fits a resolution gets no variant for it; the
+    original is used as is.
+
+    Args:
+        path: Source image
+        directory: Where variants are written
+        resolutions: Output resolutions ("WIDTHxHEIGHT")
+
+    Returns:
+        List[Dict[str, Any]]: path (absolute), width and height of each
+        distinct variant, smallest first
+    """
+    from PIL import Image
+
+    extension = os.path.splitext(path)[1].lower()
+    variants: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    with Image.open(path) as image:
+        image.load()
+        # Keep the source format, unless the extension does not say what it is
+        image_format = image.format if extension and image.format else "PNG"
+        extension = extension if image_format == image.format else ".png"
+        source = image.convert("RGBA") if image.mode == "P" else image
+        for resolution in resolutions:
+            box_width, box_height = parse_resolution(resolution)
+            scale = min(box_width / source.width, box_height / source.height)
+            size = (max(1, round(source.width * scale)), max(1, round(source.height * scale)))
+            if scale >= 1 or size in variants:
+                continue
+            output = os.path.join(directory, f"image_{size[0]}x{size[1]}{extension}")
+            options = {"quality": 95} if image_format == "JPEG" else {}
+            source.resize(size, Image.LANCZOS).save(output + ".part", format=image_format, **options)
+            os.replace(output + ".part", output)
+            variants[size] = {"path": output, "width": size[0], "height": size[1]}
+    return [variants[size] for size in sorted(variants)]
+
+
+def decode_audio(path: str, output: str) -> Dict[str, Any]:
+    """
+    Decode audio to FLAC at the mix rate and measure its loudness.
+
+    Both happen in one ffmpeg pass: the decoded stream is split between the
+    FLAC encoder and an EBU R128 (loudnorm) measurement.
+
+    Returns:
+        Dict[str, Any]: sample_rate, channels and loudness (integrated
+        LUFS, true peak in dBTP, loudness range in LU)
+    """
+    log = run_ffmpeg([
+        "-i", path,
+        "-filter_complex", "[0:a:0]asplit[pcm][measure];[measure]loudnorm=print_format=json[measured]",
+        "-map", "[pcm]", "-ar", str(Config.INGEST_MIX_RATE), "-ac", str(Config.INGEST_MIX_CHANNELS),
+        "-sample_fmt", "s16", "-c:a", "flac", "-f", "flac", output + ".part",
+        "-map", "[measured]", "-f", "null", "-",
+    ])
+    os.replace(output + ".part", output)
+    loudness = None
+    report = _LOUDNORM_REPORT.search(log)
+    if report:
+        measured = json.loads(report.group(0))
+        loudness = {
+            "integrated": float(measured["input_i"]),
+            "true_peak": float(measured["input_tp"]),
+            "range": float(measured["input_lra"]),
+        }
+    return {"sample_rate": Config.INGEST_MIX_RATE, "channels": Config.INGEST_MIX_CHANNELS, "loudness": loudness}
+
+
+def transcode_mezzanine(path: str, output: str, resolution: str, has_audio: bool) -> None:
+    """
+    Re-encode a video with the render's output settings at one resolution.
+
+    The picture is letterboxed to the resolution and converted to the render
+    frame rate, and the sound to AAC at the mix rate (silence if the source
+    has none), so the result can be joined to rendered chunks with stream
+    copy.
+    """
+    width, height = parse_resolution(resolution)
+    scale = (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={Config.INGEST_MEZZANINE_FPS}"
+    )
+    args = ["-i", path]
+    if not has_audio:
+        args += ["-f", "lavfi", "-i", f"anullsrc=r={Config.INGEST_MIX_RATE}:cl=stereo"]
+    args += ["-map", "0:v:0", "-map", "0:a:0" if has_audio else "1:a:0", "-vf", scale]
+    args += Config.INGEST_MEZZANINE_VIDEO_ARGS + Config.INGEST_MEZZANINE_AUDIO_ARGS
+    args += ["-ar", str(Config.INGEST_MIX_RATE), "-ac", str(Config.INGEST_MIX_CHANNELS)]
+    if not has_audio:
+        args.append("-shortest")
+    args += ["-movflags", "+faststart", "-f", "mp4", output + ".part"]
+    run_ffmpeg(args)
+    os.replace(output + ".part", output)
+
+
+class AssetIngest:
+    """
+    Prepares uploaded assets once so renders do not have to.
+
+    Every asset stored by the upload store is queued here. A background
+    thread probes it and writes renditions next to the asset store:
+
+    - images: copies scaled down to fit each INGEST_RESOLUTIONS entry
+    - audio: FLAC at the mix rate, with its loudness measured
+    - video (pre/post-rolls): a mezzanine per INGEST_RESOLUTIONS entry with
+      the render's encoder settings, ready to be joined by stream copy
+
+    The queue lives in the job store database, so any process running the
+    ingest thread can pick up an asset, and an ingest interrupted by a
+    restart is leased again after INGEST_LEASE_SECONDS.
+    """
+
+    def __init__(self, store: JobStore, root: str = Config.ROOT_DIR,
+                 rendition_dir: str = Config.ASSET_RENDITION_DIR):
+        """
+        Initialize the ingest queue and create its table.
+
+        Args:
+            store: Job store whose database holds the assets
+            root: Directory asset references are relative to
+            rendition_dir: Rendition directory, relative to root
+        """
+        self.store = store
+        self.root = root
+        self.rendition_dir = rendition_dir
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        conn = store._connect()
+        for statement in UPLOAD_SCHEMA + INGEST_SCHEMA:
+            conn.execute(statement)
+
+    def enqueue(self, asset_id: str) -> None:
+        """Queue a stored asset for ingest (no-op if it is already queued or done)."""
+        digest = asset_id.lower().removeprefix("sha256:")
+        self.store._connect().execute(
+            "INSERT OR IGNORE INTO asset_ingest (sha256, status, updated_at) VALUES (?, 'pending', ?)",
+            (digest, time.time()),
+        )
+        self.poke()
+
+    def start(self) -> None:
+        """Start the ingest thread for this process if it is not running."""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="asset-ingest", daemon=True)
+            self._thread.start()
+
+    def poke(self) -> None:
+        """Check for queued assets now instead of at the next interval."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self.ingest_next():
+                    continue
+            except Exception as e:
+                logger.error("Error ingesting assets: %s", e)
+            self._wake.wait(Config.INGEST_POLL_INTERVAL)
+            self._wake.clear()
+
+    def lease(self, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Lease the oldest queued asset so no other process ingests it.
+
+        Returns:
+            Optional[Dict[str, Any]]: sha256, path, kind and attempts of the
+            asset, or None if nothing is due
+        """
+        now = time.time() if now is None else now
+        with self.store._transaction() as conn:
+            row = conn.execute(
+                "SELECT i.sha256, i.attempts, a.path, a.kind FROM asset_ingest i JOIN assets a USING (sha256) "
+                "WHERE i.status = 'pending' AND (i.leased_until IS NULL OR i.leased_until < ?) "
+                "ORDER BY i.updated_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE asset_ingest SET leased_until = ?, attempts = attempts + 1 WHERE sha256 = ?",
+                (now + Config.INGEST_LEASE_SECONDS, row["sha256"]),
+            )
+        return {**dict(row), "attempts": row["attempts"] + 1}
+
+    def ingest_next(self) -> bool:
+        """
+        Ingest one queued asset.
+
+        Returns:
+            bool: False if no asset was waiting
+        """
+        asset = self.lease()
+        if asset is None:
+            return False
+        started = time.monotonic()
+        try:
+            probe, renditions = self.ingest(asset)
+        except Exception as e:
+            status = "failed" if asset["attempts"] >= Config.INGEST_MAX_ATTEMPTS else "pending"
+            logger.warning("Ingest of asset %s failed (attempt %d): %s", asset["sha256"], asset["attempts"], e)
+            self.store._connect().execute(
+                "UPDATE asset_ingest SET status = ?, error = ?, leased_until = ?, updated_at = ? WHERE sha256 = ?",
+                (status, str(e), time.time() + Config.INGEST_RETRY_DELAY, time.time(), asset["sha256"]),
+            )
+            return True
+        self.store._connect().execute(
+            "UPDATE asset_ingest SET status = 'ready', probe = ?, renditions = ?, error = NULL, "
+            "leased_until = NULL, updated_at = ? WHERE sha256 = ?",
+            (json.dumps(probe), json.dumps(renditions), time.time(), asset["sha256"]),
+        )
+        logger.info("Ingested %s asset %s in %.1fs", asset["kind"], asset["sha256"], time.monotonic() - started)
+        return True
+
+    def ingest(self, asset: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Probe an asset and write its renditions.
+
+        Args:
+            asset: sha256, path and kind of a stored asset
+
+        Returns:
+            Tuple[Dict[str, Any], Dict[str, Any]]: The probe and the
+            renditions, with paths relative to the root directory
+        """
+        source = os.path.join(self.root, asset["path"])
+        directory = os.path.join(self.root, self.rendition_dir, asset["sha256"][:2], asset["sha256"])
+        os.makedirs(directory, exist_ok=True)
+        renditions: Dict[str, Any] = {}
+        if asset["kind"] == "image":
+            probe = probe_image(source)
+            renditions["images"] = [
+                {**variant, "path": self._relative(variant["path"])}
+                for variant in make_image_variants(source, directory, Config.INGEST_RESOLUTIONS)
+            ]
+        elif asset["kind"] == "audio":
+            probe = probe_media(source)
+            output = os.path.join(directory, "audio.flac")
+            pcm = decode_audio(source, output)
+            pcm["duration"] = probe_media(output)["duration"]
+            renditions["pcm"] = {"path": self._relative(output), **pcm}
+        else:
+            probe = probe_media(source)
+            renditions["mezzanines"] = {}
+            for resolution in Config.INGEST_RESOLUTIONS:
+                output = os.path.join(directory, f"mezzanine_{resolution}.mp4")
+                transcode_mezzanine(source, output, resolution, has_audio="audio_codec" in probe)
+                renditions["mezzanines"][resolution] = {"path": self._relative(output)}
+        return probe, renditions
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.root)
+
+    def get(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the ingest state of an asset.
+
+        Returns:
+            Optional[Dict[str, Any]]: status ("pending", "ready" or
+            "failed"), attempts, error, probe and renditions; None if the
+            asset was never queued
+        """
+        digest = asset_id.lower().removeprefix("sha256:")
+        row = self.store._connect().execute(
+            "SELECT status, attempts, error, probe, renditions, updated_at FROM asset_ingest WHERE sha256 = ?",
+            (digest,),
+        ).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["probe"] = json.loads(record["probe"]) if record["probe"] else None
+        record["renditions"] = json.loads(record["renditions"]) if record["renditions"] else None
+        return record
+
+    def lookup(self, reference: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Find the renditions of an ingested asset by the path a job refers to it by.
+
+        Args:
+            reference: imageUrl, audioUrl, ... of a creation request
+
+        Returns:
+            Optional[Dict[str, Any]]: kind, file (absolute path of the
+            original), probe and renditions (absolute paths); None unless the
+            reference is a stored asset whose ingest is done
+        """
+        if not reference or "://" in reference:
+            return None
+        row = self.store._connect().execute(
+            "SELECT a.path, a.kind, i.probe, i.renditions FROM assets a JOIN asset_ingest i USING (sha256) "
+            "WHERE a.path IN (?, ?) AND i.status = 'ready'",
+            # Assets are stored relative to ROOT_DIR, or absolute when ASSET_STORE_DIR is
+            (os.path.normpath(reference.lstrip("/")), local_asset_path(reference)),
+        ).fetchone()
+        if row is None:
+            return None
+        renditions = json.loads(row["renditions"])
+        for variant in renditions.get("images", []):
+            variant["path"] = os.path.join(self.root, variant["path"])
+        if "pcm" in renditions:
+            renditions["pcm"]["path"] = os.path.join(self.root, renditions["pcm"]["path"])
+        for mezzanine in renditions.get("mezzanines", {}).values():
+            mezzanine["path"] = os.path.join(self.root, mezzanine["path"])
+        return {
+            "kind": row["kind"],
+            "file": os.path.join(self.root, row["path"]),
+            "probe": json.loads(row["probe"]),
+            "renditions": renditions,
+        }
+
+    @staticmethod
+    def image_variant(asset: Dict[str, Any], size: Tuple[int, int]) -> str:
+        """
+        Pick the smallest image rendition at least ``size`` big.
+
+        Args:
+            asset: A record returned by ``lookup``
+            size: Width and height the image will be drawn at
+
+        Returns:
+            str: Path of the rendition, or of the original if none is big enough
+        """
+        for variant in asset["renditions"].get("images", []):
+            if variant["width"] >= size[0] and variant["height"] >= size[1]:
+                return variant["path"]
+        return asset["file"]
+
+
+# Create a singleton instance
+asset_ingest = AssetIngest(job_store)
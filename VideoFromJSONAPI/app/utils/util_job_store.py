@@ -0,0 +1,946 @@
+"""Persistent job store backed by SQLite."""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Column name -> SQLite type. New columns are added to existing databases on
+# start-up, so extend this mapping rather than editing the table by hand.
+JOB_COLUMNS: Dict[str, str] = {
+    "status": "TEXT NOT NULL",
+    "api_key": "TEXT",
+    "created_at": "REAL NOT NULL",
+    "updated_at": "REAL NOT NULL",
+    "started_at": "REAL",
+    "finished_at": "REAL",
+    "progress": "TEXT",
+    "output_path": "TEXT",
+    "error": "TEXT",
+    # Render queue bookkeeping
+    "plan": "TEXT",
+    "payload": "TEXT",
+    "queue_state": "TEXT",  # queued -> leased -> done
+    "fair_tag": "REAL",
+    "enqueued_at": "REAL",
+    "worker_id": "TEXT",
+    "lease_expires_at": "REAL",  # a leased job whose worker stops heartbeating is queued again
+    "attempts": "INTEGER",
+    "cancel_requested": "INTEGER",
+    "memory_estimate": "INTEGER",  # predicted peak RSS in bytes, see util_memory
+    "host": "TEXT",  # RENDER_HOST_ID of the worker that leased the job
+    "peak_rss": "INTEGER",  # measured peak RSS in bytes of a completed render
+    # Deduplication
+    "plan_hash": "TEXT",
+    "idempotency_key": "TEXT",
+    "source_id": "TEXT",  # job whose render this one shares
+    "batch_id": "TEXT",
+    "webhook": "TEXT",  # webhook targets, see util_webhook.parse_webhook
+    "credits": "INTEGER",  # credits reserved by the job, settled by util_credits triggers
+    "profile": "TEXT",  # profile summary of a profiled render, see util_profile
+}
+
+JSON_COLUMNS = {"progress", "payload", "webhook", "profile"}
+
+JOB_INDEXES = {
+    "idx_jobs_api_key_created": "jobs (api_key, created_at)",
+    "idx_jobs_finished": "jobs (finished_at)",
+    "idx_jobs_queue": "jobs (queue_state, fair_tag)",
+    "idx_jobs_plan_hash": "jobs (api_key, plan_hash)",
+    "idx_jobs_idempotency": "jobs (api_key, idempotency_key)",
+    "idx_jobs_source": "jobs (source_id)",
+    "idx_jobs_batch": "jobs (batch_id)",
+    "idx_jobs_lease": "jobs (queue_state, lease_expires_at)",
+}
+
+
+# Statuses (besides "Error: ...") after which a job never changes again
+TERMINAL_STATUSES = {"Completed", "Cancelled", "TimedOut"}
+
+
+def is_terminal_status(status: Optional[str]) -> bool:
+    """Return True when a status string means the job will not change again."""
+    return bool(status) and (status in TERMINAL_STATUSES or status.startswith("Error"))
+
+
+class JobStore:
+    """Stores video job state in a SQLite database shared across processes."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the job store.
+
+        Args:
+            path: Path to the SQLite database file
+        """
+        self.path = path
+        self._local = threading.local()
+        self._last_compact = 0.0
+        self._watcher: Optional["JobWatcher"] = None
+        self._watcher_lock = threading.Lock()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the connection owned by the current thread and process."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self) -> None:
+        """Create the jobs table and add any columns missing from older files."""
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (video_id TEXT PRIMARY KEY, "
+            + ", ".join(f"{name} {kind}" for name, kind in JOB_COLUMNS.items())
+            + ")"
+        )
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for name, kind in JOB_COLUMNS.items():
+            if name not in existing:
+                # SQLite cannot add NOT NULL columns without a default
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind.replace(' NOT NULL', '')}")
+        for index_name, definition in JOB_INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {definition}")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a block inside a write transaction that other processes wait on."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _get_meta(conn: sqlite3.Connection, key: str, default: float = 0.0) -> float:
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, key: str, value: float) -> None:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    @staticmethod
+    def _encode(fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Serialize JSON columns and reject unknown field names."""
+        encoded = {}
+        for name, value in fields.items():
+            if name not in JOB_COLUMNS:
+                raise ValueError(f"Unknown job field: {name}")
+            if name in JSON_COLUMNS and value is not None:
+                value = json.dumps(value)
+            encoded[name] = value
+        return encoded
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict[str, Any]:
+        """Convert a database row into a plain job dictionary."""
+        job = dict(row)
+        for name in JSON_COLUMNS:
+            if job.get(name):
+                job[name] = json.loads(job[name])
+        return job
+
+    def create_job(
+        self, video_id: str, status: str = "Processing", api_key: Optional[str] = None, **fields
+    ) -> None:
+        """
+        Create a new job record.
+
+        Args:
+            video_id: Unique identifier of the job
+            status: Initial status string
+            api_key: API key that owns the job
+            **fields: Any other job columns to set
+        """
+        now = time.time()
+        values = self._encode(
+            {"status": status, "api_key": api_key, "created_at": now, "updated_at": now, **fields}
+        )
+        columns = ", ".join(["video_id", *values])
+        placeholders = ", ".join("?" for _ in range(len(values) + 1))
+        self._connect().execute(
+            f"INSERT INTO jobs ({columns}) VALUES ({placeholders})",
+            [video_id, *values.values()],
+        )
+        self._poke_watcher()
+
+    def update_job(self, video_id: str, **fields) -> bool:
+        """
+        Update fields of an existing job.
+
+        Args:
+            video_id: Unique identifier of the job
+            **fields: Job columns to set
+
+        Returns:
+            bool: True if the job exists and was updated
+        """
+        now = time.time()
+        fields.setdefault("updated_at", now)
+        if is_terminal_status(fields.get("status")):
+            fields.setdefault("finished_at", now)
+        values = self._encode(fields)
+        assignments = ", ".join(f"{name} = ?" for name in values)
+        cursor = self._connect().execute(
+            f"UPDATE jobs SET {assignments} WHERE video_id = ?",
+            [*values.values(), video_id],
+        )
+        if "finished_at" in values:
+            self._maybe_compact(now)
+        self._poke_watcher()
+        return cursor.rowcount > 0
+
+    def set_status(self, video_id: str, status: str) -> None:
+        """
+        Set the status of a job, creating the record if it does not exist.
+
+        Args:
+            video_id: Unique identifier of the job
+            status: New status string
+        """
+        fields: Dict[str, Any] = {"status": status}
+        if status.startswith("Error: "):
+            fields["error"] = status[len("Error: "):]
+        if not self.update_job(video_id, **fields):
+            try:
+                self.create_job(video_id, **fields)
+            except sqlite3.IntegrityError:
+                # Another writer created it in the meantime
+                self.update_job(video_id, **fields)
+
+    def get_job(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job record.
+
+        Args:
+            video_id: Unique identifier of the job
+
+        Returns:
+            Optional[Dict[str, Any]]: Job fields if found, None otherwise
+        """
+        row = self._connect().execute(
+            "SELECT * FROM jobs WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        return self._decode(row) if row else None
+
+    def get_status(self, video_id: str, default: Optional[str] = None) -> Optional[str]:
+        """Return only the status string of a job."""
+        row = self._connect().execute(
+            "SELECT status FROM jobs WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        return row["status"] if row else default
+
+    def list_jobs(self, api_key: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        List the most recent jobs, optionally for a single API key.
+
+        Args:
+            api_key: Only return jobs owned by this key (optional)
+            limit: Maximum number of jobs to return
+
+        Returns:
+            List[Dict[str, Any]]: Job records, newest first
+        """
+        if api_key is None:
+            rows = self._connect().execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            )
+        else:
+            rows = self._connect().execute(
+                "SELECT * FROM jobs WHERE api_key = ? ORDER BY created_at DESC LIMIT ?",
+                (api_key, limit),
+            )
+        return [self._decode(row) for row in rows]
+
+    def delete_job(self, video_id: str) -> bool:
+        """Delete a job record. Returns True if it existed."""
+        cursor = self._connect().execute("DELETE FROM jobs WHERE video_id = ?", (video_id,))
+        return cursor.rowcount > 0
+
+    def count(self) -> int:
+        """Return the number of stored jobs."""
+        return self._connect().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def compact(self, ttl_seconds: Optional[float] = None) -> int:
+        """
+        Delete finished jobs older than the TTL.
+
+        Args:
+            ttl_seconds: Age after which finished jobs are removed
+                (defaults to Config.JOB_TTL_DAYS)
+
+        Returns:
+            int: Number of jobs removed
+        """
+        if ttl_seconds is None:
+            ttl_seconds = Config.JOB_TTL_DAYS * 24 * 3600
+        cutoff = time.time() - ttl_seconds
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,)
+        )
+        if cursor.rowcount:
+            logger.info(f"Compacted {cursor.rowcount} expired jobs from the job store")
+        return cursor.rowcount
+
+    def _maybe_compact(self, now: float) -> None:
+        """Run compaction at most once per JOB_COMPACT_INTERVAL per process."""
+        if now - self._last_compact < Config.JOB_COMPACT_INTERVAL:
+            return
+        self._last_compact = now
+        try:
+            self.compact()
+        except sqlite3.Error as e:
+            logger.error(f"Error compacting job store: {e}")
+
+    def enqueue_job(
+        self,
+        video_id: str,
+        plan: str,
+        payload: Dict[str, Any],
+        cost: float,
+        memory_estimate: Optional[int] = None,
+    ) -> float:
+        """
+        Put a job on the render queue using start-time fair queuing.
+
+        The job's tag is the later of the global virtual clock and the owner's
+        newest queued tag, plus ``cost``. Owners with a higher plan weight pass
+        a smaller cost, so their tags grow more slowly and they get a larger
+        share of the workers.
+
+        Args:
+            video_id: Unique identifier of an existing job
+            plan: Plan name of the job owner
+            payload: Keyword arguments for the renderer
+            cost: Virtual time this job consumes (1 / plan weight)
+            memory_estimate: Predicted peak RSS of the render in bytes
+
+        Returns:
+            float: The fair-share tag assigned to the job
+        """
+        with self._transaction() as conn:
+            api_key = conn.execute(
+                "SELECT api_key FROM jobs WHERE video_id = ?", (video_id,)
+            ).fetchone()["api_key"]
+            last_tag = conn.execute(
+                "SELECT MAX(fair_tag) FROM jobs WHERE api_key IS ? "
+                "AND queue_state IN ('queued', 'leased')",
+                (api_key,),
+            ).fetchone()[0]
+            tag = max(self._get_meta(conn, "vclock"), last_tag or 0.0) + cost
+            conn.execute(
+                "UPDATE jobs SET plan = ?, payload = ?, queue_state = 'queued', "
+                "fair_tag = ?, enqueued_at = ?, updated_at = ?, memory_estimate = ? "
+                "WHERE video_id = ? AND finished_at IS NULL",
+                (plan, json.dumps(payload), tag, time.time(), time.time(), memory_estimate, video_id),
+            )
+        return tag
+
+    def update_queued_payload(self, video_id: str, payload: Dict[str, Any]) -> bool:
+        """
+        Replace the renderer arguments of a job no worker has leased yet.
+
+        Args:
+            video_id: Unique identifier of the job
+            payload: New keyword arguments for the renderer
+
+        Returns:
+            bool: False if the job is no longer queued (it keeps its payload)
+        """
+        cursor = self._connect().execute(
+            "UPDATE jobs SET payload = ? WHERE video_id = ? AND queue_state = 'queued'",
+            (json.dumps(payload), video_id),
+        )
+        return cursor.rowcount > 0
+
+    def lease_next_job(
+        self,
+        worker_id: str,
+        choose: Callable[..., Optional[Dict[str, Any]]],
+        limit: int = 500,
+        host: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Atomically pick the next queued job and mark it as leased.
+
+        Jobs whose lease expired (the worker stopped sending heartbeats) are
+        candidates again. A job that has already been leased
+        ``MAX_JOB_ATTEMPTS`` times fails instead of being retried.
+
+        Args:
+            worker_id: Identifier of the worker taking the job
+            choose: Policy called with the queued candidates (lowest tag first)
+                and the number of leased jobs per API key; returns the chosen
+                candidate or None. If ``host`` is given, it is also passed
+                ``memory_committed``, the summed memory estimates of the jobs
+                leased on that host
+            limit: Maximum number of candidates to consider
+            host: RENDER_HOST_ID of the worker, recorded on the leased job
+
+        Returns:
+            Optional[Dict[str, Any]]: The leased job, or None if nothing is eligible
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            candidates = [
+                dict(row)
+                for row in conn.execute(
+                    "SELECT video_id, api_key, plan, fair_tag, enqueued_at, memory_estimate FROM jobs "
+                    "WHERE queue_state = 'queued' ORDER BY fair_tag LIMIT ?",
+                    (limit,),
+                )
+            ]
+            if not candidates:
+                return None
+            running = {
+                row[0]: row[1]
+                for row in conn.execute(
+                    "SELECT api_key, COUNT(*) FROM jobs "
+                    "WHERE queue_state = 'leased' GROUP BY api_key"
+                )
+            }
+            if host is None:
+                chosen = choose(candidates, running)
+            else:
+                committed = conn.execute(
+                    "SELECT coalesce(SUM(memory_estimate), 0) FROM jobs "
+                    "WHERE queue_state = 'leased' AND host = ?",
+                    (host,),
+                ).fetchone()[0]
+                chosen = choose(candidates, running, memory_committed=committed)
+            if chosen is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET queue_state = 'leased', worker_id = ?, host = ?, started_at = ?, "
+                "updated_at = ?, lease_expires_at = ?, attempts = coalesce(attempts, 0) + 1 "
+                "WHERE video_id = ?",
+                (worker_id, host, now, now, now + Config.LEASE_TIMEOUT, chosen["video_id"]),
+            )
+            if chosen["fair_tag"] > self._get_meta(conn, "vclock"):
+                self._set_meta(conn, "vclock", chosen["fair_tag"])
+        return self.get_job(chosen["video_id"])
+
+    def _expire_leases(self, conn: sqlite3.Connection, now: float) -> None:
+        """Queue again (or fail) leased jobs whose worker stopped heartbeating."""
+        expired = conn.execute(
+            "SELECT video_id, worker_id, attempts, finished_at FROM jobs "
+            "WHERE queue_state = 'leased' AND lease_expires_at < ?",
+            (now,),
+        ).fetchall()
+        for row in expired:
+            if row["finished_at"] is not None:
+                # The worker finished the job but died before releasing it
+                conn.execute("UPDATE jobs SET queue_state = 'done' WHERE video_id = ?", (row["video_id"],))
+            elif (row["attempts"] or 0) >= Config.MAX_JOB_ATTEMPTS:
+                logger.error(f"Job {row['video_id']} lost its worker {row['attempts']} times; failing it")
+                conn.execute(
+                    "UPDATE jobs SET queue_state = 'done', status = ?, error = ?, "
+                    "finished_at = ?, updated_at = ? WHERE video_id = ?",
+                    (
+                        "Error: Render worker stopped responding",
+                        "Render worker stopped responding",
+                        now,
+                        now,
+                        row["video_id"],
+                    ),
+                )
+            else:
+                logger.warning(f"Lease of job {row['video_id']} held by {row['worker_id']} expired; requeueing")
+                conn.execute(
+                    "UPDATE jobs SET queue_state = 'queued', worker_id = NULL, updated_at = ? "
+                    "WHERE video_id = ?",
+                    (now, row["video_id"]),
+                )
+
+    def heartbeat(self, video_id: str, worker_id: str) -> bool:
+        """
+        Extend a worker's lease on a job by ``LEASE_TIMEOUT`` seconds.
+
+        Args:
+            video_id: Unique identifier of the leased job
+            worker_id: Identifier of the worker holding the lease
+
+        Returns:
+            bool: False if the worker no longer holds the lease (it expired and
+            the job was handed to another worker), True otherwise
+        """
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE jobs SET lease_expires_at = ? "
+            "WHERE video_id = ? AND worker_id = ? AND queue_state = 'leased'",
+            (now + Config.LEASE_TIMEOUT, video_id, worker_id),
+        )
+        return cursor.rowcount > 0
+
+    def requeue_job(self, video_id: str, worker_id: str) -> bool:
+        """
+        Hand a leased, unfinished job back to the queue.
+
+        Args:
+            video_id: Unique identifier of the job
+            worker_id: Worker giving up the lease
+
+        Returns:
+            bool: True if the job was queued again
+        """
+        cursor = self._connect().execute(
+            "UPDATE jobs SET queue_state = 'queued', worker_id = NULL, updated_at = ? "
+            "WHERE video_id = ? AND worker_id = ? AND queue_state = 'leased' AND finished_at IS NULL",
+            (time.time(), video_id, worker_id),
+        )
+        self._poke_watcher()
+        return cursor.rowcount > 0
+
+    def release_job(self, video_id: str, worker_id: Optional[str] = None) -> None:
+        """
+        Mark a leased job as done so it no longer counts against its owner.
+
+        Args:
+            video_id: Unique identifier of the job
+            worker_id: If given, only release the job if this worker still holds it
+        """
+        if worker_id is None:
+            self.update_job(video_id, queue_state="done")
+            return
+        self._connect().execute(
+            "UPDATE jobs SET queue_state = 'done', updated_at = ? WHERE video_id = ? AND worker_id = ?",
+            (time.time(), video_id, worker_id),
+        )
+        self._poke_watcher()
+
+    def request_cancel(self, video_id: str) -> Optional[str]:
+        """
+        Cancel a job, or ask the worker rendering it to stop.
+
+        Args:
+            video_id: Unique identifier of the job
+
+        Returns:
+            Optional[str]: "cancelled" if the job had not started and is now
+            Cancelled, "cancelling" if a worker is rendering it and has been
+            asked to stop, "finished" if it had already finished, or None if
+            the job does not exist
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT status, queue_state FROM jobs WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if is_terminal_status(row["status"]):
+                return "finished"
+            now = time.time()
+            if row["queue_state"] == "leased":
+                conn.execute(
+                    "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE video_id = ?",
+                    (now, video_id),
+                )
+                return "cancelling"
+            conn.execute(
+                "UPDATE jobs SET status = 'Cancelled', queue_state = CASE WHEN queue_state "
+                "IS NULL THEN NULL ELSE 'done' END, finished_at = ?, updated_at = ? "
+                "WHERE video_id = ?",
+                (now, now, video_id),
+            )
+        return "cancelled"
+
+    def is_cancel_requested(self, video_id: str) -> bool:
+        """Return True if a running job has been asked to stop."""
+        row = self._connect().execute(
+            "SELECT cancel_requested FROM jobs WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def queue_stats(self, window_seconds: float = 3600) -> Dict[str, Dict[str, Any]]:
+        """
+        Summarize the render queue per plan.
+
+        Args:
+            window_seconds: How far back to look for started jobs when
+                computing wait times
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Per-plan queue depth, running count and
+            wait-time statistics in seconds
+        """
+        conn = self._connect()
+        now = time.time()
+        stats: Dict[str, Dict[str, Any]] = {}
+
+        def entry(plan):
+            return stats.setdefault(plan or "unknown", {
+                "queued": 0, "running": 0, "oldest_wait": 0.0,
+                "started": 0, "avg_wait": 0.0, "max_wait": 0.0,
+            })
+
+        for row in conn.execute(
+            "SELECT plan, queue_state, COUNT(*), MIN(enqueued_at) FROM jobs "
+            "WHERE queue_state IN ('queued', 'leased') GROUP BY plan, queue_state"
+        ):
+            if row[1] == "queued":
+                entry(row[0]).update(queued=row[2], oldest_wait=round(now - row[3], 3))
+            else:
+                entry(row[0])["running"] = row[2]
+        for row in conn.execute(
+            "SELECT plan, COUNT(*), AVG(started_at - enqueued_at), MAX(started_at - enqueued_at) "
+            "FROM jobs WHERE enqueued_at IS NOT NULL AND started_at >= ? GROUP BY plan",
+            (now - window_seconds,),
+        ):
+            entry(row[0]).update(
+                started=row[1], avg_wait=round(row[2], 3), max_wait=round(row[3], 3)
+            )
+        return stats
+
+    def owns_output(self, api_key: str, filename: str) -> bool:
+        """
+        Return True if the API key owns a job whose output file has this name.
+
+        Args:
+            api_key: API key of the caller
+            filename: Base name of the output file
+
+        Returns:
+            bool: True if one of the key's jobs produced or shares the file
+        """
+        for row in self._connect().execute(
+            "SELECT output_path FROM jobs WHERE api_key = ? AND output_path LIKE ?",
+            (api_key, f"%{filename}"),
+        ):
+            if os.path.basename(row["output_path"]) == filename:
+                return True
+        return False
+
+    def measured_renders(self, limit: int) -> List[Tuple[Dict[str, Any], int]]:
+        """
+        Return the payload and measured peak RSS of recent completed renders.
+
+        Args:
+            limit: Maximum number of renders, newest first
+
+        Returns:
+            List[Tuple[Dict[str, Any], int]]: (payload, peak RSS in bytes) pairs
+        """
+        rows = self._connect().execute(
+            "SELECT payload, peak_rss FROM jobs WHERE peak_rss IS NOT NULL AND payload IS NOT NULL "
+            "ORDER BY finished_at DESC LIMIT ?",
+            (limit,),
+        )
+        return [(json.loads(row["payload"]), row["peak_rss"]) for row in rows]
+
+    def claim_job(
+        self,
+        video_id: str,
+        api_key: Optional[str],
+        plan_hash: str,
+        idempotency_key: Optional[str] = None,
+        reuse: bool = True,
+        admit: Optional[Callable[[sqlite3.Connection], bool]] = None,
+        reuse_ttl: Optional[float] = None,
+        **extra,
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Create a job unless an equivalent one already exists for the same key.
+
+        Runs in a single write transaction so concurrent identical requests
+        cannot both start a render.
+
+        Args:
+            video_id: Identifier for the new job
+            api_key: API key that owns the job (matches are scoped to it)
+            plan_hash: Canonical hash of the render plan
+            idempotency_key: Client-supplied Idempotency-Key header (optional)
+            reuse: Whether to attach to in-flight or finished identical renders
+            admit: Called with the connection inside the transaction before a
+                job that must be rendered is created; if it returns False no
+                job is created. Coalesced and reused jobs are not charged
+                (their ``credits`` are 0) and skip it
+            reuse_ttl: Seconds after which a finished render is no longer
+                reused (None: no limit); in-flight renders are always joined
+            **extra: Other job columns to set on the new job
+
+        Returns:
+            Tuple[str, Optional[Dict[str, Any]]]: One of
+            ``("replay", original)`` when the idempotency key was seen before
+            (no job is created), ``("coalesced", source)`` when the new job
+            follows an identical render in progress, ``("reused", source)``
+            when the new job is completed from an identical finished render,
+            ``("refused", None)`` when ``admit`` turned the job down, or
+            ``("created", None)`` when the job must be rendered
+        """
+        with self._transaction() as conn:
+            if idempotency_key:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE api_key IS ? AND idempotency_key = ? "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (api_key, idempotency_key),
+                ).fetchone()
+                if row:
+                    return "replay", self._decode(row)
+
+            outcome, source = "created", None
+            if reuse:
+                outcome, source = self._find_identical(conn, api_key, plan_hash, reuse_ttl)
+                outcome = outcome or "created"
+
+            if outcome == "created" and admit is not None and not admit(conn):
+                return "refused", None
+
+            now = time.time()
+            fields: Dict[str, Any] = {
+                "status": "Processing", "api_key": api_key, "created_at": now,
+                "updated_at": now, "plan_hash": plan_hash, "idempotency_key": idempotency_key,
+            }
+            fields.update(extra)
+            if source is not None:
+                # The job shares the source's render and is not charged for it
+                fields.update(source_id=source["video_id"], credits=0)
+            if outcome == "reused":
+                fields.update(
+                    status="Completed", finished_at=now, output_path=source["output_path"]
+                )
+            values = self._encode(fields)
+            conn.execute(
+                f"INSERT INTO jobs (video_id, {', '.join(values)}) "
+                f"VALUES ({', '.join('?' for _ in range(len(values) + 1))})",
+                [video_id, *values.values()],
+            )
+        return outcome, source
+
+    def find_identical(
+        self, api_key: Optional[str], plan_hash: str, reuse_ttl: Optional[float] = None
+    ) -> Optional[str]:
+        """
+        Return how ``claim_job`` would match a plan right now, without creating a job.
+
+        Returns:
+            Optional[str]: "coalesced", "reused", or None if it would be rendered
+        """
+        return self._find_identical(self._connect(), api_key, plan_hash, reuse_ttl)[0]
+
+    def _find_identical(
+        self, conn: sqlite3.Connection, api_key: Optional[str], plan_hash: str, reuse_ttl: Optional[float]
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE api_key IS ? AND plan_hash = ? AND source_id IS NULL "
+            "AND (status = 'Completed' OR finished_at IS NULL) "
+            "ORDER BY created_at DESC LIMIT 1",
+            (api_key, plan_hash),
+        ).fetchone()
+        if row and row["status"] != "Completed":
+            return "coalesced", self._decode(row)
+        if (
+            row and row["output_path"] and os.path.isfile(row["output_path"])
+            and (reuse_ttl is None or row["finished_at"] >= time.time() - reuse_ttl)
+        ):
+            return "reused", self._decode(row)
+        return None, None
+
+    def list_followers(self, video_id: str) -> List[Dict[str, Any]]:
+        """Return unfinished jobs that were coalesced onto the given job."""
+        rows = self._connect().execute(
+            "SELECT * FROM jobs WHERE source_id = ? AND finished_at IS NULL", (video_id,)
+        )
+        return [self._decode(row) for row in rows]
+
+    def list_batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Return the jobs of a batch in submission order."""
+        rows = self._connect().execute(
+            "SELECT * FROM jobs WHERE batch_id = ? ORDER BY rowid", (batch_id,)
+        )
+        return [self._decode(row) for row in rows]
+
+    def wait_for_update(
+        self, video_id: str, since: float, timeout: float
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Block until a job changes after ``since`` or finishes.
+
+        Waiting is driven by a JobWatcher, so writes from any process on the
+        host (including render child processes) wake the caller.
+
+        Args:
+            video_id: Unique identifier of the job
+            since: ``updated_at`` value the caller has already seen
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            Optional[Dict[str, Any]]: The job record (changed or not after the
+            timeout), or None if the job does not exist
+        """
+        job = self.get_job(video_id)
+        if job is None or job["updated_at"] > since or is_terminal_status(job["status"]):
+            return job
+        self._get_watcher().wait(video_id, since, timeout)
+        return self.get_job(video_id)
+
+    def _get_watcher(self) -> "JobWatcher":
+        with self._watcher_lock:
+            if self._watcher is None or self._watcher.pid != os.getpid():
+                self._watcher = JobWatcher(self)
+            return self._watcher
+
+    def _poke_watcher(self) -> None:
+        # Wake the watcher right away for writes made by this process
+        watcher = self._watcher
+        if watcher is not None:
+            watcher.poke()
+
+    def status_view(self) -> "JobStatusView":
+        """Return a dict-like view mapping video IDs to status strings."""
+        return JobStatusView(self)
+
+
+class JobWatcher:
+    """
+    Wakes threads waiting for changes to particular jobs.
+
+    One background thread per process watches the database with
+    ``PRAGMA data_version``, which changes whenever another connection (in
+    this or any other process) commits. Only then does it read ``updated_at``
+    for the jobs that have waiters, so idle waiters cost nothing and a
+    commit costs one indexed query no matter how many clients wait.
+    """
+
+    def __init__(self, store: JobStore):
+        """
+        Initialize the watcher.
+
+        Args:
+            store: Job store to watch
+        """
+        self.store = store
+        self.pid = os.getpid()
+        self._cond = threading.Condition()
+        self._waiters: Dict[str, int] = {}
+        self._versions: Dict[str, float] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._new_waiters = False
+
+    def wait(self, video_id: str, since: float, timeout: float) -> bool:
+        """
+        Wait until the job's ``updated_at`` moves past ``since``.
+
+        Args:
+            video_id: Unique identifier of the job
+            since: ``updated_at`` value the caller has already seen
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            bool: True if the job changed, False on timeout
+        """
+        with self._cond:
+            self._waiters[video_id] = self._waiters.get(video_id, 0) + 1
+            self._versions.setdefault(video_id, since)
+            # A commit may have landed between the caller's read and now
+            self._new_waiters = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="job-watcher", daemon=True)
+                self._thread.start()
+            self._wake.set()
+            try:
+                return self._cond.wait_for(lambda: self._versions[video_id] > since, timeout)
+            finally:
+                self._waiters[video_id] -= 1
+                if not self._waiters[video_id]:
+                    del self._waiters[video_id]
+                    del self._versions[video_id]
+
+    def poke(self) -> None:
+        """Check for changes now instead of at the next interval."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        conn = sqlite3.connect(self.store.path, timeout=30, isolation_level=None)
+        last_version = None
+        while True:
+            with self._cond:
+                watched = list(self._waiters)
+                if not watched:
+                    self._thread = None
+                    break
+                new_waiters, self._new_waiters = self._new_waiters, False
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != last_version or new_waiters:
+                last_version = version
+                self._refresh(conn, watched)
+            self._wake.wait(Config.JOB_WATCH_INTERVAL)
+            self._wake.clear()
+        conn.close()
+
+    def _refresh(self, conn: sqlite3.Connection, watched: List[str]) -> None:
+        versions = {}
+        for start in range(0, len(watched), 500):
+            chunk = watched[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = conn.execute(
+                f"SELECT video_id, updated_at FROM jobs WHERE video_id IN ({placeholders})", chunk
+            )
+            versions.update(rows)
+        with self._cond:
+            changed = False
+            for video_id, updated_at in versions.items():
+                if video_id in self._versions and updated_at > self._versions[video_id]:
+                    self._versions[video_id] = updated_at
+                    changed = True
+            if changed:
+                self._cond.notify_all()
+
+
+class JobStatusView(MutableMapping):
+    """Dict-like adapter so code written against ``video_status`` keeps working."""
+
+    def __init__(self, store: JobStore):
+        self._store = store
+
+    def __getitem__(self, video_id: str) -> str:
+        status = self._store.get_status(video_id)
+        if status is None:
+            raise KeyError(video_id)
+        return status
+
+    def __setitem__(self, video_id: str, status: str) -> None:
+        self._store.set_status(video_id, status)
+
+    def __delitem__(self, video_id: str) -> None:
+        if not self._store.delete_job(video_id):
+            raise KeyError(video_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([job["video_id"] for job in self._store.list_jobs(limit=-1)])
+
+    def __len__(self) -> int:
+        return self._store.count()
+
+
+# Create a singleton instance
+job_store = JobStore(Config.JOB_STORE_PATH)
@@ -0,0 +1,213 @@
+"""Logging setup: queued output, per-job context fields and sampled debug events."""
+import atexit
+import contextlib
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, TextIO
+
+from app.config import Config
+
+# Pass as ``extra=`` on high-volume debug events (one per segment, asset,
+# chunk...) to keep only 1 in LOG_DEBUG_SAMPLE_RATE of them per call site
+SAMPLED = {"sample": True}
+
+# Fields added to every record logged in the current context (a request
+# thread, a scheduler thread running a job, a render process)
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+_setup_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_pid: Optional[int] = None
+_handler: Optional["QueueingHandler"] = None
+
+
+def bind_log_context(**fields: Any) -> contextvars.Token:
+    """
+    Add fields to the records logged from here on in the current context.
+
+    Args:
+        **fields: Context fields, e.g. video_id or request_id
+
+    Returns:
+        contextvars.Token: Token that ``reset_log_context`` restores from
+    """
+    return _context.set({**_context.get(), **fields})
+
+
+def reset_log_context(token: contextvars.Token) -> None:
+    """Restore the context fields that were set before ``bind_log_context``."""
+    _context.reset(token)
+
+
+@contextlib.contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """Add fields to the records logged inside a ``with`` block."""
+    token = bind_log_context(**fields)
+    try:
+        yield
+    finally:
+        reset_log_context(token)
+
+
+class ContextFilter(logging.Filter):
+    """Attach the current context fields to a record as ``record.context``."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _context.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep 1 in N of the records logged with ``extra={"sample": N}``.
+
+    Records are counted per call site, so a sampled event in a hot loop does
+    not hide other events. ``{"sample": True}`` uses LOG_DEBUG_SAMPLE_RATE.
+    Kept records carry ``record.sampled = N``.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counters: Dict[tuple, Iterator[int]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = getattr(record, "sample", None)
+        if rate is True:
+            rate = Config.LOG_DEBUG_SAMPLE_RATE
+        if not rate or rate <= 1:
+            return True
+        site = (record.pathname, record.lineno)
+        counter = self._counters.get(site) or self._counters.setdefault(site, itertools.count())
+        if next(counter) % rate:
+            return False
+        record.sampled = rate
+        return True
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the writer thread without blocking the caller.
+
+    The message is formatted here, while its arguments still hold the values
+    they had when it was logged; the output format and the write happen on
+    the writer thread. If the queue is full the record is dropped and counted
+    rather than making the caller wait.
+    """
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text lines with the context fields appended as key=value pairs."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        context = getattr(record, "context", None)
+        if context:
+            line += " [" + " ".join(f"{key}={value}" for key, value in context.items()) + "]"
+        if getattr(record, "sampled", None):
+            line += f" (1 in {record.sampled})"
+        return line
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with the context fields as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+            **getattr(record, "context", {}),
+        }
+        if getattr(record, "sampled", None):
+            entry["sampled"] = record.sampled
+        if record.exc_text or record.exc_info:
+            entry["exception"] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level: Optional[Any] = None, fmt: Optional[str] = None, stream: Optional[TextIO] = None) -> None:
+    """
+    Route all logging through a queue to a single writer thread.
+
+    Replaces the root logger's handlers with a non-blocking queue handler
+    that adds context fields and applies sampling; a listener thread formats
+    and writes the records. Calling it again (e.g. in a render process, a
+    forked server worker, or to change the level) replaces the previous
+    setup.
+
+    Args:
+        level: Root log level (defaults to Config.LOG_LEVEL)
+        fmt: "text" or "json" (defaults to Config.LOG_FORMAT)
+        stream: Where records are written (defaults to stderr)
+    """
+    global _listener, _listener_pid, _handler
+    with _setup_lock:
+        # A forked child inherits the parent's listener but not its thread
+        if _listener and _listener_pid == os.getpid():
+            _listener.stop()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+            handler.close()
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        if (fmt or Config.LOG_FORMAT) == "json":
+            output.setFormatter(JSONFormatter())
+        else:
+            output.setFormatter(TextFormatter(Config.LOG_TEXT_FORMAT))
+
+        records: queue.Queue = queue.Queue(Config.LOG_QUEUE_SIZE)
+        _handler = QueueingHandler(records)
+        _handler.addFilter(SamplingFilter())
+        _handler.addFilter(ContextFilter())
+        root.addHandler(_handler)
+        root.setLevel(level or Config.LOG_LEVEL)
+        _listener = logging.handlers.QueueListener(records, output)
+        _listener.start()
+        _listener_pid = os.getpid()
+
+
+def dropped_records() -> int:
+    """Return the number of records dropped because the log queue was full."""
+    return _handler.dropped if _handler else 0
+
+
+@atexit.register
+def shutdown_logging() -> None:
+    """Write the records still queued and stop the writer thread."""
+    global _listener
+    with _setup_lock:
+        if _listener and _listener_pid == os.getpid():
+            _listener.stop()
+        _listener = None
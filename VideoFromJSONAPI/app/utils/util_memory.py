@@ -0,0 +1,137 @@
+"""Peak memory prediction for render jobs and the host memory budget."""
+import logging
+import os
+import resource
+import statistics
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Bounds of the calibration factor, so a few odd measurements cannot make the
+# scheduler admit everything or nothing
+MIN_CALIBRATION, MAX_CALIBRATION = 0.25, 4.0
+
+# How long a calibration factor is reused before the job store is read again
+CALIBRATION_TTL = 60
+
+
+def host_memory_budget() -> Optional[int]:
+    """
+    Return the bytes of RSS that renders on this host may commit.
+
+    Returns:
+        Optional[int]: ``RENDER_MEMORY_BUDGET_MB`` in bytes, 80% of physical
+        memory if it is 0, or None if admission control is off (-1)
+    """
+    if Config.RENDER_MEMORY_BUDGET_MB < 0:
+        return None
+    if Config.RENDER_MEMORY_BUDGET_MB > 0:
+        return Config.RENDER_MEMORY_BUDGET_MB * MB
+    try:
+        return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") * 0.8)
+    except (ValueError, OSError, AttributeError):
+        logger.warning("Cannot determine physical memory; memory admission is off")
+        return None
+
+
+def measure_peak_rss() -> int:
+    """
+    Return the peak RSS of this process plus its largest child, in bytes.
+
+    Called at the end of a render process, where the children are the ffmpeg
+    and ImageMagick processes moviepy started.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux
+    return (own + children) * 1024
+
+
+def _resolution_pixels(resolution: Any) -> int:
+    """Return the pixel count of a "WIDTHxHEIGHT" resolution (1080p if invalid)."""
+    try:
+        width, height = map(int, str(resolution).lower().split("x"))
+        return width * height
+    except ValueError:
+        return 1920 * 1080
+
+
+class MemoryModel:
+    """
+    Predicts the peak RSS of a render from its plan.
+
+    The raw estimate is linear in the output pixel count (frame buffers and
+    encoder state), with extra terms for audiograms and the number of
+    segments. Source images are scaled to the output size per segment, so
+    they are covered by the per-pixel term. The raw estimate is multiplied by
+    a calibration factor: the median ratio of measured peak RSS to raw
+    estimate over the last ``MEMORY_CALIBRATION_WINDOW`` completed renders.
+    """
+
+    def __init__(self, store):
+        """
+        Initialize the model.
+
+        Args:
+            store: Job store holding measured renders
+        """
+        self.store = store
+        self._lock = threading.Lock()
+        self._factor: Optional[float] = None
+        self._factor_expires = 0.0
+
+    @staticmethod
+    def raw_estimate(payload: Dict[str, Any]) -> int:
+        """
+        Estimate peak RSS in bytes before calibration.
+
+        Args:
+            payload: Keyword arguments of ``process_video``
+
+        Returns:
+            int: Estimated peak RSS in bytes
+        """
+        pixels = _resolution_pixels(payload.get("resolution"))
+        if payload.get("zoom_pan"):
+            # Frames are composed at 110% before being scaled down
+            pixels = int(pixels * 1.21)
+        segments = payload.get("segments") or []
+        estimate = Config.MEMORY_BASE_MB * MB + pixels * Config.MEMORY_BYTES_PER_PIXEL
+        estimate += len(segments) * Config.MEMORY_SEGMENT_MB * MB
+        if payload.get("audiogram"):
+            estimate += Config.MEMORY_AUDIOGRAM_MB * MB
+        return int(estimate)
+
+    def calibration(self) -> float:
+        """Return the calibration factor (1.0 until enough renders were measured)."""
+        with self._lock:
+            if self._factor is not None and time.monotonic() < self._factor_expires:
+                return self._factor
+        ratios = [
+            peak / self.raw_estimate(payload)
+            for payload, peak in self.store.measured_renders(Config.MEMORY_CALIBRATION_WINDOW)
+        ]
+        factor = 1.0
+        if len(ratios) >= Config.MEMORY_CALIBRATION_MIN_SAMPLES:
+            factor = min(max(statistics.median(ratios), MIN_CALIBRATION), MAX_CALIBRATION)
+        with self._lock:
+            self._factor, self._factor_expires = factor, time.monotonic() + CALIBRATION_TTL
+        return factor
+
+    def estimate(self, payload: Dict[str, Any]) -> int:
+        """
+        Predict a render's peak RSS in bytes.
+
+        Args:
+            payload: Keyword arguments of ``process_video``
+
+        Returns:
+            int: Calibrated peak RSS estimate in bytes
+        """
+        return int(self.raw_estimate(payload) * self.calibration())
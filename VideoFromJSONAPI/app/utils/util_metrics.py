@@ -0,0 +1,484 @@
+"""Prometheus metrics, aggregated over every process sharing the job store."""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.config import Config
+from app.utils.util_job_store import JobStore, job_store
+
+logger = logging.getLogger(__name__)
+
+# metric_snapshots: the latest values of each process (source "host:pid"),
+# written every METRICS_FLUSH_INTERVAL seconds. Processes that exit fold
+# their counters into the "archive" row, as do rows not updated for
+# METRICS_STALE_AFTER seconds (processes that were killed).
+METRICS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS metric_snapshots (
+        source TEXT PRIMARY KEY,
+        updated_at REAL NOT NULL,
+        data TEXT NOT NULL
+    )""",
+]
+
+ARCHIVE_SOURCE = "archive"
+
+# Render pipeline stages (see util_progress) under their metric names
+RENDER_STAGES = {
+    "downloading": "download",
+    "analysing": "decode",
+    "compositing": "composite",
+    "encoding": "encode",
+    "muxing": "mux",
+}
+
+Labels = Tuple[str, ...]
+
+
+def escape_label(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    """Format a sample value (integers without a trailing .0)."""
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+    A named metric with a fixed set of label names.
+
+    Values live in the registry; the metric only knows how to update them.
+    Labels are passed as keyword arguments and converted to strings.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def key(self, labels: Dict[str, Any]) -> Tuple[str, Labels]:
+        return self.name, tuple(str(labels[name]) for name in self.labelnames)
+
+    def new_value(self) -> Any:
+        return 0.0
+
+
+class Counter(Metric):
+    """A value that only goes up; summed over processes."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        shard = self.registry.shard()
+        key = self.key(labels)
+        shard[key] = shard.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that is set, not accumulated.
+
+    Process gauges (the default) describe the process that sets them and are
+    summed over the live processes, e.g. busy render slots. Cluster gauges
+    describe shared state (the render queue) and are set by ``on_scrape``
+    hooks in the process serving the scrape; they are never flushed.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, registry, name, documentation, labelnames=(), cluster: bool = False):
+        super().__init__(registry, name, documentation, labelnames)
+        self.cluster = cluster
+
+    def set(self, value: float, **labels) -> None:
+        # A single dict assignment: atomic under the GIL, no lock needed
+        self.registry._gauges[self.key(labels)] = float(value)
+
+
+class Histogram(Metric):
+    """
+    Observations counted into fixed buckets.
+
+    Values are a list of per-bucket counts (the last one for values above
+    every bound) followed by the sum of the observations.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets: Sequence[float] = ()):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = sorted(float(bound) for bound in buckets)
+
+    def new_value(self) -> List[float]:
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value: float, **labels) -> None:
+        shard = self.registry.shard()
+        key = self.key(labels)
+        entry = shard.get(key)
+        if entry is None:
+            entry = shard[key] = self.new_value()
+        entry[bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+
+def _add(metric: Metric, current: Any, value: Any, sign: int = 1) -> Any:
+    """Add (or subtract) two values of a counter or histogram."""
+    if current is None:
+        current = metric.new_value()
+    if isinstance(metric, Histogram):
+        if len(value) != len(current):
+            # Bucket bounds changed between versions; keep the newer layout
+            return list(value) if sign > 0 else current
+        return [a + sign * b for a, b in zip(current, value)]
+    return current + sign * value
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics of this process and shares them with the others.
+
+    Counters and histograms are updated in a dictionary owned by the calling
+    thread, so recording a sample never takes a lock; the per-thread shards
+    are only summed when the metrics are collected. The job store database
+    carries each process's totals to whichever process serves the scrape,
+    so render children, standalone workers and every gunicorn worker show up
+    in one exposition.
+    """
+
+    def __init__(self, store: JobStore, source: Optional[str] = None):
+        """
+        Initialize the registry and create its table.
+
+        Args:
+            store: Job store whose database holds the snapshots
+            source: Name of this process's snapshot row (default "host:pid")
+        """
+        self.store = store
+        self.source_name = source
+        self.metrics: Dict[str, Metric] = {}
+        self._collect_hooks: List[Callable[[], None]] = []
+        self._scrape_hooks: List[Callable[[Dict[str, Dict[Labels, Any]]], None]] = []
+        self._reset()
+        conn = store._connect()
+        for statement in METRICS_SCHEMA:
+            conn.execute(statement)
+        if hasattr(os, "register_at_fork"):
+            # A forked child starts counting from zero; its parent reports the rest
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        """Start from empty values (at creation and in forked children)."""
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, Dict]] = []
+        self._retired: Dict[Tuple[str, Labels], Any] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        # Totals already counted in the archive row (see flush)
+        self._archived: Dict[Tuple[str, Labels], Any] = {}
+        self._last_flushed: Dict[Tuple[str, Labels], Any] = {}
+        self._flushed = False
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), cluster: bool = False) -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames, cluster=cluster))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = ()
+    ) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets=buckets))
+
+    def _register(self, metric: Metric) -> Any:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def on_collect(self, hook: Callable[[], None]) -> None:
+        """Run ``hook`` before each snapshot of this process (to set process gauges)."""
+        self._collect_hooks.append(hook)
+
+    def on_scrape(self, hook: Callable[[Dict[str, Dict[Labels, Any]]], None]) -> None:
+        """Run ``hook`` with the merged samples of every process before each exposition."""
+        self._scrape_hooks.append(hook)
+
+    def shard(self) -> Dict[Tuple[str, Labels], Any]:
+        """Return the calling thread's values (registered on its first use)."""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def values(self) -> Dict[Tuple[str, Labels], Any]:
+        """Return this process's counters, histograms and process gauges."""
+        for hook in self._collect_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.error("Error collecting metrics: %s", e)
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                    continue
+                # Fold the values of finished threads so their shards can go
+                for key, value in shard.items():
+                    self._retired[key] = _add(self.metrics[key[0]], self._retired.get(key), value)
+            self._shards = live
+            totals = {
+                key: list(value) if isinstance(value, list) else value for key, value in self._retired.items()
+            }
+            shards = [shard.copy() for _, shard in live]
+        for shard in shards:
+            for key, value in shard.items():
+                totals[key] = _add(self.metrics[key[0]], totals.get(key), value)
+        for key, value in list(self._gauges.items()):
+            if not self.metrics[key[0]].cluster:
+                totals[key] = value
+        return totals
+
+    def source(self) -> str:
+        return self.source_name or f"{socket.gethostname()}:{os.getpid()}"
+
+    def encode(self, values: Dict[Tuple[str, Labels], Any]) -> str:
+        data: Dict[str, List] = {}
+        for (name, labels), value in values.items():
+            data.setdefault(name, []).append([list(labels), value])
+        return json.dumps(data)
+
+    def decode(self, text: str) -> Dict[Tuple[str, Labels], Any]:
+        values = {}
+        for name, samples in json.loads(text).items():
+            if name in self.metrics:
+                for labels, value in samples:
+                    values[(name, tuple(labels))] = value
+        return values
+
+    def _accumulate(self, totals, values, gauges: bool = True, sign: int = 1) -> None:
+        """Add ``values`` into ``totals`` (gauges are summed, or skipped)."""
+        for key, value in values.items():
+            metric = self.metrics[key[0]]
+            if isinstance(metric, Gauge):
+                if gauges:
+                    totals[key] = totals.get(key, 0.0) + value
+                continue
+            totals[key] = _add(metric, totals.get(key), value, sign)
+
+    def flush(self) -> None:
+        """Write this process's values to its snapshot row."""
+        values = self.values()
+        source = self.source()
+        with self.store._transaction() as conn:
+            row = conn.execute("SELECT 1 FROM metric_snapshots WHERE source = ?", (source,)).fetchone()
+            if row is None and self._flushed:
+                # Our row went stale (the process was stopped for a while) and
+                # was archived: those totals must not be counted twice
+                self._archived = self._last_flushed
+            self._accumulate(values, self._archived, gauges=False, sign=-1)
+            conn.execute(
+                "INSERT OR REPLACE INTO metric_snapshots (source, updated_at, data) VALUES (?, ?, ?)",
+                (source, time.time(), self.encode(values)),
+            )
+        self._last_flushed = {**self._archived}
+        self._accumulate(self._last_flushed, values, gauges=False)
+        self._flushed = True
+
+    def retire(self) -> None:
+        """Fold this process's counters into the archive before it exits."""
+        values = self.values()
+        source = self.source()
+        with self.store._transaction() as conn:
+            if self._flushed and conn.execute(
+                "SELECT 1 FROM metric_snapshots WHERE source = ?", (source,)
+            ).fetchone() is None:
+                self._archived = self._last_flushed
+            self._accumulate(values, self._archived, gauges=False, sign=-1)
+            self._fold(conn, [values])
+            conn.execute("DELETE FROM metric_snapshots WHERE source = ?", (source,))
+        self._archived = {}
+        self._flushed = False
+        # Anything recorded from here on is counted afresh
+        with self._lock:
+            self._local = threading.local()
+            self._shards = []
+            self._retired = {}
+
+    def _fold(self, conn, snapshots: List[Dict[Tuple[str, Labels], Any]]) -> None:
+        """Add counter and histogram values to the archive row (in a transaction)."""
+        row = conn.execute("SELECT data FROM metric_snapshots WHERE source = ?", (ARCHIVE_SOURCE,)).fetchone()
+        archive = self.decode(row["data"]) if row else {}
+        for values in snapshots:
+            self._accumulate(archive, values, gauges=False)
+        conn.execute(
+            "INSERT OR REPLACE INTO metric_snapshots (source, updated_at, data) VALUES (?, ?, ?)",
+            (ARCHIVE_SOURCE, time.time(), self.encode(archive)),
+        )
+
+    def collect(self) -> Dict[str, Dict[Labels, Any]]:
+        """
+        Return the samples of every process, per metric and label values.
+
+        Flushes this process first, archives rows that went stale and sums
+        the rest; cluster gauges are then set by the ``on_scrape`` hooks.
+        """
+        self.flush()
+        now = time.time()
+        totals: Dict[Tuple[str, Labels], Any] = {}
+        with self.store._transaction() as conn:
+            rows = conn.execute("SELECT source, updated_at, data FROM metric_snapshots").fetchall()
+            stale = [
+                row for row in rows
+                if row["source"] != ARCHIVE_SOURCE and row["updated_at"] < now - Config.METRICS_STALE_AFTER
+            ]
+            if stale:
+                self._fold(conn, [self.decode(row["data"]) for row in stale])
+                conn.executemany(
+                    "DELETE FROM metric_snapshots WHERE source = ?", [(row["source"],) for row in stale]
+                )
+                rows = conn.execute("SELECT source, updated_at, data FROM metric_snapshots").fetchall()
+        for row in rows:
+            self._accumulate(totals, self.decode(row["data"]), gauges=row["source"] != ARCHIVE_SOURCE)
+        samples: Dict[str, Dict[Labels, Any]] = {name: {} for name in self.metrics}
+        for (name, labels), value in totals.items():
+            samples[name][labels] = value
+        # Cluster gauges are set afresh by every scrape (a drained plan drops out)
+        for key in [key for key in self._gauges if self.metrics[key[0]].cluster]:
+            self._gauges.pop(key, None)
+        for hook in self._scrape_hooks:
+            try:
+                hook(samples)
+            except Exception as e:
+                logger.error("Error collecting metrics: %s", e)
+        for (name, labels), value in list(self._gauges.items()):
+            if self.metrics[name].cluster:
+                samples[name][labels] = value
+        return samples
+
+    def expose(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        samples = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, value in sorted(samples[name].items()):
+                pairs = [f'{label}="{escape_label(v)}"' for label, v in zip(metric.labelnames, labels)]
+                suffix = "{%s}" % ",".join(pairs) if pairs else ""
+                if not isinstance(metric, Histogram):
+                    lines.append(f"{name}{suffix} {format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + [float("inf")], value[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else format_value(bound)
+                    bucket_labels = ",".join(pairs + ['le="%s"' % le])
+                    lines.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+                lines.append(f"{name}_sum{suffix} {format_value(value[-1])}")
+                lines.append(f"{name}_count{suffix} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def start(self) -> None:
+        """Start the thread that flushes this process's values periodically."""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(Config.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error flushing metrics: %s", e)
+
+
+def render_features(zoom_pan, fade_effect, audiogram, watermark, background_music) -> str:
+    """Label value naming the optional effects of a render ("none" if it uses none)."""
+    features = [
+        name for name, enabled in (
+            ("zoom_pan", zoom_pan),
+            ("fade", fade_effect and fade_effect != "none"),
+            ("audiogram", audiogram),
+            ("watermark", watermark),
+            ("background_music", background_music),
+        ) if enabled
+    ]
+    return "+".join(features) or "none"
+
+
+def _cache_hit_ratios(samples: Dict[str, Dict[Labels, Any]]) -> None:
+    requests: Dict[str, Dict[str, float]] = {}
+    for (tier, result), value in samples["cache_requests_total"].items():
+        requests.setdefault(tier, {})[result] = value
+    for tier, results in requests.items():
+        total = sum(results.values())
+        if total:
+            CACHE_HIT_RATIO.set(results.get("hit", 0.0) / total, tier=tier)
+
+
+# Create a singleton instance
+metrics = MetricsRegistry(job_store)
+
+HTTP_REQUEST_DURATION = metrics.histogram(
+    "http_request_duration_seconds", "Time to handle an API request, by route.",
+    ("method", "route", "status"), buckets=Config.METRICS_LATENCY_BUCKETS,
+)
+RENDER_QUEUE_DEPTH = metrics.gauge(
+    "render_queue_depth", "Jobs waiting to be rendered.", ("plan",), cluster=True
+)
+RENDER_QUEUE_RUNNING = metrics.gauge(
+    "render_queue_running", "Jobs leased by a render worker.", ("plan",), cluster=True
+)
+RENDER_QUEUE_OLDEST_WAIT = metrics.gauge(
+    "render_queue_oldest_wait_seconds", "How long the oldest waiting job has waited.", ("plan",), cluster=True
+)
+RENDER_QUEUE_WAIT = metrics.histogram(
+    "render_queue_wait_seconds", "Time jobs waited in the queue before a worker started them.",
+    ("plan",), buckets=Config.METRICS_QUEUE_WAIT_BUCKETS,
+)
+RENDER_WORKER_SLOTS = metrics.gauge("render_worker_slots", "Render worker threads running.")
+RENDER_WORKERS_BUSY = metrics.gauge("render_workers_busy", "Render worker threads rendering a job.")
+RENDER_WORKER_BUSY_SECONDS = metrics.counter(
+    "render_worker_busy_seconds_total", "Time render workers spent rendering (divide by slots for utilization)."
+)
+RENDER_STAGE_DURATION = metrics.histogram(
+    "render_stage_duration_seconds", "Time completed renders spent in each pipeline stage.",
+    ("stage", "resolution", "features"), buckets=Config.METRICS_STAGE_BUCKETS,
+)
+CACHE_REQUESTS = metrics.counter(
+    "cache_requests_total", "Cache lookups by tier and result (hit or miss).", ("tier", "result")
+)
+CACHE_BYTES = metrics.counter(
+    "cache_bytes_total", "Bytes served from a cache tier (hit) or fetched to fill it (miss).", ("tier", "result")
+)
+CACHE_HIT_RATIO = metrics.gauge(
+    "cache_hit_ratio", "Share of cache lookups that were hits, by tier.", ("tier",), cluster=True
+)
+FFMPEG_PROCESSES = metrics.counter(
+    "ffmpeg_processes_total", "ffmpeg and ffprobe processes run, by purpose and outcome.", ("purpose", "outcome")
+)
+RATE_LIMIT_REJECTIONS = metrics.counter(
+    "rate_limit_rejections_total", "Requests refused by the rate limiter, by plan.", ("plan",)
+)
+
+metrics.on_scrape(_cache_hit_ratios)
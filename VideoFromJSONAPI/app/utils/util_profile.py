@@ -0,0 +1,299 @@
+"""On-demand profiling of the renders of selected jobs."""
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config import Config
+from app.utils.util_job_store import JobStore, job_store
+
+logger = logging.getLogger(__name__)
+
+# profile_requests: "profile the next N jobs that match". NULL filters match
+# any job; a request stops matching when remaining reaches 0 or it expires.
+PROFILE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS profile_requests (
+        request_id TEXT PRIMARY KEY,
+        mode TEXT NOT NULL,
+        remaining INTEGER NOT NULL,
+        api_key TEXT,
+        plan TEXT,
+        resolution TEXT,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL
+    )""",
+]
+
+PROFILE_MODES = ("sampling", "cprofile")
+PROFILE_FILTERS = ("api_key", "plan", "resolution")
+
+
+def frame_label(path: str, line: int, name: str) -> str:
+    """Name a function for stacks: "name (path:first line)", path relative to the app or site-packages."""
+    if path.startswith(Config.ROOT_DIR):
+        path = os.path.relpath(path, Config.ROOT_DIR)
+    elif "site-packages" + os.sep in path:
+        path = path.split("site-packages" + os.sep, 1)[1]
+    # ";" separates frames in collapsed stacks
+    return f"{name} ({path}:{line})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """
+    Samples the call stack of one thread at a fixed interval.
+
+    A background thread reads the target thread's current frame every
+    ``interval`` seconds, so the profiled code runs unmodified; the cost is
+    one stack walk per sample. Stacks are counted in collapsed form
+    ("outer;inner;leaf"), the input of flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float = Config.PROFILE_SAMPLE_INTERVAL, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        labels: Dict[Any, str] = {}
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = frame_label(code.co_filename, code.co_firstlineno, code.co_name)
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        """Return the samples as collapsed stacks, one "stack count" line each."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = Config.PROFILE_TOP_FUNCTIONS) -> List[Dict[str, Any]]:
+        """
+        Return the functions most often on CPU.
+
+        Returns:
+            List[Dict[str, Any]]: function, self_percent (samples where it was
+            the innermost frame) and total_percent (samples where it was
+            anywhere on the stack), by self_percent
+        """
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        samples = self.samples or 1
+        return [
+            {
+                "function": name,
+                "self_percent": round(100 * count / samples, 1),
+                "total_percent": round(100 * total[name] / samples, 1),
+            }
+            for name, count in own.most_common(limit)
+        ]
+
+
+def cprofile_top(stats, limit: int = Config.PROFILE_TOP_FUNCTIONS) -> List[Dict[str, Any]]:
+    """Return the functions with the most own time from ``pstats.Stats``."""
+    total_time = stats.total_tt or 1
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+    top = []
+    for (path, line, name), (_, calls, own, cumulative, _) in rows:
+        top.append({
+            "function": frame_label(path, line, name),
+            "calls": calls,
+            "self_percent": round(100 * own / total_time, 1),
+            "total_percent": round(100 * cumulative / total_time, 1),
+        })
+    return top
+
+
+class JobProfiler:
+    """
+    Profiles the renders of the next N jobs matching a request.
+
+    An operator arms a request (optionally limited to one API key, plan or
+    resolution); each render process claims it for its job before rendering.
+    The profile is written to PROFILE_DIR next to the job's trace and a
+    summary with the hottest functions is kept on the job, where the status
+    endpoint shows it. Requests live in the job store database, so any
+    render worker can pick them up.
+    """
+
+    def __init__(self, store: JobStore):
+        """
+        Initialize the profiler and create its table.
+
+        Args:
+            store: Job store whose database holds the requests
+        """
+        self.store = store
+        conn = store._connect()
+        for statement in PROFILE_SCHEMA:
+            conn.execute(statement)
+
+    def arm(
+        self,
+        count: int,
+        mode: str = "sampling",
+        ttl: float = Config.PROFILE_REQUEST_TTL,
+        **filters: Optional[str],
+    ) -> Dict[str, Any]:
+        """
+        Profile the next ``count`` jobs matching ``filters``.
+
+        Args:
+            count: Number of jobs to profile
+            mode: "sampling" (low overhead) or "cprofile" (every call, slower)
+            ttl: Seconds after which the request expires even if unused
+            **filters: api_key, plan and/or resolution the jobs must have
+
+        Returns:
+            Dict[str, Any]: The stored request
+        """
+        now = time.time()
+        request = {
+            "request_id": uuid.uuid4().hex[:12],
+            "mode": mode,
+            "remaining": count,
+            **{name: filters.get(name) for name in PROFILE_FILTERS},
+            "created_at": now,
+            "expires_at": now + ttl,
+        }
+        self.store._connect().execute(
+            f"INSERT INTO profile_requests ({', '.join(request)}) VALUES ({', '.join('?' * len(request))})",
+            tuple(request.values()),
+        )
+        logger.info("Profiling the next %d matching job(s) with %s (request %s)", count, mode, request["request_id"])
+        return request
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Return the requests that can still match a job."""
+        rows = self.store._connect().execute(
+            "SELECT * FROM profile_requests WHERE remaining > 0 AND expires_at > ? ORDER BY created_at",
+            (time.time(),),
+        )
+        return [dict(row) for row in rows]
+
+    def cancel(self, request_id: str) -> bool:
+        """Delete a request; returns False if there was none."""
+        cursor = self.store._connect().execute("DELETE FROM profile_requests WHERE request_id = ?", (request_id,))
+        return cursor.rowcount > 0
+
+    def claim(self, job: Dict[str, Any], resolution: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Decide whether a job about to render is profiled.
+
+        A job that was claimed before (and is rendering again after a worker
+        restart) is profiled again without using up another count.
+
+        Args:
+            job: Job record
+            resolution: Output resolution of the render
+
+        Returns:
+            Optional[Dict[str, Any]]: request_id and mode, or None
+        """
+        if job.get("profile"):
+            return {"request_id": job["profile"].get("request_id"), "mode": job["profile"]["mode"]}
+        values = {"api_key": job.get("api_key"), "plan": job.get("plan"), "resolution": resolution}
+        with self.store._transaction() as conn:
+            for row in conn.execute(
+                "SELECT * FROM profile_requests WHERE remaining > 0 AND expires_at > ? ORDER BY created_at",
+                (time.time(),),
+            ).fetchall():
+                if all(row[name] is None or row[name] == values[name] for name in PROFILE_FILTERS):
+                    conn.execute(
+                        "UPDATE profile_requests SET remaining = remaining - 1 WHERE request_id = ?",
+                        (row["request_id"],),
+                    )
+                    claimed = {"request_id": row["request_id"], "mode": row["mode"]}
+                    break
+            else:
+                return None
+        self.store.update_job(job["video_id"], profile={**claimed, "status": "running"})
+        return claimed
+
+    @staticmethod
+    def output_path(video_id: str, mode: str) -> str:
+        """Return where a job's profile is written (.collapsed or .pstats)."""
+        extension = "collapsed" if mode == "sampling" else "pstats"
+        return os.path.join(Config.PROFILE_DIR, f"{video_id}.{extension}")
+
+    @contextmanager
+    def profile(self, video_id: str, claimed: Optional[Dict[str, Any]]) -> Iterator[None]:
+        """
+        Profile the block if the job was claimed, then save the results.
+
+        Args:
+            video_id: Job being rendered
+            claimed: Result of ``claim`` (None runs the block unprofiled)
+        """
+        if not claimed:
+            yield
+            return
+        mode = claimed["mode"]
+        started = time.time()
+        if mode == "cprofile":
+            import cProfile
+
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = SamplingProfiler()
+            profiler.start()
+        try:
+            yield
+        finally:
+            summary: Dict[str, Any] = {**claimed, "status": "done", "seconds": round(time.time() - started, 3)}
+            path = self.output_path(video_id, mode)
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                if mode == "cprofile":
+                    import pstats
+
+                    profiler.disable()
+                    profiler.dump_stats(path)
+                    summary["top"] = cprofile_top(pstats.Stats(profiler))
+                else:
+                    profiler.stop()
+                    with open(path, "w") as f:
+                        f.write(profiler.collapsed())
+                    summary.update(
+                        samples=profiler.samples,
+                        interval_ms=round(profiler.interval * 1000, 3),
+                        top=profiler.top(),
+                    )
+                summary["output"] = f"/api/jobs/{video_id}/profile"
+            except Exception as e:
+                logger.error("Error saving profile of job %s: %s", video_id, e)
+                summary.update(status="failed", error=str(e))
+            self.store.update_job(video_id, profile=summary)
+
+
+# Create a singleton instance
+job_profiler = JobProfiler(job_store)
@@ -0,0 +1,172 @@
+"""Render progress tracking and ETA estimation."""
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.config import Config
+from proglog import ProgressBarLogger
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages in order, with the share of the overall percentage each
+# one covers. Encoding dominates render time, so it gets most of the range.
+STAGES = {
+    "downloading": (0.0, 10.0),
+    "analysing": (10.0, 15.0),
+    "compositing": (15.0, 20.0),
+    "encoding": (20.0, 98.0),
+    "muxing": (98.0, 100.0),
+}
+
+
+class JobProgress:
+    """
+    Tracks the progress of one render and publishes it to the job store.
+
+    The published dictionary has the current ``stage``, segment and frame
+    counters, an exponentially smoothed encoding ``fps``, ``eta_seconds``,
+    an overall ``percent`` and per-stage ``timings``. Writes are throttled to
+    one per ``PROGRESS_UPDATE_INTERVAL`` seconds, except on stage changes.
+    """
+
+    def __init__(
+        self,
+        video_id: str,
+        publish: Callable[[str, Dict[str, Any]], Any],
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initialize the tracker.
+
+        Args:
+            video_id: Unique identifier of the job
+            publish: Called with (video_id, progress dict) to store progress
+            clock: Monotonic time source (injectable for tests)
+        """
+        self.video_id = video_id
+        self._publish = publish
+        self._clock = clock
+        self._stage: Optional[str] = None
+        self._stage_started = clock()
+        self._last_publish = float("-inf")
+        self._last_frame: Optional[tuple] = None
+        self.timings: Dict[str, float] = {}
+        self.state: Dict[str, Any] = {
+            "stage": None,
+            "segments_done": 0,
+            "segments_total": None,
+            "frames_done": 0,
+            "frames_total": None,
+            "fps": None,
+            "eta_seconds": None,
+            "percent": 0.0,
+        }
+
+    def stage(self, name: str, **fields) -> None:
+        """
+        Enter a pipeline stage (re-entering the current stage is a no-op).
+
+        Args:
+            name: One of STAGES
+            **fields: Counters to update at the same time
+        """
+        self.state.update(fields)
+        if name == self._stage:
+            self._maybe_publish()
+            return
+        now = self._clock()
+        if self._stage is not None:
+            self.timings[self._stage] = round(
+                self.timings.get(self._stage, 0.0) + now - self._stage_started, 3
+            )
+        self._stage, self._stage_started = name, now
+        self.state["stage"] = name
+        self.state["percent"] = max(self.state["percent"], STAGES[name][0])
+        self._maybe_publish(force=True)
+
+    def segment_done(self) -> None:
+        """Count one more segment as downloaded and analysed."""
+        self.state["segments_done"] += 1
+        total = self.state["segments_total"]
+        if total and self._stage in ("downloading", "analysing"):
+            start, end = STAGES["downloading"][0], STAGES["analysing"][1]
+            self.state["percent"] = round(start + (end - start) * self.state["segments_done"] / total, 1)
+        self._maybe_publish()
+
+    def frames(self, done: int, total: Optional[int]) -> None:
+        """
+        Record encoded frames and update the smoothed fps and ETA.
+
+        Args:
+            done: Frames written so far
+            total: Frames in the whole video
+        """
+        now = self._clock()
+        if self._stage != "encoding":
+            self.stage("encoding")
+        if self._last_frame is not None and now > self._last_frame[1] and done > self._last_frame[0]:
+            instant = (done - self._last_frame[0]) / (now - self._last_frame[1])
+            previous = self.state["fps"]
+            alpha = Config.PROGRESS_FPS_SMOOTHING
+            self.state["fps"] = round(instant if previous is None else alpha * instant + (1 - alpha) * previous, 2)
+        if self._last_frame is None or done > self._last_frame[0]:
+            self._last_frame = (done, now)
+        self.state.update(frames_done=done, frames_total=total)
+        if total:
+            start, end = STAGES["encoding"]
+            self.state["percent"] = round(start + (end - start) * min(done / total, 1.0), 1)
+            if self.state["fps"]:
+                self.state["eta_seconds"] = round(max(total - done, 0) / self.state["fps"], 1)
+            if done >= total:
+                # ffmpeg is finalizing the container
+                self.stage("muxing", eta_seconds=0.0)
+                return
+        self._maybe_publish()
+
+    def finish(self) -> None:
+        """Mark the pipeline as done and publish the final timings."""
+        self.stage("muxing")
+        self.timings["muxing"] = round(
+            self.timings.get("muxing", 0.0) + self._clock() - self._stage_started, 3
+        )
+        self._stage = None
+        self.state.update(stage="done", percent=100.0, eta_seconds=0.0)
+        self._maybe_publish(force=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the progress dictionary as published."""
+        return {**self.state, "timings": dict(self.timings)}
+
+    def _maybe_publish(self, force: bool = False) -> None:
+        now = self._clock()
+        if not force and now - self._last_publish < Config.PROGRESS_UPDATE_INTERVAL:
+            return
+        self._last_publish = now
+        try:
+            self._publish(self.video_id, self.snapshot())
+        except Exception as e:
+            # Progress is best-effort; never fail a render because of it
+            logger.warning(f"Could not publish progress for {self.video_id}: {e}")
+
+
+class RenderProgressLogger(ProgressBarLogger):
+    """
+    Feeds moviepy's frame counter (the ``t`` bar) into a JobProgress.
+
+    When a video is written in several chunks, ``frame_offset`` is the number
+    of frames written before this chunk and ``frames_total`` the frame count
+    of the whole video.
+    """
+
+    def __init__(self, progress: JobProgress, frame_offset: int = 0, frames_total: Optional[int] = None):
+        # Do not keep a log line per frame in memory
+        super().__init__(logged_bars=None)
+        self.progress = progress
+        self.frame_offset = frame_offset
+        self.frames_total = frames_total
+
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if bar == "t" and attr == "index":
+            # The index is set before each frame is written, and to the total at the end
+            total = self.frames_total or self.bars[bar].get("total")
+            self.progress.frames(self.frame_offset + value, total)
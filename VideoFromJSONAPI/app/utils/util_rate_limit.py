@@ -1,23 +1,160 @@
 """Rate limiting and credit management utility."""
 import logging
+import os
+import sqlite3
 import threading
 import time
-from datetime import datetime, timedelta
 from typing import Dict, Optional, Tuple
 
 from app.config import Config
+from app.utils.util_credits import credit_ledger
+from app.utils.util_metrics import RATE_LIMIT_REJECTIONS
 
 logger = logging.getLogger(__name__)
 
-class RateLimiter:
-    """Handles rate limiting and credit management for API keys."""
-    
+# Locks guarding the in-memory buckets; keys hash onto one of them
+LOCK_STRIPES = 64
+
+
+class MemoryRateStore:
+    """
+    GCRA state for one process, with striped locks.
+
+    Each key holds a single number, its theoretical arrival time (TAT), so a
+    check is O(1). Keys hash onto ``LOCK_STRIPES`` locks, so requests for
+    different keys rarely wait on each other.
+    """
+
     def __init__(self):
-        """Initialize the rate limiter with empty request tracking."""
-        self._request_times: Dict[str, list] = {}  # API key -> list of request timestamps
-        self._credits: Dict[str, Dict] = {}  # API key -> credit info
-        self._lock = threading.Lock()  # Global lock for thread safety
-    
+        self._tats: Dict[str, float] = {}
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def acquire(self, key: str, now: float, interval: float, period: float) -> float:
+        """
+        Take one request slot for a key.
+
+        Args:
+            key: Bucket key
+            now: Current time
+            interval: Seconds one request adds to the TAT (period / limit)
+            period: Length of the rate window in seconds
+
+        Returns:
+            float: 0 if the request is allowed, else seconds until it would be
+        """
+        with self._locks[hash(key) % LOCK_STRIPES]:
+            tat = max(self._tats.get(key, now), now) + interval
+            allow_at = tat - period
+            if now < allow_at:
+                return allow_at - now
+            self._tats[key] = tat
+            return 0.0
+
+    def reset(self) -> None:
+        """Forget every bucket."""
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            self._tats.clear()
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+
+class SQLiteRateStore:
+    """
+    GCRA state shared by every process on the host, in a SQLite file.
+
+    A check is a single UPSERT on the key's row, which SQLite applies
+    atomically, so N worker processes enforce one limit between them instead
+    of N.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the store.
+
+        Args:
+            path: SQLite database file (created if missing)
+        """
+        self.path = path
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the connection owned by the current thread and process."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")  # limiter state may be lost on power failure
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def acquire(self, key: str, now: float, interval: float, period: float) -> float:
+        """Take one request slot for a key (see MemoryRateStore.acquire)."""
+        conn = self._connect()
+        allowed = conn.execute(
+            "INSERT INTO rate_limits (key, tat) VALUES (?1, ?2 + ?3) "
+            "ON CONFLICT(key) DO UPDATE SET tat = max(tat, ?2) + ?3 "
+            "WHERE max(tat, ?2) + ?3 - ?4 <= ?2",
+            (key, now, interval, period),
+        ).rowcount
+        if allowed:
+            return 0.0
+        row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        return max(row[0] + interval - period - now, 0.0) if row else 0.0
+
+    def reset(self) -> None:
+        """Forget every bucket."""
+        self._connect().execute("DELETE FROM rate_limits")
+
+
+class RateLimiter:
+    """
+    Handles rate limiting and credit management for API keys.
+
+    Credits are kept in the durable ledger of ``util_credits``; the credit
+    methods here read its cached balances.
+
+    Rate limits use the generic cell rate algorithm: a key on a plan allowing
+    ``rate_limit`` requests per ``RATE_LIMIT_PERIOD`` may burst that many at
+    once, then gets one more every ``RATE_LIMIT_PERIOD / rate_limit``
+    seconds. The limit comes from the key's plan in ``Config.API_PLANS``
+    (``RATE_LIMIT_REQUESTS`` for keys without a plan).
+    """
+
+    def __init__(self, store=None):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            store: Bucket store; defaults to ``RATE_LIMIT_BACKEND`` ("sqlite",
+                shared by all processes, or "memory", per process)
+        """
+        if store is None:
+            if Config.RATE_LIMIT_BACKEND == "memory":
+                store = MemoryRateStore()
+            else:
+                store = SQLiteRateStore(Config.RATE_LIMIT_STORE_PATH)
+        self.store = store
+
+    @staticmethod
+    def limit_for(api_key: str) -> int:
+        """Return the requests per RATE_LIMIT_PERIOD allowed for an API key."""
+        key_info = Config.API_KEYS.get(api_key) or {}
+        plan = Config.API_PLANS.get(str(key_info.get("plan", "")).lower())
+        if plan and plan.get("rate_limit"):
+            return plan["rate_limit"]
+        return Config.RATE_LIMIT_REQUESTS
+
     def check_rate_limit(self, api_key: str) -> Tuple[bool, Optional[str]]:
         """
         Check if the request should be rate limited.
@@ -28,32 +165,26 @@ class RateLimiter:
         Returns:
             Tuple of (allowed, error_message)
         """
-        with self._lock:
-            current_time = time.time()
-            
-            # Get or initialize request times for this API key
-            if api_key not in self._request_times:
-                self._request_times[api_key] = []
-            
-            # Remove old request times (older than 1 minute)
-            self._request_times[api_key] = [
-                t for t in self._request_times[api_key]
-                if current_time - t < 60  # 1 minute
-            ]
-            
-            # Check if rate limit exceeded (more than 60 requests per minute)
-            if len(self._request_times[api_key]) >= 60:
-                return False, (
-                    "Rate limit exceeded. Please wait before making another request."
-                )
-            
-            # Add current request time
-            self._request_times[api_key].append(current_time)
-            return True, None
+        period = Config.RATE_LIMIT_PERIOD
+        wait = self.store.acquire(api_key, time.time(), period / self.limit_for(api_key), period)
+        if wait:
+            plan = (Config.API_KEYS.get(api_key) or {}).get("plan") or "none"
+            RATE_LIMIT_REJECTIONS.inc(plan=str(plan).lower())
+            return False, (
+                "Rate limit exceeded. Please wait before making another request."
+            )
+        return True, None
+
+    def reset(self) -> None:
+        """Clear all rate limit state (used by tests)."""
+        self.store.reset()
     
     def check_credits(self, api_key: str) -> Tuple[bool, Optional[str]]:
         """
         Check if the API key has available credits.
+
+        Reads the cached balance, so it is a cheap early rejection; the job
+        itself is only admitted by ``credit_ledger.admit`` when it is created.
         
         Args:
             api_key: The API key to check
@@ -61,57 +192,26 @@ class RateLimiter:
         Returns:
             Tuple of (has_credits, error_message)
         """
-        with self._lock:
-            # Get key info from config
-            key_info = Config.API_KEYS.get(api_key)
-            if not key_info:
-                return False, "Invalid API key"
-            
-            # Get plan info
-            plan = key_info.get("plan", "free")
-            credits_limit = {
-                "free": 10,
-                "starter": 60,
-                "creator": 150,
-                "pro": 500
-            }.get(plan)
-            
-            if not credits_limit:
-                return False, "Invalid plan"
-            
-            # Initialize credits if not set
-            if "credits_used" not in key_info:
-                key_info["credits_used"] = 0
-            if "credits_reset" not in key_info:
-                key_info["credits_reset"] = (
-                    datetime.now() + timedelta(days=30)
-                ).isoformat()
-            
-            # Check if credits need to be reset
-            credits_reset = datetime.fromisoformat(key_info["credits_reset"])
-            if datetime.now() >= credits_reset:
-                key_info["credits_used"] = 0
-                key_info["credits_reset"] = (
-                    datetime.now() + timedelta(days=30)
-                ).isoformat()
-            
-            # Check if credits are available
-            if key_info["credits_used"] >= credits_limit:
-                return False, "Monthly credit limit reached"
-            
-            return True, None
+        if api_key not in Config.API_KEYS:
+            return False, "Invalid API key"
+        credit_info = credit_ledger.credit_info(api_key)
+        if not credit_info:
+            return False, "Invalid plan"
+        if credit_info["credits_remaining"] <= 0:
+            return False, "Monthly credit limit reached"
+        return True, None
     
     def use_credit(self, api_key: str) -> None:
         """
-        Use one credit for the given API key.
+        Charge one credit to the given API key outside of a job.
+
+        Jobs are charged through their ledger reservation instead.
         
         Args:
             api_key: The API key to use a credit for
         """
-        with self._lock:
-            key_info = Config.API_KEYS.get(api_key)
-            if key_info:
-                key_info["credits_used"] = key_info.get("credits_used", 0) + 1
+        if api_key in Config.API_KEYS:
+            credit_ledger.adjust(api_key, 1)
     
     def get_credit_info(self, api_key: str) -> Optional[Dict]:
         """
@@ -123,31 +223,15 @@ class RateLimiter:
         Returns:
             Dictionary containing credit information or None if key not found
         """
-        with self._lock:
-            key_info = Config.API_KEYS.get(api_key)
-            if not key_info:
-                return None
-            
-            plan = key_info.get("plan", "free")
-            credits_limit = {
-                "free": 10,
-                "starter": 60,
-                "creator": 150,
-                "pro": 500
-            }.get(plan)
-            
-            if not credits_limit:
-                return None
-            
-            return {
-                "plan": plan.capitalize(),
-                "credits_total": credits_limit,
-                "credits_used": key_info.get("credits_used", 0),
-                "credits_remaining": credits_limit - key_info.get("credits_used", 0),
-                "credits_reset": key_info.get("credits_reset"),
-                "rate_limit": 60,  # 60 requests per minute
-                "features": ["basic"] if plan == "free" else ["basic", "priority_support"]
-            }
+        credit_info = credit_ledger.credit_info(api_key)
+        if not credit_info:
+            return None
+        plan = credit_info["plan"].lower()
+        return {
+            **credit_info,
+            "rate_limit": self.limit_for(api_key),  # requests per RATE_LIMIT_PERIOD
+            "features": ["basic"] if plan == "free" else ["basic", "priority_support"]
+        }
 
 
 # Create a singleton instance
@@ -0,0 +1,395 @@
+"""Plan-weighted fair-share scheduling of render jobs."""
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import Config
+from app.utils.util_dedup import resolve_followers
+from app.utils.util_job_store import JobStore, is_terminal_status, job_store
+from app.utils.util_logging import bind_log_context, log_context, setup_logging
+from app.utils.util_memory import MemoryModel, host_memory_budget, measure_peak_rss
+from app.utils.util_metrics import (RENDER_QUEUE_DEPTH, RENDER_QUEUE_OLDEST_WAIT, RENDER_QUEUE_RUNNING,
+                                    RENDER_QUEUE_WAIT, RENDER_WORKER_BUSY_SECONDS, RENDER_WORKER_SLOTS,
+                                    RENDER_WORKERS_BUSY, metrics)
+from app.utils.util_profile import job_profiler
+from app.utils.util_trace import job_trace
+from app.utils.util_workspace import release_job_files
+
+logger = logging.getLogger(__name__)
+
+
+def render_process(store_path: str, video_id: str, payload: Dict[str, Any]) -> None:
+    """
+    Entry point of the child process that renders one job.
+
+    Args:
+        store_path: Path of the job store database
+        video_id: Unique identifier of the job
+        payload: Keyword arguments for ``process_video``
+    """
+    # Lead a new process group so the supervisor can stop every child at once
+    os.setsid()
+    # A spawned child starts with no logging setup; everything it logs is for this job
+    setup_logging()
+    bind_log_context(video_id=video_id)
+    # Media libraries are only imported here, in the render process, so the
+    # API process that supervises renders never loads them
+    from app.utils.util_video import process_video
+
+    store = JobStore(store_path)
+    job = store.get_job(video_id) or {}
+    profiled = None
+    try:
+        if job:
+            profiled = job_profiler.claim(job, resolution=payload.get("resolution"))
+    except Exception as e:
+        logger.error(f"Error checking profile requests: {e}")
+    try:
+        with job_trace(video_id, plan=job.get("plan") or "", attempt=job.get("attempts") or 1) as trace:
+            if trace and job.get("enqueued_at") and job.get("started_at"):
+                trace.add("queue_wait", job["enqueued_at"], job["started_at"])
+            with job_profiler.profile(video_id, profiled):
+                process_video(
+                    video_id=video_id,
+                    video_status=store.status_view(),
+                    status_lock=threading.Lock(),
+                    **payload,
+                )
+        if store.get_status(video_id) == "Completed":
+            # Calibrates the memory model used for admission
+            store.update_job(video_id, peak_rss=measure_peak_rss())
+    finally:
+        # Hand this render's stage timings and ffmpeg counts to the scrape
+        try:
+            metrics.retire()
+        except Exception as e:
+            logger.error(f"Error saving render metrics: {e}")
+
+
+def stop_process_group(process: multiprocessing.Process) -> None:
+    """
+    Terminate a render process and everything it started.
+
+    Sends SIGTERM to the process group, then SIGKILL to whatever is still
+    running after ``RENDER_KILL_GRACE`` seconds.
+
+    Args:
+        process: Render process started by the scheduler
+    """
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        # The child had not become a group leader yet
+        process.terminate()
+    process.join(Config.RENDER_KILL_GRACE)
+    # Kill whatever is left of the group, including grandchildren that
+    # ignored SIGTERM or outlived the render process
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    if process.exitcode is None:
+        process.kill()
+    process.join()
+
+
+class FairShareScheduler:
+    """
+    Dispatches queued render jobs to a pool of worker threads.
+
+    Jobs wait in the job store ordered by a start-time fair queuing tag. Each
+    API key's tags advance by ``1 / weight`` per job, so keys on heavier plans
+    are served proportionally more often and a burst from one key cannot push
+    everyone else to the back of the line. A key never holds more workers than
+    its plan's ``max_concurrent_jobs``, and waiting jobs are credited virtual
+    time (``SCHEDULER_AGING_RATE``) so low-weight jobs cannot starve.
+
+    Each job also carries a predicted peak RSS. A job starts only if it fits
+    in the host's memory budget next to the renders already running there;
+    smaller jobs may backfill around one that does not fit, until it has
+    waited ``MEMORY_BACKFILL_MAX_WAIT`` seconds.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        workers: int = Config.RENDER_WORKERS,
+        render_target: Callable[[str, str, Dict[str, Any]], None] = None,
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            store: Job store holding the render queue
+            workers: Number of jobs this process renders at once
+            render_target: Function run in the child process for each job,
+                called with (store path, video_id, payload); defaults to
+                ``render_process``
+        """
+        self.store = store
+        self.workers = workers
+        self.render_target = render_target or render_process
+        self._context = multiprocessing.get_context(Config.RENDER_START_METHOD)
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._wakeup = threading.Condition()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._aborting = threading.Event()
+        self._processes: Dict[str, multiprocessing.Process] = {}
+        self.memory_model = MemoryModel(store)
+        self.memory_budget = host_memory_budget()
+        self.host_id = Config.RENDER_HOST_ID
+        _schedulers.add(self)
+
+    @staticmethod
+    def plan_settings(plan: Optional[str]) -> Dict[str, Any]:
+        """Return the plan configuration, falling back to the free plan."""
+        return Config.API_PLANS.get((plan or "free").lower(), Config.API_PLANS["free"])
+
+    def submit(self, video_id: str, plan: Optional[str], payload: Dict[str, Any]) -> None:
+        """
+        Queue an existing job for rendering.
+
+        Args:
+            video_id: Unique identifier of a job already in the job store
+            plan: Plan name of the job owner
+            payload: Keyword arguments passed to the renderer
+        """
+        weight = self.plan_settings(plan).get("weight", 1)
+        memory = self.memory_model.estimate(payload)
+        tag = self.store.enqueue_job(
+            video_id, (plan or "free").lower(), payload, 1.0 / weight, memory_estimate=memory
+        )
+        logger.debug(f"Queued job {video_id} (plan={plan}, tag={tag:.3f}, memory={memory >> 20}MB)")
+        self._ensure_workers()
+        self._notify()
+
+    def _notify(self) -> None:
+        """Wake one idle worker so it re-checks the queue."""
+        with self._wakeup:
+            self._wakeup.notify()
+
+    def choose(
+        self,
+        candidates: List[Dict[str, Any]],
+        running: Dict[str, int],
+        now: Optional[float] = None,
+        memory_committed: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Pick the job to start next.
+
+        Args:
+            candidates: Queued jobs with api_key, plan, fair_tag, enqueued_at
+                and memory_estimate
+            running: Number of jobs currently leased per API key
+            memory_committed: Memory estimates of the jobs running on this
+                host, in bytes (None skips the memory check)
+
+        Returns:
+            Optional[Dict[str, Any]]: The eligible job with the lowest aged tag
+            that fits in memory, or None if every owner is at its concurrency
+            cap or nothing fits
+        """
+        now = time.time() if now is None else now
+        eligible = []
+        for job in candidates:
+            cap = self.plan_settings(job["plan"]).get("max_concurrent_jobs", 1)
+            if running.get(job["api_key"], 0) >= cap:
+                continue
+            score = job["fair_tag"] - Config.SCHEDULER_AGING_RATE * (now - job["enqueued_at"])
+            eligible.append((score, job))
+        eligible.sort(key=lambda entry: entry[0])
+        if memory_committed is None or self.memory_budget is None:
+            return eligible[0][1] if eligible else None
+        for _, job in eligible:
+            # A job larger than the whole budget runs once the host is idle
+            if memory_committed == 0 or memory_committed + (job.get("memory_estimate") or 0) <= self.memory_budget:
+                return job
+            if now - job["enqueued_at"] > Config.MEMORY_BACKFILL_MAX_WAIT:
+                # Stop backfilling so running jobs drain and this one fits
+                return None
+        return None
+
+    def _ensure_workers(self) -> None:
+        """Start worker threads on first use (after any fork of this process)."""
+        with self._lock:
+            if self._threads or self._stopping.is_set():
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    args=(f"{self.worker_prefix}:{index}",),
+                    name=f"render-worker-{index}",
+                )
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def start(self) -> List[threading.Thread]:
+        """Start the worker threads now instead of on the first submit."""
+        self._ensure_workers()
+        return list(self._threads)
+
+    def stop(self) -> None:
+        """Stop leasing new jobs; renders already running are finished."""
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def abort_running(self) -> None:
+        """Stop every running render and hand its job back to the queue."""
+        self._aborting.set()
+        with self._lock:
+            processes = list(self._processes.values())
+        for process in processes:
+            stop_process_group(process)
+
+    def _worker_loop(self, worker_id: str) -> None:
+        """Lease and render jobs until the process exits or stop() is called."""
+        while not self._stopping.is_set():
+            try:
+                job = self.store.lease_next_job(worker_id, self.choose, host=self.host_id)
+            except Exception as e:
+                logger.error(f"Error leasing render job: {e}")
+                job = None
+            if job is None:
+                with self._wakeup:
+                    if not self._stopping.is_set():
+                        self._wakeup.wait(Config.SCHEDULER_POLL_INTERVAL)
+                continue
+            with log_context(video_id=job["video_id"], plan=job["plan"]):
+                self.run_job(job)
+
+    def run_job(self, job: Dict[str, Any]) -> None:
+        """
+        Render one leased job in a child process and release its lease.
+
+        The child runs in its own process group, so stopping it also stops the
+        ffmpeg and ImageMagick processes it started. It is stopped when the
+        job is cancelled or runs longer than its plan's ``max_render_seconds``.
+        The lease is renewed every ``LEASE_HEARTBEAT_INTERVAL`` seconds; if it
+        was lost (this worker stalled and the job went to another worker), the
+        render is stopped and the job left to its new owner. A render process
+        killed by a signal is queued again (up to ``MAX_JOB_ATTEMPTS``) and
+        resumes from the segments it already finished.
+
+        Args:
+            job: Job record returned by ``lease_next_job``
+        """
+        video_id = job["video_id"]
+        worker_id = job["worker_id"]
+        started = time.monotonic()
+        RENDER_QUEUE_WAIT.observe(job["started_at"] - job["enqueued_at"], plan=job["plan"])
+        logger.info(
+            f"Starting job {video_id} for plan {job['plan']} after "
+            f"{job['started_at'] - job['enqueued_at']:.2f}s in queue"
+        )
+        deadline = job["started_at"] + self.plan_settings(job["plan"]).get(
+            "max_render_seconds", Config.API_PLANS["free"]["max_render_seconds"]
+        )
+        try:
+            process = self._context.Process(
+                target=self.render_target,
+                args=(self.store.path, video_id, job["payload"]),
+                name=f"render-{video_id[:8]}",
+            )
+            process.start()
+            with self._lock:
+                self._processes[video_id] = process
+            stopped = None
+            last_heartbeat = time.time()
+            while True:
+                process.join(Config.RENDER_SUPERVISE_INTERVAL)
+                if process.exitcode is not None:
+                    break
+                if time.time() - last_heartbeat >= Config.LEASE_HEARTBEAT_INTERVAL:
+                    last_heartbeat = time.time()
+                    if not self.store.heartbeat(video_id, worker_id):
+                        logger.warning(f"Lost the lease on job {video_id}; stopping render")
+                        stop_process_group(process)
+                        return
+                if self.store.is_cancel_requested(video_id):
+                    stopped = "Cancelled"
+                elif time.time() > deadline:
+                    stopped = "TimedOut"
+                if stopped:
+                    logger.warning(f"Stopping job {video_id}: {stopped}")
+                    stop_process_group(process)
+                    break
+
+            if self._aborting.is_set() and not stopped:
+                # Shutting down: another worker resumes the job from its checkpoints
+                logger.warning(f"Returning job {video_id} to the queue")
+                self.store.requeue_job(video_id, worker_id)
+                return
+            if stopped:
+                self.store.set_status(video_id, stopped)
+                release_job_files(video_id, remove_output=True)
+            elif process.exitcode < 0 and job.get("attempts", 0) < Config.MAX_JOB_ATTEMPTS \
+                    and not is_terminal_status(self.store.get_status(video_id)):
+                # Killed by a signal (e.g. the OOM killer): the workspace keeps
+                # the finished segments, so try again from there
+                logger.warning(
+                    f"Render process for job {video_id} was killed by signal {-process.exitcode}; "
+                    f"queueing it again"
+                )
+                self.store.requeue_job(video_id, worker_id)
+                if process.exitcode == -signal.SIGKILL and job.get("memory_estimate"):
+                    # Likely the OOM killer: leave more room on the next attempt
+                    self.store.update_job(video_id, memory_estimate=int(job["memory_estimate"] * 1.5))
+            elif not is_terminal_status(self.store.get_status(video_id)):
+                self.store.set_status(
+                    video_id, f"Error: Render process exited with code {process.exitcode}"
+                )
+                release_job_files(video_id, remove_output=True)
+        except Exception as e:
+            logger.error(f"Unhandled error rendering job {video_id}: {e}")
+            self.store.set_status(video_id, f"Error: {e}")
+        finally:
+            with self._lock:
+                self._processes.pop(video_id, None)
+            RENDER_WORKER_BUSY_SECONDS.inc(time.monotonic() - started)
+            try:
+                resolve_followers(self.store, video_id)
+            except Exception as e:
+                logger.error(f"Error resolving coalesced jobs for {video_id}: {e}")
+            self.store.release_job(video_id, worker_id)
+            # A slot just freed up, which may make another owner's job eligible
+            self._notify()
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Return queue depth, running jobs and queue wait times per plan."""
+        return self.store.queue_stats()
+
+
+# Schedulers of this process, for the worker gauges
+_schedulers: "weakref.WeakSet[FairShareScheduler]" = weakref.WeakSet()
+
+
+def _worker_gauges() -> None:
+    schedulers = list(_schedulers)
+    RENDER_WORKER_SLOTS.set(sum(len(s._threads) for s in schedulers))
+    RENDER_WORKERS_BUSY.set(sum(len(s._processes) for s in schedulers))
+
+
+def _queue_gauges(samples) -> None:
+    for plan, stats in job_store.queue_stats().items():
+        RENDER_QUEUE_DEPTH.set(stats["queued"], plan=plan)
+        RENDER_QUEUE_RUNNING.set(stats["running"], plan=plan)
+        RENDER_QUEUE_OLDEST_WAIT.set(stats["oldest_wait"], plan=plan)
+
+
+metrics.on_collect(_worker_gauges)
+metrics.on_scrape(_queue_gauges)
+
+# Create a singleton instance
+render_scheduler = FairShareScheduler(job_store)
@@ -0,0 +1,145 @@
+"""JSON Schema for creation request bodies."""
+import functools
+import itertools
+from typing import Any, Dict, List
+
+from app.config import Config
+
+# Bump when a change to the schema rejects bodies that used to be accepted
+CREATION_SCHEMA_VERSION = 1
+
+
+def build_creation_schema() -> Dict[str, Any]:
+    """
+    Build the JSON Schema of the "body" object of a creation request.
+
+    Allowed fade effects, social presets and segment counts come from Config.
+    Option objects the renderer passes through (watermark, audio filters, ...)
+    are only type-checked; asset paths and URLs are checked for presence, not
+    reachability, which the prefetcher and renderer still report per job.
+
+    Returns:
+        Dict[str, Any]: JSON Schema (draft 2020-12)
+    """
+    asset = {"type": "string", "minLength": 1}
+    optional_asset = {"type": ["string", "null"]}
+    options = {"type": ["object", "null"]}
+    return {
+        "$schema": "https://json-schema.org/draft/2020-12/schema",
+        "$id": f"urn:videofromjson:creation-body:v{CREATION_SCHEMA_VERSION}",
+        "title": "Creation request body",
+        "type": "object",
+        "required": ["segments"],
+        "additionalProperties": False,
+        "properties": {
+            "segments": {
+                "type": "array",
+                "minItems": Config.MIN_SEGMENTS,
+                "maxItems": Config.MAX_SEGMENTS,
+                # Every segment is an image shown for the length of its audio
+                "items": {
+                    "type": "object",
+                    "required": ["imageUrl", "audioUrl"],
+                    "additionalProperties": False,
+                    "properties": {
+                        "imageUrl": asset,
+                        "audioUrl": asset,
+                        "volume": {"type": "number", "minimum": 0},
+                        "duration": {"type": "number", "exclusiveMinimum": 0},
+                        "max_duration": {"type": "number", "exclusiveMinimum": 0},
+                        "text": {"type": "string"},
+                        # Image filter name, e.g. "grayscale" or "none"
+                        "filter": {"type": ["string", "null"]},
+                        "zoom_pan": {"type": ["boolean", "object"]},
+                    },
+                },
+            },
+            "zoom_pan": {"type": "boolean"},
+            "fade_effect": {"enum": sorted(Config.ALLOWED_FADE_EFFECTS)},
+            "fade_duration": {"type": "number", "minimum": 0},
+            "audiogram": {
+                "type": ["object", "null"],
+                "properties": {
+                    "gamma": {"type": "number", "exclusiveMinimum": 0},
+                    "opacity": {"type": "number", "minimum": 0, "maximum": 1},
+                },
+            },
+            "watermark": options,
+            "text_overlay": options,
+            "filter": options,
+            # Set by the shipped video_templates; not used by the renderer
+            "filter_chain": {"type": ["array", "null"], "items": {"type": "string"}},
+            "duration_limit": {"type": ["number", "null"], "exclusiveMinimum": 0},
+            "background_music": optional_asset,
+            "background_volume": {"type": "number", "minimum": 0},
+            "resolution": {"type": "string", "pattern": "^[1-9][0-9]{1,3}[xX][1-9][0-9]{1,3}$"},
+            "thumbnail": {"type": "boolean"},
+            "audio_enhancement": options,
+            "dynamic_text": options,
+            "template": {"type": ["string", "null"]},
+            # "" (an unselected form field) means no preset, like null
+            "social_preset": {"enum": [*sorted(Config.SOCIAL_MEDIA_PRESETS), "", None]},
+            "use_local_files": {"type": "boolean"},
+            "intro_music": optional_asset,
+            "outro_music": optional_asset,
+            "audio_filters": options,
+            "segment_audio_effects": {"type": ["array", "null"]},
+            # A URL, or an object with the URL and delivery options
+            "webhook": {
+                "type": ["string", "object", "null"],
+                "pattern": "^https?://",
+                "required": ["url"],
+                "additionalProperties": False,
+                "properties": {
+                    "url": {"type": "string", "pattern": "^https?://"},
+                    "secret": {"type": "string"},
+                    "batch": {"type": "boolean"},
+                },
+            },
+        },
+    }
+
+
+CREATION_SCHEMA = build_creation_schema()
+
+
+@functools.lru_cache(maxsize=None)
+def _creation_validator():
+    """
+    Build the validator once, on the first validation.
+
+    jsonschema is imported here rather than at module level so that API
+    processes start without it.
+    """
+    from jsonschema import Draft202012Validator
+
+    Draft202012Validator.check_schema(CREATION_SCHEMA)
+    return Draft202012Validator(CREATION_SCHEMA)
+
+
+def _describe(error) -> Dict[str, str]:
+    """Turn a jsonschema error into a {path, message} entry."""
+    path = "/" + "/".join(str(part) for part in error.absolute_path)
+    if error.validator == "enum":
+        message = f"{error.instance!r} is not an allowed value"
+    elif error.validator == "pattern" and error.instance is not None:
+        message = f"{error.instance!r} does not match {error.validator_value!r}"
+    else:
+        message = error.message
+    return {"path": path, "message": message}
+
+
+def validate_creation_body(body: Any) -> List[Dict[str, str]]:
+    """
+    Validate a creation request body against the schema.
+
+    Args:
+        body: The "body" object of a creation request
+
+    Returns:
+        List[Dict[str, str]]: Every problem found (up to
+        MAX_VALIDATION_ERRORS) as {path, message}, where path is a JSON
+        pointer into the body; empty if the body is valid
+    """
+    errors = itertools.islice(_creation_validator().iter_errors(body), Config.MAX_VALIDATION_ERRORS)
+    return sorted((_describe(error) for error in errors), key=lambda e: (e["path"], e["message"]))
@@ -0,0 +1,262 @@
+"""Per-job trace spans, saved in Chrome trace_event format."""
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Span currently open in this thread (or task); None when no job is traced
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("trace_span", default=None)
+
+
+class _NullSpan:
+    """Returned by ``span`` when nothing is being traced; does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+    def set(self, **attrs) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed operation of a job trace; use as a context manager."""
+
+    __slots__ = ("trace", "name", "attrs", "span_id", "parent_id", "start", "_token")
+
+    def __init__(self, trace: "JobTrace", name: str, attrs: Dict[str, Any], parent_id: Optional[str]):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = 0
+
+    def set(self, **attrs) -> None:
+        """Add attributes (e.g. results only known at the end) to the span."""
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = time.perf_counter_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = f"{exc_type.__name__}: {exc}"
+        self.trace.record(self, self.start, end)
+
+
+class JobTrace:
+    """The spans recorded for one job in this process."""
+
+    def __init__(self, video_id: str, trace_id: Optional[str] = None):
+        self.video_id = video_id
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.pid = os.getpid()
+        # perf_counter gives durations; the epoch offset places them in time
+        self._epoch_ns = time.time_ns() - time.perf_counter_ns()
+        self.events: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def record(self, span: Span, start_ns: int, end_ns: int) -> None:
+        """Store a finished span as a complete ("X") trace event."""
+        # Top-level spans are always kept, so a capped trace still covers the job
+        if len(self.events) >= Config.TRACE_MAX_SPANS and span.parent_id is not None:
+            self.dropped += 1
+            return
+        event = {
+            "name": span.name,
+            "cat": "render",
+            "ph": "X",
+            "ts": (self._epoch_ns + start_ns) // 1000,
+            "dur": max((end_ns - start_ns) // 1000, 1),
+            "pid": self.pid,
+            "tid": threading.get_native_id(),
+            "args": {**span.attrs, "span_id": span.span_id, "parent_span_id": span.parent_id},
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def add(self, name: str, start: float, end: float, **attrs) -> None:
+        """Record a span measured elsewhere, from epoch start and end times in seconds."""
+        start_ns, end_ns = int(start * 1e9) - self._epoch_ns, int(end * 1e9) - self._epoch_ns
+        self.record(Span(self, name, attrs, None), start_ns, end_ns)
+
+
+def span(name: str, **attrs) -> Any:
+    """
+    Time a block as a child of the current span.
+
+    Outside a traced job this returns a shared no-op object, so leaving
+    the instrumentation in hot paths costs one context variable lookup.
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NULL_SPAN
+    return Span(parent.trace, name, attrs, parent.span_id)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator recording a span for each call of a function."""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parent = _current.get()
+            if parent is None:
+                return func(*args, **kwargs)
+            with Span(parent.trace, span_name, {}, parent.span_id):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def trace_path(video_id: str) -> str:
+    """Return the path of a job's trace file."""
+    return os.path.join(Config.TRACE_DIR, f"{video_id}.trace.json")
+
+
+def load_trace(video_id: str) -> Optional[Dict[str, Any]]:
+    """Return a job's saved trace, or None if it has none."""
+    try:
+        with open(trace_path(video_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_trace(trace: JobTrace) -> Dict[str, Any]:
+    """
+    Write a trace to the job's trace file.
+
+    A job rendered more than once (resumed after a worker died) keeps the
+    spans of every attempt; each attempt is its own process in the viewer.
+
+    Returns:
+        Dict[str, Any]: The whole trace document as saved
+    """
+    document = load_trace(trace.video_id) or {
+        "traceEvents": [],
+        "displayTimeUnit": "ms",
+        "otherData": {"video_id": trace.video_id, "trace_id": trace.trace_id, "dropped_spans": 0},
+    }
+    attempt = sum(1 for e in document["traceEvents"] if e.get("ph") == "M" and e["name"] == "process_name") + 1
+    document["traceEvents"].append({
+        "name": "process_name", "ph": "M", "pid": trace.pid,
+        "args": {"name": f"render {trace.video_id} (attempt {attempt})"},
+    })
+    document["traceEvents"].extend(trace.events)
+    document["otherData"]["dropped_spans"] += trace.dropped
+    path = trace_path(trace.video_id)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".part", "w") as f:
+        json.dump(document, f)
+    os.replace(path + ".part", path)
+    return document
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, str):
+        return {"stringValue": value}
+    return {"stringValue": json.dumps(value, default=str)}
+
+
+def to_otlp(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a saved trace to OpenTelemetry's OTLP/JSON trace format."""
+    trace_id = document["otherData"]["trace_id"]
+    spans = []
+    for event in document["traceEvents"]:
+        if event.get("ph") != "X":
+            continue
+        args = dict(event.get("args", {}))
+        span_id = args.pop("span_id", None) or uuid.uuid4().hex[:16]
+        parent_id = args.pop("parent_span_id", None)
+        error = args.get("error")
+        spans.append({
+            "traceId": trace_id,
+            "spanId": span_id,
+            "parentSpanId": parent_id or "",
+            "name": event["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(event["ts"] * 1000),
+            "endTimeUnixNano": str((event["ts"] + event["dur"]) * 1000),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in {**args, "process.pid": event["pid"], "thread.id": event["tid"]}.items()
+            ],
+            "status": {"code": 2, "message": error} if error else {"code": 0},
+        })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": Config.TRACE_SERVICE_NAME}},
+                {"key": "video_id", "value": {"stringValue": document["otherData"]["video_id"]}},
+            ]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+
+def export_otlp(document: Dict[str, Any]) -> None:
+    """Post a trace to TRACE_OTLP_ENDPOINT (an OTLP/HTTP JSON collector)."""
+    import requests
+
+    response = requests.post(Config.TRACE_OTLP_ENDPOINT, json=to_otlp(document), timeout=Config.TRACE_OTLP_TIMEOUT)
+    if response.status_code >= 300:
+        logger.warning("Trace export failed with HTTP %s", response.status_code)
+
+
+@contextmanager
+def job_trace(video_id: str, **attrs) -> Iterator[Optional[JobTrace]]:
+    """
+    Trace everything run inside the block as one job, under a root span.
+
+    The trace is saved when the block exits, also when it raises. Yields
+    None (and records nothing) when TRACE_ENABLED is off.
+    """
+    if not Config.TRACE_ENABLED:
+        yield None
+        return
+    previous = load_trace(video_id)
+    trace = JobTrace(video_id, previous["otherData"]["trace_id"] if previous else None)
+    try:
+        with Span(trace, "render", {"video_id": video_id, **attrs}, None):
+            yield trace
+    finally:
+        try:
+            document = save_trace(trace)
+            if Config.TRACE_OTLP_ENDPOINT:
+                export_otlp(document)
+        except Exception as e:
+            logger.error("Error saving trace of job %s: %s", video_id, e)
@@ -0,0 +1,337 @@
+"""Resumable chunked uploads into a content-addressed asset store."""
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+from app.config import Config
+from app.utils.util_job_store import JobStore, job_store
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_KINDS = {"video", "audio", "image"}
+
+# uploads: one row per upload in progress, kept in the job store database so
+# every API process on the host can continue an upload another one started.
+# assets: every distinct file ever uploaded, named after its SHA-256.
+UPLOAD_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS uploads (
+        upload_id TEXT PRIMARY KEY,
+        api_key TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        filename TEXT,
+        length INTEGER,
+        received INTEGER NOT NULL DEFAULT 0,
+        writer TEXT,
+        writer_until REAL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_uploads_updated ON uploads (updated_at)",
+    """CREATE TABLE IF NOT EXISTS assets (
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL
+    )""",
+]
+
+
+class UploadStore:
+    """
+    Chunked, resumable uploads (create, append at an offset, complete).
+
+    Chunks are streamed straight from the request body to a part file while
+    the SHA-256 of the content is updated, so nothing is buffered or copied
+    and the digest is ready when the last byte arrives. The number of bytes
+    stored is recorded after every chunk, and a dropped connection keeps
+    whatever arrived, so a client resumes from the offset it gets back
+    instead of re-sending the file. On completion the file moves into the
+    asset store under its digest; a file that is already there is not
+    stored twice.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        root: str = Config.ROOT_DIR,
+        asset_dir: str = Config.ASSET_STORE_DIR,
+        parts_dir: str = Config.UPLOAD_PARTS_DIR,
+    ):
+        """
+        Initialize the upload store and create its tables.
+
+        Args:
+            store: Job store whose database holds uploads and assets
+            root: Directory asset references are relative to
+            asset_dir: Asset directory, relative to root
+            parts_dir: Directory of uploads in progress, relative to root
+        """
+        self.store = store
+        self.root = root
+        self.asset_dir = asset_dir
+        self.parts_dir = parts_dir
+        # upload_id -> (bytes hashed, hasher) for uploads this process appended to
+        self._hashers: Dict[str, Tuple[int, Any]] = {}
+        self._lock = threading.Lock()
+        conn = store._connect()
+        for statement in UPLOAD_SCHEMA:
+            conn.execute(statement)
+
+    def part_path(self, upload_id: str) -> str:
+        """Return the file that holds the bytes of an upload in progress."""
+        return os.path.join(self.root, self.parts_dir, f"{upload_id}.part")
+
+    def create(self, api_key: str, kind: str, filename: Optional[str] = None,
+               length: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Start an upload.
+
+        Args:
+            api_key: Owner of the upload
+            kind: "video", "audio" or "image"
+            filename: Original file name (its extension is kept)
+            length: Total size in bytes, if known
+
+        Returns:
+            Dict[str, Any]: The upload record
+        """
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        now = time.time()
+        os.makedirs(os.path.dirname(self.part_path(upload_id)), exist_ok=True)
+        open(self.part_path(upload_id), "wb").close()
+        self.store._connect().execute(
+            "INSERT INTO uploads (upload_id, api_key, kind, filename, length, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (upload_id, api_key, kind, filename, length, now, now),
+        )
+        return self.get(upload_id, api_key)
+
+    def get(self, upload_id: str, api_key: str) -> Optional[Dict[str, Any]]:
+        """Return an upload in progress, or None if it does not exist or belongs to another key."""
+        row = self.store._connect().execute(
+            "SELECT upload_id, kind, filename, length, received, created_at, updated_at "
+            "FROM uploads WHERE upload_id = ? AND api_key = ?",
+            (upload_id, api_key),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def _hasher(self, upload_id: str, received: int) -> Any:
+        """Return a SHA-256 of the first ``received`` bytes of an upload."""
+        with self._lock:
+            hashed, hasher = self._hashers.pop(upload_id, (None, None))
+        if hashed == received:
+            return hasher
+        # Another process took the previous chunk, or this one restarted
+        hasher = hashlib.sha256()
+        with open(self.part_path(upload_id), "rb") as f:
+            remaining = received
+            while remaining:
+                chunk = f.read(min(remaining, Config.UPLOAD_BUFFER_SIZE))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                remaining -= len(chunk)
+        return hasher
+
+    def append(self, upload_id: str, api_key: str, offset: int, stream: BinaryIO,
+               max_bytes: Optional[int] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Append a chunk read from a stream at the given offset.
+
+        Only one request appends to an upload at a time; the offset must be
+        the number of bytes already received. If the stream fails part-way,
+        the bytes read until then are kept.
+
+        Args:
+            upload_id: The upload
+            api_key: Owner of the upload
+            offset: Offset the client is sending from
+            stream: Chunk data
+            max_bytes: Length of the chunk, if the client declared one
+
+        Returns:
+            Tuple[str, Optional[Dict[str, Any]]]: ("appended", upload),
+            ("conflict", upload) if the offset is not the upload's size,
+            ("busy", upload) if another request is appending,
+            ("too_large", upload) if the chunk would pass the upload's length
+            or UPLOAD_MAX_SIZE, or ("not_found", None)
+        """
+        writer = uuid.uuid4().hex
+        now = time.time()
+        with self.store._transaction() as conn:
+            row = conn.execute(
+                "SELECT received, length, writer, writer_until FROM uploads WHERE upload_id = ? AND api_key = ?",
+                (upload_id, api_key),
+            ).fetchone()
+            if row is None:
+                return "not_found", None
+            if row["writer"] and row["writer_until"] > now:
+                outcome = "busy"
+            elif offset != row["received"]:
+                outcome = "conflict"
+            else:
+                outcome = None
+                conn.execute(
+                    "UPDATE uploads SET writer = ?, writer_until = ? WHERE upload_id = ?",
+                    (writer, now + Config.UPLOAD_WRITER_TIMEOUT, upload_id),
+                )
+        if outcome:
+            return outcome, self.get(upload_id, api_key)
+
+        length = Config.UPLOAD_MAX_SIZE if row["length"] is None else min(row["length"], Config.UPLOAD_MAX_SIZE)
+        limit = length - offset
+        if max_bytes is not None and max_bytes > limit:
+            self._release(upload_id, writer, offset)
+            return "too_large", self.get(upload_id, api_key)
+
+        received = offset
+        hasher = self._hasher(upload_id, offset)
+        outcome = "appended"
+        try:
+            with open(self.part_path(upload_id), "r+b") as f:
+                # Drop bytes a failed request wrote but never recorded
+                f.truncate(offset)
+                f.seek(offset)
+                while True:
+                    chunk = stream.read(Config.UPLOAD_BUFFER_SIZE)
+                    if not chunk:
+                        break
+                    if received + len(chunk) - offset > limit:
+                        outcome = "too_large"
+                        break
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    received += len(chunk)
+        except Exception as e:
+            # Client went away mid-chunk: keep what arrived so it can resume
+            logger.warning("Upload %s interrupted at %d bytes: %s", upload_id, received, e)
+        finally:
+            with self._lock:
+                self._hashers[upload_id] = (received, hasher)
+            self._release(upload_id, writer, received)
+        return outcome, self.get(upload_id, api_key)
+
+    def _release(self, upload_id: str, writer: str, received: int) -> None:
+        """Record the bytes stored by a writer and let the next request append."""
+        self.store._connect().execute(
+            "UPDATE uploads SET received = ?, writer = NULL, writer_until = NULL, updated_at = ? "
+            "WHERE upload_id = ? AND writer = ?",
+            (received, time.time(), upload_id, writer),
+        )
+
+    def complete(self, upload_id: str, api_key: str,
+                 sha256: Optional[str] = None) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Finish an upload and move it into the asset store.
+
+        Args:
+            upload_id: The upload
+            api_key: Owner of the upload
+            sha256: Digest the client expects, checked if given
+
+        Returns:
+            Tuple[str, Optional[Dict[str, Any]]]: ("stored", asset) or
+            ("deduplicated", asset) on success; ("incomplete", upload) if
+            fewer bytes than the declared length arrived, ("busy", upload)
+            if a chunk is still being written, ("mismatch", upload) if the
+            digest differs (the upload is discarded), or ("not_found", None)
+        """
+        with self.store._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM uploads WHERE upload_id = ? AND api_key = ?", (upload_id, api_key)
+            ).fetchone()
+            if row is None:
+                return "not_found", None
+            upload = dict(row)
+            if upload["writer"] and upload["writer_until"] > time.time():
+                return "busy", self.get(upload_id, api_key)
+            if upload["length"] is not None and upload["received"] != upload["length"]:
+                return "incomplete", self.get(upload_id, api_key)
+            # Nobody can append once the row is gone
+            conn.execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+
+        digest = self._hasher(upload_id, upload["received"]).hexdigest()
+        part = self.part_path(upload_id)
+        if sha256 and sha256.lower().removeprefix("sha256:") != digest:
+            os.remove(part)
+            return "mismatch", {"upload_id": upload_id, "received": upload["received"], "sha256": digest}
+
+        extension = os.path.splitext(upload["filename"] or "")[1][:8].lower()
+        reference = os.path.join(self.asset_dir, digest[:2], digest + extension)
+        with self.store._transaction() as conn:
+            existing = conn.execute("SELECT path FROM assets WHERE sha256 = ?", (digest,)).fetchone()
+            if existing is None or not os.path.isfile(os.path.join(self.root, existing["path"])):
+                os.makedirs(os.path.dirname(os.path.join(self.root, reference)), exist_ok=True)
+                os.replace(part, os.path.join(self.root, reference))
+                conn.execute(
+                    "INSERT OR REPLACE INTO assets (sha256, path, kind, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (digest, reference, upload["kind"], upload["received"], time.time()),
+                )
+                outcome = "stored"
+            else:
+                os.remove(part)
+                outcome = "deduplicated"
+        logger.info("Upload %s %s as asset %s", upload_id, outcome, digest)
+        return outcome, self.get_asset(digest)
+
+    def get_asset(self, asset_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a stored asset by id ("sha256:<hex>" or the bare digest).
+
+        The returned ``file_path`` can be used wherever a creation request
+        takes an asset (imageUrl, audioUrl, background_music, ...).
+        """
+        digest = asset_id.lower().removeprefix("sha256:")
+        row = self.store._connect().execute("SELECT * FROM assets WHERE sha256 = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "asset_id": f"sha256:{row['sha256']}",
+            "file_path": row["path"],
+            "kind": row["kind"],
+            "size": row["size"],
+            "created_at": row["created_at"],
+        }
+
+    def abort(self, upload_id: str, api_key: str) -> bool:
+        """Discard an upload in progress. Returns False if it does not exist."""
+        cursor = self.store._connect().execute(
+            "DELETE FROM uploads WHERE upload_id = ? AND api_key = ?", (upload_id, api_key)
+        )
+        if not cursor.rowcount:
+            return False
+        self._discard(upload_id)
+        return True
+
+    def _discard(self, upload_id: str) -> None:
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+        try:
+            os.remove(self.part_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def expire(self) -> int:
+        """Discard uploads that received nothing for UPLOAD_SESSION_TTL seconds."""
+        cutoff = time.time() - Config.UPLOAD_SESSION_TTL
+        with self.store._transaction() as conn:
+            expired = [
+                row[0] for row in conn.execute(
+                    "SELECT upload_id FROM uploads WHERE updated_at < ? AND "
+                    "(writer IS NULL OR writer_until < ?)", (cutoff, time.time())
+                )
+            ]
+            conn.executemany("DELETE FROM uploads WHERE upload_id = ?", [(u,) for u in expired])
+        for upload_id in expired:
+            self._discard(upload_id)
+        return len(expired)
+
+
+# Create a singleton instance
+upload_store = UploadStore(job_store)
@@ -1,7 +1,9 @@
+import hashlib
+import json
 import logging
 import os
-import shutil
 import subprocess
+import time
 # Fix for PIL.Image.ANTIALIAS deprecation
 from io import BytesIO
 
@@ -11,14 +13,22 @@ import moviepy.video.fx.all as vfx
 import numpy as np
 import requests
 from app.config import Config
+from app.utils.util_catalog import video_catalog
+from app.utils.util_ingest import asset_ingest
+from app.utils.util_job_store import job_store
+from app.utils.util_logging import SAMPLED
+from app.utils.util_metrics import (CACHE_BYTES, CACHE_REQUESTS, FFMPEG_PROCESSES, RENDER_STAGE_DURATION,
+                                    RENDER_STAGES, render_features)
+from app.utils.util_progress import JobProgress, RenderProgressLogger
+from app.utils.util_trace import span, traced
+from app.utils.util_workspace import job_workspace, local_asset_path, release_job_files
+from moviepy.config import get_setting
 from moviepy.editor import \
     ColorClip  # Import ColorClip for placeholder audiogram
 from moviepy.editor import ImageClip  # Added import for ImageClip
 from moviepy.editor import afx  # Import audio effects module
-from moviepy.editor import (AudioFileClip, CompositeAudioClip,
-                            CompositeVideoClip, TextClip, VideoClip,
-                            VideoFileClip, concatenate_audioclips,
-                            concatenate_videoclips)
+from moviepy.editor import (AudioFileClip, CompositeVideoClip, TextClip,
+                            VideoClip, VideoFileClip, concatenate_audioclips)
 from PIL import Image
 from PIL import Image as PILImage
 
@@ -30,18 +40,17 @@ if not hasattr(Image, "ANTIALIAS"):
 from matplotlib.backends.backend_agg import \
     FigureCanvasAgg as FigureCanvas  # For rendering plots to images
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+
+# Segment chunks rendered so far, kept in the job workspace
+CHECKPOINT_FILE = "checkpoint.json"
 
 
 def fetch_resource(url):
-    logger.error(f"Fetching resource from URL: {url}")
-    local_path = os.path.join(Config.ROOT_DIR + "/", url.lstrip("/"))
+    local_path = local_asset_path(url)
     if os.path.exists(local_path):
-        logger.error(f"Local path exists: {local_path}")
+        logger.debug("Reading resource %s from %s", url, local_path, extra=SAMPLED)
         with open(local_path, "rb") as f:
 
             class Response:
@@ -50,15 +59,157 @@ def fetch_resource(url):
 
         return Response()
     else:
-        logger.error(f"Local path does not exist: {local_path}")
         parsed_url = requests.utils.urlparse(url)
         if parsed_url.scheme not in ["http", "https"]:
-            logger.warn(f"Local_path not found: {local_path}")
-            logger.warn(f"Invalid URL scheme for resource: {url}")
+            logger.warning("Resource %s is neither a local file nor an http(s) URL", url)
             raise ValueError(f"Invalid URL scheme for resource: {url}")
+        logger.debug("Fetching resource %s", url, extra=SAMPLED)
         return requests.get(url)
 
 
+def load_checkpoint(workspace):
+    """Return the render checkpoint of a job workspace (empty if none yet)."""
+    try:
+        with open(os.path.join(workspace, CHECKPOINT_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"chunks": {}}
+
+
+def save_checkpoint(workspace, checkpoint):
+    """Atomically write the render checkpoint of a job workspace."""
+    path = os.path.join(workspace, CHECKPOINT_FILE)
+    with open(path + ".part", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".part", path)
+
+
+@traced("download_asset")
+def download_asset(url, path):
+    """
+    Download a segment asset into the job workspace.
+
+    Files are written under a temporary name and renamed when complete, so a
+    file that exists is whole and is reused when a render resumes.
+
+    Returns:
+        bool: False if the asset could not be downloaded
+    """
+    if os.path.exists(path):
+        logger.debug("Reusing downloaded asset %s", path, extra=SAMPLED)
+        CACHE_REQUESTS.inc(tier="workspace", result="hit")
+        CACHE_BYTES.inc(os.path.getsize(path), tier="workspace", result="hit")
+        return True
+    CACHE_REQUESTS.inc(tier="workspace", result="miss")
+    with span("fetch_resource", file=os.path.basename(path)) as fetch:
+        response = fetch_resource(url)
+        fetch.set(status=response.status_code, bytes=len(response.content))
+    if response.status_code != 200:
+        return False
+    with open(path + ".part", "wb") as f:
+        f.write(response.content)
+    os.replace(path + ".part", path)
+    CACHE_BYTES.inc(len(response.content), tier="workspace", result="miss")
+    return True
+
+
+def chunk_key(segment, **settings):
+    """Fingerprint of everything that affects a rendered segment chunk."""
+    data = json.dumps({"segment": segment, **settings}, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+def chunk_frame_count(duration, fps):
+    """Number of frames moviepy writes for a clip (matches write_videofile)."""
+    return len(np.arange(0, duration, 1.0 / fps))
+
+
+@traced("concat_chunks")
+def concat_chunks(chunk_paths, output_path, workspace, background_music=None):
+    """
+    Join rendered segment chunks into the final video without re-encoding.
+
+    The chunks share codec settings, so the video stream is copied as is.
+    Background music, if any, is mixed in at 40% volume and only the audio
+    stream is encoded again.
+    """
+    list_path = os.path.join(workspace, "chunks.txt")
+    with open(list_path, "w") as f:
+        for path in chunk_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    command = [get_setting("FFMPEG_BINARY"), "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+    if background_music:
+        command += [
+            "-i", background_music,
+            # Add the inputs without amix's averaging, which would lower the
+            # voice and raise it again once music shorter than the video ends
+            "-filter_complex",
+            "[1:a]volume=0.4[bg];[0:a][bg]amix=inputs=2:duration=first:normalize=0[a]",
+            "-map", "0:v", "-map", "[a]", "-c:v", "copy", "-c:a", "aac",
+        ]
+    else:
+        command += ["-c", "copy"]
+    command += ["-movflags", "+faststart", output_path]
+    result = subprocess.run(command, capture_output=True)
+    FFMPEG_PROCESSES.inc(purpose="mux", outcome="ok" if result.returncode == 0 else "error")
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to join segments: {result.stderr.decode(errors='replace')[-500:]}")
+
+
+@traced("build_segment_clip")
+def build_segment_clip(
+    image_path, audio_path, duration, canvas, size, zoom_pan, fade_effect, audiogram, watermark, image_size=None
+):
+    """
+    Compose one segment: image, audio, effects and overlays at the output size.
+
+    If ``image_size`` is given the image is drawn at that size (the canvas
+    being scaled to match) instead of its own.
+    """
+    audio_clip = AudioFileClip(audio_path)
+    if audio_clip.duration > duration:
+        # Trim the audio to match the duration
+        audio_clip = audio_clip.subclip(0, duration)
+
+    # Create video clip with image and set duration to match audio duration
+    image_clip = ImageClip(image_path).set_duration(duration)
+    if image_size and tuple(image_clip.size) != tuple(image_size):
+        image_clip = image_clip.resize(newsize=image_size)
+
+    # Apply zoom and pan if enabled
+    if zoom_pan:
+        image_clip = image_clip.fx(vfx.resize, 1.1)  # Changed from vfx.zoom_in to vfx.resize
+
+    # Generate audiogram if requested
+    if audiogram:
+        audiogram_clip = generate_audiogram_clip(audio_clip, audiogram_settings=audiogram)
+        image_clip = CompositeVideoClip([image_clip, audiogram_clip])
+
+    video_clip = image_clip.set_audio(audio_clip)
+
+    # Apply fade effects if any
+    if fade_effect != "none":
+        video_clip = video_clip.crossfadein(1).crossfadeout(1)
+
+    # Centre the segment on the canvas shared by all segments (as concatenating
+    # them with method="compose" would), then scale to the output resolution
+    video_clip = CompositeVideoClip([video_clip.set_position("center")], size=canvas).resize(newsize=size)
+
+    # Add watermark if requested
+    if watermark:
+        # TextClip renders the text with an ImageMagick subprocess
+        with span("TextClip"):
+            watermark_clip = TextClip(
+                watermark.get("text", ""),
+                font_size=watermark.get("font_size", 24),
+                color=watermark.get("color", "white")
+            ).set_position(watermark.get("position", "bottom")).set_duration(duration)
+        watermark_clip = watermark_clip.set_opacity(watermark.get("opacity", 0.5))
+        video_clip = CompositeVideoClip([video_clip, watermark_clip])
+    return video_clip
+
+
+@traced("process_video")
 def process_video(
     video_id,
     segments,
@@ -80,206 +231,214 @@ def process_video(
     audio_filters,  # Added parameter
     segment_audio_effects,  # Added parameter
 ):
-    logger.error(f"Starting process_video for video_id: {video_id}")
+    """
+    Render a video segment by segment, resuming from earlier checkpoints.
+
+    Each segment is encoded to its own chunk in the job workspace and
+    recorded in ``checkpoint.json``; downloaded assets are kept there too. If
+    the render process dies (worker restart, OOM kill) the workspace
+    survives, and the next worker to lease the job only renders the chunks
+    that are missing before joining them into the final video.
+    """
+    logger.info("Rendering video %s", video_id)
+    job_store.update_job(video_id, started_at=time.time())
+    workspace = job_workspace(video_id)
+    progress = JobProgress(video_id, lambda vid, state: job_store.update_job(vid, progress=state))
     try:
-        logger.error(f"Processing video {video_id}")
+        os.makedirs(workspace, exist_ok=True)
+        checkpoint = load_checkpoint(workspace)
+        if checkpoint["chunks"]:
+            logger.info("Resuming video %s with %d rendered segments", video_id, len(checkpoint["chunks"]))
 
-        # Initialize list for video clips
-        clips = []
+        # Set resolution
+        try:
+            width, height = map(int, resolution.lower().split("x"))
+        except ValueError as e:
+            logger.warning("Invalid resolution format %r: %s", resolution, e)
+            raise ValueError(f"Invalid resolution format '{resolution}': {e}")
 
         # Ensure segments is a list of dictionaries
         if not isinstance(segments, list):
             segments = [segments]
-        
+
+        fps = 24  # You can choose a different fps if needed
+
+        # Download every asset and measure the segments
+        progress.stage("downloading", segments_total=len(segments))
+        sources = []
         for idx, segment in enumerate(segments):
-            logger.error(f"Processing segment {idx+1}/{len(segments)}: {segment}")
+            logger.debug("Downloading segment %d/%d", idx + 1, len(segments), extra=SAMPLED)
             if isinstance(segment, str):
                 # If segment is a string, treat it as an image URL
                 image_url = segment
                 audio_url = None
-                text = ""
             else:
                 # If segment is a dictionary, extract the values
                 image_url = segment.get("imageUrl")
                 audio_url = segment.get("audioUrl")
-                text = segment.get("text", "")
-            filter_effect = segment.get("filter", "none")
-
-            # Remove or comment out the faulty debug statement
-            # logger.error(f"Segment {idx+1} duration: {duration} seconds")
-
-            # Download image
-            image_response = fetch_resource(image_url)
-            if image_response.status_code != 200:
-                logger.warn(f"Failed to download image from {image_url}")
-                continue
-            image_path = f"temp/temp_images/{video_id}_{idx}.jpg"
-            os.makedirs("temp/temp_images", exist_ok=True)
-            with open(image_path, "wb") as img_file:
-                img_file.write(image_response.content)
-            logger.error(f"Downloaded image to {image_path}")
-
-            # Download audio
-            audio_response = fetch_resource(audio_url)
-            if audio_response.status_code != 200:
-                logger.warn(f"Failed to download audio from {audio_url}")
-                continue
-            audio_path = f"temp/temp_audios/{video_id}_{idx}.mp3"
-            os.makedirs("temp/temp_audios", exist_ok=True)
-            with open(audio_path, "wb") as aud_file:
-                aud_file.write(audio_response.content)
-            logger.error(f"Downloaded audio to {audio_path}")
-
-            # Load audio clip
-            audio_clip = AudioFileClip(audio_path)
-            audio_duration = audio_clip.duration
-            logger.error(
-                f"Original audio clip {idx+1} duration: {audio_duration} seconds"
-            )
 
-            # Determine max_duration if provided
-            # set duration to the lesser of audio duration and max_duration
-            max_duration = segment.get("max_duration", None)
-            if max_duration is not None:
-                logger.error(f"Segment {idx+1} max_duration: {max_duration} seconds")
-                # Use the lesser of audio duration and max_duration
-                duration = min(audio_duration, max_duration)
+            progress.stage("downloading")
+            # Uploaded assets that were ingested are read from the asset store
+            # and need no probing
+            image_asset = asset_ingest.lookup(image_url)
+            if image_asset:
+                image_path = image_asset["file"]
+                CACHE_REQUESTS.inc(tier="rendition", result="hit")
+                CACHE_BYTES.inc(os.path.getsize(image_path), tier="rendition", result="hit")
             else:
-                duration = audio_duration
-            logger.error(f"Segment {idx+1} final duration: {duration} seconds")
-
-            # Adjust audio clip duration if needed
-            if audio_duration > duration:
-                # Trim the audio to match the duration
-                audio_duration = duration
-                audio_clip = audio_clip.subclip(0, duration)
-                logger.error(f"Trimmed audio clip {idx+1} to {duration} seconds")
-            # No need to loop audio if it's shorter than duration, since duration == audio_duration
-
-            # Create video clip with image and set duration to match audio duration
-            image_clip = ImageClip(image_path).set_duration(audio_duration)
-            logger.debug(f"Set image clip duration to {audio_duration} seconds")
-
-            # Apply zoom and pan if enabled
-            if zoom_pan:
-                image_clip = image_clip.fx(
-                    vfx.resize, 1.1
-                )  # Changed from vfx.zoom_in to vfx.resize
-                logger.debug("Applied zoom and pan effect")
-
-            # Generate audiogram if requested
-            if audiogram:
-                # Placeholder function for generating audiogram clip
-                audiogram_clip = generate_audiogram_clip(
-                    audio_clip, audiogram_settings=audiogram
-                )
-                image_clip = CompositeVideoClip([image_clip, audiogram_clip])
-                logger.debug("Added audiogram overlay to video clip")
-
-            # Set audio to the video clip
-            video_clip = image_clip.set_audio(audio_clip)
-
-            # Apply fade effects if any
-            if fade_effect != "none":
-                video_clip = video_clip.crossfadein(1).crossfadeout(1)
-                logger.debug(f"Applied fade effects to segment {idx+1}")
+                CACHE_REQUESTS.inc(tier="rendition", result="miss")
+                image_path = os.path.join(workspace, f"image_{idx}.jpg")
+                if not download_asset(image_url, image_path):
+                    logger.warning("Failed to download image from %s", image_url)
+                    continue
+            audio_asset = asset_ingest.lookup(audio_url)
+            if audio_asset and "pcm" in audio_asset["renditions"]:
+                audio_path = audio_asset["renditions"]["pcm"]["path"]
+                audio_duration = audio_asset["renditions"]["pcm"]["duration"]
+                CACHE_REQUESTS.inc(tier="rendition", result="hit")
+                CACHE_BYTES.inc(os.path.getsize(audio_path), tier="rendition", result="hit")
+            else:
+                CACHE_REQUESTS.inc(tier="rendition", result="miss")
+                audio_path = os.path.join(workspace, f"audio_{idx}.mp3")
+                if not download_asset(audio_url, audio_path):
+                    logger.warning("Failed to download audio from %s", audio_url)
+                    continue
+
+                progress.stage("analysing")
+                with span("AudioFileClip", segment=idx):
+                    audio_clip = AudioFileClip(audio_path)
+                FFMPEG_PROCESSES.inc(purpose="decode", outcome="ok")
+                audio_duration = audio_clip.duration
+                audio_clip.close()
+
+            # Use the lesser of audio duration and max_duration
+            max_duration = segment.get("max_duration", None)
+            duration = audio_duration if max_duration is None else min(audio_duration, max_duration)
+            logger.debug(
+                "Segment %d lasts %.2fs (audio %.2fs)", idx + 1, duration, audio_duration, extra=SAMPLED
+            )
 
-            # Add to clips list
-            clips.append(video_clip)
+            if image_asset:
+                image_size = (image_asset["probe"]["width"], image_asset["probe"]["height"])
+            else:
+                with PILImage.open(image_path) as image:
+                    image_size = image.size
+            sources.append((idx, segment, image_path, audio_path, duration, image_size, image_asset))
+            progress.segment_done()
 
-        if not clips:
-            logger.warn("No valid segments to process.")
+        if not sources:
+            logger.warning("No valid segments in video %s", video_id)
             with status_lock:
                 video_status[video_id] = "Error: No valid segments."
             return
 
-        # Concatenate all clips with crossfade effect
-        final_video = concatenate_videoclips(clips, method="compose")
-        logger.debug("Concatenated video clips with compose method")
-
-        # Set fps for the final video
-        fps = 24  # You can choose a different fps if needed
-        final_video.fps = fps
-
-        # Add background music with volume at 40%
-        logger.error("*********** Background music ***********")
+        zoom = 1.1 if zoom_pan else 1
+        canvas = (
+            max(round(s[5][0] * zoom) for s in sources),
+            max(round(s[5][1] * zoom) for s in sources),
+        )
+        # Compose at about the output size rather than the largest image's:
+        # images are shrunk first (ingested ones start from a pre-scaled
+        # variant) and the canvas with them. Audiograms are drawn at their
+        # own pixel size, so those segments keep the source scale.
+        scale = 1.0 if audiogram else min(1.0, max(width / canvas[0], height / canvas[1]))
+        frames_total = sum(chunk_frame_count(s[4], fps) for s in sources)
+        progress.stage("compositing", frames_total=frames_total)
+
+        # Render each segment to its own chunk, skipping chunks already done
+        chunk_paths = []
+        frames_done = 0
+        for idx, segment, image_path, audio_path, duration, image_size, image_asset in sources:
+            with span("segment", segment=idx, duration=round(duration, 3)) as segment_span:
+                chunk_path = os.path.join(workspace, f"chunk_{idx}.mp4")
+                key = chunk_key(
+                    segment, duration=duration, canvas=canvas, resolution=(width, height),
+                    zoom_pan=zoom_pan, fade_effect=fade_effect, audiogram=audiogram, watermark=watermark,
+                )
+                entry = checkpoint["chunks"].get(str(idx))
+                if entry and entry["key"] == key and os.path.exists(chunk_path):
+                    logger.debug("Segment %d already rendered; skipping", idx + 1, extra=SAMPLED)
+                    segment_span.set(resumed=True)
+                else:
+                    draw_size = None
+                    if scale < 1:
+                        draw_size = tuple(max(1, round(side * scale)) for side in image_size)
+                        if image_asset:
+                            image_path = asset_ingest.image_variant(image_asset, draw_size)
+                    clip = build_segment_clip(
+                        image_path, audio_path, duration,
+                        tuple(max(1, round(side * scale)) for side in canvas), (width, height),
+                        zoom_pan, fade_effect, audiogram, watermark, image_size=draw_size,
+                    )
+                    partial_path = os.path.join(workspace, f"chunk_{idx}.part.mp4")
+                    try:
+                        with span("write_videofile"):
+                            clip.write_videofile(
+                                partial_path,
+                                codec="libx264",
+                                audio_codec="aac",
+                                fps=fps,
+                                temp_audiofile=os.path.join(workspace, f"chunk_{idx}_audio.m4a"),
+                                logger=RenderProgressLogger(
+                                    progress, frame_offset=frames_done, frames_total=frames_total
+                                ),
+                            )
+                    except Exception:
+                        FFMPEG_PROCESSES.inc(purpose="encode", outcome="error")
+                        raise
+                    FFMPEG_PROCESSES.inc(purpose="encode", outcome="ok")
+                    clip.close()
+                    os.replace(partial_path, chunk_path)
+                    checkpoint["chunks"][str(idx)] = {"key": key}
+                    save_checkpoint(workspace, checkpoint)
+                chunk_paths.append(chunk_path)
+                frames_done += chunk_frame_count(duration, fps)
+                progress.frames(frames_done, frames_total)
+
+        # Join the chunks and add background music
+        progress.stage("muxing")
+        bg_audio_path = None
         if background_music:
-            logger.error(os.path.join(Config.ROOT_DIR, background_music))
             logger.debug("Adding background music with 40% volume")
-            bg_audio_path = os.path.join(
-                Config.ROOT_DIR, background_music
-            )  # Use os.path.join for path
-            bg_audio = AudioFileClip(bg_audio_path.lstrip("/")).volumex(
-                0.4
-            )  # Set volume to 40%
-            video_audio = final_video.audio
-            final_audio = CompositeAudioClip([video_audio, bg_audio])
-            final_video = final_video.set_audio(final_audio)
-            logger.debug("Background music added to final video")
-
-        # Set resolution
-        try:
-            width, height = map(int, resolution.lower().split("x"))
-            final_video = final_video.resize(newsize=(width, height))
-            logger.error(f"Set video resolution to {(width, height)}.")
-        except ValueError as e:
-            logger.warn(f"Invalid resolution format '{resolution}': {e}")
-            raise ValueError(f"Invalid resolution format '{resolution}': {e}")
-
-        # Add watermark if requested
-        if watermark:
-            watermark_text = watermark.get("text", "")
-            watermark_position = watermark.get("position", "bottom")
-            watermark_font_size = watermark.get("font_size", 24)
-            watermark_color = watermark.get("color", "white")
-            watermark_opacity = watermark.get("opacity", 0.5)
-            
-            # Create watermark clip without opacity first
-            watermark_clip = TextClip(
-                watermark_text,
-                font_size=watermark_font_size,
-                color=watermark_color
-            ).set_position(watermark_position).set_duration(final_video.duration)
-            
-            # Set opacity after creation
-            watermark_clip = watermark_clip.set_opacity(watermark_opacity)
-            
-            # Composite watermark with video
-            final_video = CompositeVideoClip([final_video, watermark_clip])
-            logger.debug("Added watermark to final video")
-
-        # Export the final video with specified fps
-        output_path = os.path.join("static/videos", f"{video_id}.mp4")
-        final_video.write_videofile(
-            output_path, codec="libx264", audio_codec="aac", fps=fps
+            bg_audio_path = local_asset_path(background_music)
+        output_path = os.path.join(Config.VIDEO_OUTPUT_DIR, f"{video_id}.mp4")
+        partial_output = os.path.join(workspace, "output.part.mp4")
+        concat_chunks(chunk_paths, partial_output, workspace, background_music=bg_audio_path)
+        os.replace(partial_output, output_path)
+        progress.finish()
+        logger.info("Rendered video %s", video_id)
+        features = render_features(zoom_pan, fade_effect, audiogram, watermark, background_music)
+        for stage, seconds in progress.timings.items():
+            RENDER_STAGE_DURATION.observe(
+                seconds, stage=RENDER_STAGES.get(stage, stage), resolution=f"{width}x{height}", features=features
+            )
+        video_catalog.record(
+            video_id, output_path, duration=sum(s[4] for s in sources), width=width, height=height
         )
-        logger.info(f"Video processing completed for ID: {video_id}")
+        job_store.update_job(video_id, output_path=output_path)
 
         with status_lock:
             video_status[video_id] = "Completed"
 
     except Exception as e:
-        logger.warn(f"Exception in process_video: {e}")
-        logger.warn(f"Error processing video {video_id}: {e}")
+        logger.exception("Error rendering video %s: %s", video_id, e)
         with status_lock:
-            video_status[video_id] = "Error"
+            video_status[video_id] = f"Error: {e}"
     finally:
-        logger.error("Cleaning up temporary files.")
-        # Clean up temporary files
-        try:
-            shutil.rmtree("temp/temp_images")
-            shutil.rmtree("temp/temp_audios")
-            logger.error("Cleaned up temporary files.")
-        except Exception as cleanup_error:
-            logger.warn(f"Error during cleanup: {cleanup_error}")
+        # Clean up this job's temporary files (other jobs keep theirs). A
+        # render process that is killed never gets here, so its checkpoints
+        # stay for the next attempt.
+        release_job_files(video_id)
 
 
+@traced("generate_audiogram_clip")
 def generate_audiogram_clip(audio_clip, audiogram_settings):
     # Load audio data from the audio clip's filename
     audio_path = audio_clip.filename  # Get the path to the audio file
-    y, sr = librosa.load(
-        audio_path, sr=None
-    )  # Load audio data with original sampling rate
+    with span("librosa.load"):
+        y, sr = librosa.load(
+            audio_path, sr=None
+        )  # Load audio data with original sampling rate
 
     # Audiogram settings with defaults
     width = int(audiogram_settings.get("width", 640))
@@ -303,6 +462,7 @@ def generate_audiogram_clip(audio_clip, audiogram_settings):
     time_axis = np.linspace(0, duration, num=len(y))
 
     # Function to generate frames for the audiogram animation
+    @traced("audiogram.make_frame")
     def make_frame(t):
         current_sample = int(t * sr)
         window_size = int(sr / fps)  # Number of samples per frame
@@ -350,7 +510,7 @@ def generate_audiogram_clip(audio_clip, audiogram_settings):
 
 
 def merge_audio_files(audio_files, output_path):
-    logger.error(f"Merging audio files: {audio_files} into {output_path}")
+    logger.debug("Merging %d audio files into %s", len(audio_files), output_path)
     dir_name = os.path.dirname(output_path)
     audio_list_path = os.path.join(dir_name, "audio_list.txt")
     with open(audio_list_path, "w") as f:
@@ -358,10 +518,7 @@ def merge_audio_files(audio_files, output_path):
             abs_audio_path = os.path.abspath(audio)
             f.write(f"file '{abs_audio_path}'\n")
 
-    logger.error(f"Created audio list file for ffmpeg: {audio_list_path}")
-
     try:
-        logger.error("Running ffmpeg for merging audio files.")
         subprocess.run(
             [
                 "ffmpeg",
@@ -378,9 +535,9 @@ def merge_audio_files(audio_files, output_path):
             ],
             check=True,
         )
-        logger.error(f"Merged audio files into {output_path}")
+        logger.debug("Merged audio files into %s", output_path)
     except subprocess.CalledProcessError as e:
-        logger.warn(f"ffmpeg error during audio merging: {e}")
+        logger.error("ffmpeg error during audio merging: %s", e)
         raise
 
 
@@ -394,7 +551,7 @@ def merge_audio_tracks(
     loop_background=False,
     fade_out_background=True,
 ):
-    logger.error(f"Merging audio tracks into {output_path}")
+    logger.debug("Merging audio tracks into %s", output_path)
     """
     Merges segment audio files with optional background, intro, and outro music.
     """
@@ -408,7 +565,7 @@ def merge_audio_tracks(
 
     # Add intro music if available
     if intro_music:
-        logger.error("Adding intro music.")
+        logger.debug("Adding intro music")
         audio_clips.append(intro_music)
 
     # Add segment audio files
@@ -437,9 +594,8 @@ def merge_audio_tracks(
 
 
 def generate_thumbnail(video_path, thumbnail_path):
-    logger.error(f"Generating thumbnail for {video_path} at {thumbnail_path}")
+    logger.debug("Generating thumbnail for %s at %s", video_path, thumbnail_path)
     try:
-        logger.error("Running ffmpeg for thumbnail generation.")
         subprocess.run(
             [
                 "ffmpeg",
@@ -454,7 +610,6 @@ def generate_thumbnail(video_path, thumbnail_path):
             ],
             check=True,
         )
-        logger.error(f"Generated thumbnail for {video_path} at {thumbnail_path}")
     except subprocess.CalledProcessError as e:
-        logger.error(f"ffmpeg error during thumbnail generation: {e}")
+        logger.error("ffmpeg error during thumbnail generation: %s", e)
         raise
@@ -0,0 +1,323 @@
+"""Durable outbox and background sender for job webhooks."""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.config import Config
+from app.utils.util_job_store import JobStore, job_store
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+TIMESTAMP_HEADER = "X-Webhook-Timestamp"
+
+# Deliveries are queued by triggers in the same transaction that finishes a
+# job, so no code path (render process, coalesced followers, cancellation,
+# reused output) can finish a job without queueing its webhooks.
+OUTBOX_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS webhook_outbox (
+        id INTEGER PRIMARY KEY,
+        video_id TEXT NOT NULL,
+        event TEXT NOT NULL,
+        url TEXT NOT NULL,
+        secret TEXT,
+        batch INTEGER NOT NULL DEFAULT 0,
+        created_at REAL NOT NULL,
+        next_attempt_at REAL NOT NULL,
+        leased_until REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        delivered_at REAL,
+        abandoned_at REAL,
+        UNIQUE (video_id, url)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_webhook_due ON webhook_outbox (delivered_at, abandoned_at, next_attempt_at)",
+]
+
+_NOW_SQL = "((julianday('now') - 2440587.5) * 86400.0)"
+_ENQUEUE_SQL = f"""
+    INSERT OR IGNORE INTO webhook_outbox (video_id, event, url, secret, batch, created_at, next_attempt_at)
+    SELECT NEW.video_id,
+           CASE NEW.status WHEN 'Completed' THEN 'job.completed' ELSE 'job.failed' END,
+           json_extract(value, '$.url'), json_extract(value, '$.secret'),
+           coalesce(json_extract(value, '$.batch'), 0), {_NOW_SQL}, {_NOW_SQL}
+    FROM json_each(NEW.webhook)
+    WHERE coalesce(json_extract(value, '$.on'), 'any') IN
+          ('any', CASE NEW.status WHEN 'Completed' THEN 'completed' ELSE 'failed' END);
+"""
+OUTBOX_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS jobs_webhook_on_update AFTER UPDATE OF finished_at ON jobs "
+    "WHEN OLD.finished_at IS NULL AND NEW.finished_at IS NOT NULL AND NEW.webhook IS NOT NULL "
+    f"BEGIN {_ENQUEUE_SQL} END",
+    "CREATE TRIGGER IF NOT EXISTS jobs_webhook_on_insert AFTER INSERT ON jobs "
+    "WHEN NEW.finished_at IS NOT NULL AND NEW.webhook IS NOT NULL "
+    f"BEGIN {_ENQUEUE_SQL} END",
+]
+
+
+def parse_webhook(body: Dict[str, Any]) -> Tuple[Optional[List[Dict[str, Any]]], Optional[Dict[str, str]]]:
+    """
+    Build the webhook targets of a job from its creation request body.
+
+    ``body["webhook"]`` may be a URL or an object with ``url`` and optional
+    ``secret`` (HMAC key) and ``batch`` (allow several events per request).
+    The configured ``SUCCESS_WEBHOOK_URL`` and ``ERROR_WEBHOOK_URL`` are added
+    for every job.
+
+    Args:
+        body: The "body" object of a creation request
+
+    Returns:
+        Tuple of (targets or None, None) on success or (None, error response)
+    """
+    targets = []
+    webhook = body.get("webhook")
+    if webhook is not None:
+        if isinstance(webhook, str):
+            webhook = {"url": webhook}
+        if not isinstance(webhook, dict) or urlparse(str(webhook.get("url", ""))).scheme not in ("http", "https"):
+            return None, {
+                "error": "Invalid webhook",
+                "message": "webhook must be an http(s) URL or an object with an http(s) url"
+            }
+        targets.append({
+            "url": webhook["url"],
+            "secret": webhook.get("secret"),
+            "batch": bool(webhook.get("batch", False)),
+            "on": "any",
+        })
+    if Config.SUCCESS_WEBHOOK_URL:
+        targets.append({"url": Config.SUCCESS_WEBHOOK_URL, "on": "completed"})
+    if Config.ERROR_WEBHOOK_URL:
+        targets.append({"url": Config.ERROR_WEBHOOK_URL, "on": "failed"})
+    return targets or None, None
+
+
+def sign(secret: str, timestamp: str, body: bytes) -> str:
+    """Return the signature header value for a delivery."""
+    digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256)
+    return f"sha256={digest.hexdigest()}"
+
+
+class WebhookOutbox:
+    """
+    Delivers queued webhook events from the job store database.
+
+    A background thread leases due deliveries, groups batchable events per
+    endpoint and posts them from a thread pool over a pooled HTTP session, so
+    a slow receiver only holds up its own deliveries. Failed deliveries are
+    retried with jittered exponential backoff up to ``WEBHOOK_MAX_ATTEMPTS``.
+    Leases expire, so events held by a process that died are sent by another.
+    """
+
+    def __init__(self, store: JobStore):
+        """
+        Initialize the outbox and create its table and triggers.
+
+        Args:
+            store: Job store whose finished jobs produce webhook events
+        """
+        self.store = store
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._session: Optional["requests.Session"] = None
+        conn = self._connect()
+        for statement in OUTBOX_SCHEMA + OUTBOX_TRIGGERS:
+            conn.execute(statement)
+
+    @property
+    def session(self) -> "requests.Session":
+        """Pooled HTTP session, created (and requests imported) on the first delivery."""
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=Config.WEBHOOK_WORKERS, pool_maxsize=Config.WEBHOOK_WORKERS)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the connection owned by the current thread and process."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.store.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def start(self) -> None:
+        """Start the sender thread for this process if it is not running."""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._pool = ThreadPoolExecutor(Config.WEBHOOK_WORKERS, thread_name_prefix="webhook")
+            self._thread = threading.Thread(target=self._run, name="webhook-sender", daemon=True)
+            self._thread.start()
+
+    def poke(self) -> None:
+        """Check for due deliveries now instead of at the next interval."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self.deliver_due(self._pool):
+                    continue
+            except Exception as e:
+                logger.error(f"Error delivering webhooks: {e}")
+            self._wake.wait(Config.WEBHOOK_POLL_INTERVAL)
+            self._wake.clear()
+
+    def lease_due(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Lease deliveries that are due so no other sender picks them up.
+
+        Args:
+            now: Current time (defaults to time.time())
+
+        Returns:
+            List[Dict[str, Any]]: The leased outbox rows
+        """
+        now = time.time() if now is None else now
+        rows = self._connect().execute(
+            "UPDATE webhook_outbox SET leased_until = ? WHERE id IN ("
+            "  SELECT id FROM webhook_outbox"
+            "  WHERE delivered_at IS NULL AND abandoned_at IS NULL AND next_attempt_at <= ?"
+            "  AND (leased_until IS NULL OR leased_until < ?)"
+            "  ORDER BY next_attempt_at LIMIT ?"
+            ") RETURNING *",
+            (now + Config.WEBHOOK_LEASE_SECONDS, now, now, Config.WEBHOOK_LEASE_LIMIT),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def group(rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Group batchable events for the same endpoint into requests."""
+        groups: Dict[Tuple[str, Optional[str]], List[Dict[str, Any]]] = {}
+        requests_to_send = []
+        for row in rows:
+            if not row["batch"]:
+                requests_to_send.append([row])
+                continue
+            group = groups.setdefault((row["url"], row["secret"]), [])
+            group.append(row)
+            if len(group) == Config.WEBHOOK_BATCH_SIZE:
+                requests_to_send.append(groups.pop((row["url"], row["secret"])))
+        return requests_to_send + list(groups.values())
+
+    def deliver_due(self, pool: Optional[ThreadPoolExecutor] = None, now: Optional[float] = None) -> int:
+        """
+        Send every due delivery once.
+
+        Args:
+            pool: Executor to send requests on (sends inline if None)
+            now: Current time (defaults to time.time())
+
+        Returns:
+            int: Number of events attempted
+        """
+        rows = self.lease_due(now)
+        if not rows:
+            return 0
+        batches = self.group(rows)
+        if pool is None:
+            for batch in batches:
+                self._send(batch)
+        else:
+            list(pool.map(self._send, batches))
+        return len(rows)
+
+    def event_payload(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the JSON body describing one job event."""
+        job = self.store.get_job(row["video_id"]) or {}
+        payload = {
+            "event": row["event"],
+            "video_id": row["video_id"],
+            "status": job.get("status"),
+            "finished_at": job.get("finished_at"),
+        }
+        if job.get("error"):
+            payload["error"] = job["error"]
+        if job.get("output_path") and job.get("status") == "Completed":
+            payload["download_url"] = f"/api/download/{os.path.basename(job['output_path'])}"
+        return payload
+
+    def _send(self, rows: List[Dict[str, Any]]) -> None:
+        """POST one request (a single event, or a batch) and record the result."""
+        events = [self.event_payload(row) for row in rows]
+        body = json.dumps({"events": events} if rows[0]["batch"] else events[0]).encode()
+        timestamp = str(int(time.time()))
+        headers = {"Content-Type": "application/json", TIMESTAMP_HEADER: timestamp}
+        secret = rows[0]["secret"] or Config.WEBHOOK_SECRET
+        if secret:
+            headers[SIGNATURE_HEADER] = sign(secret, timestamp, body)
+        import requests
+
+        try:
+            response = self.session.post(rows[0]["url"], data=body, headers=headers, timeout=Config.WEBHOOK_TIMEOUT)
+            error = None if response.ok else f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            error = str(e)
+        ids = [row["id"] for row in rows]
+        placeholders = ", ".join("?" for _ in ids)
+        conn = self._connect()
+        if error is None:
+            conn.execute(
+                f"UPDATE webhook_outbox SET delivered_at = ?, attempts = attempts + 1, "
+                f"leased_until = NULL WHERE id IN ({placeholders})",
+                [time.time(), *ids],
+            )
+            logger.info(f"Delivered {len(rows)} webhook event(s) to {rows[0]['url']}")
+            return
+        attempts = max(row["attempts"] for row in rows) + 1
+        if attempts >= Config.WEBHOOK_MAX_ATTEMPTS:
+            logger.error(f"Giving up on webhook to {rows[0]['url']} after {attempts} attempts: {error}")
+            conn.execute(
+                f"UPDATE webhook_outbox SET abandoned_at = ?, attempts = attempts + 1, last_error = ?, "
+                f"leased_until = NULL WHERE id IN ({placeholders})",
+                [time.time(), error, *ids],
+            )
+            return
+        delay = min(Config.WEBHOOK_BACKOFF_BASE * 2 ** (attempts - 1), Config.WEBHOOK_BACKOFF_MAX)
+        # Jitter so deliveries to a recovering receiver do not arrive all at once
+        delay *= random.uniform(0.5, 1.0)
+        logger.warning(f"Webhook to {rows[0]['url']} failed ({error}); retrying in {delay:.1f}s")
+        conn.execute(
+            f"UPDATE webhook_outbox SET next_attempt_at = ?, attempts = attempts + 1, last_error = ?, "
+            f"leased_until = NULL WHERE id IN ({placeholders})",
+            [time.time() + delay, error, *ids],
+        )
+
+    def deliveries(self, video_id: str) -> List[Dict[str, Any]]:
+        """Return the outbox rows of a job."""
+        rows = self._connect().execute(
+            "SELECT * FROM webhook_outbox WHERE video_id = ? ORDER BY id", (video_id,)
+        )
+        return [dict(row) for row in rows]
+
+
+# Create a singleton instance
+webhook_outbox = WebhookOutbox(job_store)
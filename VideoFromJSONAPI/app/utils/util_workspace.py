@@ -0,0 +1,43 @@
+"""Local file locations: per-job scratch directories and asset references."""
+import os
+import shutil
+
+from app.config import Config
+
+
+def job_workspace(video_id):
+    """Return the scratch directory that holds one job's intermediate files."""
+    return os.path.join(Config.JOB_WORKSPACE_DIR, video_id)
+
+
+def release_job_files(video_id, remove_output=False):
+    """
+    Delete a job's scratch directory and, optionally, its partial output.
+
+    Args:
+        video_id: Unique identifier of the job
+        remove_output: Also remove VIDEO_OUTPUT_DIR/<video_id>.mp4 (used when a
+            render is cancelled or killed part-way through)
+    """
+    shutil.rmtree(job_workspace(video_id), ignore_errors=True)
+    output_path = os.path.join(Config.VIDEO_OUTPUT_DIR, f"{video_id}.mp4")
+    if remove_output and os.path.exists(output_path):
+        os.remove(output_path)
+
+
+def local_asset_path(reference):
+    """
+    Return the file a local asset reference (imageUrl, audioUrl, ...) names.
+
+    References are relative to ROOT_DIR, with or without a leading "/".
+    Absolute paths inside the asset store, asset cache or rendition
+    directories are used as they are, so those directories can live outside
+    ROOT_DIR (docker-compose mounts them under /data).
+    """
+    if os.path.isabs(reference):
+        path = os.path.normpath(reference)
+        for directory in (Config.ASSET_STORE_DIR, Config.ASSET_CACHE_DIR, Config.ASSET_RENDITION_DIR):
+            directory = os.path.normpath(os.path.join(Config.ROOT_DIR, directory))
+            if path.startswith(directory + os.sep):
+                return path
+    return os.path.join(Config.ROOT_DIR, reference.lstrip("/"))
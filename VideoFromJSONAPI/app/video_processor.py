@@ -4,6 +4,7 @@ from typing import Dict, List, Optional, Tuple
 
 import moviepy.editor as mpy
 from app.social_media import SocialMediaValidator
+from app.utils.util_trace import traced
 
 logger = logging.getLogger(__name__)
 
@@ -72,6 +73,7 @@ class VideoProcessor:
         return positions.get(position, bottom_right)
 
     @staticmethod
+    @traced("VideoProcessor.add_watermark")
     def add_watermark(
         video: mpy.VideoFileClip,
         text: str,
@@ -100,6 +102,7 @@ class VideoProcessor:
         return mpy.CompositeVideoClip([video, watermark])
 
     @staticmethod
+    @traced("VideoProcessor.add_subtitles")
     def add_subtitles(
         video: mpy.VideoFileClip,
         subtitles: List[Dict],
@@ -138,6 +141,7 @@ class VideoProcessor:
         return mpy.CompositeVideoClip([video] + subtitle_clips)
 
     @staticmethod
+    @traced("VideoProcessor.adjust_audio")
     def adjust_audio(
         video: mpy.VideoFileClip,
         volume: float = 1.0,
@@ -161,6 +165,7 @@ class VideoProcessor:
         return video
 
     @staticmethod
+    @traced("VideoProcessor.add_transition")
     def add_transition(
         video: mpy.VideoFileClip,
         transition_type: str = "fade",
@@ -177,6 +182,7 @@ class VideoProcessor:
             return video
 
     @staticmethod
+    @traced("VideoProcessor.resize_video")
     def resize_video(video_path: str, platform: str) -> Optional[str]:
         """Resize video to match platform requirements."""
         try:
@@ -257,6 +263,7 @@ class VideoProcessor:
             return None
 
     @staticmethod
+    @traced("VideoProcessor.get_video_info")
     def get_video_info(video_path: str) -> Optional[dict]:
         """Get video information including dimensions and duration."""
         try:
@@ -275,6 +282,7 @@ class VideoProcessor:
             return None
 
     @staticmethod
+    @traced("VideoProcessor.validate_video_for_platform")
     def validate_video_for_platform(
         video_path: str, 
         platform: str
@@ -300,6 +308,7 @@ class VideoProcessor:
         return True, "Video meets platform requirements"
 
     @staticmethod
+    @traced("VideoProcessor.process_video_for_platform")
     def process_video_for_platform(
         video_path: str, 
         platform: str,
@@ -0,0 +1,88 @@
+"""Standalone render worker.
+
+Runs render workers without the HTTP API, leasing jobs from the shared job
+store. Point API nodes and workers at the same ``JOB_STORE_PATH`` and
+``VIDEO_OUTPUT_DIR`` (for example a shared volume) and start API nodes with
+``RENDER_WORKERS=0`` so they only accept and report jobs::
+
+    python -m app.worker --workers 4
+"""
+import argparse
+import logging
+import signal
+import sys
+import threading
+import time
+
+from app.config import Config
+from app.utils.util_ingest import asset_ingest
+from app.utils.util_job_store import job_store
+from app.utils.util_logging import setup_logging
+from app.utils.util_metrics import metrics
+from app.utils.util_scheduler import FairShareScheduler
+
+logger = logging.getLogger(__name__)
+
+
+def run(workers, shutdown_grace=Config.WORKER_SHUTDOWN_GRACE):
+    """
+    Render jobs until SIGTERM or SIGINT.
+
+    On a signal the worker stops leasing new jobs and waits up to
+    ``shutdown_grace`` seconds for running renders. Renders still running
+    after that are stopped and their jobs queued again for another worker.
+
+    Args:
+        workers: Number of jobs to render at once
+        shutdown_grace: Seconds to wait for running renders on shutdown
+
+    Returns:
+        int: Process exit code
+    """
+    scheduler = FairShareScheduler(job_store, workers=workers)
+    stopping = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"Received signal {signum}; finishing running renders")
+        scheduler.stop()
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    threads = scheduler.start()
+    # Uploaded assets are ingested where renders run
+    asset_ingest.start()
+    metrics.start()
+    logger.info(f"Render worker {scheduler.worker_prefix} started with {workers} slot(s) on {job_store.path}")
+    stopping.wait()
+    deadline = time.monotonic() + shutdown_grace
+    for thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0))
+    if any(thread.is_alive() for thread in threads):
+        logger.warning("Renders still running after the grace period; returning them to the queue")
+        scheduler.abort_running()
+        for thread in threads:
+            thread.join(Config.RENDER_KILL_GRACE + 5)
+        return 1
+    logger.info("Render worker stopped")
+    return 0
+
+
+def main():
+    """Main entry point for the worker."""
+    parser = argparse.ArgumentParser(description="VideoFromJSON render worker")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=max(Config.RENDER_WORKERS, 1),
+        help="Number of jobs to render at once (default: RENDER_WORKERS)"
+    )
+    args = parser.parse_args()
+
+    setup_logging()
+    return run(args.workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,26 @@
 import logging
 import os
 import shutil
+import time
 import uuid
 from datetime import datetime, timedelta
 
 from app.config import Config
 from app.endpoints import allroutes
-from app.utils import *
-from flask import Flask, jsonify, request, url_for
+from app.utils.util_catalog import video_catalog
+from app.utils.util_ingest import asset_ingest
+from app.utils.util_logging import bind_log_context, reset_log_context, setup_logging
+from app.utils.util_metrics import HTTP_REQUEST_DURATION, metrics
+from app.utils.util_scheduler import render_scheduler
+from app.utils.util_webhook import webhook_outbox
+from flask import Flask, g, jsonify, request, url_for
 
 #  from werkzeug.debug import DebuggedApplication
 
+setup_logging()
 logger = logging.getLogger(__name__)
 logger.debug("Importing application.py")
 
-logger.setLevel("DEBUG")
-logging.basicConfig(level=Config.LOG_LEVEL)
-
 logger.debug("Creating Flask app instance")
 app = Flask(__name__)
 
@@ -27,23 +31,39 @@ logger.debug(f"Flask app configured with debug mode: {Config.DEBUG}")
 # Request ID middleware
 @app.before_request
 def before_request():
+    g.request_started = time.perf_counter()
     if Config.ENABLE_REQUEST_ID:
         request_id = request.headers.get(Config.REQUEST_ID_HEADER) or str(uuid.uuid4())
         request.request_id = request_id
-        logger.info(
-            f"Request started: {request_id} - {request.method} {request.path}"
-        )
+        # Every record logged while handling the request carries its ID
+        g.log_context_token = bind_log_context(request_id=request_id)
+        logger.debug("Request started: %s %s", request.method, request.path)
 
 @app.after_request
 def after_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        # Labelled by route pattern (e.g. /api/status/<video_id>), not by path
+        HTTP_REQUEST_DURATION.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=request.url_rule.rule if request.url_rule else "unmatched",
+            status=response.status_code,
+        )
     if Config.ENABLE_REQUEST_ID:
         request_id = getattr(request, 'request_id', None)
         if request_id:
             logger.info(
-                f"Request completed: {request_id} - Status: {response.status_code}"
+                "Request completed: %s %s - Status: %s", request.method, request.path, response.status_code
             )
     return response
 
+@app.teardown_request
+def teardown_request(error=None):
+    token = g.pop("log_context_token", None)
+    if token is not None:
+        reset_log_context(token)
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -68,7 +88,10 @@ def cleanup_temp_files():
     temp_dirs = [
         Config.TEMP_VIDEO_DIR,
         "temp/temp_images",
-        "temp/temp_audios"
+        "temp/temp_audios",
+        Config.ASSET_CACHE_DIR,
+        Config.TRACE_DIR,
+        Config.PROFILE_DIR,
     ]
     
     for temp_dir in temp_dirs:
@@ -87,17 +110,55 @@ def cleanup_temp_files():
 
 app.register_blueprint(allroutes, url_prefix="/api")
 
-directories = [
-    "static/videos",
-    "templates",
-    "temp/temp_videos",
-    "temp/temp_images",
-    "temp/temp_audios",
-    Config.TEMP_VIDEO_DIR,
-    Config.UPLOADS_DIR,
-]
-for directory in directories:
-    os.makedirs(directory, exist_ok=True)
+
+def prepare_runtime():
+    """
+    One-off startup work: create directories and catalog existing videos.
+
+    Runs once per server start: at import for the development server, or
+    from gunicorn's master process (see gunicorn.conf.py), never per worker.
+    """
+    directories = [
+        Config.VIDEO_OUTPUT_DIR,
+        "templates",
+        "temp/temp_videos",
+        "temp/temp_images",
+        "temp/temp_audios",
+        Config.TEMP_VIDEO_DIR,
+        Config.UPLOADS_DIR,
+    ]
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+
+    # Catalog videos rendered before the catalog existed (once per job store)
+    video_catalog.import_files()
+
+
+def start_background_services():
+    """
+    Start this process's background threads.
+
+    Threads do not survive a fork, so under gunicorn this runs in every
+    worker after it is forked, and never in the master.
+    """
+    # Deliver queued job webhooks in the background
+    webhook_outbox.start()
+
+    # Share this process's metrics with whichever process serves /api/metrics
+    metrics.start()
+
+    # Nodes that render also prepare uploaded assets for rendering, and start
+    # rendering right away: jobs queued (or whose leases expired) before a
+    # restart resume from their checkpoints without waiting for a new submit
+    if Config.RENDER_WORKERS:
+        asset_ingest.start()
+        render_scheduler.start()
+
+
+if not Config.WSGI_SERVER:
+    # Development server, "flask run" and tests: this process does it all
+    prepare_runtime()
+    start_background_services()
 
 
 def runme():
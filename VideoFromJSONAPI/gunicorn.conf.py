@@ -0,0 +1,68 @@
+"""Gunicorn settings for serving the API in production.
+
+Run from this directory (gunicorn reads ./gunicorn.conf.py by itself)::
+
+    gunicorn
+
+The app is imported once in the master and forked into API_WORKERS
+processes of API_THREADS threads each. One-off startup work (directories,
+the video catalog import, temp file cleanup) runs once in the master; the
+background threads (webhook sender, asset ingest) and the log writer are
+started in each worker after the fork. Job state, rate limits and credits
+live in the SQLite stores, so every worker sees the same values.
+
+Each request holds one of the API_WORKERS x API_THREADS threads until it is
+answered, and long polls (?wait=) and status event streams do so for their
+whole wait. Only STATUS_MAX_WAITERS threads per worker (half of API_THREADS
+by default) may wait like this. Beyond that, long polls answer at once and
+streams get 503, so the remaining threads always serve creation, download
+and health requests. For many more watchers, raise API_THREADS together with
+STATUS_MAX_WAITERS. Threads are cheap while waiting, but each one is a real
+OS thread.
+"""
+import logging
+import os
+
+# Tell application.py that startup work is done by the hooks below
+os.environ.setdefault("WSGI_SERVER", "gunicorn")
+
+from app.config import Config  # noqa: E402
+
+wsgi_app = "application:application"
+bind = Config.API_BIND
+workers = Config.API_WORKERS
+threads = Config.API_THREADS
+worker_class = "gthread"
+preload_app = Config.API_PRELOAD
+timeout = Config.API_TIMEOUT
+graceful_timeout = Config.API_GRACEFUL_TIMEOUT
+keepalive = Config.API_KEEPALIVE
+# Requests are logged by the app, with their request ID
+accesslog = None
+
+
+def on_starting(server):
+    """Check the settings and do the one-off startup work (master, once)."""
+    if Config.RATE_LIMIT_BACKEND == "memory" and server.cfg.workers > 1:
+        raise RuntimeError(
+            "RATE_LIMIT_BACKEND=memory keeps a separate limit in every worker; "
+            "use the sqlite backend or API_WORKERS=1"
+        )
+    if Config.RENDER_WORKERS and server.cfg.workers > 1:
+        logging.getLogger(__name__).warning(
+            "Each of the %d API workers runs %d render(s); set RENDER_WORKERS=0 and run "
+            "python -m app.worker to render in separate processes",
+            server.cfg.workers, Config.RENDER_WORKERS,
+        )
+    import application
+
+    application.prepare_runtime()
+    application.cleanup_temp_files()
+
+
+def post_fork(server, worker):
+    """Give each worker its own log writer and background threads."""
+    import application
+
+    application.setup_logging()
+    application.start_background_services()
@@ -0,0 +1,107 @@
+"""
+Concurrency stress benchmark for the rate limiter.
+
+Hammers the limiter from several processes, each running several threads,
+and reports throughput, latency percentiles and whether the number of
+allowed requests stayed within the configured limit.
+
+    python -m tests.benchmarks.bench_rate_limit --backend sqlite --processes 4 --threads 8
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from app.config import Config
+from app.utils.util_rate_limit import MemoryRateStore, RateLimiter, SQLiteRateStore
+
+
+def _make_limiter(backend, path):
+    return RateLimiter(MemoryRateStore() if backend == "memory" else SQLiteRateStore(path))
+
+
+def _run_process(backend, path, threads, requests, keys, limit, results):
+    """Run ``threads`` threads of ``requests`` checks each and report the totals."""
+    Config.RATE_LIMIT_REQUESTS = limit
+    # Stretch the period so no slot is earned back while the benchmark runs
+    Config.RATE_LIMIT_PERIOD = 3600
+    limiter = _make_limiter(backend, path)
+    latencies, allowed = [], {}
+    lock = threading.Lock()
+
+    def worker():
+        rng = random.Random()
+        local_latencies, local_allowed = [], {}
+        for _ in range(requests):
+            key = f"key-{rng.randrange(keys)}"
+            start = time.perf_counter()
+            ok, _ = limiter.check_rate_limit(key)
+            local_latencies.append(time.perf_counter() - start)
+            local_allowed[key] = local_allowed.get(key, 0) + ok
+        with lock:
+            latencies.extend(local_latencies)
+            for key, count in local_allowed.items():
+                allowed[key] = allowed.get(key, 0) + count
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put((latencies, allowed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="sqlite")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=2000, help="checks per thread")
+    parser.add_argument("--keys", type=int, default=100, help="distinct API keys")
+    parser.add_argument("--limit", type=int, default=50, help="requests allowed per key")
+    args = parser.parse_args()
+    if args.backend == "memory" and args.processes > 1:
+        print("memory backend is per process; the limit below is enforced per process")
+
+    path = os.path.join(tempfile.mkdtemp(), "ratelimit.sqlite3")
+    _make_limiter(args.backend, path)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_run_process,
+            args=(args.backend, path, args.threads, args.requests, args.keys, args.limit, results),
+        )
+        for _ in range(args.processes)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    latencies, allowed = [], {}
+    for _ in processes:
+        process_latencies, process_allowed = results.get()
+        latencies += process_latencies
+        for key, count in process_allowed.items():
+            allowed[key] = allowed.get(key, 0) + count
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    expected = args.limit * (args.processes if args.backend == "memory" else 1)
+    over = {key: count for key, count in allowed.items() if count > expected}
+    print(f"backend:     {args.backend}")
+    print(f"checks:      {len(latencies)} in {elapsed:.2f}s ({len(latencies) / elapsed:,.0f}/s, including startup)")
+    print(f"latency:     p50 {statistics.median(latencies) * 1e6:.0f}us, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f}us, max {latencies[-1] * 1e6:.0f}us")
+    print(f"allowed:     {sum(allowed.values())} (at most {expected} per key)")
+    print(f"over limit:  {len(over)} keys")
+    raise SystemExit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,10 @@ import os
 import shutil
 import tempfile
 
+# Keep job and rate limit state from tests out of the developer's temp/ directory
+os.environ.setdefault("JOB_STORE_PATH", os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+os.environ.setdefault("RATE_LIMIT_STORE_PATH", os.path.join(tempfile.mkdtemp(), "ratelimit.sqlite3"))
+
 import pytest
 from app.config import Config
 from app.endpoints import allroutes
@@ -0,0 +1,183 @@
+"""Tests for API key lookups and the key info cache."""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from app.config import Config
+from app.utils.util_api_keys import APIKeyManager
+from app.utils.util_job_store import JobStore
+
+
+class FakeSupabase:
+    """Stand-in for the Supabase client, backed by a dict of key rows."""
+
+    def __init__(self, rows=None):
+        self.rows = dict(rows or {})
+        self.selects = 0
+        self.fail = False
+        self.gate = None  # threading.Event a select waits on, if set
+
+    def table(self, name):
+        return _FakeQuery(self, name)
+
+
+class _FakeQuery:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.op = None
+        self.payload = None
+        self.key = None
+
+    def select(self, columns):
+        self.op = "select"
+        return self
+
+    def insert(self, row):
+        self.op, self.payload = "insert", row
+        return self
+
+    def update(self, values):
+        self.op, self.payload = "update", values
+        return self
+
+    def eq(self, column, value):
+        self.key = value
+        return self
+
+    def execute(self):
+        client = self.client
+        if self.op == "select":
+            client.selects += 1
+            if client.gate:
+                client.gate.wait(5)
+            if client.fail:
+                raise ConnectionError("backend unavailable")
+            row = client.rows.get(self.key)
+            return _Response([dict(row)] if row else [])
+        if self.op == "insert":
+            client.rows[self.payload["key"]] = dict(self.payload)
+            return _Response([dict(self.payload)])
+        row = client.rows.get(self.key)
+        if not row:
+            return _Response([])
+        row.update(self.payload)
+        return _Response([dict(row)])
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class TestKeyInfoCache(unittest.TestCase):
+    """Test that key lookups reach the backend only when they must."""
+
+    def setUp(self):
+        """Set up a manager over a stand-in backend with one active key."""
+        self.client = FakeSupabase({
+            "remote_key": {"key": "remote_key", "name": "Remote", "is_active": True, "expires_at": None},
+        })
+        self.manager = APIKeyManager(client=self.client)
+
+    def test_valid_key_is_looked_up_once(self):
+        """Test that repeated validation and info calls share one query."""
+        for _ in range(10):
+            self.assertTrue(self.manager.validate_key("remote_key"))
+            self.assertEqual(self.manager.get_key_info("remote_key")["name"], "Remote")
+        self.assertEqual(self.client.selects, 1)
+
+    def test_unknown_key_is_cached_briefly(self):
+        """Test that an unknown key is remembered for the negative TTL only."""
+        with patch("time.monotonic", return_value=1000.0) as mock_time:
+            for _ in range(5):
+                self.assertFalse(self.manager.validate_key("bogus"))
+            self.assertEqual(self.client.selects, 1)
+            mock_time.return_value = 1000.0 + Config.API_KEY_NEGATIVE_CACHE_TTL + 1
+            self.assertFalse(self.manager.validate_key("bogus"))
+            self.assertEqual(self.client.selects, 2)
+            # A found key outlives the negative TTL
+            self.manager.validate_key("remote_key")
+            mock_time.return_value += Config.API_KEY_NEGATIVE_CACHE_TTL + 1
+            self.manager.validate_key("remote_key")
+            self.assertEqual(self.client.selects, 3)
+
+    def test_expiry_is_checked_on_every_use(self):
+        """Test that a cached key stops validating once it expires."""
+        expires_at = datetime.now() + timedelta(hours=1)
+        self.client.rows["remote_key"]["expires_at"] = expires_at.isoformat()
+        self.assertTrue(self.manager.validate_key("remote_key"))
+        with patch("app.utils.util_api_keys.datetime") as mock_datetime:
+            mock_datetime.now.return_value = expires_at + timedelta(seconds=1)
+            mock_datetime.fromisoformat = datetime.fromisoformat
+            self.assertFalse(self.manager.validate_key("remote_key"))
+        self.assertEqual(self.client.selects, 1)
+
+    def test_concurrent_misses_share_one_lookup(self):
+        """Test that threads missing on the same key wait for one query."""
+        self.client.gate = threading.Event()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.manager.validate_key("remote_key")))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        while not self.manager.key_cache._lookups:
+            threading.Event().wait(0.001)
+        self.client.gate.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [True] * 8)
+        self.assertEqual(self.client.selects, 1)
+
+    def test_failed_lookup_is_not_cached(self):
+        """Test that a backend error rejects the key without caching the result."""
+        self.client.fail = True
+        self.assertFalse(self.manager.validate_key("remote_key"))
+        self.client.fail = False
+        self.assertTrue(self.manager.validate_key("remote_key"))
+        self.assertEqual(self.client.selects, 2)
+
+    def test_revoke_invalidates_cached_key(self):
+        """Test that a revoked key is rejected immediately."""
+        self.assertTrue(self.manager.validate_key("remote_key"))
+        self.assertTrue(self.manager.revoke_key("remote_key"))
+        self.assertFalse(self.manager.validate_key("remote_key"))
+
+    def test_revoke_reaches_other_processes(self):
+        """Test that a key revoked through one process's manager is dropped by another's cache."""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        store = JobStore(os.path.join(temp_dir, "jobs.sqlite3"))
+        first, second = APIKeyManager(client=self.client, store=store), APIKeyManager(client=self.client, store=store)
+        second.key_cache.check_interval = 0
+        self.assertTrue(first.validate_key("remote_key"))
+        self.assertTrue(second.validate_key("remote_key"))
+        self.assertTrue(first.revoke_key("remote_key"))
+        self.assertFalse(second.validate_key("remote_key"))
+        # Invalidations made before a cache starts are not replayed
+        third = APIKeyManager(client=self.client, store=store)
+        self.assertEqual(third.key_cache._seen, second.key_cache._seen)
+
+    def test_create_invalidates_negative_entry(self):
+        """Test that a new key is accepted even if it was cached as unknown."""
+        with patch("secrets.token_urlsafe", return_value="new_key"):
+            self.assertFalse(self.manager.validate_key("new_key"))
+            self.manager.create_key("New")
+        self.assertTrue(self.manager.validate_key("new_key"))
+
+    def test_cache_size_is_bounded(self):
+        """Test that the least recently used entries are dropped past the limit."""
+        self.manager.key_cache.max_size = 3
+        for i in range(5):
+            self.manager.validate_key(f"bogus_{i}")
+        self.assertEqual(list(self.manager.key_cache._entries), ["bogus_2", "bogus_3", "bogus_4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,247 @@
+"""Tests for batch video creation."""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+
+from app.config import Config
+from app.endpoints.creation import creation_bp, prefetch_batch_assets
+from app.utils.util_batch import AssetPrefetcher, aggregate_status, remote_assets, rewrite_assets
+from app.utils.util_credits import credit_ledger
+from app.utils.util_job_store import job_store
+from app.utils.util_workspace import local_asset_path
+from flask import Flask
+
+
+class _AssetHandler(BaseHTTPRequestHandler):
+    """Serves a fixed payload and counts requests per path."""
+
+    hits = {}
+
+    def do_GET(self):
+        _AssetHandler.hits[self.path] = _AssetHandler.hits.get(self.path, 0) + 1
+        if self.path.startswith("/missing"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = f"content of {self.path}".encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAssetPrefetcher(unittest.TestCase):
+    """Test cases for shared asset downloads."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Start a local HTTP server standing in for the asset hosts."""
+        cls.server = HTTPServer(("127.0.0.1", 0), _AssetHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the HTTP server."""
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """Use a private cache directory under ROOT_DIR."""
+        _AssetHandler.hits = {}
+        self.cache_dir = os.path.relpath(tempfile.mkdtemp(dir=Config.ROOT_DIR), Config.ROOT_DIR)
+        self.prefetcher = AssetPrefetcher(cache_dir=self.cache_dir, workers=4)
+
+    def tearDown(self):
+        """Remove the cache directory."""
+        shutil.rmtree(os.path.join(Config.ROOT_DIR, self.cache_dir))
+
+    def test_shared_assets_are_fetched_once(self):
+        """Test that assets used by many bodies are downloaded a single time."""
+        music = f"{self.base_url}/music.mp3"
+        payloads = [
+            {"segments": [{"imageUrl": f"{self.base_url}/{i}.png", "audioUrl": music}],
+             "background_music": None}
+            for i in range(5)
+        ]
+        urls = set().union(*(remote_assets(p) for p in payloads))
+        self.assertEqual(len(urls), 6)
+
+        mapping = self.prefetcher.fetch_all(urls)
+        self.assertEqual(_AssetHandler.hits["/music.mp3"], 1)
+        with open(os.path.join(Config.ROOT_DIR, mapping[music]), "rb") as f:
+            self.assertEqual(f.read(), b"content of /music.mp3")
+
+        # A second batch within the TTL hits the cache
+        self.prefetcher.fetch_all([music])
+        self.assertEqual(_AssetHandler.hits["/music.mp3"], 1)
+
+        rewritten = rewrite_assets(payloads[0], mapping)
+        self.assertEqual(rewritten["segments"][0]["audioUrl"], mapping[music])
+
+    def test_cache_outside_root_dir(self):
+        """Test that assets cached in an absolute directory resolve to that directory."""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        music = f"{self.base_url}/music.mp3"
+        with patch.object(Config, "ASSET_CACHE_DIR", cache_dir):
+            reference = AssetPrefetcher(cache_dir=cache_dir).fetch(music)
+            self.assertTrue(reference.startswith(cache_dir + os.sep))
+            with open(local_asset_path(reference), "rb") as f:
+                self.assertEqual(f.read(), b"content of /music.mp3")
+        # Other absolute references stay relative to ROOT_DIR
+        self.assertEqual(local_asset_path(reference), os.path.join(Config.ROOT_DIR, reference.lstrip("/")))
+        self.assertEqual(local_asset_path("/static/a.png"), os.path.join(Config.ROOT_DIR, "static", "a.png"))
+
+    def test_failed_downloads_are_left_to_the_renderer(self):
+        """Test that a failed asset keeps its original URL."""
+        missing = f"{self.base_url}/missing.png"
+        self.assertEqual(self.prefetcher.fetch_all([missing]), {})
+        payload = {"segments": [missing]}
+        self.assertEqual(rewrite_assets(payload, {}), payload)
+
+
+class TestAggregateStatus(unittest.TestCase):
+    """Test cases for batch status aggregation."""
+
+    def test_aggregate_status(self):
+        """Test the overall status for mixed item states."""
+        done = {"status": "Completed"}
+        failed = {"status": "Error: boom"}
+        running = {"status": "Processing"}
+        self.assertEqual(aggregate_status([done, running])[0], "Processing")
+        self.assertEqual(aggregate_status([done, done])[0], "Completed")
+        self.assertEqual(aggregate_status([done, failed])[0], "Partially completed")
+        self.assertEqual(aggregate_status([failed])[0], "Error")
+        self.assertEqual(aggregate_status([done, failed, running])[1],
+                         {"total": 3, "processing": 1, "completed": 1, "failed": 1})
+
+
+class TestBatchEndpoint(unittest.TestCase):
+    """Test cases for POST /creation/batch."""
+
+    def setUp(self):
+        """Create a client and a fresh API key."""
+        app = Flask(__name__)
+        app.register_blueprint(creation_bp)
+        self.client = app.test_client()
+        self.api_key = f"batch-{uuid.uuid4().hex}"
+        Config.API_KEYS[self.api_key] = {"name": "Batch Key", "plan": "starter"}
+        # Jobs are queued in the job store, but no render worker is started
+        patch("app.endpoints.creation.render_scheduler._ensure_workers").start()
+        self.prefetch = patch("app.endpoints.creation.prefetch_batch_assets").start()
+
+    def tearDown(self):
+        """Remove the API key and patches."""
+        patch.stopall()
+        del Config.API_KEYS[self.api_key]
+
+    def body(self, i):
+        return {"segments": [{"imageUrl": f"https://example.com/{i}.png",
+                              "audioUrl": "https://example.com/shared.mp3"}]}
+
+    def test_json_array_batch(self):
+        """Test that a JSON array creates one job per item under one batch id."""
+        response = self.client.post(
+            "/creation/batch",
+            json=[{"body": self.body(0)}, self.body(1), self.body(0)],
+            headers={"X-API-Key": self.api_key},
+        )
+        self.assertEqual(response.status_code, 202)
+        data = response.get_json()
+        self.assertEqual([item["index"] for item in data["items"]], [0, 1, 2])
+        self.assertEqual(data["items"][2]["deduplicated"]["source_video_id"],
+                         data["items"][0]["video_id"])
+        self.assertEqual(data["counts"]["total"], 3)
+        # Every rendered item holds a credit until its job finishes; the
+        # coalesced duplicate holds none
+        self.assertEqual(credit_ledger.balance(self.api_key, fresh=True), (2, 0))
+
+        # Only distinct plans are rendered; they are queued before the response
+        (jobs,) = self.prefetch.call_args[0]
+        self.assertEqual([video_id for video_id, _ in jobs],
+                         [data["items"][0]["video_id"], data["items"][1]["video_id"]])
+        for video_id, _ in jobs:
+            job = job_store.get_job(video_id)
+            self.assertEqual((job["queue_state"], job["plan"]), ("queued", "starter"))
+        self.assertIsNone(job_store.get_job(data["items"][2]["video_id"])["queue_state"])
+
+        status = self.client.get(f"/creation/batch/{data['batch_id']}").get_json()
+        self.assertEqual(status["status"], "Processing")
+        self.assertEqual([item["video_id"] for item in status["items"]],
+                         [item["video_id"] for item in data["items"]])
+
+    def test_ndjson_batch(self):
+        """Test that an NDJSON stream is accepted."""
+        lines = "\n".join(json.dumps({"body": self.body(i)}) for i in range(3))
+        response = self.client.post(
+            "/creation/batch",
+            data=lines + "\n",
+            content_type="application/x-ndjson",
+            headers={"X-API-Key": self.api_key},
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(response.get_json()["items"]), 3)
+
+    def test_unknown_api_key_is_refused(self):
+        """Test that creation checks keys with the same helper as downloads."""
+        for path, body in (("/creation", {"body": self.body(0)}), ("/creation/batch", [self.body(0)])):
+            response = self.client.post(path, json=body, headers={"X-API-Key": "unknown-key"})
+            self.assertEqual(response.status_code, 401, path)
+        self.assertEqual(credit_ledger.balance("unknown-key", fresh=True), (0, 0))
+
+    def test_invalid_items_reject_whole_batch(self):
+        """Test that every invalid item is reported and no job is created."""
+        response = self.client.post(
+            "/creation/batch",
+            json=[self.body(0), {"segments": []}, "not an object"],
+            headers={"X-API-Key": self.api_key},
+        )
+        self.assertEqual(response.status_code, 400)
+        errors = response.get_json()["items"]
+        self.assertEqual([error["index"] for error in errors], [1, 2])
+        self.prefetch.assert_not_called()
+        self.assertEqual(credit_ledger.balance(self.api_key, fresh=True), (0, 0))
+
+    def test_batch_needs_enough_credits(self):
+        """Test that a batch larger than the remaining credits is refused."""
+        credit_ledger.adjust(self.api_key, 59)
+        response = self.client.post(
+            "/creation/batch",
+            json=[self.body(0), self.body(1)],
+            headers={"X-API-Key": self.api_key},
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_prefetch_rewrites_only_queued_jobs(self):
+        """Test that prefetched assets reach jobs still queued, not ones already rendering."""
+        jobs = []
+        for i in range(2):
+            video_id = f"prefetch-{uuid.uuid4().hex}"
+            job_store.create_job(video_id, api_key=self.api_key)
+            job_store.enqueue_job(video_id, "starter", self.body(i), 1.0)
+            jobs.append((video_id, self.body(i)))
+        job_store.update_job(jobs[1][0], queue_state="leased")
+        mapping = {"https://example.com/shared.mp3": "temp/asset_cache/shared.mp3"}
+        with patch("app.endpoints.creation.asset_prefetcher.fetch_all", return_value=mapping):
+            prefetch_batch_assets(jobs)
+        queued, leased = (job_store.get_job(video_id)["payload"] for video_id, _ in jobs)
+        self.assertEqual(queued["segments"][0]["audioUrl"], "temp/asset_cache/shared.mp3")
+        self.assertEqual(leased["segments"][0]["audioUrl"], "https://example.com/shared.mp3")
+
+    def test_unknown_batch(self):
+        """Test that an unknown batch id returns 404."""
+        self.assertEqual(self.client.get("/creation/batch/unknown").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
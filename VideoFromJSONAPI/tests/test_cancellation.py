@@ -0,0 +1,150 @@
+"""Tests for job cancellation and render deadlines."""
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.endpoints.jobs import jobs_bp
+from app.utils.util_job_store import JobStore, job_store
+from app.utils.util_scheduler import FairShareScheduler
+from flask import Flask
+
+
+def _stuck_render(store_path, video_id, payload):
+    """Stand-in renderer that starts a long-running child like ffmpeg would."""
+    os.setsid()
+    child = subprocess.Popen(["sleep", "60"])
+    # Rename so the test never reads a half-written file
+    with open(payload["pid_file"] + ".tmp", "w") as f:
+        f.write(str(child.pid))
+    os.replace(payload["pid_file"] + ".tmp", payload["pid_file"])
+    time.sleep(60)
+
+
+def _group_is_running(pgid):
+    """Return True if any process of the group exists and is not a zombie."""
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Fields after the parenthesised command: state, ppid, pgrp, ...
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (FileNotFoundError, ProcessLookupError, IndexError):
+            continue
+        if int(fields[2]) == pgid and fields[0] != "Z":
+            return True
+    return False
+
+
+def wait_until(predicate, timeout, message):
+    """Poll ``predicate`` until it is true, failing after ``timeout`` seconds."""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError(message)
+        time.sleep(0.05)
+
+
+class TestRenderSupervision(unittest.TestCase):
+    """Test cases for stopping running renders."""
+
+    def setUp(self):
+        """Create a scheduler whose renders never finish on their own."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.scheduler = FairShareScheduler(self.store, workers=1, render_target=_stuck_render)
+        self.scheduler._ensure_workers = lambda: None
+        self.pid_file = os.path.join(self.temp_dir, "child.pid")
+        self.patches = [
+            patch.object(Config, "RENDER_SUPERVISE_INTERVAL", 0.1),
+            patch.object(Config, "RENDER_KILL_GRACE", 1),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def start_job(self, video_id):
+        self.store.create_job(video_id, api_key="key")
+        self.scheduler.submit(video_id, "free", {"pid_file": self.pid_file})
+        job = self.store.lease_next_job("test-worker", self.scheduler.choose)
+        worker = threading.Thread(target=self.scheduler.run_job, args=(job,))
+        worker.start()
+        wait_until(lambda: os.path.exists(self.pid_file), 60, "render process did not start")
+        with open(self.pid_file) as f:
+            return worker, os.getpgid(int(f.read()))
+
+    def test_cancel_kills_render_and_children(self):
+        """Test that cancelling a running job stops the whole process group."""
+        worker, pgid = self.start_job("running")
+        self.assertEqual(self.store.request_cancel("running"), "cancelling")
+        worker.join(30)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(self.store.get_status("running"), "Cancelled")
+        self.assertEqual(self.store.get_job("running")["queue_state"], "done")
+        wait_until(lambda: not _group_is_running(pgid), 10, "render process group is still running")
+
+    def test_deadline_times_out_job(self):
+        """Test that a render over its plan's time limit is stopped."""
+        # Long enough for the spawned render process to import the app
+        with patch.dict(Config.API_PLANS["free"], {"max_render_seconds": 5}):
+            worker, pgid = self.start_job("slow")
+            worker.join(30)
+        self.assertEqual(self.store.get_status("slow"), "TimedOut")
+        wait_until(lambda: not _group_is_running(pgid), 10, "render process group is still running")
+
+    def test_queued_job_is_cancelled_immediately(self):
+        """Test that a job that has not started is cancelled without a worker."""
+        self.store.create_job("queued", api_key="key")
+        self.scheduler.submit("queued", "free", {})
+        self.assertEqual(self.store.request_cancel("queued"), "cancelled")
+        self.assertEqual(self.store.get_status("queued"), "Cancelled")
+        self.assertIsNone(self.store.lease_next_job("test-worker", self.scheduler.choose))
+        self.assertEqual(self.store.request_cancel("queued"), "finished")
+
+
+class TestCancelEndpoint(unittest.TestCase):
+    """Test cases for DELETE /jobs/<id> and POST /jobs/<id>/cancel."""
+
+    def setUp(self):
+        """Create a client and a queued job."""
+        app = Flask(__name__)
+        app.register_blueprint(jobs_bp)
+        self.client = app.test_client()
+        self.video_id = f"cancel-{time.time_ns()}"
+        job_store.create_job(self.video_id, api_key="owner-key")
+
+    def test_cancel_requires_owner(self):
+        """Test that only the owning API key may cancel a job."""
+        self.assertEqual(self.client.delete(f"/jobs/{self.video_id}").status_code, 401)
+        response = self.client.delete(
+            f"/jobs/{self.video_id}", headers={"X-API-Key": "other-key"}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_cancel_queued_job(self):
+        """Test cancelling a job that has not started, then cancelling again."""
+        headers = {"X-API-Key": "owner-key"}
+        response = self.client.post(f"/jobs/{self.video_id}/cancel", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["status"], "Cancelled")
+        self.assertEqual(self.client.delete(f"/jobs/{self.video_id}", headers=headers).status_code, 409)
+
+    def test_unknown_job(self):
+        """Test that cancelling an unknown job returns 404."""
+        response = self.client.delete("/jobs/unknown", headers={"X-API-Key": "owner-key"})
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
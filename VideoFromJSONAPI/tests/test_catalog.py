@@ -0,0 +1,136 @@
+"""Tests for the video catalog and GET /api/videos."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.endpoints import status
+from app.endpoints.status import status_bp
+from app.utils.util_catalog import VideoCatalog
+from app.utils.util_job_store import JobStore
+from flask import Flask
+
+
+class TestVideoCatalog(unittest.TestCase):
+    """Test cases for catalog entries and keyset pagination."""
+
+    def setUp(self):
+        """Create a temporary job store with a catalog."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.catalog = VideoCatalog(self.store)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def complete(self, video_id, api_key="key", created_at=None, **fields):
+        self.store.create_job(video_id, api_key=api_key, created_at=created_at or time.time())
+        self.store.update_job(video_id, status="Completed", output_path=f"static/videos/{video_id}.mp4", **fields)
+
+    def test_completed_jobs_are_cataloged(self):
+        """Test that completing a job adds it, and followers copy its metadata."""
+        self.store.create_job("source", api_key="key")
+        self.catalog.record("source", "static/videos/source.mp4", duration=12.5, width=1280, height=720)
+        self.store.update_job("source", status="Completed", output_path="static/videos/source.mp4")
+        self.complete("follower", api_key="other", source_id="source")
+        # Reused outputs are inserted already completed
+        self.store.create_job("reused", api_key="other", status="Completed",
+                              output_path="static/videos/source.mp4", source_id="source")
+
+        videos, _ = self.catalog.list_videos("other")
+        self.assertEqual(sorted(v["video_id"] for v in videos), ["follower", "reused"])
+        self.assertTrue(all(v["duration"] == 12.5 and v["width"] == 1280 for v in videos))
+        self.assertEqual([v["video_id"] for v in self.catalog.list_videos("key")[0]], ["source"])
+
+    def test_unfinished_jobs_are_not_cataloged(self):
+        """Test that failed jobs and jobs without output stay out of the catalog."""
+        self.store.create_job("failed", api_key="key")
+        self.store.update_job("failed", status="Error: boom")
+        self.assertEqual(self.catalog.list_videos("key"), ([], None))
+
+    def test_keyset_pagination_and_dates(self):
+        """Test that pages follow each other without gaps or repeats."""
+        for i in range(5):
+            self.complete(f"video-{i}", created_at=1000 + i)
+        self.complete("same-time", created_at=1004)
+        seen, cursor = [], None
+        while True:
+            videos, cursor = self.catalog.list_videos("key", limit=2, cursor=cursor)
+            seen += [v["video_id"] for v in videos]
+            if cursor is None:
+                break
+        self.assertEqual(seen, ["video-4", "same-time", "video-3", "video-2", "video-1", "video-0"])
+        videos, _ = self.catalog.list_videos("key", since=1001, until=1003)
+        self.assertEqual([v["video_id"] for v in videos], ["video-2", "video-1"])
+        with self.assertRaises(ValueError):
+            self.catalog.list_videos("key", cursor="not-a-cursor")
+
+    def test_import_existing_files_once(self):
+        """Test that files rendered before the catalog existed are imported once."""
+        output_dir = os.path.join(self.temp_dir, "videos")
+        os.makedirs(output_dir)
+        for name in ("old.mp4", "notes.txt"):
+            open(os.path.join(output_dir, name), "wb").close()
+        self.assertEqual(self.catalog.import_files(output_dir), 1)
+        self.assertEqual(self.catalog.import_files(output_dir), 0)
+        self.assertEqual([v["video_id"] for v in self.catalog.list_videos(None)[0]], ["old"])
+
+
+class TestListVideosEndpoint(unittest.TestCase):
+    """Test cases for GET /api/videos."""
+
+    def setUp(self):
+        """Serve the status blueprint over a temporary catalog."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.catalog = VideoCatalog(self.store)
+        patcher = patch.object(status, "video_catalog", self.catalog)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app = Flask(__name__)
+        app.register_blueprint(status_bp, url_prefix="/api/")
+        self.client = app.test_client()
+        for i in range(3):
+            self.store.create_job(f"video-{i}", api_key="key", created_at=1700000000 + i)
+            self.catalog.record(f"video-{i}", f"static/videos/video-{i}.mp4", duration=3, width=640, height=360)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def get(self, query="", **headers):
+        return self.client.get(f"/api/videos{query}", headers={Config.API_KEY_HEADER: "key", **headers})
+
+    def test_pages_and_fields(self):
+        """Test the page shape and following next_cursor."""
+        body = self.get("?limit=2").get_json()
+        self.assertEqual([v["id"] for v in body["videos"]], ["video-2", "video-1"])
+        self.assertEqual(body["videos"][0]["resolution"], "640x360")
+        self.assertEqual(body["videos"][0]["download_url"], "/api/download/video-2.mp4")
+        self.assertEqual(body["videos"][0]["created_at"], "2023-11-14T22:13:22+00:00")
+        body = self.get(f"?limit=2&cursor={body['next_cursor']}").get_json()
+        self.assertEqual(([v["id"] for v in body["videos"]], body["next_cursor"]), (["video-0"], None))
+
+    def test_owner_and_date_filters(self):
+        """Test that other keys see nothing and dates narrow the listing."""
+        self.assertEqual(self.client.get("/api/videos").get_json()["videos"], [])
+        body = self.get("?since=2023-11-14T22:13:21Z").get_json()
+        self.assertEqual([v["id"] for v in body["videos"]], ["video-2", "video-1"])
+        self.assertEqual(self.get("?since=yesterday").status_code, 400)
+
+    def test_conditional_get(self):
+        """Test that an unchanged listing returns 304 and a change invalidates it."""
+        etag = self.get().headers["ETag"]
+        self.assertEqual(self.get(**{"If-None-Match": etag}).status_code, 304)
+        self.catalog.remove("video-0")
+        response = self.get(**{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()["videos"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""Tests for resuming renders from segment checkpoints."""
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.utils import util_video
+from app.utils.util_catalog import VideoCatalog
+from app.utils.util_job_store import JobStore
+from app.utils.util_video import (chunk_key, concat_chunks, job_workspace, load_checkpoint, process_video,
+                                  save_checkpoint)
+
+SEGMENTS = [
+    {"imageUrl": "tests/testfiles/images/1.jpg", "audioUrl": "tests/testfiles/audio/segment_1.mp3", "max_duration": 1},
+    {"imageUrl": "tests/testfiles/images/2.jpg", "audioUrl": "tests/testfiles/audio/segment_2.mp3", "max_duration": 1},
+]
+
+
+class _RenderKilled(BaseException):
+    """Stands in for the render process dying mid-job."""
+
+
+class TestCheckpoint(unittest.TestCase):
+    """Test cases for checkpointed, resumable renders."""
+
+    def setUp(self):
+        """Point the job store, workspaces and output at a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.store.create_job("video", api_key="key")
+        for p in (
+            patch.object(Config, "JOB_WORKSPACE_DIR", os.path.join(self.temp_dir, "jobs")),
+            patch.object(Config, "VIDEO_OUTPUT_DIR", self.temp_dir),
+            patch.object(util_video, "job_store", self.store),
+            patch.object(util_video, "video_catalog", VideoCatalog(self.store)),
+        ):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def render(self):
+        status = {}
+        process_video(
+            "video", SEGMENTS, False, "none", None, None, None, "160x120", None, None, None, None,
+            True, status, threading.Lock(), None, None, None, None,
+        )
+        return status["video"]
+
+    def test_checkpoint_round_trip(self):
+        """Test that checkpoints are written atomically and read back."""
+        workspace = os.path.join(self.temp_dir, "workspace")
+        os.makedirs(workspace)
+        self.assertEqual(load_checkpoint(workspace), {"chunks": {}})
+        save_checkpoint(workspace, {"chunks": {"0": {"key": "abc"}}})
+        self.assertEqual(load_checkpoint(workspace)["chunks"]["0"]["key"], "abc")
+        self.assertEqual(os.listdir(workspace), ["checkpoint.json"])
+
+    def test_chunk_key_follows_settings(self):
+        """Test that changing a render setting invalidates a chunk."""
+        self.assertEqual(chunk_key(SEGMENTS[0], fade_effect="none"), chunk_key(SEGMENTS[0], fade_effect="none"))
+        self.assertNotEqual(chunk_key(SEGMENTS[0], fade_effect="none"), chunk_key(SEGMENTS[0], fade_effect="fade"))
+
+    def test_resume_renders_only_missing_segments(self):
+        """Test that a render killed after one segment resumes from the next one."""
+        build = util_video.build_segment_clip
+        calls = []
+
+        def dies_on_second_segment(image_path, *args, **kwargs):
+            calls.append(image_path)
+            if len(calls) == 2:
+                raise _RenderKilled()
+            return build(image_path, *args, **kwargs)
+
+        # A killed process never reaches its cleanup
+        with patch.object(util_video, "build_segment_clip", dies_on_second_segment), \
+                patch.object(util_video, "release_job_files"):
+            with self.assertRaises(_RenderKilled):
+                self.render()
+        workspace = job_workspace("video")
+        self.assertEqual(list(load_checkpoint(workspace)["chunks"]), ["0"])
+
+        calls.clear()
+        with patch.object(util_video, "build_segment_clip", dies_on_second_segment), \
+                patch.object(util_video, "fetch_resource") as fetch:
+            self.assertEqual(self.render(), "Completed")
+        self.assertEqual(calls, [os.path.join(workspace, "image_1.jpg")])
+        fetch.assert_not_called()
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, "video.mp4")))
+        self.assertFalse(os.path.exists(workspace))
+        self.assertEqual(self.store.get_job("video")["progress"]["frames_done"], 48)
+        videos, _ = util_video.video_catalog.list_videos("key")
+        self.assertEqual((videos[0]["duration"], videos[0]["width"]), (2, 160))
+
+
+def max_volume(path, start):
+    """Return the peak level in dB of a file's audio from ``start`` seconds on."""
+    result = subprocess.run(
+        ["ffmpeg", "-ss", str(start), "-i", path, "-af", "volumedetect", "-f", "null", "-"],
+        capture_output=True, text=True,
+    )
+    return float(re.search(r"max_volume: (-?[\d.]+) dB", result.stderr).group(1))
+
+
+@unittest.skipUnless(shutil.which("ffmpeg"), "ffmpeg is not installed")
+class TestConcatChunks(unittest.TestCase):
+    """Test cases for joining chunks and mixing in background music."""
+
+    def setUp(self):
+        """Make a 3 second chunk with a tone and 1 second of music."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.chunk = os.path.join(self.temp_dir, "chunk.mp4")
+        self.music = os.path.join(self.temp_dir, "music.wav")
+        subprocess.run(
+            ["ffmpeg", "-y", "-f", "lavfi", "-i", "color=c=black:s=64x64:d=3", "-f", "lavfi",
+             "-i", "sine=frequency=440:duration=3", "-c:v", "libx264", "-c:a", "aac", "-shortest", self.chunk],
+            capture_output=True, check=True,
+        )
+        subprocess.run(
+            ["ffmpeg", "-y", "-f", "lavfi", "-i", "sine=frequency=220:duration=1", self.music],
+            capture_output=True, check=True,
+        )
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_voice_level_after_short_music_ends(self):
+        """Test that the voice keeps its level once background music shorter than the video ends."""
+        output = os.path.join(self.temp_dir, "out.mp4")
+        with patch.object(util_video, "get_setting", return_value="ffmpeg"):
+            concat_chunks([self.chunk], output, self.temp_dir, background_music=self.music)
+        self.assertAlmostEqual(max_volume(output, 2), max_volume(self.chunk, 2), delta=1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -26,12 +26,14 @@ import json
 import os
 import time
 import unittest
-from datetime import datetime, timedelta
+import uuid
+from datetime import datetime
 from unittest.mock import Mock, mock_open, patch
 
 import dotenv
 from app.config import Config
 from app.endpoints.creation import creation_bp
+from app.utils.util_credits import credit_ledger
 from app.utils.util_rate_limit import RateLimiter, rate_limiter
 from flask import Flask
 
@@ -89,8 +91,6 @@ class TestCreationEndpoint(unittest.TestCase):
         Config.API_KEYS[self.valid_api_key] = {
             "name": "Test Key",
             "plan": "starter",
-            "credits_used": 0,
-            "credits_reset": (datetime.now() + timedelta(days=30)).isoformat(),
             "is_active": True
         }
         
@@ -105,13 +105,11 @@ class TestCreationEndpoint(unittest.TestCase):
             "video_id": "test-video-123"
         }
         
-        # Set up test API key
-        self.test_api_key = "test_key_123"
+        # Set up test API key (a fresh one, so the credit ledger starts empty)
+        self.test_api_key = f"test_key_{uuid.uuid4().hex}"
         Config.API_KEYS[self.test_api_key] = {
             "name": "Test Key",
             "plan": "starter",
-            "credits_used": 0,
-            "credits_reset": "2024-04-24T00:00:00",
             "is_active": True
         }
         
@@ -132,8 +130,7 @@ class TestCreationEndpoint(unittest.TestCase):
         }
         
         # Reset rate limiter state
-        rate_limiter._request_times = {}
-        rate_limiter._credits = {}
+        rate_limiter.reset()
         
         # Set up mock classes for moviepy
         self.mock_audio_clip = MagicMock()
@@ -168,8 +165,7 @@ class TestCreationEndpoint(unittest.TestCase):
     def tearDown(self):
         """Clean up after each test."""
         # Reset rate limiter state
-        rate_limiter._request_times = {}
-        rate_limiter._credits = {}
+        rate_limiter.reset()
         
         # Remove test API key
         if self.test_api_key in Config.API_KEYS:
@@ -188,7 +184,6 @@ class TestCreationEndpoint(unittest.TestCase):
     @patch('app.utils.util_video.fetch_resource')
     @patch('app.utils.util_video.AudioFileClip')
     @patch('app.utils.util_video.ImageClip')
-    @patch('app.utils.util_video.concatenate_videoclips')
     @patch('os.makedirs')
     @patch('builtins.open', new_callable=mock_open)
     @patch('threading.Thread')
@@ -203,7 +198,6 @@ class TestCreationEndpoint(unittest.TestCase):
         mock_thread,
         mock_open,
         mock_makedirs,
-        mock_concatenate,
         mock_image_clip,
         mock_audio_clip,
         mock_fetch_resource
@@ -223,7 +217,6 @@ class TestCreationEndpoint(unittest.TestCase):
         # Set up mock clips
         mock_audio_clip.return_value = self.mock_audio_clip
         mock_image_clip.return_value = self.mock_image_clip
-        mock_concatenate.return_value = self.mock_video_clip
         
         # Set up mock thread
         mock_thread.return_value = self.mock_thread
@@ -240,10 +233,11 @@ class TestCreationEndpoint(unittest.TestCase):
         self.assertIn('credits', data)
         self.assertEqual(data['status'], 'Processing')
         
-        # Check credit information
+        # Check credit information: the job holds a credit until it finishes
         credit_info = data['credits']
         self.assertEqual(credit_info['plan'], 'Starter')
-        self.assertEqual(credit_info['credits_used'], 1)
+        self.assertEqual(credit_info['credits_used'], 0)
+        self.assertEqual(credit_info['credits_reserved'], 1)
         self.assertEqual(credit_info['credits_remaining'], 59)
 
     def test_missing_api_key(self):
@@ -261,7 +255,6 @@ class TestCreationEndpoint(unittest.TestCase):
     @patch('app.utils.util_video.fetch_resource')
     @patch('app.utils.util_video.AudioFileClip')
     @patch('app.utils.util_video.ImageClip')
-    @patch('app.utils.util_video.concatenate_videoclips')
     @patch('os.makedirs')
     @patch('builtins.open', new_callable=mock_open)
     @patch('threading.Thread')
@@ -276,7 +269,6 @@ class TestCreationEndpoint(unittest.TestCase):
         mock_thread,
         mock_open,
         mock_makedirs,
-        mock_concatenate,
         mock_image_clip,
         mock_audio_clip,
         mock_fetch_resource
@@ -296,26 +288,28 @@ class TestCreationEndpoint(unittest.TestCase):
         # Set up mock clips
         mock_audio_clip.return_value = self.mock_audio_clip
         mock_image_clip.return_value = self.mock_image_clip
-        mock_concatenate.return_value = self.mock_video_clip
         
         # Set up mock thread
         mock_thread.return_value = self.mock_thread
         
-        # First 60 requests should be allowed
-        for _ in range(60):
+        # Give the key's plan a limit of 60 requests per minute
+        starter = {**Config.API_PLANS["starter"], "rate_limit": 60}
+        with patch.dict(Config.API_PLANS, {"starter": starter}):
+            # First 60 requests should be allowed
+            for _ in range(60):
+                response = self.client.post(
+                    '/creation',
+                    headers={'X-API-Key': self.test_api_key},
+                    json=self.test_data
+                )
+                self.assertEqual(response.status_code, 202)
+            
+            # 61st request should be blocked
             response = self.client.post(
                 '/creation',
                 headers={'X-API-Key': self.test_api_key},
                 json=self.test_data
             )
-            self.assertEqual(response.status_code, 202)
-        
-        # 61st request should be blocked
-        response = self.client.post(
-            '/creation',
-            headers={'X-API-Key': self.test_api_key},
-            json=self.test_data
-        )
         
         self.assertEqual(response.status_code, 429)
         data = json.loads(response.data)
@@ -325,7 +319,7 @@ class TestCreationEndpoint(unittest.TestCase):
     def test_credit_limit(self):
         """Test credit limit enforcement."""
         # Set up API key with no remaining credits
-        Config.API_KEYS[self.test_api_key]["credits_used"] = 60
+        credit_ledger.adjust(self.test_api_key, 60)
         
         response = self.client.post(
             '/creation',
@@ -383,11 +377,39 @@ class TestCreationEndpoint(unittest.TestCase):
         self.assertEqual(data['error'], 'Invalid JSON format')
         self.assertIn('segments', data['message'])
 
+    def test_schema_errors_are_listed(self):
+        """Test that every schema error is returned and no credit is reserved."""
+        invalid_data = {
+            "body": {
+                "segments": [{"imageUrl": "https://example.com/image1.png"}],
+                "fade_effect": "sparkle",
+                "resolution": "big"
+            }
+        }
+
+        response = self.client.post(
+            '/creation',
+            headers={'X-API-Key': self.test_api_key},
+            json=invalid_data
+        )
+
+        self.assertEqual(response.status_code, 400)
+        data = json.loads(response.data)
+        self.assertEqual(
+            [error['path'] for error in data['errors']],
+            ['/fade_effect', '/resolution', '/segments/0']
+        )
+        self.assertEqual(data['schema_version'], 1)
+        self.assertEqual(credit_ledger.balance(self.test_api_key, fresh=True), (0, 0))
+
+        response = self.client.get('/creation/schema')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Schema-Version'], '1')
+
     @patch('app.utils.util_video.process_video')
     @patch('app.utils.util_video.fetch_resource')
     @patch('app.utils.util_video.AudioFileClip')
     @patch('app.utils.util_video.ImageClip')
-    @patch('app.utils.util_video.concatenate_videoclips')
     @patch('os.makedirs')
     @patch('builtins.open', new_callable=mock_open)
     @patch('threading.Thread')
@@ -402,7 +424,6 @@ class TestCreationEndpoint(unittest.TestCase):
         mock_thread,
         mock_open,
         mock_makedirs,
-        mock_concatenate,
         mock_image_clip,
         mock_audio_clip,
         mock_fetch_resource,
@@ -423,7 +444,6 @@ class TestCreationEndpoint(unittest.TestCase):
         # Set up mock clips
         mock_audio_clip.return_value = self.mock_audio_clip
         mock_image_clip.return_value = self.mock_image_clip
-        mock_concatenate.return_value = self.mock_video_clip
         
         # Set up mock thread
         mock_thread.return_value = self.mock_thread
@@ -473,7 +493,6 @@ class TestCreationEndpoint(unittest.TestCase):
     @patch('app.utils.util_video.fetch_resource')
     @patch('app.utils.util_video.AudioFileClip')
     @patch('app.utils.util_video.ImageClip')
-    @patch('app.utils.util_video.concatenate_videoclips')
     @patch('os.makedirs')
     @patch('builtins.open', new_callable=mock_open)
     @patch('threading.Thread')
@@ -488,7 +507,6 @@ class TestCreationEndpoint(unittest.TestCase):
         mock_thread,
         mock_open,
         mock_makedirs,
-        mock_concatenate,
         mock_image_clip,
         mock_audio_clip,
         mock_fetch_resource
@@ -508,14 +526,12 @@ class TestCreationEndpoint(unittest.TestCase):
         # Set up mock clips
         mock_audio_clip.return_value = self.mock_audio_clip
         mock_image_clip.return_value = self.mock_image_clip
-        mock_concatenate.return_value = self.mock_video_clip
         
         # Set up mock thread
         mock_thread.return_value = self.mock_thread
         
-        # Set up API key with expired reset date
-        Config.API_KEYS[self.test_api_key]["credits_reset"] = "2024-03-24T00:00:00"
-        Config.API_KEYS[self.test_api_key]["credits_used"] = 60
+        # Use up all credits in the previous month
+        credit_ledger.adjust(self.test_api_key, 60, at=self.current_time - 31 * 24 * 3600)
         
         response = self.client.post(
             '/creation',
@@ -525,7 +541,8 @@ class TestCreationEndpoint(unittest.TestCase):
         
         self.assertEqual(response.status_code, 202)
         data = json.loads(response.data)
-        self.assertEqual(data['credits']['credits_used'], 1)
+        self.assertEqual(data['credits']['credits_used'], 0)
+        self.assertEqual(data['credits']['credits_reserved'], 1)
         self.assertEqual(data['credits']['credits_remaining'], 59)
 
 
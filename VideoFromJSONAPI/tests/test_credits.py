@@ -0,0 +1,131 @@
+"""Tests for the credit ledger."""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.utils.util_credits import CreditLedger, billing_period, period_end
+from app.utils.util_job_store import JobStore
+
+
+class TestCreditLedger(unittest.TestCase):
+    """Test cases for reserving, charging and refunding credits."""
+
+    def setUp(self):
+        """Create a temporary job store with a ledger and a free-plan key."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.ledger = CreditLedger(self.store)
+        key_patch = patch.dict(Config.API_KEYS, {"key": {"plan": "free"}})
+        key_patch.start()
+        self.addCleanup(key_patch.stop)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def claim(self, video_id, plan_hash=None, **kwargs):
+        return self.store.claim_job(
+            video_id, "key", plan_hash or video_id, admit=self.ledger.admit("key"), credits=1, **kwargs
+        )[0]
+
+    def test_jobs_are_charged_only_when_they_complete(self):
+        """Test that reservations are committed on completion and refunded otherwise."""
+        for video_id in ("done", "failed", "cancelled", "deleted"):
+            self.assertEqual(self.claim(video_id), "created")
+        self.assertEqual(self.ledger.balance("key", fresh=True), (4, 0))
+
+        self.store.update_job("done", status="Completed")
+        self.store.update_job("failed", status="Error: boom")
+        self.assertEqual(self.store.request_cancel("cancelled"), "cancelled")
+        self.store.delete_job("deleted")
+        self.assertEqual(self.ledger.balance("key", fresh=True), (0, 1))
+        self.assertEqual(
+            [(entry["video_id"], entry["kind"]) for entry in self.ledger.entries("key")[4:]],
+            [("done", "commit"), ("failed", "refund"), ("cancelled", "refund"), ("deleted", "refund")],
+        )
+
+        # A job is settled once, however often it is updated afterwards
+        self.store.update_job("done", status="Completed")
+        self.assertEqual(len(self.ledger.entries("key")), 8)
+
+    def test_reused_output_is_not_charged(self):
+        """Test that a job completed from an identical render reserves and commits nothing."""
+        self.claim("source", plan_hash="h")
+        output = os.path.join(self.temp_dir, "source.mp4")
+        open(output, "wb").close()
+        self.store.update_job("source", status="Completed", output_path=output)
+        self.assertEqual(self.claim("copy", plan_hash="h"), "reused")
+        self.assertEqual(self.ledger.balance("key", fresh=True), (0, 1))
+        self.assertEqual([entry["video_id"] for entry in self.ledger.entries("key")], ["source", "source"])
+
+    def test_admission_stops_at_plan_credits(self):
+        """Test that reserved and used credits together cap new jobs."""
+        self.ledger.adjust("key", 8)
+        self.assertEqual(self.claim("a"), "created")
+        self.assertEqual(self.claim("b"), "created")
+        self.assertEqual(self.claim("c"), "refused")
+        self.assertIsNone(self.store.get_job("c"))
+
+        # A failed job gives its credit back
+        self.store.update_job("a", status="Error: boom")
+        self.assertEqual(self.claim("c"), "created")
+
+        info = self.ledger.credit_info("key")
+        self.assertEqual(
+            (info["credits_total"], info["credits_used"], info["credits_reserved"], info["credits_remaining"]),
+            (10, 8, 2, 0),
+        )
+
+    def test_concurrent_claims_never_overspend(self):
+        """Test that threads racing for the last credits admit exactly the limit."""
+        outcomes = []
+
+        def worker(i):
+            outcomes.append(self.claim(f"job-{i}"))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(outcomes.count("created"), 10)
+        self.assertEqual(self.ledger.balance("key", fresh=True), (10, 0))
+
+    def test_credits_reset_each_month(self):
+        """Test that usage counts against the month the job was created in."""
+        last_month = time.time() - 40 * 24 * 3600
+        self.ledger.adjust("key", 10, at=last_month)
+        self.assertEqual(self.ledger.balance("key", billing_period(last_month)), (0, 10))
+        self.assertEqual(self.ledger.balance("key"), (0, 0))
+        self.assertEqual(self.claim("new"), "created")
+        self.assertEqual(period_end("2024-12"), "2025-01-01T00:00:00+00:00")
+
+    def test_balance_is_cached(self):
+        """Test that balances are read from the cache until it expires."""
+        self.ledger.balance("key")
+        self.store._connect().execute(
+            "INSERT INTO credit_ledger (api_key, period, kind, amount, created_at) "
+            "VALUES ('key', ?, 'adjust', 3, 0)",
+            (billing_period(),),
+        )
+        self.assertEqual(self.ledger.balance("key"), (0, 0))
+        with patch("time.monotonic", return_value=time.monotonic() + Config.CREDIT_CACHE_TTL + 1):
+            self.assertEqual(self.ledger.balance("key"), (0, 3))
+
+    def test_ledger_is_append_only(self):
+        """Test that ledger entries cannot be changed or removed."""
+        self.ledger.adjust("key", 1)
+        with self.assertRaises(sqlite3.DatabaseError):
+            self.store._connect().execute("UPDATE credit_ledger SET amount = 0")
+        with self.assertRaises(sqlite3.DatabaseError):
+            self.store._connect().execute("DELETE FROM credit_ledger")
+
+
+if __name__ == "__main__":
+    unittest.main()
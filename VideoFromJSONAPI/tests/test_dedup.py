@@ -0,0 +1,217 @@
+"""Tests for request deduplication and output reuse."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import uuid
+from unittest.mock import patch
+
+from app.config import Config
+from app.endpoints.creation import creation_bp
+from app.utils.util_credits import credit_ledger
+from app.utils.util_dedup import PlanHasher, resolve_followers
+from app.utils.util_job_store import JobStore, job_store
+from flask import Flask
+
+
+class TestPlanHasher(unittest.TestCase):
+    """Test cases for canonical plan hashing."""
+
+    def setUp(self):
+        """Create a hasher and a local asset file."""
+        self.hasher = PlanHasher()
+        self.temp_dir = tempfile.mkdtemp(dir=Config.ROOT_DIR)
+        self.asset = os.path.join(self.temp_dir, "image.jpg")
+        with open(self.asset, "wb") as f:
+            f.write(b"image-bytes")
+        self.reference = os.path.relpath(self.asset, Config.ROOT_DIR)
+
+    def tearDown(self):
+        """Remove the asset directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_key_order_does_not_matter(self):
+        """Test that equivalent plans hash the same regardless of key order."""
+        first = {"segments": [{"imageUrl": "https://a/1.png", "audioUrl": "https://a/1.mp3"}],
+                 "resolution": "1280x720"}
+        second = {"resolution": "1280x720",
+                  "segments": [{"audioUrl": "https://a/1.mp3", "imageUrl": "https://a/1.png"}]}
+        self.assertEqual(self.hasher.plan_hash(first), self.hasher.plan_hash(second))
+
+    def test_settings_change_hash(self):
+        """Test that a different setting produces a different hash."""
+        plan = {"segments": ["https://a/1.png"], "resolution": "1280x720"}
+        other = {"segments": ["https://a/1.png"], "resolution": "1920x1080"}
+        self.assertNotEqual(self.hasher.plan_hash(plan), self.hasher.plan_hash(other))
+
+    def test_local_assets_hashed_by_content(self):
+        """Test that a copy of a local asset matches and an edit does not."""
+        copy = os.path.join(self.temp_dir, "copy.jpg")
+        shutil.copyfile(self.asset, copy)
+        plan = {"segments": [{"imageUrl": self.reference}]}
+        same = {"segments": [{"imageUrl": os.path.relpath(copy, Config.ROOT_DIR)}]}
+        original = self.hasher.plan_hash(plan)
+        self.assertEqual(original, self.hasher.plan_hash(same))
+
+        with open(self.asset, "wb") as f:
+            f.write(b"edited-image-bytes")
+        self.assertNotEqual(original, self.hasher.plan_hash(plan))
+
+    def test_reuse_ttl_only_for_remote_assets(self):
+        """Test that only plans using remote URLs get a reuse time limit."""
+        self.assertIsNone(self.hasher.reuse_ttl({"segments": [{"imageUrl": self.reference}]}))
+        self.assertEqual(self.hasher.reuse_ttl({"segments": ["https://a/1.png"]}), Config.DEDUP_REUSE_TTL)
+        self.assertEqual(self.hasher.reuse_ttl({"segments": [], "background_music": "http://a/m.mp3"}),
+                         Config.DEDUP_REUSE_TTL)
+
+
+class TestClaimJob(unittest.TestCase):
+    """Test cases for atomic job claiming in the job store."""
+
+    def setUp(self):
+        """Create a store in a fresh temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_in_flight_job_is_coalesced(self):
+        """Test that an identical request attaches to the running render."""
+        self.assertEqual(self.store.claim_job("a", "key", "h1"), ("created", None))
+        outcome, source = self.store.claim_job("b", "key", "h1")
+        self.assertEqual(outcome, "coalesced")
+        self.assertEqual(source["video_id"], "a")
+        self.assertEqual(self.store.get_job("b")["source_id"], "a")
+
+    def test_matches_are_scoped_to_api_key(self):
+        """Test that another key's identical plan is rendered separately."""
+        self.store.claim_job("a", "key-1", "h1")
+        self.assertEqual(self.store.claim_job("b", "key-2", "h1")[0], "created")
+
+    def test_failed_jobs_are_not_reused(self):
+        """Test that an identical request after a failure renders again."""
+        self.store.claim_job("a", "key", "h1")
+        self.store.set_status("a", "Error: boom")
+        self.assertEqual(self.store.claim_job("b", "key", "h1")[0], "created")
+
+    def test_idempotency_key_replay(self):
+        """Test that a repeated Idempotency-Key returns the original job."""
+        self.store.claim_job("a", "key", "h1", idempotency_key="retry-1")
+        outcome, original = self.store.claim_job("b", "key", "h1", idempotency_key="retry-1")
+        self.assertEqual(outcome, "replay")
+        self.assertEqual(original["video_id"], "a")
+        self.assertIsNone(self.store.get_job("b"))
+
+    def test_followers_finish_with_linked_outputs(self):
+        """Test that coalesced jobs complete with their own file once the source ends."""
+        output = os.path.join(self.temp_dir, "a.mp4")
+        with open(output, "wb") as f:
+            f.write(b"video")
+        self.store.claim_job("a", "key", "h1")
+        self.store.claim_job("b", "key", "h1")
+        self.store.update_job("a", status="Completed", output_path=output)
+
+        self.assertEqual(resolve_followers(self.store, "a"), 1)
+        follower = self.store.get_job("b")
+        self.assertEqual(follower["status"], "Completed")
+        self.assertEqual(follower["output_path"], os.path.join(self.temp_dir, "b.mp4"))
+        self.assertTrue(os.path.samefile(output, follower["output_path"]))
+
+        # A later identical request reuses the finished output immediately
+        outcome, source = self.store.claim_job("c", "key", "h1")
+        self.assertEqual(outcome, "reused")
+        self.assertEqual(self.store.get_job("c")["status"], "Completed")
+
+    def test_stale_renders_are_not_reused(self):
+        """Test that a render finished longer ago than reuse_ttl is rendered again."""
+        output = os.path.join(self.temp_dir, "a.mp4")
+        with open(output, "wb") as f:
+            f.write(b"video")
+        self.store.claim_job("a", "key", "h1")
+        self.store.update_job("a", status="Completed", output_path=output, finished_at=time.time() - 120)
+        self.assertEqual(self.store.claim_job("b", "key", "h1", reuse_ttl=60)[0], "created")
+        self.assertEqual(self.store.claim_job("c", "key", "h2")[0], "created")
+        self.store.update_job("c", status="Completed", output_path=output)
+        self.assertEqual(self.store.claim_job("d", "key", "h2", reuse_ttl=60)[0], "reused")
+
+
+class TestCreationDeduplication(unittest.TestCase):
+    """Test cases for deduplication at the creation endpoint."""
+
+    def setUp(self):
+        """Create a client and a fresh API key."""
+        app = Flask(__name__)
+        app.register_blueprint(creation_bp)
+        self.client = app.test_client()
+        self.api_key = f"dedup-{uuid.uuid4().hex}"
+        Config.API_KEYS[self.api_key] = {"name": "Dedup Key", "plan": "starter"}
+        self.body = {"body": {"segments": [{"imageUrl": "https://example.com/1.png",
+                                            "audioUrl": "https://example.com/1.mp3"}]}}
+        self.submit = patch("app.endpoints.creation.render_scheduler.submit").start()
+        # Tests resubmit within a minute; lift the plan's rate limit
+        patch.dict(Config.API_PLANS, {"starter": {**Config.API_PLANS["starter"], "rate_limit": 60}}).start()
+
+    def tearDown(self):
+        """Remove the API key and patches."""
+        patch.stopall()
+        del Config.API_KEYS[self.api_key]
+
+    def post(self, body, **headers):
+        return self.client.post("/creation", json=body, headers={"X-API-Key": self.api_key, **headers})
+
+    def test_identical_request_is_coalesced(self):
+        """Test that a resubmitted body attaches to the job in flight."""
+        first = self.post(self.body).get_json()
+        response = self.post(self.body)
+        self.assertEqual(response.status_code, 202)
+        data = response.get_json()
+        self.assertNotEqual(data["video_id"], first["video_id"])
+        self.assertEqual(data["deduplicated"],
+                         {"type": "coalesced", "source_video_id": first["video_id"]})
+        self.assertEqual(self.submit.call_count, 1)
+        # Only the render holds a credit
+        self.assertEqual(credit_ledger.balance(self.api_key, fresh=True), (1, 0))
+
+    def test_reused_output_is_not_charged(self):
+        """Test that a resubmit answered from a finished render costs no credit, even with none left."""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        first = self.post(self.body).get_json()
+        output = os.path.join(temp_dir, f"{first['video_id']}.mp4")
+        with open(output, "wb") as f:
+            f.write(b"video")
+        job_store.update_job(first["video_id"], status="Completed", output_path=output, finished_at=time.time())
+        self.assertEqual(credit_ledger.balance(self.api_key, fresh=True), (0, 1))
+
+        credit_ledger.adjust(self.api_key, Config.API_PLANS["starter"]["credits"] - 1)
+        response = self.post(self.body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["deduplicated"]["type"], "reused")
+        self.assertEqual(credit_ledger.balance(self.api_key, fresh=True), (0, Config.API_PLANS["starter"]["credits"]))
+        self.assertEqual(self.post(self.body, **{"Cache-Control": "no-cache"}).status_code, 403)
+
+    def test_no_cache_forces_render(self):
+        """Test that Cache-Control: no-cache bypasses deduplication."""
+        self.post(self.body)
+        response = self.post(self.body, **{"Cache-Control": "no-cache"})
+        self.assertNotIn("deduplicated", response.get_json())
+        self.assertEqual(self.submit.call_count, 2)
+
+    def test_idempotency_key(self):
+        """Test that retries with an Idempotency-Key are answered without charging."""
+        first = self.post(self.body, **{"Idempotency-Key": "abc"}).get_json()
+        response = self.post(self.body, **{"Idempotency-Key": "abc"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(response.get_json()["video_id"], first["video_id"])
+        self.assertEqual(credit_ledger.balance(self.api_key, fresh=True), (1, 0))
+
+        other = {"body": {**self.body["body"], "resolution": "1280x720"}}
+        self.assertEqual(self.post(other, **{"Idempotency-Key": "abc"}).status_code, 422)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Tests for conditional, ranged and offloaded video downloads."""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.endpoints import download
+from app.endpoints.download import download_bp
+from app.utils.util_api_keys import api_key_manager
+from app.utils.util_catalog import VideoCatalog
+from app.utils.util_job_store import JobStore
+from flask import Flask
+
+API_KEY = "your-api-key-here"
+
+
+class TestDownloadRanges(unittest.TestCase):
+    """Test cases for /api/download/<filename>."""
+
+    def setUp(self):
+        """Serve a 1000-byte video owned by API_KEY from a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        catalog = VideoCatalog(self.store)
+        self.path = os.path.join(self.temp_dir, "video.mp4")
+        with open(self.path, "wb") as f:
+            f.write(bytes(range(250)) * 4)
+        self.store.create_job("video", api_key=API_KEY, status="Completed", output_path=self.path)
+        for p in (
+            patch.object(Config, "VIDEO_OUTPUT_DIR", self.temp_dir),
+            patch.object(Config, "DOWNLOAD_ACCEL_PREFIX", ""),
+            patch.object(download, "job_store", self.store),
+            patch.object(download, "video_catalog", catalog),
+        ):
+            p.start()
+            self.addCleanup(p.stop)
+        app = Flask(__name__)
+        app.register_blueprint(download_bp, url_prefix="/api")
+        self.client = app.test_client()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def get(self, headers=None, query="", key=API_KEY):
+        return self.client.get(f"/api/download/video.mp4{query}", headers={Config.API_KEY_HEADER: key, **(headers or {})})
+
+    def test_full_download(self):
+        """Test that the whole file is sent with an ETag and Accept-Ranges."""
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1000)
+        self.assertEqual(response.headers["Accept-Ranges"], "bytes")
+        self.assertIn("attachment", response.headers["Content-Disposition"])
+        self.assertIn("private", response.headers["Cache-Control"])
+        self.assertTrue(response.headers["ETag"])
+        response.close()
+
+    def test_range_request(self):
+        """Test that a byte range returns 206 with just those bytes."""
+        response = self.get({"Range": "bytes=100-199"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.headers["Content-Range"], "bytes 100-199/1000")
+        self.assertEqual(response.data, (bytes(range(250)) * 4)[100:200])
+        response.close()
+
+    def test_if_none_match(self):
+        """Test that a matching ETag returns 304 without a body."""
+        etag = self.get().headers["ETag"]
+        response = self.get({"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+    def test_api_key_checks(self):
+        """Test missing, invalid and foreign API keys, and the query parameter."""
+        self.assertEqual(self.client.get("/api/download/video.mp4").status_code, 401)
+        self.assertEqual(self.get(key="invalid").status_code, 401)
+        self.assertEqual(self.client.get(f"/api/download/video.mp4?api_key={API_KEY}&inline=1").status_code, 200)
+        with patch.object(api_key_manager, "validate_key", return_value=True):
+            self.assertEqual(self.get(key="someone-else").status_code, 403)
+
+    def test_owner_outlives_compacted_job(self):
+        """Test that a compacted job's file stays private and unknown files are refused."""
+        self.store.update_job("video", finished_at=1)
+        self.store.compact()
+        self.assertIsNone(self.store.get_job("video"))
+        with patch.object(api_key_manager, "validate_key", return_value=True):
+            self.assertEqual(self.get(key="someone-else").status_code, 403)
+            self.assertEqual(self.get().status_code, 200)
+            with open(os.path.join(self.temp_dir, "orphan.mp4"), "wb") as f:
+                f.write(b"x")
+            response = self.client.get("/api/download/orphan.mp4", headers={Config.API_KEY_HEADER: API_KEY})
+            self.assertEqual(response.status_code, 403)
+
+    def test_accel_redirect(self):
+        """Test that the transfer is handed to nginx when configured."""
+        with patch.object(Config, "DOWNLOAD_ACCEL_PREFIX", "/internal/videos/"):
+            response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Accel-Redirect"], "/internal/videos/video.mp4")
+        self.assertEqual(response.mimetype, "video/mp4")
+        self.assertEqual(response.data, b"")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Tests that the API process starts without the media libraries."""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from app.config import Config
+
+# Only render processes (and the ingest thread) need these
+RENDER_ONLY_MODULES = {
+    "librosa", "numba", "llvmlite", "matplotlib", "moviepy", "scipy", "numpy", "PIL", "imageio",
+    "supabase", "requests", "jsonschema",
+}
+# Wall-clock seconds allowed for importing application.py. Generous, so it
+# only catches a heavy import creeping back in, not a slow host
+IMPORT_BUDGET = 5.0
+# Slowest imports listed in the (informational) timing report
+REPORT_TOP = 10
+# Run in the child: time the import and list the loaded modules
+IMPORT_SCRIPT = (
+    "import json, sys, time; started = time.perf_counter(); import application; "
+    "print(json.dumps({'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}))"
+)
+
+
+def import_application():
+    """
+    Import the application in a fresh API process.
+
+    Returns:
+        Tuple[float, Set[str], Dict[str, float]]: Seconds the import took,
+        modules loaded afterwards, and the cumulative import time in seconds
+        of each one (from -X importtime)
+    """
+    temp_dir = tempfile.mkdtemp()
+    env = {
+        **os.environ,
+        "RENDER_WORKERS": "0",
+        "JOB_STORE_PATH": os.path.join(temp_dir, "jobs.sqlite3"),
+        "RATE_LIMIT_STORE_PATH": os.path.join(temp_dir, "ratelimit.sqlite3"),
+        "VIDEO_OUTPUT_DIR": os.path.join(temp_dir, "videos"),
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SCRIPT],
+        cwd=Config.ROOT_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise AssertionError(f"import application failed:\n{result.stderr[-2000:]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative) / 1e6
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return loaded["seconds"], set(loaded["modules"]), times
+
+
+class TestImportTime(unittest.TestCase):
+    """Test cases for what the API process imports."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Import the API once in a child process and report the slowest imports."""
+        cls.seconds, cls.modules, times = import_application()
+        # Per-module timings depend on the host and disk cache, so they are only reported
+        slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:REPORT_TOP]
+        sys.stderr.write(
+            "\nAPI import times (cumulative): "
+            + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in slowest) + "\n"
+        )
+
+    def test_render_libraries_are_not_imported(self):
+        """Test that serving the API imports no media or client libraries."""
+        loaded = {name.split(".")[0] for name in self.modules}
+        self.assertIn("application", loaded)
+        self.assertEqual(loaded & RENDER_ONLY_MODULES, set())
+
+    def test_application_imports_within_budget(self):
+        """Test that the API process imports in IMPORT_BUDGET seconds."""
+        self.assertLess(self.seconds, IMPORT_BUDGET)
+
+
+if __name__ == "__main__":
+    unittest.main()
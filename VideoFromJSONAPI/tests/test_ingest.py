@@ -0,0 +1,151 @@
+"""Tests for background ingest of uploaded assets."""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.utils import util_ingest
+from app.utils.util_ingest import AssetIngest
+from app.utils.util_job_store import JobStore
+from app.utils.util_uploads import UploadStore
+from PIL import Image
+
+HAS_FFMPEG = bool(shutil.which(Config.FFMPEG_BINARY) and shutil.which(Config.FFPROBE_BINARY))
+
+
+class TestAssetIngest(unittest.TestCase):
+    """Test cases for probing assets and preparing their renditions."""
+
+    def setUp(self):
+        """Create an upload store and an ingest queue in a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.uploads = UploadStore(self.store, root=self.temp_dir, asset_dir="assets", parts_dir="parts")
+        self.ingest = AssetIngest(self.store, root=self.temp_dir, rendition_dir="renditions")
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def store_asset(self, kind, filename, data):
+        upload_id = self.uploads.create("key", kind, filename, len(data))["upload_id"]
+        self.uploads.append(upload_id, "key", 0, io.BytesIO(data))
+        _, asset = self.uploads.complete(upload_id, "key")
+        self.ingest.enqueue(asset["asset_id"])
+        return asset
+
+    def image_bytes(self, size, fmt="JPEG"):
+        buffer = io.BytesIO()
+        Image.new("RGB", size, "red").save(buffer, format=fmt)
+        return buffer.getvalue()
+
+    def test_images_get_a_variant_per_output_resolution(self):
+        """Test that a large image is pre-scaled to fit each standard resolution."""
+        asset = self.store_asset("image", "photo.jpg", self.image_bytes((4000, 3000)))
+        self.assertEqual(self.ingest.get(asset["asset_id"])["status"], "pending")
+        self.assertTrue(self.ingest.ingest_next())
+        self.assertFalse(self.ingest.ingest_next())
+
+        record = self.ingest.get(asset["asset_id"])
+        self.assertEqual(record["status"], "ready")
+        self.assertEqual((record["probe"]["width"], record["probe"]["height"]), (4000, 3000))
+        sizes = [(v["width"], v["height"]) for v in record["renditions"]["images"]]
+        self.assertEqual(sizes, [(1080, 810), (1440, 1080)])
+        for variant in record["renditions"]["images"]:
+            with Image.open(os.path.join(self.temp_dir, variant["path"])) as image:
+                self.assertEqual((image.format, image.size), ("JPEG", (variant["width"], variant["height"])))
+
+    def test_small_images_are_used_as_is(self):
+        """Test that an image that fits every resolution gets no variants."""
+        asset = self.store_asset("image", "icon.png", self.image_bytes((640, 480), "PNG"))
+        self.ingest.ingest_next()
+        self.assertEqual(self.ingest.get(asset["asset_id"])["renditions"]["images"], [])
+
+    def test_renders_find_renditions_by_asset_path(self):
+        """Test the lookup renders use and the choice of image variant."""
+        asset = self.store_asset("image", "photo.jpg", self.image_bytes((4000, 3000)))
+        self.assertIsNone(self.ingest.lookup(asset["file_path"]))  # not ingested yet
+        self.ingest.ingest_next()
+
+        found = self.ingest.lookup("/" + asset["file_path"])
+        self.assertEqual(found["file"], os.path.join(self.temp_dir, asset["file_path"]))
+        self.assertTrue(found["renditions"]["images"][0]["path"].startswith(self.temp_dir))
+        self.assertTrue(AssetIngest.image_variant(found, (1000, 750)).endswith("image_1080x810.jpg"))
+        self.assertTrue(AssetIngest.image_variant(found, (1200, 900)).endswith("image_1440x1080.jpg"))
+        self.assertEqual(AssetIngest.image_variant(found, (2000, 1500)), found["file"])
+        self.assertIsNone(self.ingest.lookup("https://example.com/photo.jpg"))
+        self.assertIsNone(self.ingest.lookup("assets/elsewhere.jpg"))
+
+    def test_assets_stored_outside_root_dir(self):
+        """Test that absolute store and rendition directories (docker-compose) are found by renders."""
+        asset_dir = os.path.join(self.temp_dir, "data", "assets")
+        rendition_dir = os.path.join(self.temp_dir, "data", "renditions")
+        parts_dir = os.path.join(self.temp_dir, "parts")
+        uploads = UploadStore(self.store, root=Config.ROOT_DIR, asset_dir=asset_dir, parts_dir=parts_dir)
+        ingest = AssetIngest(self.store, root=Config.ROOT_DIR, rendition_dir=rendition_dir)
+        data = self.image_bytes((4000, 3000))
+        upload_id = uploads.create("key", "image", "photo.jpg", len(data))["upload_id"]
+        uploads.append(upload_id, "key", 0, io.BytesIO(data))
+        _, asset = uploads.complete(upload_id, "key")
+        ingest.enqueue(asset["asset_id"])
+        ingest.ingest_next()
+
+        with patch.object(Config, "ASSET_STORE_DIR", asset_dir):
+            self.assertEqual(util_ingest.local_asset_path(asset["file_path"]), asset["file_path"])
+            found = ingest.lookup(asset["file_path"])
+        self.assertEqual(found["file"], asset["file_path"])
+        self.assertTrue(os.path.isfile(found["renditions"]["images"][0]["path"]))
+
+    def test_failures_are_retried_then_given_up(self):
+        """Test that a failing ingest is retried after a delay and then marked failed."""
+        asset = self.store_asset("audio", "voice.mp3", b"not audio")
+        with patch.object(util_ingest, "probe_media", side_effect=RuntimeError("ffprobe failed")), \
+                patch.object(Config, "INGEST_RETRY_DELAY", 0):
+            for attempt in range(Config.INGEST_MAX_ATTEMPTS):
+                self.assertTrue(self.ingest.ingest_next())
+                # Leased again only once the retry delay has passed
+                self.ingest.store._connect().execute("UPDATE asset_ingest SET leased_until = 0")
+            self.assertFalse(self.ingest.ingest_next())
+        record = self.ingest.get(asset["asset_id"])
+        self.assertEqual((record["status"], record["attempts"]), ("failed", Config.INGEST_MAX_ATTEMPTS))
+        self.assertIn("ffprobe failed", record["error"])
+
+    def test_enqueue_is_idempotent(self):
+        """Test that a deduplicated upload does not ingest the asset again."""
+        data = self.image_bytes((4000, 3000))
+        asset = self.store_asset("image", "a.jpg", data)
+        self.ingest.ingest_next()
+        self.store_asset("image", "b.jpg", data)
+        self.assertFalse(self.ingest.ingest_next())
+        self.assertEqual(self.ingest.get(asset["asset_id"])["status"], "ready")
+
+    @unittest.skipUnless(HAS_FFMPEG, "ffmpeg is not installed")
+    def test_audio_is_decoded_to_flac_with_loudness(self):
+        """Test that audio is decoded at the mix rate and measured."""
+        with open(os.path.join(Config.ROOT_DIR, "tests/testfiles/audio/segment_1.mp3"), "rb") as f:
+            asset = self.store_asset("audio", "segment.mp3", f.read())
+        self.ingest.ingest_next()
+        pcm = self.ingest.get(asset["asset_id"])["renditions"]["pcm"]
+        probe = util_ingest.probe_media(os.path.join(self.temp_dir, pcm["path"]))
+        self.assertEqual((probe["audio_codec"], probe["sample_rate"]), ("flac", Config.INGEST_MIX_RATE))
+        self.assertAlmostEqual(pcm["duration"], probe["duration"])
+        self.assertLess(pcm["loudness"]["integrated"], 0)
+
+    @unittest.skipUnless(HAS_FFMPEG, "ffmpeg is not installed")
+    def test_videos_get_a_mezzanine_per_output_resolution(self):
+        """Test that pre/post-rolls are transcoded to the render's encoder settings."""
+        with open(os.path.join(Config.ROOT_DIR, "tests/testfiles/test_video.mp4"), "rb") as f:
+            asset = self.store_asset("video", "pre_roll.mp4", f.read())
+        self.ingest.ingest_next()
+        mezzanines = self.ingest.get(asset["asset_id"])["renditions"]["mezzanines"]
+        self.assertEqual(sorted(mezzanines), sorted(Config.INGEST_RESOLUTIONS))
+        probe = util_ingest.probe_media(os.path.join(self.temp_dir, mezzanines["1080x1920"]["path"]))
+        self.assertEqual((probe["width"], probe["height"], probe["video_codec"]), (1080, 1920, "h264"))
+        self.assertEqual((probe["frame_rate"], probe["audio_codec"]), (f"{Config.INGEST_MEZZANINE_FPS}/1", "aac"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Tests for the persistent job store."""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from app.utils.util_job_store import JobStore
+
+
+def _write_status(path, video_id):
+    """Update a job from a separate process."""
+    JobStore(path).set_status(video_id, "Completed")
+
+
+class TestJobStore(unittest.TestCase):
+    """Test cases for the SQLite job store."""
+
+    def setUp(self):
+        """Create a store in a fresh temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "jobs.sqlite3")
+        self.store = JobStore(self.path)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_create_and_get_job(self):
+        """Test that a created job can be read back with its owner."""
+        self.store.create_job("abc", api_key="key-1")
+        job = self.store.get_job("abc")
+        self.assertEqual(job["status"], "Processing")
+        self.assertEqual(job["api_key"], "key-1")
+        self.assertIsNone(job["finished_at"])
+
+    def test_terminal_status_sets_finished_at(self):
+        """Test that completing a job records when it finished."""
+        self.store.create_job("abc")
+        self.store.update_job("abc", status="Completed", output_path="static/videos/abc.mp4")
+        job = self.store.get_job("abc")
+        self.assertIsNotNone(job["finished_at"])
+        self.assertEqual(job["output_path"], "static/videos/abc.mp4")
+
+    def test_error_status_records_message(self):
+        """Test that 'Error: ...' statuses also populate the error field."""
+        self.store.create_job("abc")
+        self.store.set_status("abc", "Error: No valid segments.")
+        job = self.store.get_job("abc")
+        self.assertEqual(job["error"], "No valid segments.")
+        self.assertIsNotNone(job["finished_at"])
+
+    def test_progress_round_trip(self):
+        """Test that JSON fields are decoded on read."""
+        self.store.create_job("abc", progress={"stage": "encoding"})
+        self.assertEqual(self.store.get_job("abc")["progress"], {"stage": "encoding"})
+
+    def test_status_view(self):
+        """Test the dict-like view used by process_video."""
+        view = self.store.status_view()
+        view["abc"] = "Processing"
+        self.assertEqual(view["abc"], "Processing")
+        self.assertEqual(view.get("missing", "Unknown video ID"), "Unknown video ID")
+        self.assertIn("abc", view)
+        self.assertEqual(len(view), 1)
+        del view["abc"]
+        self.assertNotIn("abc", view)
+
+    def test_list_jobs_by_owner(self):
+        """Test listing jobs filtered by API key."""
+        self.store.create_job("a", api_key="key-1")
+        self.store.create_job("b", api_key="key-2")
+        jobs = self.store.list_jobs(api_key="key-1")
+        self.assertEqual([job["video_id"] for job in jobs], ["a"])
+
+    def test_compact_removes_expired_jobs(self):
+        """Test that compaction drops only old finished jobs."""
+        self.store.create_job("old")
+        self.store.create_job("running")
+        self.store.update_job("old", status="Completed", finished_at=time.time() - 100)
+        removed = self.store.compact(ttl_seconds=10)
+        self.assertEqual(removed, 1)
+        self.assertIsNone(self.store.get_job("old"))
+        self.assertIsNotNone(self.store.get_job("running"))
+
+    def test_persists_across_instances(self):
+        """Test that a new store instance (e.g. after restart) sees old jobs."""
+        self.store.create_job("abc")
+        self.assertEqual(JobStore(self.path).get_status("abc"), "Processing")
+
+    def test_visible_across_processes(self):
+        """Test that updates from another process are visible."""
+        self.store.create_job("abc")
+        process = multiprocessing.get_context("spawn").Process(
+            target=_write_status, args=(self.path, "abc")
+        )
+        process.start()
+        process.join(30)
+        self.assertEqual(self.store.get_status("abc"), "Completed")
+
+
+if __name__ == "__main__":
+    unittest.main()
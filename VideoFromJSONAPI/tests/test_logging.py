@@ -0,0 +1,127 @@
+"""Tests for queued, context-aware logging."""
+import io
+import json
+import logging
+import queue
+import threading
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.utils import util_logging
+from app.utils.util_logging import SAMPLED, QueueingHandler, log_context, setup_logging, shutdown_logging
+
+
+class TestLogging(unittest.TestCase):
+    """Test cases for the logging setup."""
+
+    def setUp(self):
+        """Route logging to a buffer, keeping the previous root handlers."""
+        root = logging.getLogger()
+        self.saved = (root.handlers[:], root.level)
+        self.stream = io.StringIO()
+        self.logger = logging.getLogger("tests.logging")
+
+    def tearDown(self):
+        """Stop the writer thread and restore the previous root handlers."""
+        shutdown_logging()
+        root = logging.getLogger()
+        root.handlers[:], level = self.saved
+        root.setLevel(level)
+
+    def lines(self):
+        shutdown_logging()
+        return self.stream.getvalue().splitlines()
+
+    def test_records_are_written_by_the_listener_thread(self):
+        """Test that records reach the stream from a thread other than the caller's."""
+        setup_logging("INFO", "json", self.stream)
+        writers = []
+        output = util_logging._listener.handlers[0]
+        original_emit = output.emit
+
+        def emit(record):
+            writers.append(threading.current_thread())
+            original_emit(record)
+
+        with patch.object(output, "emit", emit):
+            self.logger.info("rendered %s", "abc")
+            self.logger.debug("not shown")
+            (entry,) = [json.loads(line) for line in self.lines()]
+        self.assertEqual(entry["message"], "rendered abc")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertNotIn(threading.current_thread(), writers)
+
+    def test_disabled_levels_are_not_formatted(self):
+        """Test that arguments of filtered-out records are never converted to text."""
+        setup_logging("INFO", "text", self.stream)
+
+        class Expensive:
+            calls = 0
+
+            def __str__(self):
+                Expensive.calls += 1
+                return "expensive"
+
+        self.logger.debug("segment %s", Expensive())
+        self.logger.info("segment %s", Expensive())
+        self.assertEqual(self.lines()[0].split(" - ")[-1], "segment expensive")
+        self.assertEqual(Expensive.calls, 1)
+
+    def test_context_fields_are_attached(self):
+        """Test that context fields are added in text and JSON output."""
+        setup_logging("INFO", "json", self.stream)
+        with log_context(video_id="v1"):
+            with log_context(request_id="r1"):
+                self.logger.info("inner")
+            self.logger.info("outer")
+        self.logger.info("none")
+        entries = [json.loads(line) for line in self.lines()]
+        self.assertEqual(
+            [(entry.get("video_id"), entry.get("request_id")) for entry in entries],
+            [("v1", "r1"), ("v1", None), (None, None)],
+        )
+
+        self.stream = io.StringIO()
+        setup_logging("INFO", "text", self.stream)
+        with log_context(video_id="v1"):
+            self.logger.info("text")
+        self.assertTrue(self.lines()[0].endswith("text [video_id=v1]"))
+
+    def test_sampled_events_are_thinned_per_call_site(self):
+        """Test that 1 in N sampled records is kept for each call site."""
+        setup_logging("DEBUG", "json", self.stream)
+        with patch.object(Config, "LOG_DEBUG_SAMPLE_RATE", 10):
+            for i in range(25):
+                self.logger.debug("first %d", i, extra=SAMPLED)
+            for i in range(5):
+                self.logger.debug("second %d", i, extra=SAMPLED)
+            self.logger.debug("always", extra={"sample": 1})
+        entries = [json.loads(line) for line in self.lines()]
+        self.assertEqual(
+            [entry["message"] for entry in entries],
+            ["first 0", "first 10", "first 20", "second 0", "always"],
+        )
+        self.assertEqual(entries[0]["sampled"], 10)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test that the handler never waits for the writer."""
+        handler = QueueingHandler(queue.Queue(2))
+        for i in range(5):
+            handler.handle(logging.makeLogRecord({"msg": f"record {i}"}))
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_exceptions_are_logged_with_traceback(self):
+        """Test that tracebacks survive the trip through the queue."""
+        setup_logging("INFO", "json", self.stream)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            self.logger.exception("render failed")
+        (entry,) = [json.loads(line) for line in self.lines()]
+        self.assertIn("ValueError: boom", entry["exception"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Tests for memory-aware render admission."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.utils.util_job_store import JobStore
+from app.utils.util_memory import MB, MemoryModel, host_memory_budget, measure_peak_rss
+from app.utils.util_scheduler import FairShareScheduler
+
+HD = {"resolution": "1920x1080", "segments": [{}]}
+UHD = {"resolution": "3840x2160", "segments": [{}]}
+
+
+class TestMemoryModel(unittest.TestCase):
+    """Test cases for peak RSS prediction and calibration."""
+
+    def setUp(self):
+        """Create a temporary job store."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.model = MemoryModel(self.store)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_estimate_grows_with_plan(self):
+        """Test that resolution and audiograms raise the estimate."""
+        self.assertGreater(self.model.raw_estimate(UHD), self.model.raw_estimate(HD))
+        self.assertEqual(
+            self.model.raw_estimate({**HD, "audiogram": {"color": "white"}}) - self.model.raw_estimate(HD),
+            Config.MEMORY_AUDIOGRAM_MB * MB,
+        )
+
+    def test_calibration_from_measured_renders(self):
+        """Test that the estimate follows measured peak RSS."""
+        self.assertEqual(self.model.calibration(), 1.0)
+        for i in range(Config.MEMORY_CALIBRATION_MIN_SAMPLES):
+            self.store.create_job(f"video-{i}", status="Completed", finished_at=time.time())
+            self.store.update_job(f"video-{i}", payload=HD, peak_rss=2 * self.model.raw_estimate(HD))
+        self.model._factor = None
+        self.assertEqual(self.model.calibration(), 2.0)
+        self.assertEqual(self.model.estimate(UHD), 2 * self.model.raw_estimate(UHD))
+
+    def test_budget_and_measurement(self):
+        """Test the configured budget and the peak RSS measurement."""
+        with patch.object(Config, "RENDER_MEMORY_BUDGET_MB", 1024):
+            self.assertEqual(host_memory_budget(), 1024 * MB)
+        with patch.object(Config, "RENDER_MEMORY_BUDGET_MB", -1):
+            self.assertIsNone(host_memory_budget())
+        self.assertGreater(measure_peak_rss(), 0)
+
+
+class TestMemoryAdmission(unittest.TestCase):
+    """Test cases for scheduling within the host memory budget."""
+
+    def setUp(self):
+        """Create a scheduler with a 1000 MB budget on one host."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.scheduler = FairShareScheduler(self.store, workers=1)
+        self.scheduler._ensure_workers = lambda: None
+        self.scheduler.memory_budget = 1000 * MB
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def queue(self, video_id, memory_mb):
+        self.store.create_job(video_id, api_key=video_id)
+        self.scheduler.submit(video_id, "pro", {})
+        self.store.update_job(video_id, memory_estimate=memory_mb * MB)
+
+    def lease(self, host="host-a"):
+        job = self.store.lease_next_job("worker", self.scheduler.choose, host=host)
+        return job["video_id"] if job else None
+
+    def test_jobs_start_while_they_fit(self):
+        """Test that committed memory is tracked per host."""
+        self.queue("a", 600)
+        self.queue("b", 600)
+        self.assertEqual(self.lease(), "a")
+        self.assertIsNone(self.lease())
+        # Another host has its own budget
+        self.assertEqual(self.lease("host-b"), "b")
+
+    def test_small_jobs_backfill(self):
+        """Test that a smaller job starts next to a large one that does not fit."""
+        self.queue("running", 600)
+        self.queue("large", 800)
+        self.queue("small", 300)
+        self.assertEqual(self.lease(), "running")
+        self.assertEqual(self.lease(), "small")
+        self.store.release_job("running")
+        self.assertIsNone(self.lease())
+        self.store.release_job("small")
+        self.assertEqual(self.lease(), "large")
+
+    def test_backfill_stops_for_long_waiting_job(self):
+        """Test that a job waiting for memory is not overtaken forever."""
+        self.queue("running", 600)
+        self.queue("large", 800)
+        self.queue("small", 300)
+        self.lease()
+        self.store.update_job("large", enqueued_at=time.time() - Config.MEMORY_BACKFILL_MAX_WAIT - 1)
+        self.assertIsNone(self.lease())
+
+    def test_oversized_job_runs_alone(self):
+        """Test that a job larger than the budget starts on an idle host."""
+        self.queue("huge", 2000)
+        self.assertEqual(self.lease(), "huge")
+
+
+if __name__ == "__main__":
+    unittest.main()
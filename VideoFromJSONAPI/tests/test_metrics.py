@@ -0,0 +1,177 @@
+"""Tests for the metrics registry and the /api/metrics endpoint."""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.endpoints.metrics import metrics_bp
+from app.utils.util_job_store import JobStore
+from app.utils.util_metrics import MetricsRegistry, render_features
+from flask import Flask
+
+
+def make_registry(store, source):
+    """A registry with one metric of each kind, as a process would define them."""
+    registry = MetricsRegistry(store, source=source)
+    registry.requests = registry.counter("requests_total", "Requests.", ("route",))
+    registry.busy = registry.gauge("busy", "Busy workers.")
+    registry.latency = registry.histogram("latency_seconds", "Latency.", ("route",), buckets=[0.1, 1])
+    return registry
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test cases for recording, sharing and exposing metrics."""
+
+    def setUp(self):
+        """Create a job store in a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_threads_record_without_sharing_state(self):
+        """Test that samples recorded by many threads are all counted."""
+        registry = make_registry(self.store, "api:1")
+
+        def work():
+            for _ in range(1000):
+                registry.requests.inc(route="/api/health")
+                registry.latency.observe(0.05, route="/api/health")
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        registry.requests.inc(route="/api/health")  # this thread is still alive
+
+        samples = registry.collect()
+        self.assertEqual(samples["requests_total"][("/api/health",)], 8001)
+        self.assertEqual(samples["latency_seconds"][("/api/health",)][:3], [8000, 0, 0])
+        # Finished threads were folded into the process totals
+        self.assertEqual(len(registry._shards), 1)
+        self.assertEqual(registry.collect()["requests_total"][("/api/health",)], 8001)
+
+    def test_exposition_format(self):
+        """Test the Prometheus text output of each metric kind."""
+        registry = make_registry(self.store, "api:1")
+        registry.requests.inc(2, route='/a"b')
+        registry.busy.set(3)
+        for value in (0.05, 0.5, 5):
+            registry.latency.observe(value, route="/a")
+        text = registry.expose()
+        self.assertIn("# TYPE requests_total counter\n", text)
+        self.assertIn('requests_total{route="/a\\"b"} 2\n', text)
+        self.assertIn("busy 3\n", text)
+        self.assertIn("# TYPE latency_seconds histogram\n", text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 1\n', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1"} 2\n', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 3\n', text)
+        self.assertIn('latency_seconds_sum{route="/a"} 5.55\n', text)
+        self.assertIn('latency_seconds_count{route="/a"} 3\n', text)
+
+    def test_processes_are_summed(self):
+        """Test that a scrape includes every process sharing the job store."""
+        api, worker = make_registry(self.store, "api:1"), make_registry(self.store, "worker:2")
+        api.requests.inc(route="/a")
+        api.busy.set(1)
+        worker.requests.inc(4, route="/a")
+        worker.busy.set(2)
+        worker.flush()
+        samples = api.collect()
+        self.assertEqual(samples["requests_total"][("/a",)], 5)
+        self.assertEqual(samples["busy"][()], 3)
+
+    def test_exited_processes_keep_their_counts(self):
+        """Test that a render process's counters outlive it, but not its gauges."""
+        api, render = make_registry(self.store, "api:1"), make_registry(self.store, "render:2")
+        render.latency.observe(2, route="/a")
+        render.busy.set(1)
+        render.flush()
+        render.retire()
+        samples = api.collect()
+        self.assertEqual(samples["latency_seconds"][("/a",)], [0, 0, 1, 2.0])
+        self.assertNotIn((), samples["busy"])
+        # Values recorded after retiring are not counted twice
+        render.latency.observe(2, route="/a")
+        render.flush()
+        self.assertEqual(api.collect()["latency_seconds"][("/a",)], [0, 0, 2, 4.0])
+
+    def test_stale_processes_are_archived(self):
+        """Test that a killed process's row is archived without double counting."""
+        api, worker = make_registry(self.store, "api:1"), make_registry(self.store, "worker:2")
+        worker.requests.inc(3, route="/a")
+        worker.busy.set(2)
+        worker.flush()
+        self.store._connect().execute(
+            "UPDATE metric_snapshots SET updated_at = ? WHERE source = 'worker:2'",
+            (time.time() - Config.METRICS_STALE_AFTER - 1,),
+        )
+        samples = api.collect()
+        self.assertEqual(samples["requests_total"][("/a",)], 3)
+        self.assertNotIn((), samples["busy"])
+        # The worker was only paused: its next flush adds just the new requests
+        worker.requests.inc(route="/a")
+        worker.flush()
+        self.assertEqual(api.collect()["requests_total"][("/a",)], 4)
+
+    def test_cluster_gauges_are_set_per_scrape(self):
+        """Test that scrape hooks set cluster gauges and stale values are dropped."""
+        registry = make_registry(self.store, "api:1")
+        depth = registry.gauge("queue_depth", "Queued jobs.", ("plan",), cluster=True)
+        plans = {"free": 2, "pro": 1}
+        registry.on_scrape(lambda samples: [depth.set(n, plan=plan) for plan, n in plans.items()])
+        self.assertEqual(registry.collect()["queue_depth"], {("free",): 2, ("pro",): 1})
+        del plans["pro"]
+        self.assertEqual(registry.collect()["queue_depth"], {("free",): 2})
+        self.assertNotIn("queue_depth", self.store._connect().execute(
+            "SELECT data FROM metric_snapshots WHERE source = 'api:1'"
+        ).fetchone()["data"])
+
+    def test_render_features(self):
+        """Test the features label of render stage timings."""
+        self.assertEqual(render_features(False, "none", None, None, None), "none")
+        self.assertEqual(
+            render_features(True, "fade", {"color": "red"}, None, "/music.mp3"),
+            "zoom_pan+fade+audiogram+background_music",
+        )
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    """Test cases for GET /api/metrics."""
+
+    def setUp(self):
+        """Create a test client serving the metrics blueprint."""
+        app = Flask(__name__)
+        app.register_blueprint(metrics_bp, url_prefix="/api")
+        self.client = app.test_client()
+
+    def test_metrics_are_exposed(self):
+        """Test that the render and cache metrics are listed in text format."""
+        response = self.client.get("/api/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain; version=0.0.4"))
+        text = response.get_data(as_text=True)
+        for name in (
+            "http_request_duration_seconds", "render_queue_depth", "render_queue_wait_seconds",
+            "render_workers_busy", "render_stage_duration_seconds", "cache_requests_total",
+            "cache_bytes_total", "cache_hit_ratio", "ffmpeg_processes_total", "rate_limit_rejections_total",
+        ):
+            self.assertIn(f"# TYPE {name} ", text)
+
+    def test_token_is_required_when_configured(self):
+        """Test that METRICS_TOKEN protects the endpoint."""
+        with patch.object(Config, "METRICS_TOKEN", "secret"):
+            self.assertEqual(self.client.get("/api/metrics").status_code, 401)
+            response = self.client.get("/api/metrics", headers={"Authorization": "Bearer secret"})
+            self.assertEqual(response.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
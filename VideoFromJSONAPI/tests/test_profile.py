@@ -0,0 +1,186 @@
+"""Tests for on-demand render profiling."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.endpoints.profiles import profiles_bp
+from app.endpoints.status import job_status_payload
+from app.utils.util_job_store import JobStore, job_store
+from app.utils.util_profile import JobProfiler, SamplingProfiler, job_profiler
+from flask import Flask
+
+
+def make_frame(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def render(seconds):
+    make_frame(seconds)
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    """Test cases for the stack sampler."""
+
+    def test_hot_function_is_on_top(self):
+        """Test that a busy function dominates the samples and the collapsed stacks."""
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.start()
+        render(0.2)
+        profiler.stop()
+        self.assertGreater(profiler.samples, 10)
+        top = profiler.top()
+        self.assertTrue(top[0]["function"].startswith("make_frame (tests/test_profile.py:"))
+        self.assertGreater(top[0]["self_percent"], 50)
+        line = profiler.collapsed().splitlines()[0]
+        stack, count = line.rsplit(" ", 1)
+        self.assertIn("render (tests/test_profile.py:", stack.split(";")[-2])
+        self.assertGreater(int(count), 0)
+
+
+class TestJobProfiler(unittest.TestCase):
+    """Test cases for profile requests and profiled renders."""
+
+    def setUp(self):
+        """Create a job store and profile directory in a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.profiler = JobProfiler(self.store)
+        self.patch = patch.object(Config, "PROFILE_DIR", self.temp_dir)
+        self.patch.start()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.patch.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def job(self, video_id, **fields):
+        self.store.create_job(video_id, **fields)
+        return self.store.get_job(video_id)
+
+    def test_requests_match_the_next_jobs(self):
+        """Test that a request covers count matching jobs and ignores the others."""
+        request = self.profiler.arm(2, plan="pro", resolution="1920x1080")
+        self.assertIsNone(self.profiler.claim(self.job("free-1", plan="free"), resolution="1920x1080"))
+        self.assertIsNone(self.profiler.claim(self.job("pro-720", plan="pro"), resolution="1280x720"))
+        claimed = self.profiler.claim(self.job("pro-1", plan="pro"), resolution="1920x1080")
+        self.assertEqual(claimed, {"request_id": request["request_id"], "mode": "sampling"})
+        self.assertEqual(self.store.get_job("pro-1")["profile"]["status"], "running")
+        self.assertIsNotNone(self.profiler.claim(self.job("pro-2", plan="pro"), resolution="1920x1080"))
+        self.assertIsNone(self.profiler.claim(self.job("pro-3", plan="pro"), resolution="1920x1080"))
+        self.assertEqual(self.profiler.pending(), [])
+
+    def test_retried_job_keeps_its_claim(self):
+        """Test that a job rendered again is profiled again without using up the request."""
+        self.profiler.arm(1, mode="cprofile")
+        self.profiler.claim(self.job("job-1"))
+        claimed = self.profiler.claim(self.store.get_job("job-1"))
+        self.assertEqual(claimed["mode"], "cprofile")
+        self.assertIsNone(self.profiler.claim(self.job("job-2")))
+
+    def test_expired_and_cancelled_requests(self):
+        """Test that expired or cancelled requests match nothing."""
+        self.profiler.arm(1, ttl=-1)
+        request = self.profiler.arm(1)
+        self.assertTrue(self.profiler.cancel(request["request_id"]))
+        self.assertFalse(self.profiler.cancel(request["request_id"]))
+        self.assertIsNone(self.profiler.claim(self.job("job-1")))
+
+    def test_profiled_render_is_saved(self):
+        """Test the files and job summary of sampling and cProfile renders."""
+        for mode in ("sampling", "cprofile"):
+            video_id = f"job-{mode}"
+            self.profiler.arm(1, mode=mode)
+            claimed = self.profiler.claim(self.job(video_id))
+            with patch.object(Config, "PROFILE_SAMPLE_INTERVAL", 0.001):
+                with self.profiler.profile(video_id, claimed):
+                    render(0.1)
+            summary = self.store.get_job(video_id)["profile"]
+            self.assertEqual(summary["status"], "done")
+            self.assertEqual(summary["output"], f"/api/jobs/{video_id}/profile")
+            self.assertIn("make_frame", {entry["function"].split(" ")[0] for entry in summary["top"]})
+            self.assertLessEqual(len(summary["top"]), Config.PROFILE_TOP_FUNCTIONS)
+            self.assertTrue(os.path.exists(self.profiler.output_path(video_id, mode)))
+            self.assertEqual(job_status_payload(self.store.get_job(video_id))["profile"], summary)
+
+    def test_unclaimed_render_is_not_profiled(self):
+        """Test that a job without a claim runs unprofiled."""
+        self.job("job-1")
+        with self.profiler.profile("job-1", None):
+            render(0)
+        self.assertIsNone(self.store.get_job("job-1")["profile"])
+        self.assertNotIn("profile", job_status_payload(self.store.get_job("job-1")))
+
+
+class TestProfilesEndpoint(unittest.TestCase):
+    """Test cases for the /api/profiles admin endpoints."""
+
+    def setUp(self):
+        """Create a test client and an admin token."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.patches = [
+            patch.object(Config, "ADMIN_TOKEN", "admin-secret"),
+            patch.object(Config, "PROFILE_DIR", self.temp_dir),
+        ]
+        for p in self.patches:
+            p.start()
+        app = Flask(__name__)
+        app.register_blueprint(profiles_bp, url_prefix="/api")
+        self.client = app.test_client()
+        self.headers = {"Authorization": "Bearer admin-secret"}
+
+    def tearDown(self):
+        """Cancel the requests armed by the test and remove the temporary directory."""
+        for request in job_profiler.pending():
+            job_profiler.cancel(request["request_id"])
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def test_admin_token_is_required(self):
+        """Test that the endpoints need ADMIN_TOKEN and are off without one."""
+        self.assertEqual(self.client.get("/api/profiles").status_code, 401)
+        response = self.client.get("/api/profiles", headers={"Authorization": "Bearer wrong"})
+        self.assertEqual(response.status_code, 401)
+        with patch.object(Config, "ADMIN_TOKEN", ""):
+            self.assertEqual(self.client.get("/api/profiles", headers=self.headers).status_code, 403)
+
+    def test_arm_list_and_cancel(self):
+        """Test the life cycle of a profile request."""
+        response = self.client.post("/api/profiles", json={"count": 3, "plan": "pro"}, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        request_id = response.get_json()["request_id"]
+        listed = self.client.get("/api/profiles", headers=self.headers).get_json()["profiles"]
+        self.assertEqual([(r["request_id"], r["remaining"], r["plan"]) for r in listed], [(request_id, 3, "pro")])
+        self.assertEqual(self.client.delete(f"/api/profiles/{request_id}", headers=self.headers).status_code, 200)
+        self.assertEqual(self.client.delete(f"/api/profiles/{request_id}", headers=self.headers).status_code, 404)
+
+    def test_invalid_requests(self):
+        """Test that bad counts, modes and filters are rejected."""
+        for body in ({"count": 0}, {"count": Config.PROFILE_MAX_JOBS + 1}, {"count": "2"},
+                     {"mode": "perf"}, {"plan": 3}, {"ttl": 0}):
+            response = self.client.post("/api/profiles", json=body, headers=self.headers)
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_job_profile_download(self):
+        """Test downloading the collapsed stacks of a profiled job."""
+        video_id = f"profiled-{time.time_ns()}"
+        job_store.create_job(video_id)
+        self.assertEqual(self.client.get(f"/api/jobs/{video_id}/profile", headers=self.headers).status_code, 404)
+        job_profiler.arm(1, api_key=f"key-{video_id}")
+        claimed = job_profiler.claim({**job_store.get_job(video_id), "api_key": f"key-{video_id}"})
+        with job_profiler.profile(video_id, claimed):
+            render(0.05)
+        response = self.client.get(f"/api/jobs/{video_id}/profile", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("make_frame", response.get_data(as_text=True))
+        response.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
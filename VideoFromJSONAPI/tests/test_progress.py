@@ -0,0 +1,140 @@
+"""Tests for render progress reporting."""
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.endpoints.status import poll_interval_hint, status_bp
+from app.utils.util_job_store import JobStore
+from app.utils.util_progress import JobProgress, RenderProgressLogger
+from flask import Flask
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestJobProgress(unittest.TestCase):
+    """Test cases for JobProgress."""
+
+    def setUp(self):
+        """Create a tracker that records what it publishes."""
+        self.clock = FakeClock()
+        self.published = []
+        self.progress = JobProgress(
+            "video", lambda vid, state: self.published.append(state), clock=self.clock
+        )
+
+    def test_stages_and_segments(self):
+        """Test that stage changes are published with segment counts."""
+        self.progress.stage("downloading", segments_total=2)
+        self.clock.now += 1
+        self.progress.stage("analysing")
+        self.progress.segment_done()
+        self.assertEqual(self.published[-1]["stage"], "analysing")
+        self.assertEqual(self.published[-1]["timings"], {"downloading": 1.0})
+        self.assertEqual(self.progress.state["segments_done"], 1)
+        self.assertEqual(self.progress.state["percent"], 7.5)
+
+    def test_frames_fps_and_eta(self):
+        """Test that encoded frames produce a smoothed fps and an ETA."""
+        self.progress.stage("encoding", frames_total=240)
+        self.progress.frames(1, 240)
+        self.clock.now += 1
+        self.progress.frames(25, 240)
+        self.assertEqual(self.progress.state["fps"], 24.0)
+        self.assertEqual(self.progress.state["eta_seconds"], 9.0)
+        self.clock.now += 1
+        self.progress.frames(61, 240)
+        # 0.3 * 36 + 0.7 * 24
+        self.assertEqual(self.progress.state["fps"], 27.6)
+        self.assertEqual(self.published[-1]["frames_done"], 61)
+
+    def test_writes_are_throttled(self):
+        """Test that frame updates inside the interval are not published."""
+        self.progress.stage("encoding")
+        count = len(self.published)
+        for frame in range(1, 50):
+            self.progress.frames(frame, 240)
+        self.assertEqual(len(self.published), count)
+        self.clock.now += Config.PROGRESS_UPDATE_INTERVAL
+        self.progress.frames(50, 240)
+        self.assertEqual(len(self.published), count + 1)
+
+    def test_last_frame_switches_to_muxing_and_finish(self):
+        """Test the final stages of a render."""
+        self.progress.stage("encoding")
+        self.progress.frames(240, 240)
+        self.assertEqual(self.published[-1]["stage"], "muxing")
+        self.progress.finish()
+        self.assertEqual(self.published[-1]["stage"], "done")
+        self.assertEqual(self.published[-1]["percent"], 100.0)
+        self.assertIn("muxing", self.published[-1]["timings"])
+
+    def test_publish_errors_are_ignored(self):
+        """Test that a failing job store write does not break the render."""
+        progress = JobProgress("video", lambda vid, state: 1 / 0)
+        progress.stage("downloading")
+
+    def test_moviepy_logger_feeds_frames(self):
+        """Test that moviepy's frame bar is forwarded to the tracker."""
+        proglog = RenderProgressLogger(self.progress)
+        for index in proglog.iter_bar(t=range(48)):
+            pass
+        self.assertEqual(self.progress.state["frames_done"], 48)
+        self.assertEqual(self.progress.state["frames_total"], 48)
+        self.assertEqual(self.progress.state["stage"], "muxing")
+        self.assertEqual(proglog.logs, [])
+
+
+class TestStatusProgress(unittest.TestCase):
+    """Test cases for progress in the status endpoint."""
+
+    def setUp(self):
+        """Create a client backed by a temporary job store."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        patcher = patch("app.endpoints.status.job_store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app = Flask(__name__)
+        app.register_blueprint(status_bp, url_prefix="/api")
+        self.client = app.test_client()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_status_includes_progress_and_retry_after(self):
+        """Test that a rendering job reports progress and a polling hint."""
+        self.store.create_job("video", api_key="key")
+        self.store.update_job("video", progress={"stage": "encoding", "eta_seconds": 60.0})
+        response = self.client.get("/api/status/video")
+        self.assertEqual(response.get_json()["progress"]["stage"], "encoding")
+        self.assertEqual(response.headers["Retry-After"], "15")
+
+    def test_finished_job_has_no_retry_after(self):
+        """Test that finished jobs do not ask the client to poll again."""
+        self.store.create_job("video", api_key="key")
+        self.store.set_status("video", "Completed")
+        response = self.client.get("/api/status/video")
+        self.assertNotIn("Retry-After", response.headers)
+
+    def test_poll_interval_bounds(self):
+        """Test that the polling hint stays within the configured bounds."""
+        job = {"status": "Processing", "progress": {"eta_seconds": 1}}
+        self.assertEqual(poll_interval_hint(job), Config.STATUS_POLL_MIN_SECONDS)
+        job["progress"]["eta_seconds"] = 3600
+        self.assertEqual(poll_interval_hint(job), Config.STATUS_POLL_MAX_SECONDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
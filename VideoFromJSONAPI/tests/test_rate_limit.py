@@ -1,10 +1,25 @@
 """Tests for rate limiting system."""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
 import unittest
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from unittest.mock import MagicMock, patch
 
 from app.config import Config
-from app.utils.util_rate_limit import RateLimiter
+from app.utils.util_credits import CreditLedger
+from app.utils.util_job_store import JobStore
+from app.utils.util_rate_limit import MemoryRateStore, RateLimiter, SQLiteRateStore
+
+
+def _take_slots(path, count, results):
+    """Make ``count`` requests from a separate process and report the allowed ones."""
+    Config.RATE_LIMIT_REQUESTS = 10
+    limiter = RateLimiter(SQLiteRateStore(path))
+    results.put(sum(limiter.check_rate_limit("shared")[0] for _ in range(count)))
 
 
 class TestRateLimiter(unittest.TestCase):
@@ -12,13 +27,25 @@ class TestRateLimiter(unittest.TestCase):
 
     def setUp(self):
         """Set up test environment."""
-        self.rate_limiter = RateLimiter()
+        self.rate_limiter = RateLimiter(MemoryRateStore())
         self.test_api_key = "test_key_123"
         self.test_api_key2 = "test_key_456"
         
-        # Reset rate limiter state
-        self.rate_limiter._request_times = {}
-        self.rate_limiter._credits = {}
+        # Credits go to a private ledger
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        self.ledger = CreditLedger(JobStore(os.path.join(temp_dir, "jobs.sqlite3")))
+        ledger_patch = patch("app.utils.util_rate_limit.credit_ledger", self.ledger)
+        ledger_patch.start()
+        self.addCleanup(ledger_patch.stop)
+
+        # Rate limit tests run against a 60 requests per minute plan
+        for p in (
+            patch.dict(Config.API_KEYS, {self.test_api_key: {"plan": "starter"}}),
+            patch.dict(Config.API_PLANS, {"starter": {**Config.API_PLANS["starter"], "rate_limit": 60}}),
+        ):
+            p.start()
+            self.addCleanup(p.stop)
 
     def test_rate_limit_basic(self):
         """Test basic rate limiting functionality."""
@@ -49,8 +76,6 @@ class TestRateLimiter(unittest.TestCase):
         Config.API_KEYS[self.test_api_key] = {
             "name": "Test Key",
             "plan": "free",
-            "credits_used": 0,
-            "credits_reset": (datetime.now() + timedelta(days=30)).isoformat(),
             "is_active": True
         }
         
@@ -66,14 +91,13 @@ class TestRateLimiter(unittest.TestCase):
 
     def test_credits_monthly_reset(self):
         """Test credit reset after monthly period."""
-        # Set up API key with expired reset date
+        # Set up API key that used all its credits last month
         Config.API_KEYS[self.test_api_key] = {
             "name": "Test Key",
             "plan": "free",
-            "credits_used": 10,
-            "credits_reset": (datetime.now() - timedelta(days=1)).isoformat(),
             "is_active": True
         }
+        self.ledger.adjust(self.test_api_key, 10, at=time.time() - 31 * 24 * 3600)
         
         # Credits should be reset
         has_credits, _ = self.rate_limiter.check_credits(self.test_api_key)
@@ -90,10 +114,9 @@ class TestRateLimiter(unittest.TestCase):
         Config.API_KEYS[self.test_api_key] = {
             "name": "Test Key",
             "plan": "starter",
-            "credits_used": 30,
-            "credits_reset": (datetime.now() + timedelta(days=30)).isoformat(),
             "is_active": True
         }
+        self.ledger.adjust(self.test_api_key, 30)
         
         credit_info = self.rate_limiter.get_credit_info(self.test_api_key)
         self.assertEqual(credit_info["plan"], "Starter")
@@ -112,8 +135,6 @@ class TestRateLimiter(unittest.TestCase):
         Config.API_KEYS[self.test_api_key] = {
             "name": "Test Key",
             "plan": "invalid_plan",
-            "credits_used": 0,
-            "credits_reset": (datetime.now() + timedelta(days=30)).isoformat(),
             "is_active": True
         }
         
@@ -138,6 +159,61 @@ class TestRateLimiter(unittest.TestCase):
             allowed, _ = self.rate_limiter.check_rate_limit(self.test_api_key)
             self.assertFalse(allowed)
 
+    def test_per_plan_limits(self):
+        """Test that each key gets the rate limit of its plan, separately."""
+        unplanned = "test_key_without_plan"
+        with patch.dict(Config.API_KEYS, {self.test_api_key2: {"plan": "pro"}}), \
+                patch.dict(Config.API_PLANS, {"pro": {**Config.API_PLANS["pro"], "rate_limit": 3}}), \
+                patch.object(Config, "RATE_LIMIT_REQUESTS", 2):
+            self.assertEqual(self.rate_limiter.limit_for(self.test_api_key2), 3)
+            self.assertEqual(self.rate_limiter.get_credit_info(self.test_api_key2)["rate_limit"], 3)
+            allowed = [self.rate_limiter.check_rate_limit(self.test_api_key2)[0] for _ in range(4)]
+            self.assertEqual(allowed, [True, True, True, False])
+            allowed = [self.rate_limiter.check_rate_limit(unplanned)[0] for _ in range(3)]
+            self.assertEqual(allowed, [True, True, False])
+            self.assertTrue(self.rate_limiter.check_rate_limit(self.test_api_key)[0])
+
+    def test_requests_refill_gradually(self):
+        """Test that a spent burst earns back one request per period / limit."""
+        with patch("time.time", return_value=1000.0) as mock_time:
+            for _ in range(60):
+                self.rate_limiter.check_rate_limit(self.test_api_key)
+            self.assertFalse(self.rate_limiter.check_rate_limit(self.test_api_key)[0])
+            mock_time.return_value = 1001.0
+            self.assertTrue(self.rate_limiter.check_rate_limit(self.test_api_key)[0])
+            self.assertFalse(self.rate_limiter.check_rate_limit(self.test_api_key)[0])
+
+    def test_threads_never_exceed_limit(self):
+        """Test that concurrent threads on one key are allowed exactly the limit."""
+        allowed = []
+
+        def worker():
+            allowed.extend(self.rate_limiter.check_rate_limit(self.test_api_key)[0] for _ in range(20))
+
+        with patch("time.time", return_value=1000.0):
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(sum(allowed), 60)
+
+    def test_sqlite_store_is_shared_across_processes(self):
+        """Test that processes sharing the SQLite store share one limit."""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, "ratelimit.sqlite3")
+        SQLiteRateStore(path)
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        processes = [context.Process(target=_take_slots, args=(path, 10, results)) for _ in range(3)]
+        for process in processes:
+            process.start()
+        counts = [results.get(timeout=60) for _ in processes]
+        for process in processes:
+            process.join()
+        self.assertEqual(sum(counts), 10)
+
     def test_credit_info_all_plans(self):
         """Test credit information for all subscription plans."""
         plans = ["free", "starter", "creator", "pro"]
@@ -152,8 +228,6 @@ class TestRateLimiter(unittest.TestCase):
             Config.API_KEYS[self.test_api_key] = {
                 "name": f"Test Key {plan}",
                 "plan": plan,
-                "credits_used": 0,
-                "credits_reset": (datetime.now() + timedelta(days=30)).isoformat(),
                 "is_active": True
             }
             
@@ -0,0 +1,89 @@
+"""Tests for plan-weighted fair-share scheduling."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from app.config import Config
+from app.utils.util_job_store import JobStore
+from app.utils.util_scheduler import FairShareScheduler
+
+
+class TestFairShareScheduler(unittest.TestCase):
+    """Test cases for the render scheduler."""
+
+    def setUp(self):
+        """Create a scheduler over a fresh job store without starting workers."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.scheduler = FairShareScheduler(self.store, workers=1)
+        self.scheduler._ensure_workers = lambda: None
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def queue(self, video_id, api_key, plan):
+        self.store.create_job(video_id, api_key=api_key)
+        self.scheduler.submit(video_id, plan, {"segments": []})
+
+    def lease(self):
+        job = self.store.lease_next_job("test-worker", self.scheduler.choose)
+        return job["video_id"] if job else None
+
+    def test_heavier_plan_overtakes_backlog(self):
+        """Test that a pro job does not wait behind a free-tier burst."""
+        for i in range(5):
+            self.queue(f"free-{i}", "free-key", "free")
+        self.queue("pro-0", "pro-key", "pro")
+        self.assertEqual(self.lease(), "pro-0")
+        self.assertEqual(self.lease(), "free-0")
+
+    def test_weighted_share(self):
+        """Test that owners are served in proportion to their plan weight."""
+        for i in range(8):
+            self.queue(f"free-{i}", "free-key", "free")
+            self.queue(f"creator-{i}", "creator-key", "creator")
+        order = []
+        for _ in range(10):
+            video_id = self.lease()
+            order.append(video_id)
+            self.store.release_job(video_id)
+        creator_jobs = len([v for v in order if v.startswith("creator")])
+        self.assertEqual(creator_jobs, 8)
+
+    def test_concurrency_cap(self):
+        """Test that a key cannot hold more workers than its plan allows."""
+        self.queue("free-0", "free-key", "free")
+        self.queue("free-1", "free-key", "free")
+        self.assertEqual(self.lease(), "free-0")
+        # Free plan allows a single running job
+        self.assertIsNone(self.lease())
+        self.store.release_job("free-0")
+        self.assertEqual(self.lease(), "free-1")
+
+    def test_aging_prevents_starvation(self):
+        """Test that a long-waiting job beats a fresher job with a lower tag."""
+        now = time.time()
+        candidates = [
+            {"video_id": "new", "api_key": "a", "plan": "pro", "fair_tag": 1.0, "enqueued_at": now},
+            {"video_id": "old", "api_key": "b", "plan": "free", "fair_tag": 3.0,
+             "enqueued_at": now - 3 / Config.SCHEDULER_AGING_RATE},
+        ]
+        self.assertEqual(self.scheduler.choose(candidates, {}, now=now)["video_id"], "old")
+
+    def test_queue_metrics_per_plan(self):
+        """Test that queue depth and wait times are reported per plan."""
+        self.queue("free-0", "free-key", "free")
+        self.queue("pro-0", "pro-key", "pro")
+        self.lease()
+        metrics = self.scheduler.get_metrics()
+        self.assertEqual(metrics["free"]["queued"], 1)
+        self.assertEqual(metrics["pro"]["running"], 1)
+        self.assertEqual(metrics["pro"]["started"], 1)
+        self.assertGreaterEqual(metrics["pro"]["avg_wait"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
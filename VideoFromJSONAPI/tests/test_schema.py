@@ -0,0 +1,89 @@
+"""Tests for the creation body schema."""
+import glob
+import json
+import os
+import re
+import unittest
+
+from app.config import Config
+from app.endpoints.creation import parse_creation_body
+from app.utils.util_schema import CREATION_SCHEMA, CREATION_SCHEMA_VERSION, validate_creation_body
+
+
+def segment(i=1, **extra):
+    return {"imageUrl": f"https://example.com/{i}.png", "audioUrl": f"https://example.com/{i}.mp3", **extra}
+
+
+class TestCreationSchema(unittest.TestCase):
+    """Test cases for validating creation request bodies."""
+
+    def test_documented_bodies_are_valid(self):
+        """Test that the documented examples and test fixtures pass."""
+        self.assertEqual(validate_creation_body({"segments": [segment()]}), [])
+        self.assertEqual(validate_creation_body({
+            "segments": [segment(1, volume=0.8, duration=5, zoom_pan={"enabled": True})],
+            "zoom_pan": True,
+            "fade_effect": "wipeleft",
+            "audiogram": {"enabled": True, "size": "640x480", "gamma": 1.5, "opacity": 0.7},
+            "watermark": {"text": "Sample Watermark", "opacity": 0.5},
+            "background_music": "https://example.com/background_music.mp3",
+            "background_volume": 0.3,
+            "resolution": "1280x720",
+            "thumbnail": True,
+            "text_overlay": {"text": "Sample Text"},
+            "filter": {"filter_type": "grayscale"},
+            "use_local_files": True,
+            "social_preset": "tiktok",
+            "webhook": {"url": "https://example.com/hooks/video", "secret": "s", "batch": False},
+        }), [])
+        with open(os.path.join(os.path.dirname(__file__), "testfiles", "timing_test.json")) as f:
+            self.assertEqual(validate_creation_body(json.load(f)["body"]), [])
+
+    def test_shipped_templates_and_example_are_accepted(self):
+        """Test that the video templates and the Web app's example body pass the endpoint's checks."""
+        repo_dir = os.path.dirname(Config.ROOT_DIR)
+        paths = sorted(glob.glob(os.path.join(repo_dir, "video_templates", "*", "*.json")))
+        self.assertTrue(paths)
+        for path in paths:
+            with open(path) as f:
+                body = json.load(f)
+            # Style-only templates are combined with the caller's segments
+            body.setdefault("segments", [segment()])
+            self.assertEqual(parse_creation_body(body)[1], None, path)
+        with open(os.path.join(repo_dir, "VideoFromJSONWeb", "templates", "creation.html")) as f:
+            example = re.search(r"<h2>Example JSON</h2>\s*<pre>(.*?)</pre>", f.read(), re.S).group(1)
+        self.assertEqual(parse_creation_body(json.loads(example))[1], None)
+
+    def test_all_errors_are_reported(self):
+        """Test that one call lists every problem with its location."""
+        errors = validate_creation_body({
+            "segments": [segment(1), {"imageUrl": "https://example.com/2.png", "volume": "loud"}],
+            "fade_effect": "sparkle",
+            "resolution": "big",
+            "zoompan": True,
+        })
+        self.assertEqual([error["path"] for error in errors], [
+            "/", "/fade_effect", "/resolution", "/segments/1", "/segments/1/volume",
+        ])
+        self.assertIn("zoompan", errors[0]["message"])
+        self.assertEqual(errors[1]["message"], "'sparkle' is not an allowed value")
+
+    def test_segment_count_follows_config(self):
+        """Test that segment counts outside the configured range are rejected."""
+        self.assertEqual(validate_creation_body({"segments": []})[0]["path"], "/segments")
+        too_many = {"segments": [segment(i) for i in range(Config.MAX_SEGMENTS + 1)]}
+        self.assertEqual(len(validate_creation_body(too_many)), 1)
+
+    def test_error_count_is_bounded(self):
+        """Test that a body with many problems lists at most the configured number."""
+        body = {"segments": ["not a segment"] * (Config.MAX_VALIDATION_ERRORS * 2)}
+        self.assertEqual(len(validate_creation_body(body)), Config.MAX_VALIDATION_ERRORS)
+
+    def test_schema_is_versioned(self):
+        """Test that the schema identifies its version."""
+        self.assertTrue(CREATION_SCHEMA["$id"].endswith(f"v{CREATION_SCHEMA_VERSION}"))
+        self.assertEqual(CREATION_SCHEMA["properties"]["fade_effect"]["enum"], sorted(Config.ALLOWED_FADE_EFFECTS))
+
+
+if __name__ == "__main__":
+    unittest.main()
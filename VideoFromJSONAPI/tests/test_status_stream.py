@@ -0,0 +1,166 @@
+"""Tests for long-polling and Server-Sent Events status updates."""
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from app.endpoints.status import status_bp
+from app.utils.util_job_store import JobStore
+from flask import Flask
+
+
+def _update_later(store_path, video_id, delay):
+    """Write a status change from another process, like a render child does."""
+    time.sleep(delay)
+    JobStore(store_path).update_job(video_id, progress={"stage": "encoding"})
+
+
+class TestWaitForUpdate(unittest.TestCase):
+    """Test cases for JobStore.wait_for_update."""
+
+    def setUp(self):
+        """Create a temporary job store with one job."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "jobs.sqlite3")
+        self.store = JobStore(self.path)
+        self.store.create_job("video", api_key="key")
+        self.since = self.store.get_job("video")["updated_at"]
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_returns_immediately_when_already_changed(self):
+        """Test that a change the caller has not seen is returned at once."""
+        start = time.monotonic()
+        job = self.store.wait_for_update("video", self.since - 1, timeout=5)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(job["video_id"], "video")
+
+    def test_times_out_without_change(self):
+        """Test that the wait ends after the timeout."""
+        start = time.monotonic()
+        job = self.store.wait_for_update("video", self.since, timeout=0.5)
+        self.assertGreaterEqual(time.monotonic() - start, 0.5)
+        self.assertEqual(job["updated_at"], self.since)
+
+    def test_wakes_on_write_from_another_thread(self):
+        """Test that a write in this process wakes the waiter."""
+        threading.Timer(0.2, lambda: self.store.set_status("video", "Completed")).start()
+        start = time.monotonic()
+        job = self.store.wait_for_update("video", self.since, timeout=10)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(job["status"], "Completed")
+
+    def test_wakes_on_write_from_another_process(self):
+        """Test that a write from a different process wakes the waiter."""
+        process = multiprocessing.get_context("spawn").Process(
+            target=_update_later, args=(self.path, "video", 0.2)
+        )
+        process.start()
+        try:
+            job = self.store.wait_for_update("video", self.since, timeout=30)
+            self.assertEqual(job["progress"], {"stage": "encoding"})
+        finally:
+            process.join()
+
+    def test_unknown_job(self):
+        """Test that waiting for an unknown job returns None."""
+        self.assertIsNone(self.store.wait_for_update("missing", 0, timeout=0.1))
+
+
+class TestStatusStreaming(unittest.TestCase):
+    """Test cases for ?wait= and /status/<id>/events."""
+
+    def setUp(self):
+        """Create a client backed by a temporary job store."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        patcher = patch("app.endpoints.status.job_store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        app = Flask(__name__)
+        app.register_blueprint(status_bp, url_prefix="/api")
+        self.client = app.test_client()
+        self.store.create_job("video", api_key="key")
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_long_poll_returns_on_change(self):
+        """Test that ?wait= blocks until the status changes."""
+        threading.Timer(0.2, lambda: self.store.set_status("video", "Completed")).start()
+        start = time.monotonic()
+        response = self.client.get("/api/status/video?wait=10")
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(response.get_json()["status"], "Completed")
+
+    def test_long_poll_timeout_returns_current_status(self):
+        """Test that ?wait= answers with the unchanged status on timeout."""
+        response = self.client.get("/api/status/video?wait=0.3")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["status"], "Processing")
+
+    def test_invalid_wait(self):
+        """Test that a non-numeric or non-finite wait is rejected."""
+        for wait in ("soon", "nan", "inf", "-inf"):
+            self.assertEqual(self.client.get(f"/api/status/video?wait={wait}").status_code, 400, wait)
+        self.assertEqual(self.client.get("/api/status/video?wait=1&since=nan").status_code, 400)
+
+    def test_events_stream_until_finished(self):
+        """Test that the event stream sends each change and ends with the job."""
+        def finish():
+            self.store.update_job("video", progress={"stage": "encoding", "percent": 50.0})
+            time.sleep(0.1)
+            self.store.set_status("video", "Completed")
+
+        threading.Timer(0.2, finish).start()
+        response = self.client.get("/api/status/video/events")
+        self.assertEqual(response.mimetype, "text/event-stream")
+        events = [
+            json.loads(line[len("data: "):])
+            for line in response.get_data(as_text=True).splitlines()
+            if line.startswith("data: ")
+        ]
+        self.assertEqual(events[0]["status"], "Processing")
+        self.assertEqual(events[-1]["status"], "Completed")
+        self.assertIn({"stage": "encoding", "percent": 50.0}, [e.get("progress") for e in events])
+
+    def test_waiters_are_capped(self):
+        """Test that long polls answer at once and streams are refused when every slot is taken."""
+        with patch("app.endpoints.status._waiters", threading.BoundedSemaphore(1)) as waiters:
+            waiters.acquire()
+            start = time.monotonic()
+            response = self.client.get("/api/status/video?wait=10")
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertEqual(response.get_json()["status"], "Processing")
+            response = self.client.get("/api/status/video/events")
+            self.assertEqual(response.status_code, 503)
+            self.assertIn("Retry-After", response.headers)
+            waiters.release()
+            # A finished stream gives its slot back
+            self.store.set_status("video", "Completed")
+            self.client.get("/api/status/video/events").close()
+            self.assertTrue(waiters.acquire(blocking=False))
+
+    def test_events_stream_is_time_limited(self):
+        """Test that a stream of an unchanging job ends after STATUS_EVENTS_MAX_DURATION."""
+        with patch("app.endpoints.status.Config.STATUS_EVENTS_MAX_DURATION", 0.3):
+            start = time.monotonic()
+            body = self.client.get("/api/status/video/events").get_data(as_text=True)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertIn("event: status", body)
+
+    def test_events_unknown_job(self):
+        """Test that streaming an unknown job returns 404."""
+        self.assertEqual(self.client.get("/api/status/missing/events").status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
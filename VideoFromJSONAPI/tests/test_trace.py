@@ -0,0 +1,171 @@
+"""Tests for per-job render traces."""
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.endpoints.jobs import jobs_bp
+from app.utils import util_trace
+from app.utils.util_job_store import job_store
+from app.utils.util_trace import job_trace, load_trace, span, to_otlp, traced
+from flask import Flask
+
+
+@traced("decode")
+def decode(seconds):
+    with span("read", seconds=seconds) as read:
+        time.sleep(seconds)
+        read.set(bytes=100)
+
+
+class TestJobTrace(unittest.TestCase):
+    """Test cases for recording and saving trace spans."""
+
+    def setUp(self):
+        """Write traces to a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.patch = patch.object(Config, "TRACE_DIR", self.temp_dir)
+        self.patch.start()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.patch.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def spans(self, video_id):
+        return {e["name"]: e for e in load_trace(video_id)["traceEvents"] if e["ph"] == "X"}
+
+    def test_spans_nest_under_the_job(self):
+        """Test that spans record their parent, timing and attributes."""
+        with job_trace("job-1", plan="pro") as trace:
+            trace.add("queue_wait", time.time() - 2, time.time() - 1)
+            decode(0.01)
+        spans = self.spans("job-1")
+        self.assertEqual(set(spans), {"render", "queue_wait", "decode", "read"})
+        self.assertEqual(spans["render"]["args"]["plan"], "pro")
+        self.assertEqual(spans["decode"]["args"]["parent_span_id"], spans["render"]["args"]["span_id"])
+        self.assertEqual(spans["read"]["args"]["parent_span_id"], spans["decode"]["args"]["span_id"])
+        self.assertEqual((spans["read"]["args"]["seconds"], spans["read"]["args"]["bytes"]), (0.01, 100))
+        self.assertGreaterEqual(spans["read"]["dur"], 10000)  # microseconds
+        self.assertLessEqual(spans["render"]["ts"], spans["decode"]["ts"])
+        self.assertAlmostEqual(spans["queue_wait"]["dur"], 1e6, delta=1000)
+
+    def test_nothing_is_recorded_outside_a_job(self):
+        """Test that instrumentation outside a traced job is a no-op."""
+        self.assertIs(span("idle"), util_trace._NULL_SPAN)
+        decode(0)
+        with patch.object(Config, "TRACE_ENABLED", False):
+            with job_trace("job-off") as trace:
+                decode(0)
+        self.assertIsNone(trace)
+        self.assertIsNone(load_trace("job-off"))
+
+    def test_other_threads_are_not_attached(self):
+        """Test that a thread started outside the job does not record into it."""
+        with job_trace("job-2"):
+            thread = threading.Thread(target=decode, args=(0,))
+            thread.start()
+            thread.join()
+        self.assertEqual(set(self.spans("job-2")), {"render"})
+
+    def test_errors_and_attempts_are_kept(self):
+        """Test that a failed attempt is saved and a retry adds to the same trace."""
+        with self.assertRaises(ValueError):
+            with job_trace("job-3"):
+                with span("encode"):
+                    raise ValueError("x264 crashed")
+        with job_trace("job-3"):
+            decode(0)
+        document = load_trace("job-3")
+        names = [e["args"]["name"] for e in document["traceEvents"] if e["ph"] == "M"]
+        self.assertEqual(len(names), 2)
+        self.assertTrue(names[1].endswith("(attempt 2)"))
+        encode = [e for e in document["traceEvents"] if e["name"] == "encode"][0]
+        self.assertEqual(encode["args"]["error"], "ValueError: x264 crashed")
+        self.assertIn("decode", {e["name"] for e in document["traceEvents"]})
+
+    def test_span_limit(self):
+        """Test that spans past TRACE_MAX_SPANS are counted, not kept (except the job's own)."""
+        with patch.object(Config, "TRACE_MAX_SPANS", 3):
+            with job_trace("job-4"):
+                for _ in range(5):
+                    decode(0)
+        document = load_trace("job-4")
+        spans = [e["name"] for e in document["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual(spans, ["read", "decode", "read", "render"])
+        self.assertEqual(document["otherData"]["dropped_spans"], 7)
+
+    def test_otlp_conversion(self):
+        """Test the OpenTelemetry export of a saved trace."""
+        with job_trace("job-5"):
+            decode(0)
+        document = load_trace("job-5")
+        spans = {s["name"]: s for s in to_otlp(document)["resourceSpans"][0]["scopeSpans"][0]["spans"]}
+        self.assertEqual(spans["read"]["parentSpanId"], spans["decode"]["spanId"])
+        self.assertEqual(spans["render"]["parentSpanId"], "")
+        self.assertEqual(len(spans["render"]["traceId"]), 32)
+        self.assertEqual(spans["read"]["startTimeUnixNano"], str(self.spans("job-5")["read"]["ts"] * 1000))
+        attributes = {a["key"]: a["value"] for a in spans["read"]["attributes"]}
+        self.assertEqual(attributes["bytes"], {"intValue": "100"})
+        self.assertEqual(attributes["seconds"], {"intValue": "0"})
+
+    def test_traces_are_exported_when_configured(self):
+        """Test that traces are posted to TRACE_OTLP_ENDPOINT."""
+        with patch.object(Config, "TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"), \
+                patch.object(util_trace, "export_otlp") as export:
+            with job_trace("job-6"):
+                decode(0)
+        self.assertEqual(export.call_args[0][0]["otherData"]["video_id"], "job-6")
+
+
+class TestTraceEndpoint(unittest.TestCase):
+    """Test cases for GET /jobs/<id>/trace."""
+
+    def setUp(self):
+        """Create a client and a job with a trace."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.patch = patch.object(Config, "TRACE_DIR", self.temp_dir)
+        self.patch.start()
+        app = Flask(__name__)
+        app.register_blueprint(jobs_bp)
+        self.client = app.test_client()
+        self.video_id = f"trace-{time.time_ns()}"
+        job_store.create_job(self.video_id, api_key="owner-key")
+        with job_trace(self.video_id):
+            decode(0)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.patch.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def test_trace_formats(self):
+        """Test the Chrome and OTLP forms of a job's trace."""
+        headers = {"X-API-Key": "owner-key"}
+        response = self.client.get(f"/jobs/{self.video_id}/trace", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("traceEvents", response.get_json())
+        response = self.client.get(f"/jobs/{self.video_id}/trace?format=otlp", headers=headers)
+        self.assertIn("resourceSpans", response.get_json())
+        response = self.client.get(f"/jobs/{self.video_id}/trace?format=svg", headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_trace_requires_owner(self):
+        """Test that only the owning API key may read a trace."""
+        self.assertEqual(self.client.get(f"/jobs/{self.video_id}/trace").status_code, 401)
+        response = self.client.get(f"/jobs/{self.video_id}/trace", headers={"X-API-Key": "other-key"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_missing_trace(self):
+        """Test that a job that was not rendered has no trace."""
+        video_id = f"untraced-{time.time_ns()}"
+        job_store.create_job(video_id, api_key="owner-key")
+        response = self.client.get(f"/jobs/{video_id}/trace", headers={"X-API-Key": "owner-key"})
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
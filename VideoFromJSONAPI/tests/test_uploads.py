@@ -0,0 +1,176 @@
+"""Tests for resumable uploads and the asset store."""
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.endpoints.upload import upload_bp
+from app.utils.util_ingest import AssetIngest
+from app.utils.util_job_store import JobStore
+from app.utils.util_uploads import UploadStore
+from flask import Flask
+
+
+class FlakyStream(io.BytesIO):
+    """A request body whose connection drops after ``fail_after`` bytes."""
+
+    def __init__(self, data, fail_after):
+        super().__init__(data)
+        self.fail_after = fail_after
+
+    def read(self, size=-1):
+        if self.tell() >= self.fail_after:
+            raise ConnectionResetError("client went away")
+        return super().read(min(size, self.fail_after - self.tell()))
+
+
+class TestUploadStore(unittest.TestCase):
+    """Test cases for chunked uploads into the asset store."""
+
+    def setUp(self):
+        """Create a job store and an upload store in a temporary directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.uploads = UploadStore(self.store, root=self.temp_dir, asset_dir="assets", parts_dir="parts")
+        self.data = os.urandom(300_000)
+        buffer_patch = patch.object(Config, "UPLOAD_BUFFER_SIZE", 64 * 1024)
+        buffer_patch.start()
+        self.addCleanup(buffer_patch.stop)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def upload(self, data, api_key="key", filename="clip.mp4", chunk=100_000):
+        upload_id = self.uploads.create(api_key, "video", filename, len(data))["upload_id"]
+        for offset in range(0, len(data), chunk):
+            outcome, _ = self.uploads.append(upload_id, api_key, offset, io.BytesIO(data[offset:offset + chunk]))
+            self.assertEqual(outcome, "appended")
+        return upload_id
+
+    def test_chunks_are_assembled_and_hashed(self):
+        """Test that a file sent in chunks is stored under its SHA-256."""
+        upload_id = self.upload(self.data)
+        outcome, asset = self.uploads.complete(upload_id, "key")
+        digest = hashlib.sha256(self.data).hexdigest()
+        self.assertEqual(outcome, "stored")
+        self.assertEqual(asset["asset_id"], f"sha256:{digest}")
+        self.assertTrue(asset["file_path"].endswith(f"{digest}.mp4"))
+        with open(os.path.join(self.temp_dir, asset["file_path"]), "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertIsNone(self.uploads.get(upload_id, "key"))
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, "parts")), [])
+
+    def test_identical_uploads_are_stored_once(self):
+        """Test that the same content from another key reuses the stored file."""
+        _, first = self.uploads.complete(self.upload(self.data), "key")
+        outcome, second = self.uploads.complete(self.upload(self.data, api_key="other", filename="x.mp4"), "other")
+        self.assertEqual(outcome, "deduplicated")
+        self.assertEqual(second, first)
+        self.assertEqual(len(os.listdir(os.path.dirname(os.path.join(self.temp_dir, first["file_path"])))), 1)
+
+    def test_dropped_connection_resumes_from_received_bytes(self):
+        """Test that bytes received before a failure are kept and hashed correctly."""
+        upload_id = self.uploads.create("key", "video", "clip.mp4", len(self.data))["upload_id"]
+        outcome, upload = self.uploads.append(upload_id, "key", 0, FlakyStream(self.data, 150_000))
+        self.assertEqual((outcome, upload["received"]), ("appended", 150_000))
+
+        # Resuming from the wrong offset is refused with the right one
+        outcome, upload = self.uploads.append(upload_id, "key", 0, io.BytesIO(self.data))
+        self.assertEqual((outcome, upload["received"]), ("conflict", 150_000))
+
+        # A process that did not see the first chunk re-hashes what is stored
+        fresh = UploadStore(self.store, root=self.temp_dir, asset_dir="assets", parts_dir="parts")
+        outcome, _ = fresh.append(upload_id, "key", 150_000, io.BytesIO(self.data[150_000:]))
+        self.assertEqual(outcome, "appended")
+        _, asset = fresh.complete(upload_id, "key", sha256=hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(asset["size"], len(self.data))
+
+    def test_limits_and_checks(self):
+        """Test the declared length, completeness, checksum and ownership checks."""
+        upload_id = self.uploads.create("key", "image", "a.png", 10)["upload_id"]
+        self.assertEqual(self.uploads.append(upload_id, "key", 0, io.BytesIO(b"x" * 11))[0], "too_large")
+        self.assertEqual(self.uploads.append(upload_id, "other", 0, io.BytesIO(b"x"))[0], "not_found")
+        self.assertEqual(self.uploads.append(upload_id, "key", 0, io.BytesIO(b"x" * 5))[0], "appended")
+        self.assertEqual(self.uploads.complete(upload_id, "key")[0], "incomplete")
+        self.uploads.append(upload_id, "key", 5, io.BytesIO(b"y" * 5))
+        self.assertEqual(self.uploads.complete(upload_id, "key", sha256="0" * 64)[0], "mismatch")
+        self.assertEqual(self.uploads.complete(upload_id, "key")[0], "not_found")
+
+    def test_idle_uploads_expire(self):
+        """Test that abandoned uploads and their part files are removed."""
+        upload_id = self.uploads.create("key", "audio", "a.mp3")["upload_id"]
+        with patch("time.time", return_value=os.path.getmtime(self.uploads.part_path(upload_id))
+                   + Config.UPLOAD_SESSION_TTL + 1):
+            self.assertEqual(self.uploads.expire(), 1)
+        self.assertIsNone(self.uploads.get(upload_id, "key"))
+        self.assertFalse(os.path.exists(self.uploads.part_path(upload_id)))
+
+
+class TestUploadEndpoints(unittest.TestCase):
+    """Test cases for the resumable upload endpoints."""
+
+    def setUp(self):
+        """Set up a test client with a temporary upload store."""
+        self.temp_dir = tempfile.mkdtemp()
+        store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        uploads = UploadStore(store, root=self.temp_dir, asset_dir="assets", parts_dir="parts")
+        patch("app.endpoints.upload.upload_store", uploads).start()
+        patch("app.endpoints.upload.asset_ingest", AssetIngest(store, root=self.temp_dir)).start()
+        patch("app.endpoints.upload.validate_api_key", return_value=True).start()
+        app = Flask(__name__)
+        app.register_blueprint(upload_bp, url_prefix="/api")
+        self.client = app.test_client()
+        self.headers = {"X-API-Key": "key"}
+
+    def tearDown(self):
+        """Remove patches and the temporary directory."""
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def test_upload_protocol(self):
+        """Test creating, resuming and completing an upload over HTTP."""
+        data = b"frame" * 1000
+        response = self.client.post("/api/uploads", json={"kind": "video", "filename": "pre.mp4",
+                                                          "length": len(data)}, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.get_json()["upload_id"]
+        url = f"/api/uploads/{upload_id}"
+
+        response = self.client.patch(url, data=data[:2000], headers={**self.headers, "Upload-Offset": "0"})
+        self.assertEqual(response.headers["Upload-Offset"], "2000")
+        response = self.client.patch(url, data=data[:2000], headers={**self.headers, "Upload-Offset": "0"})
+        self.assertEqual(response.status_code, 409)
+        offset = int(self.client.get(url, headers=self.headers).headers["Upload-Offset"])
+        self.client.patch(url, data=data[offset:], headers={**self.headers, "Upload-Offset": str(offset)})
+
+        response = self.client.post(f"{url}/complete", json={}, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        asset = json.loads(response.data)
+        self.assertEqual(asset["asset_id"], "sha256:" + hashlib.sha256(data).hexdigest())
+        self.assertFalse(asset["deduplicated"])
+        response = self.client.get(f"/api/assets/{asset['asset_id']}", headers=self.headers)
+        self.assertEqual(response.get_json()["file_path"], asset["file_path"])
+        self.assertEqual(response.get_json()["ingest"]["status"], "pending")
+
+    def test_invalid_requests(self):
+        """Test that bad kinds, sizes and offsets are rejected."""
+        response = self.client.post("/api/uploads", json={"kind": "pdf"}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/api/uploads", json={"kind": "video", "length": Config.UPLOAD_MAX_SIZE + 1},
+                                    headers=self.headers)
+        self.assertEqual(response.status_code, 413)
+        upload_id = self.client.post("/api/uploads", json={"kind": "audio"}, headers=self.headers).get_json()["upload_id"]
+        response = self.client.patch(f"/api/uploads/{upload_id}", data=b"x", headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.delete(f"/api/uploads/{upload_id}", headers=self.headers).status_code, 200)
+        self.assertEqual(self.client.get(f"/api/uploads/{upload_id}", headers=self.headers).status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""Tests for webhook delivery."""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+
+from app.config import Config
+from app.utils.util_job_store import JobStore
+from app.utils.util_webhook import (SIGNATURE_HEADER, TIMESTAMP_HEADER, WebhookOutbox,
+                                    parse_webhook, sign)
+
+
+class _ReceiverHandler(BaseHTTPRequestHandler):
+    """Records webhook requests; fails the first ``failures`` of them."""
+
+    received = []
+    failures = 0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if _ReceiverHandler.failures:
+            _ReceiverHandler.failures -= 1
+            self.send_response(503)
+        else:
+            _ReceiverHandler.received.append((self.path, dict(self.headers), body))
+            self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestWebhookOutbox(unittest.TestCase):
+    """Test cases for the webhook outbox and sender."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Start a local HTTP server standing in for webhook receivers."""
+        cls.server = HTTPServer(("127.0.0.1", 0), _ReceiverHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the HTTP server."""
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        """Create a temporary job store with an outbox."""
+        _ReceiverHandler.received = []
+        _ReceiverHandler.failures = 0
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.outbox = WebhookOutbox(self.store)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def create_job(self, video_id, **webhook):
+        targets, error = parse_webhook({"webhook": {"url": f"{self.base_url}/hook", **webhook}})
+        self.assertIsNone(error)
+        self.store.create_job(video_id, api_key="key", webhook=targets)
+
+    def test_finished_job_is_delivered_with_signature(self):
+        """Test that finishing a job queues a signed delivery."""
+        self.create_job("video", secret="s3cret")
+        self.assertEqual(self.outbox.deliveries("video"), [])
+        self.store.update_job("video", status="Completed", output_path="static/videos/video.mp4")
+        self.assertEqual(self.outbox.deliver_due(), 1)
+
+        path, headers, body = _ReceiverHandler.received[0]
+        self.assertEqual(path, "/hook")
+        self.assertEqual(headers[SIGNATURE_HEADER], sign("s3cret", headers[TIMESTAMP_HEADER], body))
+        event = json.loads(body)
+        self.assertEqual(event["event"], "job.completed")
+        self.assertEqual(event["download_url"], "/api/download/video.mp4")
+        self.assertIsNotNone(self.outbox.deliveries("video")[0]["delivered_at"])
+        self.assertEqual(self.outbox.deliver_due(), 0)
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        """Test that a failing receiver gets the event again later."""
+        self.create_job("video")
+        self.store.set_status("video", "Error: boom")
+        _ReceiverHandler.failures = 1
+        self.outbox.deliver_due()
+        delivery = self.outbox.deliveries("video")[0]
+        self.assertEqual(delivery["attempts"], 1)
+        self.assertEqual(delivery["last_error"], "HTTP 503")
+        self.assertGreater(delivery["next_attempt_at"], time.time())
+        self.assertEqual(self.outbox.deliver_due(), 0)
+
+        self.assertEqual(self.outbox.deliver_due(now=delivery["next_attempt_at"] + 1), 1)
+        self.assertEqual(json.loads(_ReceiverHandler.received[0][2])["error"], "boom")
+
+    def test_gives_up_after_max_attempts(self):
+        """Test that a delivery is abandoned after WEBHOOK_MAX_ATTEMPTS."""
+        self.create_job("video")
+        self.store.set_status("video", "Cancelled")
+        _ReceiverHandler.failures = 10
+        with patch.object(Config, "WEBHOOK_MAX_ATTEMPTS", 1):
+            self.outbox.deliver_due()
+        self.assertIsNotNone(self.outbox.deliveries("video")[0]["abandoned_at"])
+
+    def test_batching_sends_one_request_per_endpoint(self):
+        """Test that batchable events for one endpoint share a request."""
+        for video_id in ("a", "b", "c"):
+            self.create_job(video_id, batch=True)
+            self.store.set_status(video_id, "Completed")
+        self.assertEqual(self.outbox.deliver_due(), 3)
+        self.assertEqual(len(_ReceiverHandler.received), 1)
+        events = json.loads(_ReceiverHandler.received[0][2])["events"]
+        self.assertEqual(sorted(event["video_id"] for event in events), ["a", "b", "c"])
+
+    def test_job_created_finished_queues_once(self):
+        """Test that reused jobs (inserted as finished) queue exactly one delivery."""
+        targets, _ = parse_webhook({"webhook": f"{self.base_url}/hook"})
+        self.store.create_job("video", status="Completed", finished_at=time.time(), webhook=targets)
+        self.store.update_job("video", output_path="static/videos/video.mp4")
+        self.assertEqual(len(self.outbox.deliveries("video")), 1)
+
+    def test_global_webhooks_follow_outcome(self):
+        """Test that SUCCESS_WEBHOOK_URL and ERROR_WEBHOOK_URL only get their events."""
+        with patch.object(Config, "SUCCESS_WEBHOOK_URL", f"{self.base_url}/ok"), \
+                patch.object(Config, "ERROR_WEBHOOK_URL", f"{self.base_url}/error"):
+            targets, _ = parse_webhook({})
+        self.store.create_job("video", webhook=targets)
+        self.store.set_status("video", "Error: boom")
+        self.assertEqual([d["url"] for d in self.outbox.deliveries("video")], [f"{self.base_url}/error"])
+
+    def test_invalid_webhook(self):
+        """Test that non-http webhook URLs are rejected."""
+        self.assertIsNotNone(parse_webhook({"webhook": "ftp://example.com"})[1])
+        self.assertEqual(parse_webhook({}), (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
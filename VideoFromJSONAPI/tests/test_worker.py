@@ -0,0 +1,186 @@
+"""Tests for job leases and the standalone render worker."""
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from app.config import Config
+from app.utils.util_job_store import JobStore
+from app.utils.util_scheduler import FairShareScheduler
+
+from tests.test_cancellation import _group_is_running, _stuck_render, wait_until
+
+
+class TestJobLeases(unittest.TestCase):
+    """Test cases for lease heartbeats and visibility timeouts."""
+
+    def setUp(self):
+        """Create a temporary job store with one queued job."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.scheduler = FairShareScheduler(self.store, workers=1)
+        self.scheduler._ensure_workers = lambda: None
+        self.store.create_job("video", api_key="key")
+        self.scheduler.submit("video", "free", {})
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def lease(self, worker_id):
+        return self.store.lease_next_job(worker_id, self.scheduler.choose)
+
+    def expire(self):
+        self.store._connect().execute("UPDATE jobs SET lease_expires_at = 0")
+
+    def test_heartbeat_extends_lease(self):
+        """Test that a live worker keeps its job."""
+        self.assertEqual(self.lease("a")["worker_id"], "a")
+        self.assertTrue(self.store.heartbeat("video", "a"))
+        self.assertGreater(self.store.get_job("video")["lease_expires_at"], time.time())
+        self.assertIsNone(self.lease("b"))
+
+    def test_expired_lease_goes_to_another_worker(self):
+        """Test that a job whose worker stopped heartbeating is leased again."""
+        self.lease("a")
+        self.expire()
+        job = self.lease("b")
+        self.assertEqual(job["worker_id"], "b")
+        self.assertEqual(job["attempts"], 2)
+        self.assertFalse(self.store.heartbeat("video", "a"))
+        # The stale worker's release does not touch the new lease
+        self.store.release_job("video", "a")
+        self.assertEqual(self.store.get_job("video")["queue_state"], "leased")
+
+    def test_job_fails_after_max_attempts(self):
+        """Test that a job that keeps losing its worker is failed."""
+        for attempt in range(Config.MAX_JOB_ATTEMPTS):
+            self.assertIsNotNone(self.lease(f"worker-{attempt}"))
+            self.expire()
+        self.assertIsNone(self.lease("last"))
+        job = self.store.get_job("video")
+        self.assertTrue(job["status"].startswith("Error"))
+        self.assertEqual(job["queue_state"], "done")
+
+    def test_finished_job_is_not_rendered_again(self):
+        """Test that a job finished before its worker died is just released."""
+        self.lease("a")
+        self.store.set_status("video", "Completed")
+        self.expire()
+        self.assertIsNone(self.lease("b"))
+        self.assertEqual(self.store.get_job("video")["queue_state"], "done")
+
+    def test_requeue(self):
+        """Test that a worker can hand its job back."""
+        self.lease("a")
+        self.assertFalse(self.store.requeue_job("video", "b"))
+        self.assertTrue(self.store.requeue_job("video", "a"))
+        self.assertEqual(self.lease("b")["worker_id"], "b")
+
+
+class TestLostLease(unittest.TestCase):
+    """Test cases for workers that lose their lease while rendering."""
+
+    def setUp(self):
+        """Create a scheduler whose renders never finish on their own."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = JobStore(os.path.join(self.temp_dir, "jobs.sqlite3"))
+        self.scheduler = FairShareScheduler(self.store, workers=1, render_target=_stuck_render)
+        self.scheduler._ensure_workers = lambda: None
+        self.pid_file = os.path.join(self.temp_dir, "child.pid")
+        for p in (
+            patch.object(Config, "RENDER_SUPERVISE_INTERVAL", 0.1),
+            patch.object(Config, "LEASE_HEARTBEAT_INTERVAL", 0.1),
+            patch.object(Config, "RENDER_KILL_GRACE", 1),
+        ):
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def start_job(self, create=True):
+        if create:
+            self.store.create_job("video", api_key="key")
+            self.scheduler.submit("video", "free", {"pid_file": self.pid_file})
+        elif os.path.exists(self.pid_file):
+            os.remove(self.pid_file)
+        job = self.store.lease_next_job("a", self.scheduler.choose)
+        worker = threading.Thread(target=self.scheduler.run_job, args=(job,))
+        worker.start()
+        wait_until(lambda: os.path.exists(self.pid_file), 60, "render process did not start")
+        with open(self.pid_file) as f:
+            return worker, os.getpgid(int(f.read()))
+
+    def kill_render(self):
+        # The render process leads its own process group
+        os.killpg(self.scheduler._processes["video"].pid, signal.SIGKILL)
+
+    def test_render_stops_when_lease_is_taken(self):
+        """Test that a worker stops rendering a job another worker now owns."""
+        worker, pgid = self.start_job()
+        self.store._connect().execute("UPDATE jobs SET worker_id = 'b'")
+        worker.join(30)
+        self.assertFalse(worker.is_alive())
+        wait_until(lambda: not _group_is_running(pgid), 10, "render process group is still running")
+        job = self.store.get_job("video")
+        self.assertEqual((job["status"], job["queue_state"], job["worker_id"]), ("Processing", "leased", "b"))
+
+    def test_abort_running_requeues_job(self):
+        """Test that a shutting-down worker hands its running job back."""
+        worker, pgid = self.start_job()
+        self.scheduler.stop()
+        self.scheduler.abort_running()
+        worker.join(30)
+        wait_until(lambda: not _group_is_running(pgid), 10, "render process group is still running")
+        job = self.store.get_job("video")
+        self.assertEqual((job["status"], job["queue_state"]), ("Processing", "queued"))
+
+    def test_killed_render_is_queued_again(self):
+        """Test that a render killed by a signal (e.g. OOM) is retried."""
+        worker, _ = self.start_job()
+        self.kill_render()
+        worker.join(30)
+        job = self.store.get_job("video")
+        self.assertEqual((job["status"], job["queue_state"]), ("Processing", "queued"))
+        with patch.object(Config, "MAX_JOB_ATTEMPTS", 1):
+            worker, _ = self.start_job(create=False)
+            self.kill_render()
+            worker.join(30)
+        self.assertTrue(self.store.get_status("video").startswith("Error"))
+
+
+class TestWorkerProcess(unittest.TestCase):
+    """Test cases for python -m app.worker."""
+
+    def test_worker_exits_cleanly_on_sigterm(self):
+        """Test that an idle worker starts and stops on SIGTERM."""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        env = {**os.environ, "JOB_STORE_PATH": os.path.join(temp_dir, "jobs.sqlite3")}
+        process = subprocess.Popen(
+            [sys.executable, "-m", "app.worker", "--workers", "1"],
+            cwd=Config.ROOT_DIR,
+            env=env,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        deadline = time.time() + 60
+        output = ""
+        while "started" not in output:
+            self.assertLess(time.time(), deadline, "worker did not start")
+            output += process.stderr.readline()
+        process.send_signal(signal.SIGTERM)
+        self.assertEqual(process.wait(30), 0)
+        process.stderr.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
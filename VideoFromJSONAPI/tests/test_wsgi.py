@@ -0,0 +1,86 @@
+"""Tests for the gunicorn serving configuration."""
+import importlib
+import os
+import runpy
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest.mock import DEFAULT, MagicMock, patch
+
+from app.config import Config
+
+CONFIG_FILE = os.path.join(Config.ROOT_DIR, "gunicorn.conf.py")
+
+
+class TestGunicornConfig(unittest.TestCase):
+    """Test cases for gunicorn.conf.py."""
+
+    def setUp(self):
+        """Load the config file with a stand-in for application.py."""
+        self.application = MagicMock()
+        modules = patch.dict(sys.modules, {"application": self.application})
+        modules.start()
+        self.addCleanup(modules.stop)
+        environ = patch.dict(os.environ)
+        environ.start()
+        self.addCleanup(environ.stop)
+        self.settings = runpy.run_path(CONFIG_FILE)
+
+    def server(self, workers):
+        return SimpleNamespace(cfg=SimpleNamespace(workers=workers))
+
+    def test_settings_come_from_config(self):
+        """Test the worker, thread and preload settings."""
+        self.assertEqual(self.settings["wsgi_app"], "application:application")
+        self.assertEqual(self.settings["workers"], Config.API_WORKERS)
+        self.assertEqual(self.settings["threads"], Config.API_THREADS)
+        self.assertEqual(self.settings["worker_class"], "gthread")
+        self.assertEqual(self.settings["preload_app"], Config.API_PRELOAD)
+        self.assertEqual(os.environ["WSGI_SERVER"], "gunicorn")
+
+    def test_startup_work_runs_in_the_master_only(self):
+        """Test that one-off work runs on starting and threads start per worker."""
+        self.settings["on_starting"](self.server(4))
+        self.application.prepare_runtime.assert_called_once_with()
+        self.application.cleanup_temp_files.assert_called_once_with()
+        self.application.start_background_services.assert_not_called()
+
+        for _ in range(4):
+            self.settings["post_fork"](self.server(4), None)
+        self.assertEqual(self.application.start_background_services.call_count, 4)
+        self.assertEqual(self.application.setup_logging.call_count, 4)
+        self.application.prepare_runtime.assert_called_once_with()
+
+    def test_per_process_rate_limits_are_refused(self):
+        """Test that the in-memory rate limit backend needs a single worker."""
+        with patch.object(Config, "RATE_LIMIT_BACKEND", "memory"):
+            with self.assertRaises(RuntimeError):
+                self.settings["on_starting"](self.server(2))
+            self.settings["on_starting"](self.server(1))
+        self.application.prepare_runtime.assert_called_once_with()
+
+
+class TestBackgroundServices(unittest.TestCase):
+    """Test cases for the threads each serving process starts."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Import application.py without starting the development server's services."""
+        with patch.object(Config, "WSGI_SERVER", "gunicorn"):
+            cls.application = importlib.import_module("application")
+
+    def test_render_workers_start_with_the_process(self):
+        """Test that a rendering process starts its workers on boot, not on the first submit."""
+        for workers, started in ((2, True), (0, False)):
+            with patch.object(Config, "RENDER_WORKERS", workers), patch.multiple(
+                self.application, webhook_outbox=DEFAULT, metrics=DEFAULT,
+                asset_ingest=DEFAULT, render_scheduler=DEFAULT,
+            ) as services:
+                self.application.start_background_services()
+            self.assertEqual(services["render_scheduler"].start.called, started, workers)
+            self.assertEqual(services["asset_ingest"].start.called, started, workers)
+            services["webhook_outbox"].start.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,46 @@
 from flask import Blueprint, render_template, request, jsonify, current_app
+from jsonschema import Draft202012Validator
 import logging
 import os
+import requests
 
 routes = Blueprint("routes", __name__)
 
 logger = logging.getLogger(__name__)
 
+# Validator for creation bodies, built from the schema the API publishes
+creation_validator = None
+
+
+def validate_creation_form(form_data):
+    """
+    Return the API's schema errors for a creation form, as "path: message" strings.
+
+    If the schema cannot be loaded the form is reported as an error rather
+    than passed as valid; the next submission tries to load it again.
+    """
+    global creation_validator
+    if creation_validator is None:
+        try:
+            response = requests.get(
+                f"{current_app.config['API_BASE_URL']}/api/creation/schema", timeout=5
+            )
+            response.raise_for_status()
+            creation_validator = Draft202012Validator(response.json())
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Could not load the creation schema: {e}")
+            return [f"/: could not load the creation schema from the API ({e})"]
+    # Empty form fields mean "use the default"
+    body = {
+        key: value
+        for key, value in form_data.items()
+        if key != "api_key" and value not in ("", None)
+    }
+    return [
+        "/" + "/".join(str(part) for part in error.absolute_path) + ": " + error.message
+        for error in creation_validator.iter_errors(body)
+    ]
+
 
 @routes.route("/web")
 def web_index():
@@ -170,6 +205,19 @@ def web_creation():
         audio_filters = form_data.get("audio_filters", {})
         segment_audio_effects = form_data.get("segment_audio_effects", [])
 
+        # Reject the form before rendering if the API would reject it
+        errors = validate_creation_form(form_data)
+        if errors:
+            return render_template(
+                "creation.html",
+                allowed_fade_effects=sorted(current_app.config["ALLOWED_FADE_EFFECTS"]),
+                social_presets=list(current_app.config["SOCIAL_MEDIA_PRESETS"].keys()),
+                error="; ".join(errors),
+                form_data=form_data,
+                background_music_files=background_music_files,
+                sound_effect_files=sound_effect_files,
+            )
+
         # Handle social preset
         if social_preset:
             preset = current_app.config["SOCIAL_MEDIA_PRESETS"].get(social_preset)
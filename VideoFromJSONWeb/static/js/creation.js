@@ -286,57 +286,114 @@ function populateFormFields(data) {
     }
 }
 
-// Add polling function to check video status
+// Follow video status: stream updates over Server-Sent Events when the
+// browser supports them, otherwise long-poll the status endpoint
 function pollStatus(videoId) {
-    var checkStatus = setInterval(function () {
-        fetch('/api/status/' + videoId)
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error(`Status fetch error: ${response.status}`);
-                }
-                return response.json();
-            })
-            .then(data => {
-                var statusText = document.getElementById('status-text');
-                if (statusText) {
-                    statusText.innerText = data.status;
-                } else {
-                    console.error("status-text element not found");
-                }
+    if (window.EventSource) {
+        var source = new EventSource('/api/status/' + videoId + '/events');
+        source.addEventListener('status', function (event) {
+            var data = JSON.parse(event.data);
+            if (showStatus(videoId, data)) {
+                source.close();
+            }
+        });
+        source.onerror = function () {
+            // The stream closes when the job finishes; fall back only if it never opened
+            if (source.readyState === EventSource.CLOSED) {
+                longPollStatus(videoId);
+            }
+        };
+        return;
+    }
+    longPollStatus(videoId);
+}
 
-                if (data.status === "Completed") {
-                    clearInterval(checkStatus);
-                    var videoSource = document.getElementById('video-source');
-                    var videoPlayer = document.getElementById('video-player');
-
-                    if (videoSource && videoPlayer) {
-                        videoSource.src = '/api/download/' + videoId + '.mp4';
-                        videoPlayer.style.display = 'block';
-                        videoPlayer.load(); // Ensure the video element loads the new source
-                        videoPlayer.play().catch(error => {
-                            console.error('Error playing the video:', error);
-                        }); // Attempt to play the video
-                    } else {
-                        console.error("video-source or video-player element not found");
-                    }
-                } else if (data.status === "Error") {
-                    clearInterval(checkStatus);
-                    if (statusText) {
-                        statusText.innerText = 'An error occurred during processing.';
-                    } else {
-                        console.error("status-text element not found");
-                    }
-                }
-            })
-            .catch(error => {
-                console.error('Error fetching status:', error);
-                clearInterval(checkStatus);
-                var statusText = document.getElementById('status-text');
-                if (statusText) {
-                    statusText.innerText = 'Failed to fetch video status.';
-                } else {
-                    console.error("status-text element not found");
-                }
-            });
-    }, 5000);
+function longPollStatus(videoId, since) {
+    var url = '/api/status/' + videoId + '?wait=30' + (since ? '&since=' + since : '');
+    fetch(url)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Status fetch error: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            if (!showStatus(videoId, data)) {
+                longPollStatus(videoId, data.updated_at);
+            }
+        })
+        .catch(error => {
+            console.error('Error fetching status:', error);
+            var statusText = document.getElementById('status-text');
+            if (statusText) {
+                statusText.innerText = 'Failed to fetch video status.';
+            } else {
+                console.error("status-text element not found");
+            }
+        });
+}
+
+// Downloads need the owner's API key; a video element cannot send headers,
+// so the key from the form goes in the query string
+function downloadUrl(videoId) {
+    var apiKeyInput = document.getElementById('api_key');
+    var apiKey = apiKeyInput ? apiKeyInput.value : '';
+    return '/api/download/' + videoId + '.mp4?inline=1&api_key=' + encodeURIComponent(apiKey);
+}
+
+// Update the page from a status JSON; returns true once the job has finished
+function showStatus(videoId, data) {
+    var statusText = document.getElementById('status-text');
+    if (statusText) {
+        statusText.innerText = describeStatus(data);
+    } else {
+        console.error("status-text element not found");
+    }
+
+    if (data.status === "Completed") {
+        var videoSource = document.getElementById('video-source');
+        var videoPlayer = document.getElementById('video-player');
+
+        if (videoSource && videoPlayer) {
+            videoSource.src = downloadUrl(videoId);
+            videoPlayer.style.display = 'block';
+            videoPlayer.load(); // Ensure the video element loads the new source
+            videoPlayer.play().catch(error => {
+                console.error('Error playing the video:', error);
+            }); // Attempt to play the video
+        } else {
+            console.error("video-source or video-player element not found");
+        }
+        return true;
+    } else if (data.status.startsWith("Error")) {
+        if (statusText) {
+            statusText.innerText = 'An error occurred during processing.';
+        } else {
+            console.error("status-text element not found");
+        }
+        return true;
+    } else if (data.status === "Cancelled" || data.status === "TimedOut") {
+        if (statusText) {
+            statusText.innerText = data.status === "Cancelled"
+                ? 'The video was cancelled.'
+                : 'The video took too long to render and was stopped.';
+        } else {
+            console.error("status-text element not found");
+        }
+        return true;
+    }
+    return data.status === "Unknown video ID";
+}
+
+// Build a human readable status line from the status JSON
+function describeStatus(data) {
+    var progress = data.progress;
+    if (!progress || !progress.stage || data.status !== "Processing") {
+        return data.status;
+    }
+    var text = data.status + ' (' + progress.stage + ', ' + Math.round(progress.percent) + '%';
+    if (progress.eta_seconds) {
+        text += ', about ' + Math.ceil(progress.eta_seconds) + 's left';
+    }
+    return text + ')';
 }